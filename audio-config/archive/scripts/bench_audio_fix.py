@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Benchmark the speaker fix and diagnostic paths
+
+Runs speaker_pin_fix.py (--verify-only and a full fix cycle) and
+sof_speaker_fix.main() against fixture codec dumps, served from a fake
+sysfs/proc/dev tree (SimulatedCodecTree) so no hardware or root is needed.
+
+Timings are broken down by phase:
+  startup      - fresh interpreter running `import speaker_pin_fix`
+  import       - startup minus a bare interpreter start
+  parse_cold   - parse_codec_dump() with an empty block cache
+  parse_warm   - parse_codec_dump() of an already seen dump
+  node_lookup  - looking up the speaker path nodes in a parsed dump
+  verify       - pre-fix verify_codec_state() (dump read + parse + checks)
+  verb_write   - time spent inside the backend writing the fix verbs
+  reconfig_wait- rest of the fix transaction: reconfig + settle polling
+  post_verify  - verify_codec_state() after the fix
+and end-to-end: verify_only, fix_cycle (speaker_pin_fix main) and sof_main.
+
+Results are JSON lines (one object per scenario/backend/phase) so they
+can be stored and compared; --baseline flags phases that got slower,
+and parse_cold slower than --min-parse-rate dumps per second.
+
+Usage:
+    ./bench_audio_fix.py                       # JSON lines on stdout
+    ./bench_audio_fix.py --format text
+    ./bench_audio_fix.py -o new.jsonl --baseline old.jsonl
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from hdacodec import (HDCodecController, CodecBackend, SimulatedBackend,
+                      SimulatedCodec, SimulatedCodecTree, parse_codec_dump)
+from hdacodec import dump as dump_module
+from hdacodec.simulator import ALC298_FIXTURE
+
+import speaker_pin_fix
+import sof_speaker_fix
+
+BACKENDS = ('sim', 'sysfs', 'hwdep')
+SPEAKER_NODES = (0x03, 0x0d, 0x17)
+
+
+class TimedBackend(CodecBackend):
+    """Wrap a backend and accumulate the time spent writing verbs"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.needs_reconfig = backend.needs_reconfig
+        self.write_ns = 0
+        if hasattr(backend, 'read_verb'):
+            self.read_verb = backend.read_verb
+
+    def codec_info(self):
+        return self.backend.codec_info()
+
+    def read_dump(self):
+        return self.backend.read_dump()
+
+    def write_verbs(self, verbs):
+        start = time.perf_counter_ns()
+        try:
+            self.backend.write_verbs(verbs)
+        finally:
+            self.write_ns += time.perf_counter_ns() - start
+
+    def reconfigure(self):
+        self.backend.reconfigure()
+
+    def close(self):
+        self.backend.close()
+
+
+class Bench:
+    """Collects samples per (scenario, backend, dump, phase)"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, key, ns):
+        self.samples.setdefault(key, []).append(ns / 1000.0)
+
+    def time(self, key, func, *args):
+        start = time.perf_counter_ns()
+        result = func(*args)
+        self.add(key, time.perf_counter_ns() - start)
+        return result
+
+    def results(self):
+        for (scenario, backend, dump, phase), us in self.samples.items():
+            us = sorted(us)
+            yield {
+                'scenario': scenario,
+                'backend': backend,
+                'dump': dump,
+                'phase': phase,
+                'n': len(us),
+                'min_us': round(us[0], 1),
+                'median_us': round(statistics.median(us), 1),
+                'p95_us': round(us[min(len(us) - 1, int(len(us) * 0.95))], 1),
+                'max_us': round(us[-1], 1),
+                'mean_us': round(statistics.fmean(us), 1),
+            }
+
+
+def bench_startup(bench, iterations):
+    """Time a cold interpreter importing the fix script vs. a bare start"""
+    def run(code):
+        start = time.perf_counter_ns()
+        subprocess.run([sys.executable, '-c', code], cwd=SCRIPT_DIR, check=True)
+        return time.perf_counter_ns() - start
+
+    for _ in range(iterations):
+        bare = run('pass')
+        full = run('import speaker_pin_fix')
+        bench.add(('speaker_pin_fix', None, None, 'startup'), full)
+        bench.add(('speaker_pin_fix', None, None, 'import'), max(full - bare, 0))
+
+
+def bench_parse(bench, name, text, iterations):
+    """Time cold/warm dump parsing and speaker node lookups"""
+    for _ in range(iterations):
+        dump_module._block_cache.clear()
+        bench.time(('parse', None, name, 'parse_cold'), parse_codec_dump, text)
+        dump = bench.time(('parse', None, name, 'parse_warm'), parse_codec_dump, text)
+
+        start = time.perf_counter_ns()
+        for node_id in SPEAKER_NODES:
+            dump.node(node_id)
+        bench.add(('parse', None, name, 'node_lookup'), time.perf_counter_ns() - start)
+
+
+def make_backend(kind, tree):
+    if kind == 'sim':
+        return SimulatedBackend(tree.codec)
+    if kind == 'sysfs':
+        return tree.sysfs_backend()
+    return tree.hwdep_backend()
+
+
+def reset_codec(tree):
+    tree.codec.reset()
+    tree.sync()
+
+
+def bench_fix(bench, name, tree, kind, iterations):
+    """Time speaker_pin_fix phase by phase, then its main() and sof main()"""
+    for _ in range(iterations):
+        reset_codec(tree)
+        backend = TimedBackend(make_backend(kind, tree))
+        codec = HDCodecController(backend)
+
+        t0 = time.perf_counter_ns()
+        speaker_pin_fix.verify_codec_state(codec)
+        t1 = time.perf_counter_ns()
+        speaker_pin_fix.unmute_speaker_pin(codec)
+        t2 = time.perf_counter_ns()
+        speaker_pin_fix.verify_codec_state(codec)
+        t3 = time.perf_counter_ns()
+        codec.close()
+
+        key = ('speaker_pin_fix', kind, name)
+        bench.add(key + ('verify',), t1 - t0)
+        bench.add(key + ('verb_write',), backend.write_ns)
+        bench.add(key + ('reconfig_wait',), t2 - t1 - backend.write_ns)
+        bench.add(key + ('post_verify',), t3 - t2)
+
+        reset_codec(tree)
+        codec = HDCodecController(make_backend(kind, tree))
+        bench.time(key + ('verify_only',), speaker_pin_fix.main, ['--verify-only'], codec)
+        bench.time(key + ('fix_cycle',), speaker_pin_fix.main, [], codec)
+        codec.close()
+
+        if kind != 'sysfs':
+            # sof_speaker_fix needs GET verbs, which init_verbs cannot do
+            reset_codec(tree)
+            codec = HDCodecController(make_backend(kind, tree))
+            bench.time(('sof_speaker_fix', kind, name, 'sof_main'), sof_speaker_fix.main, codec)
+
+
+def compare(results, baseline_path, threshold, min_delta_us, min_parse_rate=0):
+    """
+    Return messages for phases whose median grew by more than threshold
+    Growth below min_delta_us is timer noise and never counts. A
+    parse_cold median under min_parse_rate dumps per second counts too,
+    baseline or not.
+    """
+    def key(r):
+        return (r['scenario'], r['backend'], r['dump'], r['phase'])
+
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                baseline[key(r)] = r
+
+    regressions = []
+    for r in results:
+        if r['phase'] == 'parse_cold' and min_parse_rate and r['median_us']:
+            rate = 1e6 / r['median_us']
+            if rate < min_parse_rate:
+                regressions.append(f"{'/'.join(str(k) for k in key(r) if k)}: "
+                                   f"{rate:.0f} dumps/s, below {min_parse_rate:.0f}")
+        old = baseline.get(key(r))
+        if not old or not old['median_us']:
+            continue
+        ratio = r['median_us'] / old['median_us']
+        if ratio > threshold and r['median_us'] - old['median_us'] >= min_delta_us:
+            regressions.append(f"{'/'.join(str(k) for k in key(r) if k)}: "
+                               f"{old['median_us']:.1f} -> {r['median_us']:.1f} us "
+                               f"(x{ratio:.2f})")
+    return regressions
+
+
+def format_text(results):
+    lines = [f"{'scenario':<16} {'backend':<7} {'phase':<14} {'n':>4} "
+             f"{'median us':>10} {'p95 us':>10} {'min us':>10}"]
+    for r in results:
+        lines.append(f"{r['scenario']:<16} {r['backend'] or '-':<7} {r['phase']:<14} "
+                     f"{r['n']:>4} {r['median_us']:>10.1f} {r['p95_us']:>10.1f} "
+                     f"{r['min_us']:>10.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the speaker fix and diagnostic paths on simulated codecs"
+    )
+    parser.add_argument('--dump', action='append', type=Path,
+                        help=f'Codec dump fixture (repeatable, default: {ALC298_FIXTURE.name})')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='Backend(s) to benchmark (default: all)')
+    parser.add_argument('-n', '--iterations', type=int, default=50,
+                        help='Iterations per in-process phase (default: 50)')
+    parser.add_argument('--startup-iterations', type=int, default=5,
+                        help='Interpreter starts to time, 0 to skip (default: 5)')
+    parser.add_argument('--format', choices=('json', 'text'), default='json',
+                        help='Output format (default: JSON lines)')
+    parser.add_argument('-o', '--output', type=Path,
+                        help='Also write JSON lines results to this file')
+    parser.add_argument('--baseline', type=Path,
+                        help='JSON lines results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Median slowdown ratio counted as a regression (default: 1.25)')
+    parser.add_argument('--min-delta-us', type=float, default=5.0,
+                        help='Ignore slowdowns smaller than this (default: 5 us)')
+    parser.add_argument('--min-parse-rate', type=float, default=200.0,
+                        help='Cold parses per second each dump must reach, '
+                             '0 to skip (default: 200)')
+    args = parser.parse_args()
+
+    dumps = args.dump or [ALC298_FIXTURE]
+    backends = args.backend or BACKENDS
+    bench = Bench()
+
+    if args.startup_iterations:
+        bench_startup(bench, args.startup_iterations)
+
+    with tempfile.TemporaryDirectory(prefix='hda-bench-') as tmp, \
+            open(os.devnull, 'w') as devnull:
+        for path in dumps:
+            text = path.read_text()
+            bench_parse(bench, path.name, text, args.iterations)
+
+            for kind in backends:
+                tree = SimulatedCodecTree(Path(tmp) / path.stem / kind,
+                                          SimulatedCodec.from_text(text))
+                # The scripts print as they go; keep that cost, drop the text
+                with contextlib.redirect_stdout(devnull):
+                    bench_fix(bench, path.name, tree, kind, args.iterations)
+                if tree.codec.rejected:
+                    print(f"warning: {path.name}/{kind}: codec rejected "
+                          f"{len(tree.codec.rejected)} verbs", file=sys.stderr)
+
+    meta = {'python': platform.python_version(), 'machine': platform.machine()}
+    results = [dict(r, **meta) for r in bench.results()]
+
+    if args.format == 'json':
+        for r in results:
+            print(json.dumps(r))
+    else:
+        print(format_text(results))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold,
+                              args.min_delta_us, args.min_parse_rate)
+        for msg in regressions:
+            print(f"REGRESSION {msg}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
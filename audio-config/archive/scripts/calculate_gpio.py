@@ -13,11 +13,21 @@ Intel GPIO numbering:
 - Need to identify which community pin 98 belongs to
 """
 
+import argparse
 import os
 import sys
-import subprocess
 from pathlib import Path
 
+from gpiotools import (
+    GpioTopology, load_topology, acpi_gpio_resources, GpioChip, find_chip
+)
+from gpiotools.debugfs import GpioDebugfsIndex, load_gpio_debugfs
+from gpiotools.i2c import I2cBus, MAX98390_ADDRS
+from gpiotools.search import search_lines, wait_for, PARALLEL, SEQUENTIAL
+
+# I2C bus the MAX98390 amplifiers sit on
+MAX98390_BUS = 2
+
 class Color:
     RED = '\033[0;31m'
     GREEN = '\033[0;32m'
@@ -33,114 +43,118 @@ def read_sysfs(path):
         return None
 
 def get_gpio_chips():
-    """Get all GPIO chips with their information."""
-    chips = []
-    gpio_path = Path('/sys/class/gpio')
-
-    for chip_dir in sorted(gpio_path.glob('gpiochip*')):
-        base = int(read_sysfs(chip_dir / 'base') or -1)
-        ngpio = int(read_sysfs(chip_dir / 'ngpio') or 0)
-        label = read_sysfs(chip_dir / 'label') or 'unknown'
-
-        if base >= 0:
-            chips.append({
-                'name': chip_dir.name,
-                'base': base,
-                'ngpio': ngpio,
-                'end': base + ngpio - 1,
-                'label': label
-            })
-
-    return sorted(chips, key=lambda x: x['base'])
+    """Get all GPIO chips with their information (read once, then cached)."""
+    return load_topology().chips
 
 def check_gpio_debugfs():
-    """Check GPIO debugfs for more information."""
-    debugfs_path = Path('/sys/kernel/debug/gpio')
-    if debugfs_path.exists():
-        try:
-            content = debugfs_path.read_text()
-            return content
-        except PermissionError:
-            return "Permission denied. Run with sudo."
-    return None
+    """Index the lines GPIO debugfs reports as requested.
+
+    Returns (GpioDebugfsIndex, error message or None); the index is empty
+    when debugfs could not be read.
+    """
+    try:
+        return load_gpio_debugfs(), None
+    except PermissionError:
+        return GpioDebugfsIndex(), "Permission denied. Run with sudo."
+    except OSError:
+        return GpioDebugfsIndex(), "Not available"
 
 def find_gpio_in_chip(pin_number, chips):
     """Find which chip a pin number belongs to."""
-    candidates = []
-
     # Method 1: Direct offset (pin_number is relative to chip base)
-    for chip in chips:
-        gpio_number = chip['base'] + pin_number
-        if gpio_number <= chip['end']:
-            candidates.append({
-                'method': 'direct_offset',
-                'chip': chip,
-                'gpio': gpio_number,
-                'confidence': 'high' if 'INT' in chip['label'] else 'medium'
-            })
-
     # Method 2: Absolute pin number (if pin is in chip range)
-    for chip in chips:
-        if chip['base'] <= pin_number <= chip['end']:
-            candidates.append({
-                'method': 'absolute',
-                'chip': chip,
-                'gpio': pin_number,
-                'confidence': 'medium'
-            })
-
-    return candidates
-
-def test_gpio(gpio_number, dry_run=False):
-    """Test if a GPIO number can be exported and controlled."""
-    export_path = Path('/sys/class/gpio/export')
-    gpio_path = Path(f'/sys/class/gpio/gpio{gpio_number}')
-
-    if gpio_path.exists():
-        print(f"  {Color.YELLOW}GPIO {gpio_number} already exported{Color.NC}")
-        return True
+    return GpioTopology(chips).candidates(pin_number)
+
+def map_dsdt_gpios(asl_path, topology):
+    """Map every GpioIo/GpioInt resource of a disassembled DSDT to Linux GPIOs."""
+    resources = acpi_gpio_resources(Path(asl_path).read_text(errors='replace'))
+    print(f"Found {len(resources)} GPIO resources in {asl_path}\n")
+
+    # Resolve all pins of one controller in a single batch
+    by_source = {}
+    for res in resources:
+        by_source.setdefault(res['source'], set()).update(res['pins'])
+    resolved = {source: topology.resolve_many(pins, source)
+                for source, pins in by_source.items()}
+
+    for res in resources:
+        for pin in res['pins']:
+            cands = resolved[res['source']][pin]
+            best = cands[0] if len(cands) == 1 else None
+            if best:
+                pad = best['pad']
+                pad_desc = f" pad {pad['name'] or pad['pin']}" if pad else ""
+                print(f"  {res['type']:<7} {res['source']} pin 0x{pin:04X} -> "
+                      f"GPIO {best['gpio']} ({best['chip']['label']}{pad_desc})")
+            else:
+                gpios = ', '.join(str(c['gpio']) for c in cands) or 'none'
+                print(f"  {res['type']:<7} {res['source']} pin 0x{pin:04X} -> "
+                      f"candidates: {gpios}")
+    return resolved
+
+def max98390_present(i2c):
+    """Probe the MAX98390 amplifier addresses (0x38/0x39) on an open I2cBus."""
+    return any(i2c.probe(addr) for addr in MAX98390_ADDRS)
+
+def resolve_line(gpio_number, topology=None):
+    """Map a Linux GPIO number to its GpioChip and chip-relative offset."""
+    topology = topology or load_topology()
+    chip = topology.chip_for_gpio(gpio_number)
+    if chip is None:
+        return None, None
+    path = find_chip(chip['label'])
+    if path is None:
+        return None, None
+    return GpioChip(path), gpio_number - chip['base']
+
+def test_gpio(gpio_number, dry_run=False, chip=None, offset=None,
+              i2c=None, detect=None, timeout=1.0):
+    """Test if a GPIO number can be driven high and brings up the amplifiers.
+
+    The line is requested through /dev/gpiochipN as an output that is
+    already HIGH (one ioctl, no export/direction/value steps), held while
+    the amplifier addresses are probed on the already open I2C bus, and
+    released again on return.
+    """
+    if chip is None:
+        chip, offset = resolve_line(gpio_number)
+        if chip is None:
+            print(f"  {Color.RED}✗ No gpiochip device for GPIO {gpio_number}{Color.NC}")
+            return False
 
-    if dry_run:
-        print(f"  [DRY RUN] Would export GPIO {gpio_number}")
-        return False
+    owns_i2c = i2c is None and detect is None
+    if detect is None:
+        i2c = i2c or I2cBus(MAX98390_BUS)
+        detect = lambda: max98390_present(i2c)
 
     try:
-        # Export GPIO
-        export_path.write_text(str(gpio_number))
-        print(f"  {Color.GREEN}✓ Exported GPIO {gpio_number}{Color.NC}")
-
-        # Wait for sysfs to populate
-        import time
-        time.sleep(0.2)
-
-        if not gpio_path.exists():
-            print(f"  {Color.RED}✗ GPIO directory not created{Color.NC}")
-            return False
-
-        # Set direction
-        (gpio_path / 'direction').write_text('out')
-        print(f"  {Color.GREEN}✓ Set direction to output{Color.NC}")
-
-        # Read current value
-        current = (gpio_path / 'value').read_text().strip()
-        print(f"  ℹ Current value: {current}")
-
-        # Set to high
-        (gpio_path / 'value').write_text('1')
-        print(f"  {Color.GREEN}✓ Set value to HIGH{Color.NC}")
-
-        time.sleep(0.5)
-
-        # Test I2C
-        print(f"  📡 Scanning I2C bus 2...")
-        result = subprocess.run(['i2cdetect', '-y', '2'],
-                              capture_output=True, text=True)
-        if '38' in result.stdout or '39' in result.stdout:
-            print(f"  {Color.GREEN}✓✓✓ SUCCESS! Device detected on I2C!{Color.NC}")
-            return True
-        else:
-            print(f"  {Color.YELLOW}⚠ No device detected (yet){Color.NC}")
-            return False
+        with chip:
+            info = chip.line_info(offset)
+            if info['used']:
+                print(f"  {Color.YELLOW}GPIO {gpio_number} already in use by "
+                      f"'{info['consumer']}'{Color.NC}")
+                return False
+
+            if dry_run:
+                print(f"  [DRY RUN] Would drive {chip.path} line {offset} "
+                      f"(GPIO {gpio_number}) HIGH")
+                return False
+
+            with chip.request_lines([offset], output=True, values={offset: 1}) as req:
+                print(f"  {Color.GREEN}✓ Requested {chip.path} line {offset} "
+                      f"as output, HIGH{Color.NC}")
+                print(f"  ℹ Line value: {req.get_values()[offset]}")
+
+                # Poll instead of fixed sleeps: the amp answers as soon as
+                # it is out of reset
+                print(f"  📡 Waiting for I2C device (up to {timeout:.1f} s)...")
+                elapsed = wait_for(detect, timeout)
+                if elapsed is not None:
+                    print(f"  {Color.GREEN}✓✓✓ SUCCESS! Device detected on I2C "
+                          f"after {elapsed * 1000:.0f} ms!{Color.NC}")
+                    return True
+                print(f"  {Color.YELLOW}⚠ No device detected{Color.NC}")
+                return False
 
     except PermissionError:
         print(f"  {Color.RED}✗ Permission denied. Run with sudo.{Color.NC}")
@@ -148,8 +162,94 @@ def test_gpio(gpio_number, dry_run=False):
     except Exception as e:
         print(f"  {Color.RED}✗ Error: {e}{Color.NC}")
         return False
+    finally:
+        if owns_i2c:
+            i2c.close()
+
+def candidate_targets(candidates):
+    """(GpioChip, offset, gpio) search targets, one GpioChip per controller."""
+    chips = {}
+    targets = []
+    for cand in candidates:
+        label = cand['chip']['label']
+        if label not in chips:
+            path = find_chip(label)
+            chips[label] = GpioChip(path) if path else None
+            if path is None:
+                print(f"  {Color.YELLOW}No gpiochip device for {label}, "
+                      f"skipping its candidates{Color.NC}")
+        if chips[label] is not None:
+            targets.append((chips[label], cand['gpio'] - cand['chip']['base'], cand['gpio']))
+    return targets, [chip for chip in chips.values() if chip is not None]
+
+def search_candidates(candidates, strategy=SEQUENTIAL, dry_run=False,
+                      targets=None, i2c=None, detect=None, timeout=0.25):
+    """Find the candidate that brings up the amplifiers.
+
+    Candidate lines are tested one by one (SEQUENTIAL, only the line
+    under test is touched) or, on request, all held and driven together
+    (PARALLEL, bisecting once the amps answer); every line is restored
+    to its original direction/value afterwards.
+    Returns the working candidate, or None.
+    """
+    chips = []
+    if targets is None:
+        targets, chips = candidate_targets(candidates)
+    if not targets:
+        return None
+
+    if dry_run:
+        for chip, offset, gpio in targets:
+            print(f"  [DRY RUN] Would drive {chip.path} line {offset} (GPIO {gpio}) HIGH")
+        return None
+
+    owns_i2c = i2c is None and detect is None
+    if detect is None:
+        i2c = i2c or I2cBus(MAX98390_BUS)
+        detect = lambda: max98390_present(i2c)
+
+    try:
+        print(f"  Testing {len(targets)} lines ({strategy})...")
+        result = search_lines(targets, detect, strategy=strategy, timeout=timeout,
+                              consumer="calculate_gpio", log=lambda msg: print(f"  ℹ {msg}"))
+    except PermissionError:
+        print(f"  {Color.RED}✗ Permission denied. Run with sudo.{Color.NC}")
+        return None
+    except OSError as e:
+        print(f"  {Color.RED}✗ Error: {e}{Color.NC}")
+        return None
+    finally:
+        if owns_i2c:
+            i2c.close()
+        for chip in chips:
+            chip.close()
+
+    for gpio, consumer in result['skipped']:
+        print(f"  {Color.YELLOW}GPIO {gpio} already in use by '{consumer}', skipped{Color.NC}")
+    print(f"  {result['rounds']} rounds in {result['elapsed'] * 1000:.0f} ms, "
+          f"all lines restored")
+
+    for cand in candidates:
+        if cand['gpio'] == result['found']:
+            return cand
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - MAX98390 GPIO calculator and line search"
+    )
+    parser.add_argument('--dsdt', metavar='DSL',
+                        help='Map the GPIO resources of a decompiled DSDT')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Only list the lines that would be driven')
+    parser.add_argument('--parallel', action='store_true',
+                        help='WARNING: drive every candidate line HIGH at once and bisect '
+                             '(lines that were HIGH are driven LOW meanwhile). Candidates are '
+                             'guessed offsets that may belong to other hardware; only use '
+                             'this when they are known to be independent and unused. '
+                             'Default: one line at a time')
+    args = parser.parse_args(argv)
 
-def main():
     print("=== Samsung Galaxy Book5 Pro MAX98390 GPIO Calculator ===\n")
 
     acpi_pin = 0x62  # From ACPI declaration
@@ -157,7 +257,8 @@ def main():
 
     # Get GPIO chips
     print("[1] Detecting GPIO controllers...\n")
-    chips = get_gpio_chips()
+    topology = load_topology()
+    chips = topology.chips
 
     if not chips:
         print(f"{Color.RED}No GPIO chips found!{Color.NC}")
@@ -174,7 +275,7 @@ def main():
 
     # Find candidates
     print(f"[2] Calculating GPIO candidates for pin {acpi_pin}...\n")
-    candidates = find_gpio_in_chip(acpi_pin, chips)
+    candidates = topology.candidates(acpi_pin)
 
     if not candidates:
         print(f"{Color.RED}No valid candidates found!{Color.NC}")
@@ -187,18 +288,35 @@ def main():
               f"({conf_color}{cand['confidence']} confidence{Color.NC})")
         print(f"     Chip: {cand['chip']['label']} (base {cand['chip']['base']})")
         print(f"     Method: {cand['method']}")
+        if cand['pad']:
+            pad = cand['pad']
+            print(f"     Pad:    {pad['name'] or pad['pin']} "
+                  f"(group {pad['group'] or '?'}, {pad['controller']})")
+        print()
+
+    if args.dsdt:
+        print("[2b] Mapping DSDT GPIO resources...\n")
+        map_dsdt_gpios(args.dsdt, topology)
         print()
 
     # Check debugfs
     print("[3] Checking GPIO debugfs...\n")
-    debugfs = check_gpio_debugfs()
-    if debugfs:
-        # Look for pin 98 references
-        for line in debugfs.split('\n'):
-            if '98' in line or 'gpio-98' in line.lower():
-                print(f"  {line}")
+    debugfs, error = check_gpio_debugfs()
+    if error:
+        print(f"  {error}")
     else:
-        print("  Not available or permission denied")
+        # Exact lookups of the candidate lines, no substring matching
+        claimed = [(cand, debugfs.get_gpio(cand['gpio'])) for cand in candidates]
+        claimed = [(cand, rec) for cand, rec in claimed if rec]
+        for cand, rec in claimed:
+            value = {1: 'hi', 0: 'lo'}.get(rec['value'], '?')
+            print(f"  GPIO {rec['gpio']} ({rec['chip_label'] or rec['chip']} line "
+                  f"{rec['offset']}): {rec['direction']} {value}, "
+                  f"used by '{rec['consumer']}'"
+                  f"{' ACTIVE LOW' if rec['active_low'] else ''}")
+        if not claimed:
+            print(f"  None of the candidate lines is in use "
+                  f"({len(debugfs)} requested lines listed)")
     print()
 
     # Interactive testing
@@ -209,19 +327,19 @@ def main():
         return 0
 
     print("[4] Testing candidates...\n")
-    dry_run = '--dry-run' in sys.argv
-
-    for i, cand in enumerate(candidates, 1):
-        print(f"Testing candidate {i}: GPIO {cand['gpio']}")
-        if test_gpio(cand['gpio'], dry_run):
-            print(f"\n{Color.GREEN}=== SUCCESS ==={Color.NC}")
-            print(f"Working GPIO: {cand['gpio']}")
-            print(f"\nTo make permanent, add to boot script:")
-            print(f"  echo {cand['gpio']} > /sys/class/gpio/export")
-            print(f"  echo out > /sys/class/gpio/gpio{cand['gpio']}/direction")
-            print(f"  echo 1 > /sys/class/gpio/gpio{cand['gpio']}/value")
-            return 0
-        print()
+    strategy = PARALLEL if args.parallel else SEQUENTIAL
+    if args.parallel:
+        print(f"  {Color.YELLOW}--parallel: driving every candidate line at once{Color.NC}")
+
+    cand = search_candidates(candidates, strategy, args.dry_run)
+    if cand:
+        print(f"\n{Color.GREEN}=== SUCCESS ==={Color.NC}")
+        print(f"Working GPIO: {cand['gpio']}")
+        chip_path = find_chip(cand['chip']['label']) or '/dev/gpiochipN'
+        print(f"\nTo make permanent, hold the line high from a boot service:")
+        print(f"  gpioset -c {chip_path} {cand['gpio'] - cand['chip']['base']}=1")
+        return 0
+    print()
 
     print(f"{Color.YELLOW}No working GPIO found.{Color.NC}")
     print("\nNext steps:")
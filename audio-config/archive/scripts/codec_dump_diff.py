@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Samsung Galaxy Book5 Pro - Codec dump differ
+
+Shows what changed between codec dumps (/proc/asound/cardN/codec#M
+text) field by field instead of a text diff, e.g.
+
+    0x17 Amp-Out [0x80 0x80] → [0x00 0x00]
+
+Only nodes whose block hashes differ are parsed (see hdacodec/dumpdiff.py),
+so one reference can be checked against thousands of collected dumps.
+With several dumps (or a directory) the machines are grouped by how
+they differ from the reference. Dumps are read one at a time and only
+a few example paths are kept per group, so memory grows with the
+number of distinct ways the dumps differ, not with the number of dumps.
+
+Usage:
+    python3 codec_dump_diff.py before.txt after.txt
+    python3 codec_dump_diff.py before.txt              # against the live codec
+    python3 codec_dump_diff.py reference.txt dumps/ [--top 20] [--json]
+
+Exit status: 0 no differences, 1 differences, 2 unreadable input.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from hdacodec.discovery import default_codec
+from hdacodec.dumpdiff import DumpIndex, diff_index, diff_signature
+
+TOP_GROUPS = 10
+EXAMPLES = 3
+
+
+def iter_dump_paths(paths):
+    """Files named on the command line; directories are walked in order"""
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield Path(root) / name
+        else:
+            yield path
+
+
+def read_dump(path):
+    with open(path, errors='replace') as f:
+        return f.read()
+
+
+def load_index(path):
+    """
+    DumpIndex of a dump file
+    Raises: OSError, ValueError if the file has no codec header or nodes
+    """
+    index = DumpIndex(read_dump(path), str(path))
+    if not index.blocks and not index.header:
+        raise ValueError("not a codec dump")
+    return index
+
+
+def print_diff(diffs):
+    if not diffs:
+        print("No differences")
+        return
+    for d in diffs:
+        print(f"  {d['desc']}")
+
+
+def compare_pair(reference, path, as_json):
+    try:
+        other = load_index(path)
+        diffs = diff_index(reference, other)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not read {path}: {e}", file=sys.stderr)
+        return 2
+    if as_json:
+        print(json.dumps({'reference': reference.name, 'dump': other.name, 'diffs': diffs}))
+    else:
+        print(f"{reference.name} → {other.name}:")
+        print_diff(diffs)
+    return 1 if diffs else 0
+
+
+def compare_fleet(reference, paths, top, as_json):
+    """Group dumps by their diff against the reference"""
+    groups = {}     # signature -> {'count', 'examples', 'diffs'}
+    total = identical = unreadable = 0
+    for path in paths:
+        try:
+            diffs = diff_index(reference, load_index(path))
+        except (OSError, ValueError) as e:
+            # One bad file must not end a run over thousands of dumps
+            print(f"WARNING: Could not read {path}: {e}", file=sys.stderr)
+            unreadable += 1
+            continue
+        total += 1
+        if not diffs:
+            identical += 1
+            continue
+        signature = diff_signature(diffs)
+        group = groups.get(signature)
+        if group is None:
+            group = groups[signature] = {'count': 0, 'examples': [], 'diffs': diffs}
+        group['count'] += 1
+        if len(group['examples']) < EXAMPLES:
+            group['examples'].append(str(path))
+
+    ordered = sorted(groups.values(), key=lambda g: -g['count'])
+    if as_json:
+        print(json.dumps({'reference': reference.name, 'dumps': total, 'identical': identical,
+                          'unreadable': unreadable, 'groups': ordered}))
+    else:
+        skipped = f", {unreadable} unreadable" if unreadable else ''
+        print(f"{total} dump(s) against {reference.name}: {identical} identical, "
+              f"{total - identical} differ in {len(groups)} way(s){skipped}")
+        for group in ordered[:top]:
+            more = ', ...' if group['count'] > len(group['examples']) else ''
+            print(f"\n  {group['count']} dump(s), e.g. {', '.join(group['examples'])}{more}")
+            for d in group['diffs']:
+                print(f"      {d['desc']}")
+        if len(ordered) > top:
+            print(f"\n  ... {len(ordered) - top} smaller group(s)")
+    if unreadable and not total:
+        return 2
+    return 1 if groups else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - field-level diff of codec dumps"
+    )
+    parser.add_argument('reference', help='Reference (before) codec dump')
+    parser.add_argument('dumps', nargs='*',
+                        help='Dumps or directories to compare (default: the live codec)')
+    parser.add_argument('--top', type=int, default=TOP_GROUPS,
+                        help=f'Groups listed for many dumps (default: {TOP_GROUPS})')
+    parser.add_argument('--json', action='store_true', help='Print JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        reference = load_index(args.reference)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not read {args.reference}: {e}", file=sys.stderr)
+        return 2
+
+    dumps = args.dumps
+    if not dumps:
+        location = default_codec()
+        if location is None:
+            print("ERROR: No codec dump given and no codec found in /proc/asound", file=sys.stderr)
+            return 2
+        dumps = [str(location['proc_path'])]
+
+    if len(dumps) == 1 and not Path(dumps[0]).is_dir():
+        return compare_pair(reference, dumps[0], args.json)
+    return compare_fleet(reference, iter_dump_paths(dumps), args.top, args.json)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
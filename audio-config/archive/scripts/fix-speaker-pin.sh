@@ -32,13 +32,19 @@ echo
 echo "Step 2: Applying HDA verbs..."
 echo
 
-# Unmute mixer node 0x0d (in case it's still muted)
+# Verb format: NODE VERB PAYLOAD. SET_AMP_GAIN_MUTE is the 4-bit verb
+# 0x300 with a 16-bit payload; EAPD (0x70c) and Pin-ctls (0x707) are
+# 12-bit verbs with an 8-bit payload (see hdacodec/verbs.py).
+
+# Unmute mixer node 0x0d input 0 (in case it's still muted)
+# 0x7000 = input amp, left + right, index 0, unmute, gain 0
 echo "  - Unmuting mixer node 0x0d..."
-echo "0x0d 0x7000 0xb000" > /sys/class/sound/hwC0D0/init_verbs
+echo "0x0d 0x300 0x7000" > /sys/class/sound/hwC0D0/init_verbs
 
 # Unmute speaker pin 0x17 output amplifier (CRITICAL FIX!)
+# 0xb000 = output amp, left + right, unmute, gain 0
 echo "  - Unmuting speaker pin 0x17 output amp..."
-echo "0x17 0x3000 0xb000" > /sys/class/sound/hwC0D0/init_verbs
+echo "0x17 0x300 0xb000" > /sys/class/sound/hwC0D0/init_verbs
 
 # Enable EAPD on speaker pin
 echo "  - Enabling speaker amplifier (EAPD)..."
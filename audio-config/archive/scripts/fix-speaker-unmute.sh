@@ -22,28 +22,25 @@ echo ""
 # HDA verb format for sysfs: NODE_ID VERB_ID PARAMETER
 #
 # Node 0x0d: Audio Mixer (routes to speaker pin 0x17)
-# Verb 0x703: SET_AMP_GAIN_MUTE
-#   Bits 15-13: 0x7 = Input amp
-#   Bits 12-8: 0x00 = Input index 0
-#   Bits 3-0: 0x3 = Select input 0
+# Verb 0x300: SET_AMP_GAIN_MUTE (4-bit verb, 16-bit payload)
 #
-# Parameter for unmute:
-#   Bit 15: 0 = Set left channel
-#   Bit 14: 0 = Set right channel
-#   Bit 13: 1 = Set both channels
+# Payload:
+#   Bit 15: 1 = Set output amp
+#   Bit 14: 1 = Set input amp
+#   Bit 13: 1 = Set left channel
+#   Bit 12: 1 = Set right channel
+#   Bits 11-8: Input amp index (0 = input from DAC 0x03)
 #   Bit 7: 0 = Unmute (1 = mute)
-#   Bits 6-0: Gain (0x00 = 0dB)
+#   Bits 6-0: Gain
 #
-# Combined: 0xb000 = Set both channels, unmute, 0dB gain
+# Combined: 0x7000 = input amp 0, both channels, unmute
+# (the verb layout is checked by hdacodec/verbs.py)
 
 echo "Writing HDA verbs to unmute mixer node 0x0d..."
 
-# Unmute input 0 (from DAC 0x03) - both channels
-echo "0x0d 0x7000 0xb000" > /sys/class/sound/hwC0D0/init_verbs
-echo "  Left channel: unmute, 0dB"
-
-echo "0x0d 0x7001 0xb000" > /sys/class/sound/hwC0D0/init_verbs
-echo "  Right channel: unmute, 0dB"
+# Unmute input 0 (from DAC 0x03) - both channels in one verb
+echo "0x0d 0x300 0x7000" > /sys/class/sound/hwC0D0/init_verbs
+echo "  Input 0, left + right channel: unmute"
 
 echo ""
 echo "Triggering codec reconfiguration..."
@@ -0,0 +1,33 @@
+"""
+GPIO helpers for the Galaxy Book5 Pro MAX98390 amplifier scripts
+"""
+
+from .topology import (
+    GpioTopology, load_topology, acpi_gpio_resources, pad_group
+)
+from .chardev import GpioChip, LineRequest, FakeGpioChip, find_chip
+from .debugfs import GpioDebugfsIndex, iter_gpio_debugfs, load_gpio_debugfs
+from .i2c import I2cBus, I2cStub, probe_buses, list_buses
+from .search import search_lines, wait_for, PARALLEL, SEQUENTIAL
+
+__all__ = [
+    'GpioTopology',
+    'load_topology',
+    'acpi_gpio_resources',
+    'pad_group',
+    'GpioChip',
+    'LineRequest',
+    'FakeGpioChip',
+    'find_chip',
+    'GpioDebugfsIndex',
+    'iter_gpio_debugfs',
+    'load_gpio_debugfs',
+    'I2cBus',
+    'I2cStub',
+    'probe_buses',
+    'list_buses',
+    'search_lines',
+    'wait_for',
+    'PARALLEL',
+    'SEQUENTIAL',
+]
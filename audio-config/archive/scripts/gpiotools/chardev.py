@@ -0,0 +1,426 @@
+"""
+GPIO character device (/dev/gpiochipN) access through the v2 uAPI
+
+Replaces the deprecated /sys/class/gpio export/direction/value dance:
+lines are requested in bulk with their direction and initial values in
+a single GPIO_V2_GET_LINE ioctl, values are read/written atomically
+through a mask, and the line fd is held open for as long as the lines
+are needed (the kernel releases them when it is closed).
+
+The ioctl function is injectable, like hdacodec.hwdep, so the same code
+runs against FakeGpioChip (in-process stub) or a gpio-sim/gpio-mockup
+chip (real /dev/gpiochipN, no hardware).
+"""
+
+import ctypes
+import fcntl
+import glob
+import os
+
+GPIO_MAX_NAME_SIZE = 32
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+
+# enum gpio_v2_line_flag
+GPIO_V2_LINE_FLAG_USED = 1 << 0
+GPIO_V2_LINE_FLAG_ACTIVE_LOW = 1 << 1
+GPIO_V2_LINE_FLAG_INPUT = 1 << 2
+GPIO_V2_LINE_FLAG_OUTPUT = 1 << 3
+
+# enum gpio_v2_line_attr_id
+GPIO_V2_LINE_ATTR_ID_FLAGS = 1
+GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES = 2
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE = 3
+
+
+class gpiochip_info(ctypes.Structure):
+    _fields_ = [
+        ('name', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+        ('label', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+        ('lines', ctypes.c_uint32),
+    ]
+
+
+class gpio_v2_line_attribute(ctypes.Structure):
+    class _value(ctypes.Union):
+        _fields_ = [
+            ('flags', ctypes.c_uint64),
+            ('values', ctypes.c_uint64),
+            ('debounce_period_us', ctypes.c_uint32),
+        ]
+
+    _anonymous_ = ('u',)
+    _fields_ = [
+        ('id', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32),
+        ('u', _value),
+    ]
+
+
+class gpio_v2_line_config_attribute(ctypes.Structure):
+    _fields_ = [
+        ('attr', gpio_v2_line_attribute),
+        ('mask', ctypes.c_uint64),
+    ]
+
+
+class gpio_v2_line_config(ctypes.Structure):
+    _fields_ = [
+        ('flags', ctypes.c_uint64),
+        ('num_attrs', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32 * 5),
+        ('attrs', gpio_v2_line_config_attribute * GPIO_V2_LINE_NUM_ATTRS_MAX),
+    ]
+
+
+class gpio_v2_line_request(ctypes.Structure):
+    _fields_ = [
+        ('offsets', ctypes.c_uint32 * GPIO_V2_LINES_MAX),
+        ('consumer', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+        ('config', gpio_v2_line_config),
+        ('num_lines', ctypes.c_uint32),
+        ('event_buffer_size', ctypes.c_uint32),
+        ('padding', ctypes.c_uint32 * 5),
+        ('fd', ctypes.c_int32),
+    ]
+
+
+class gpio_v2_line_values(ctypes.Structure):
+    _fields_ = [
+        ('bits', ctypes.c_uint64),
+        ('mask', ctypes.c_uint64),
+    ]
+
+
+class gpio_v2_line_info(ctypes.Structure):
+    _fields_ = [
+        ('name', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+        ('consumer', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+        ('offset', ctypes.c_uint32),
+        ('num_attrs', ctypes.c_uint32),
+        ('flags', ctypes.c_uint64),
+        ('attrs', gpio_v2_line_attribute * GPIO_V2_LINE_NUM_ATTRS_MAX),
+        ('padding', ctypes.c_uint32 * 4),
+    ]
+
+
+def _ioc(direction, nr, struct):
+    return (direction << 30) | (ctypes.sizeof(struct) << 16) | (0xB4 << 8) | nr
+
+
+# include/uapi/linux/gpio.h
+GPIO_GET_CHIPINFO_IOCTL = _ioc(2, 0x01, gpiochip_info)                  # _IOR
+GPIO_V2_GET_LINEINFO_IOCTL = _ioc(3, 0x05, gpio_v2_line_info)           # _IOWR
+GPIO_V2_GET_LINE_IOCTL = _ioc(3, 0x07, gpio_v2_line_request)            # _IOWR
+GPIO_V2_LINE_SET_CONFIG_IOCTL = _ioc(3, 0x0D, gpio_v2_line_config)      # _IOWR
+GPIO_V2_LINE_GET_VALUES_IOCTL = _ioc(3, 0x0E, gpio_v2_line_values)      # _IOWR
+GPIO_V2_LINE_SET_VALUES_IOCTL = _ioc(3, 0x0F, gpio_v2_line_values)      # _IOWR
+
+
+def _line_config(output, values, offsets):
+    """
+    gpio_v2_line_config with output values
+    Args:
+        output: True/False for all lines, None to leave every line's
+                direction as it is, or {offset: bool} per line
+        values: {offset: 0/1} for output lines
+        offsets: Line offsets of the request, in request order
+    """
+    config = gpio_v2_line_config()
+    if isinstance(output, dict):
+        # Inputs by default, outputs through a flags attribute
+        config.flags = GPIO_V2_LINE_FLAG_INPUT
+        mask = 0
+        for i, offset in enumerate(offsets):
+            if output.get(offset):
+                mask |= 1 << i
+        if mask:
+            attr = config.attrs[config.num_attrs]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_FLAGS
+            attr.attr.flags = GPIO_V2_LINE_FLAG_OUTPUT
+            attr.mask = mask
+            config.num_attrs += 1
+    elif output is not None:
+        config.flags = GPIO_V2_LINE_FLAG_OUTPUT if output else GPIO_V2_LINE_FLAG_INPUT
+
+    if output is not None and values:
+        bits = mask = 0
+        for i, offset in enumerate(offsets):
+            if offset in values:
+                mask |= 1 << i
+                if values[offset]:
+                    bits |= 1 << i
+        attr = config.attrs[config.num_attrs]
+        attr.attr.id = GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES
+        attr.attr.values = bits
+        attr.mask = mask
+        config.num_attrs += 1
+    return config
+
+
+class LineRequest:
+    """
+    Lines held through one request fd
+
+    Values are keyed by chip offset; get/set touch all lines in a single
+    ioctl. Closing the request releases the lines.
+    """
+
+    def __init__(self, fd, offsets, ioctl, consumer, close_fd=os.close):
+        self.fd = fd
+        self.offsets = list(offsets)
+        self.consumer = consumer
+        self._ioctl = ioctl
+        self._close_fd = close_fd
+        self._index = {offset: i for i, offset in enumerate(self.offsets)}
+
+    def _mask(self, offsets):
+        mask = 0
+        for offset in offsets:
+            mask |= 1 << self._index[offset]
+        return mask
+
+    def get_values(self, offsets=None):
+        """Return {offset: 0/1} for the requested lines (default: all)"""
+        offsets = self.offsets if offsets is None else offsets
+        vals = gpio_v2_line_values(0, self._mask(offsets))
+        self._ioctl(self.fd, GPIO_V2_LINE_GET_VALUES_IOCTL, vals, True)
+        return {o: (vals.bits >> self._index[o]) & 1 for o in offsets}
+
+    def set_values(self, values):
+        """Set {offset: 0/1} on output lines atomically"""
+        bits = 0
+        for offset, value in values.items():
+            if value:
+                bits |= 1 << self._index[offset]
+        vals = gpio_v2_line_values(bits, self._mask(values))
+        self._ioctl(self.fd, GPIO_V2_LINE_SET_VALUES_IOCTL, vals, True)
+
+    def reconfigure(self, output, values=None):
+        """
+        Switch lines to output (with values) or input in one ioctl
+        output is True/False for all lines or {offset: bool} per line.
+        """
+        config = _line_config(output, values, self.offsets)
+        self._ioctl(self.fd, GPIO_V2_LINE_SET_CONFIG_IOCTL, config, True)
+
+    def close(self):
+        if self.fd is not None:
+            self._close_fd(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GpioChip:
+    """
+    A /dev/gpiochipN character device
+
+    Usage:
+        with GpioChip('/dev/gpiochip0') as chip:
+            with chip.request_lines([98], output=True, values={98: 1}) as req:
+                ...
+    """
+
+    def __init__(self, path, ioctl=None, close_fd=None):
+        self.path = path
+        self._ioctl = ioctl or fcntl.ioctl
+        self._close_fd = close_fd or os.close
+        self.fd = None
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def info(self):
+        """Return {'name', 'label', 'lines'}"""
+        self.open()
+        info = gpiochip_info()
+        self._ioctl(self.fd, GPIO_GET_CHIPINFO_IOCTL, info, True)
+        return {'name': info.name.decode(), 'label': info.label.decode(), 'lines': info.lines}
+
+    def line_info(self, offset):
+        """
+        Current state of one line, without requesting it
+        Returns: {'offset', 'name', 'consumer', 'used', 'output', 'active_low'}
+        """
+        self.open()
+        info = gpio_v2_line_info()
+        info.offset = offset
+        self._ioctl(self.fd, GPIO_V2_GET_LINEINFO_IOCTL, info, True)
+        return {
+            'offset': offset,
+            'name': info.name.decode(),
+            'consumer': info.consumer.decode(),
+            'used': bool(info.flags & GPIO_V2_LINE_FLAG_USED),
+            'output': bool(info.flags & GPIO_V2_LINE_FLAG_OUTPUT),
+            'active_low': bool(info.flags & GPIO_V2_LINE_FLAG_ACTIVE_LOW),
+        }
+
+    def request_lines(self, offsets, output=False, values=None, consumer="calculate_gpio"):
+        """
+        Request lines in one ioctl, already in their direction/values
+        Args:
+            offsets: Chip-relative line offsets (at most 64)
+            output: Request as outputs, inputs (False), {offset: bool}
+                    per line, or None to keep each line's current
+                    direction (e.g. to read its value before changing it)
+            values: {offset: 0/1} initial output values
+            consumer: Label shown in debugfs / gpioinfo
+        Returns: LineRequest holding the lines
+        """
+        offsets = list(offsets)
+        if not 0 < len(offsets) <= GPIO_V2_LINES_MAX:
+            raise ValueError(f"Can request 1..{GPIO_V2_LINES_MAX} lines, got {len(offsets)}")
+        self.open()
+
+        req = gpio_v2_line_request()
+        for i, offset in enumerate(offsets):
+            req.offsets[i] = offset
+        req.num_lines = len(offsets)
+        req.consumer = consumer.encode()[:GPIO_MAX_NAME_SIZE - 1]
+        req.config = _line_config(output, values, offsets)
+
+        self._ioctl(self.fd, GPIO_V2_GET_LINE_IOCTL, req, True)
+        return LineRequest(req.fd, offsets, self._ioctl, consumer, self._close_fd)
+
+
+def find_chip(label, dev_glob='/dev/gpiochip*', ioctl=None):
+    """
+    Character device path of the chip with the given label (e.g. INTC1083:00)
+    Returns: path, or None if no chip has that label
+    """
+    for path in sorted(glob.glob(dev_glob)):
+        try:
+            with GpioChip(path, ioctl=ioctl) as chip:
+                if chip.info()['label'] == label:
+                    return path
+        except OSError:
+            continue
+    return None
+
+
+class FakeGpioChip:
+    """
+    In-process stand-in for a gpiochip, driven through the ioctl hook
+
+    Line state lives in `lines` ({offset: {'output', 'value', 'used',
+    'consumer', 'pull'}}); an input reads its pull level, as on gpio-sim.
+    `on_set(offset, value)` callbacks fire whenever a line's value
+    changes (e.g. to make an emulated I2C device appear when its enable
+    line goes high). Request fds are real (/dev/null) so that closing
+    them works; closing through close_fd() releases the lines.
+
+    Usage:
+        fake = FakeGpioChip(label='INTC1083:00', ngpio=360)
+        chip = fake.chip()
+    """
+
+    def __init__(self, name='gpiochip0', label='fake-gpio', ngpio=64):
+        self.name = name
+        self.label = label
+        self.lines = {o: {'output': False, 'value': 0, 'used': False,
+                          'consumer': '', 'pull': 0}
+                      for o in range(ngpio)}
+        self.requests = {}
+        self.on_set = []
+        self.ioctl_count = 0
+
+    def _set(self, offset, value):
+        line = self.lines[offset]
+        if line['value'] != value:
+            line['value'] = value
+            for callback in self.on_set:
+                callback(offset, value)
+
+    def _apply_config(self, offsets, config):
+        flags = {offset: config.flags for offset in offsets}
+        values = {}
+        for attr in config.attrs[:config.num_attrs]:
+            for i, offset in enumerate(offsets):
+                if not attr.mask >> i & 1:
+                    continue
+                if attr.attr.id == GPIO_V2_LINE_ATTR_ID_FLAGS:
+                    flags[offset] = attr.attr.flags
+                elif attr.attr.id == GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES:
+                    values[offset] = attr.attr.values >> i & 1
+        for offset in offsets:
+            line = self.lines[offset]
+            # Neither direction flag: keep the line as it is
+            if flags[offset] & GPIO_V2_LINE_FLAG_OUTPUT:
+                line['output'] = True
+            elif flags[offset] & GPIO_V2_LINE_FLAG_INPUT:
+                if line['output']:
+                    line['output'] = False
+                    self._set(offset, line['pull'])
+            if line['output'] and offset in values:
+                self._set(offset, values[offset])
+
+    def chip(self, path=os.devnull):
+        """GpioChip wired to this stub"""
+        return GpioChip(path, ioctl=self.ioctl, close_fd=self.close_fd)
+
+    def close_fd(self, fd):
+        """Close a chip or request fd; closing a request releases its lines"""
+        for offset in self.requests.pop(fd, ()):
+            self.lines[offset]['used'] = False
+            self.lines[offset]['consumer'] = ''
+        os.close(fd)
+
+    def ioctl(self, fd, request, arg, mutate_flag=True):
+        self.ioctl_count += 1
+        if request == GPIO_GET_CHIPINFO_IOCTL:
+            arg.name = self.name.encode()
+            arg.label = self.label.encode()
+            arg.lines = len(self.lines)
+        elif request == GPIO_V2_GET_LINEINFO_IOCTL:
+            line = self.lines[arg.offset]
+            arg.consumer = line['consumer'].encode()
+            arg.flags = ((GPIO_V2_LINE_FLAG_USED if line['used'] else 0)
+                         | (GPIO_V2_LINE_FLAG_OUTPUT if line['output'] else GPIO_V2_LINE_FLAG_INPUT))
+        elif request == GPIO_V2_GET_LINE_IOCTL:
+            offsets = list(arg.offsets[:arg.num_lines])
+            for offset in offsets:
+                if offset not in self.lines:
+                    raise OSError(22, "Invalid argument")
+                if self.lines[offset]['used']:
+                    raise OSError(16, "Device or resource busy")
+            for offset in offsets:
+                self.lines[offset]['used'] = True
+                self.lines[offset]['consumer'] = arg.consumer.decode()
+            self._apply_config(offsets, arg.config)
+            arg.fd = os.open(os.devnull, os.O_RDONLY | os.O_CLOEXEC)
+            self.requests[arg.fd] = offsets
+        elif request == GPIO_V2_LINE_SET_CONFIG_IOCTL:
+            self._apply_config(self.requests[fd], arg)
+        elif request == GPIO_V2_LINE_GET_VALUES_IOCTL:
+            bits = 0
+            for i, offset in enumerate(self.requests[fd]):
+                if arg.mask >> i & 1 and self.lines[offset]['value']:
+                    bits |= 1 << i
+            arg.bits = bits
+        elif request == GPIO_V2_LINE_SET_VALUES_IOCTL:
+            for i, offset in enumerate(self.requests[fd]):
+                if arg.mask >> i & 1:
+                    if not self.lines[offset]['output']:
+                        raise OSError(1, "Operation not permitted")
+                    self._set(offset, arg.bits >> i & 1)
+        else:
+            raise OSError(25, "Inappropriate ioctl for device")
+        return 0
@@ -0,0 +1,110 @@
+"""
+Streaming parser for /sys/kernel/debug/gpio
+
+The file is read line by line: a chip header sets the current chip and
+every requested line becomes one record, so a dump from a machine with
+thousands of GPIOs never sits in memory as a whole. Matching is on the
+parsed numbers, never on substrings ('98' no longer matches gpio-198 or
+a consumer named "amp98").
+
+gpiolib_dbg_show() format:
+  gpiochip0: GPIOs 512-871, parent: platform/INTC1083:00, INTC1083:00:
+   gpio-610 (                    |reset               ) out lo ACTIVE LOW
+"""
+
+import re
+from pathlib import Path
+
+DEBUGFS_GPIO = Path('/sys/kernel/debug/gpio')
+
+# "%s: GPIOs %u-%u[, parent: %s/%s][, %s][, can sleep]:"
+_CHIP_RE = re.compile(
+    r'^(?P<chip>\S+): GPIOs (?P<first>\d+)-(?P<last>\d+)'
+    r'(?:, parent: (?P<parent>[^,]*))?(?:, (?P<label>.*?))??(?P<sleep>, can sleep)?:\s*$')
+# " gpio-%-3u (%-20.20s|%-20.20s) %s %s %s%s"
+_LINE_RE = re.compile(
+    r'^\s*gpio-(?P<gpio>\d+)\s+\((?P<name>[^|]*)\|(?P<consumer>[^)]*)\)\s+'
+    r'(?P<direction>in|out|\?)\s+(?P<value>hi|lo|\?)\s*(?P<irq>IRQ)?\s*(?P<active_low>ACTIVE LOW)?')
+
+_VALUES = {'hi': 1, 'lo': 0}
+
+
+def iter_gpio_debugfs(lines):
+    """
+    Yield one record per requested line of a gpio debugfs dump
+    Args:
+        lines: Iterable of text lines (e.g. an open file)
+    Yields: {'chip', 'chip_label', 'gpio', 'offset', 'name', 'consumer',
+             'direction', 'value', 'irq', 'active_low'}
+             value is 1/0, or None if unknown; offset is relative to
+             the chip's first GPIO
+    """
+    chip = None
+    for line in lines:
+        m = _LINE_RE.match(line)
+        if m:
+            if chip is None:
+                continue
+            gpio = int(m.group('gpio'))
+            yield {
+                'chip': chip['chip'],
+                'chip_label': chip['label'],
+                'gpio': gpio,
+                'offset': gpio - chip['first'],
+                'name': m.group('name').strip(),
+                'consumer': m.group('consumer').strip(),
+                'direction': m.group('direction'),
+                'value': _VALUES.get(m.group('value')),
+                'irq': m.group('irq') is not None,
+                'active_low': m.group('active_low') is not None,
+            }
+            continue
+        m = _CHIP_RE.match(line)
+        if m:
+            chip = {'chip': m.group('chip'), 'label': m.group('label'),
+                    'first': int(m.group('first'))}
+        # Anything else (driver dbg_show extras, blank lines) is skipped
+
+
+class GpioDebugfsIndex:
+    """
+    Requested lines indexed by (chip, offset) and global GPIO number
+
+    chip may be the device name (gpiochip0) or its label (INTC1083:00).
+    """
+
+    def __init__(self, records=()):
+        self.by_offset = {}
+        self.by_gpio = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        self.by_gpio[record['gpio']] = record
+        self.by_offset[(record['chip'], record['offset'])] = record
+        if record['chip_label']:
+            self.by_offset[(record['chip_label'], record['offset'])] = record
+
+    def get(self, chip, offset):
+        """Record of a chip's line, or None if it is not requested"""
+        return self.by_offset.get((chip, offset))
+
+    def get_gpio(self, gpio):
+        """Record of a global GPIO number, or None if it is not requested"""
+        return self.by_gpio.get(gpio)
+
+    def __len__(self):
+        return len(self.by_gpio)
+
+    def __iter__(self):
+        return iter(self.by_gpio.values())
+
+
+def load_gpio_debugfs(path=DEBUGFS_GPIO):
+    """
+    Stream the debugfs file into an index
+    Raises: OSError (PermissionError without root, FileNotFoundError
+            without debugfs)
+    """
+    with open(path) as f:
+        return GpioDebugfsIndex(iter_gpio_debugfs(f))
@@ -0,0 +1,275 @@
+"""
+Native I2C probing through /dev/i2c-N (no i2cdetect)
+
+Opens the bus once and probes only the addresses of interest with the
+same transactions i2cdetect uses in its default mode: SMBus quick write,
+or receive byte for the 0x30-0x37 / 0x50-0x5f ranges where a quick
+write can corrupt EEPROMs. An address claimed by a kernel driver is
+reported as 'busy' (i2cdetect's UU) without touching the device.
+
+Several buses are probed concurrently from a thread pool; each probe is
+two ioctls on an fd that is already open.
+
+The ioctl function is injectable, as in chardev.py, so the same code
+runs against I2cStub (in-process) or the kernel's i2c-stub module
+(modprobe i2c-stub chip_addr=0x38,0x39 gives a real /dev/i2c-N).
+
+Usage:
+    python3 -m gpiotools.i2c --bus 2 --addr 0x38 --addr 0x39
+"""
+
+import argparse
+import ctypes
+import errno
+import fcntl
+import glob
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# include/uapi/linux/i2c-dev.h
+I2C_SLAVE = 0x0703
+I2C_FUNCS = 0x0705
+I2C_SMBUS = 0x0720
+
+# include/uapi/linux/i2c.h
+I2C_SMBUS_WRITE = 0
+I2C_SMBUS_READ = 1
+I2C_SMBUS_QUICK = 0
+I2C_SMBUS_BYTE = 1
+I2C_SMBUS_BLOCK_MAX = 32
+
+I2C_FUNC_SMBUS_QUICK = 0x00010000
+I2C_FUNC_SMBUS_READ_BYTE = 0x00020000
+
+MAX98390_ADDRS = (0x38, 0x39)
+
+PRESENT = 'present'
+BUSY = 'busy'
+
+
+class i2c_smbus_data(ctypes.Union):
+    _fields_ = [
+        ('byte', ctypes.c_uint8),
+        ('word', ctypes.c_uint16),
+        ('block', ctypes.c_uint8 * (I2C_SMBUS_BLOCK_MAX + 2)),
+    ]
+
+
+class i2c_smbus_ioctl_data(ctypes.Structure):
+    _fields_ = [
+        ('read_write', ctypes.c_uint8),
+        ('command', ctypes.c_uint8),
+        ('size', ctypes.c_uint32),
+        ('data', ctypes.POINTER(i2c_smbus_data)),
+    ]
+
+
+def _use_read_byte(addr):
+    """i2cdetect's MODE_AUTO: receive byte where quick write is unsafe"""
+    return 0x30 <= addr <= 0x37 or 0x50 <= addr <= 0x5f
+
+
+class I2cBus:
+    """
+    An open /dev/i2c-N adapter
+
+    Usage:
+        with I2cBus(2) as bus:
+            bus.probe(0x38)     # 'present', 'busy' or None
+    """
+
+    def __init__(self, bus, path=None, ioctl=None, close_fd=None):
+        self.bus = bus
+        self.path = path or f"/dev/i2c-{bus}"
+        self._ioctl = ioctl or fcntl.ioctl
+        self._close_fd = close_fd or os.close
+        self.fd = None
+        self._funcs = None
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            self._close_fd(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def funcs(self):
+        """Adapter functionality bits (I2C_FUNC_*), read once"""
+        if self._funcs is None:
+            self.open()
+            funcs = ctypes.c_ulong()
+            self._ioctl(self.fd, I2C_FUNCS, funcs, True)
+            self._funcs = funcs.value
+        return self._funcs
+
+    def _smbus(self, read_write, size):
+        data = i2c_smbus_data()
+        args = i2c_smbus_ioctl_data(read_write, 0, size, ctypes.pointer(data))
+        self._ioctl(self.fd, I2C_SMBUS, args, True)
+        return data
+
+    def probe(self, addr):
+        """
+        Probe one 7-bit address
+        Returns: PRESENT, BUSY (bound to a kernel driver) or None
+        """
+        if not 0x03 <= addr <= 0x77:
+            raise ValueError(f"I2C address 0x{addr:02x} outside 0x03-0x77")
+        self.open()
+        try:
+            self._ioctl(self.fd, I2C_SLAVE, addr)
+        except OSError as e:
+            if e.errno == errno.EBUSY:
+                return BUSY
+            raise
+
+        funcs = self.funcs()
+        try:
+            if _use_read_byte(addr) or not funcs & I2C_FUNC_SMBUS_QUICK:
+                if not funcs & I2C_FUNC_SMBUS_READ_BYTE:
+                    raise OSError(errno.EOPNOTSUPP,
+                                  f"i2c-{self.bus} supports neither quick write nor read byte")
+                self._smbus(I2C_SMBUS_READ, I2C_SMBUS_BYTE)
+            else:
+                self._smbus(I2C_SMBUS_WRITE, I2C_SMBUS_QUICK)
+        except OSError as e:
+            if e.errno == errno.EOPNOTSUPP:
+                raise
+            # ENXIO/EREMOTEIO/ETIMEDOUT: nothing acknowledged
+            return None
+        return PRESENT
+
+    def scan(self, addresses):
+        """Return {addr: PRESENT/BUSY/None} for the given addresses"""
+        return {addr: self.probe(addr) for addr in addresses}
+
+
+def list_buses(dev_glob='/dev/i2c-*'):
+    """Bus numbers with a /dev/i2c-N node, sorted"""
+    buses = []
+    for path in glob.glob(dev_glob):
+        m = re.search(r'i2c-(\d+)$', path)
+        if m:
+            buses.append(int(m.group(1)))
+    return sorted(buses)
+
+
+def probe_buses(buses, addresses, open_bus=I2cBus, max_workers=8):
+    """
+    Probe the same addresses on several buses concurrently
+    Args:
+        buses: Bus numbers
+        addresses: 7-bit addresses to probe on each bus
+        open_bus: Factory returning an I2cBus for a bus number
+    Returns: {bus: {addr: PRESENT/BUSY/None}}, or {bus: OSError} for a
+             bus that could not be opened or probed
+    """
+    addresses = list(addresses)
+
+    def scan(bus):
+        try:
+            with open_bus(bus) as i2c:
+                return i2c.scan(addresses)
+        except OSError as e:
+            return e
+
+    buses = list(buses)
+    if not buses:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(buses))) as pool:
+        return dict(zip(buses, pool.map(scan, buses)))
+
+
+class I2cStub:
+    """
+    In-process stand-in for an I2C adapter, driven through the ioctl hook
+
+    Devices in `present` acknowledge probes, addresses in `busy` are
+    claimed by a "driver" (I2C_SLAVE fails with EBUSY). Both sets can be
+    changed at any time, e.g. from a FakeGpioChip on_set callback to make
+    an amplifier appear when its enable line goes high.
+
+    Usage:
+        stub = I2cStub(bus=2, present={0x38})
+        with stub.bus() as i2c:
+            i2c.probe(0x38)
+    """
+
+    def __init__(self, bus=0, present=(), busy=(),
+                 funcs=I2C_FUNC_SMBUS_QUICK | I2C_FUNC_SMBUS_READ_BYTE):
+        self.bus_number = bus
+        self.present = set(present)
+        self.busy = set(busy)
+        self.funcs = funcs
+        self.slave = {}
+        self.transfers = []
+
+    def bus(self, path=os.devnull):
+        """I2cBus wired to this stub"""
+        return I2cBus(self.bus_number, path=path, ioctl=self.ioctl)
+
+    def ioctl(self, fd, request, arg, mutate_flag=True):
+        if request == I2C_FUNCS:
+            arg.value = self.funcs
+        elif request == I2C_SLAVE:
+            if arg in self.busy:
+                raise OSError(errno.EBUSY, "Device or resource busy")
+            self.slave[fd] = arg
+        elif request == I2C_SMBUS:
+            addr = self.slave.get(fd)
+            self.transfers.append((addr, arg.read_write, arg.size))
+            if addr not in self.present:
+                raise OSError(errno.ENXIO, "No such device or address")
+            if arg.read_write == I2C_SMBUS_READ:
+                arg.data.contents.byte = 0
+        else:
+            raise OSError(errno.ENOTTY, "Inappropriate ioctl for device")
+        return 0
+
+
+def _addr(text):
+    return int(text, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe I2C addresses without i2cdetect")
+    parser.add_argument('--bus', type=int, action='append',
+                        help="Bus number (repeatable; default: every /dev/i2c-N)")
+    parser.add_argument('--addr', type=_addr, action='append',
+                        help="7-bit address (repeatable; default: MAX98390 0x38/0x39)")
+    args = parser.parse_args(argv)
+
+    buses = args.bus or list_buses()
+    addresses = args.addr or list(MAX98390_ADDRS)
+    if not buses:
+        print("No /dev/i2c-* buses (is i2c-dev loaded?)")
+        return 1
+
+    found = False
+    for bus, result in probe_buses(buses, addresses).items():
+        if isinstance(result, OSError):
+            print(f"  Bus {bus}: {result.strerror or result}")
+            continue
+        hits = [f"0x{addr:02x}{' (UU)' if state == BUSY else ''}"
+                for addr, state in result.items() if state]
+        if hits:
+            found = True
+            print(f"  Bus {bus}: {', '.join(hits)}")
+    if not found:
+        print("  No device found at " + ", ".join(f"0x{a:02x}" for a in addresses))
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
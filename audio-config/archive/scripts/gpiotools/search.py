@@ -0,0 +1,211 @@
+"""
+GPIO candidate search with rollback
+
+Finds which of several candidate lines enables a device, without the
+sysfs export / set / fixed sleep / scan loop:
+
+  sequential - the default: one candidate at a time. Only the line under
+               test is requested and driven HIGH; every other line keeps
+               its state, as with the one-line-at-a-time sysfs loop.
+  parallel   - opt-in, for candidates known to be independent and
+               unused: all of them are driven HIGH at once (one request
+               and one atomic set per chip); once the device answers,
+               the responsible line is found by bisection: drop every
+               suspect LOW, raise half of them and see whether the
+               device comes back. log2(n) rounds instead of n, but every
+               candidate becomes an output, and lines that were HIGH
+               are driven LOW while bisecting. Candidates are guessed
+               offsets that may belong to other hardware, so this is
+               never the default.
+
+Every line is requested as-is first, so its original direction and
+value are known, and is restored to exactly that state before its fd
+is released, whether a device was found, nothing was found or an
+error occurred. Lines already held by another consumer are skipped.
+
+Device detection is a predicate (e.g. probing 0x38/0x39 on an open
+I2cBus) polled with a short backoff, so each step costs as long as the
+device takes to answer rather than a fixed sleep.
+"""
+
+import time
+
+PARALLEL = 'parallel'
+SEQUENTIAL = 'sequential'
+
+
+def wait_for(predicate, timeout):
+    """Poll predicate with a short backoff (5 ms doubling to 100 ms) until
+    it is true or timeout expires. Returns the elapsed time, or None."""
+    start = time.monotonic()
+    interval = 0.005
+    while True:
+        if predicate():
+            return time.monotonic() - start
+        remaining = start + timeout - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, 0.1)
+
+
+class _HeldLines:
+    """Candidate lines requested as-is, grouped per chip, with their
+    original direction/value for rollback"""
+
+    def __init__(self, targets, consumer):
+        # targets: [(chip, offset, tag)]
+        self.tags = {}          # tag -> (chip path, offset)
+        self.requests = {}      # chip path -> (chip, LineRequest)
+        self.original = {}      # chip path -> ({offset: output}, {offset: value})
+        self.skipped = []       # [(tag, consumer)]
+        self.driving = set()    # chip paths switched to output
+
+        by_chip = {}
+        seen = set()
+        for chip, offset, tag in targets:
+            if (chip.path, offset) in seen:
+                continue
+            seen.add((chip.path, offset))
+            entry = by_chip.setdefault(chip.path, (chip, []))
+            entry[1].append((offset, tag))
+
+        try:
+            for path, (chip, lines) in by_chip.items():
+                free = []
+                for offset, tag in lines:
+                    info = chip.line_info(offset)
+                    if info['used']:
+                        self.skipped.append((tag, info['consumer']))
+                    else:
+                        free.append((offset, tag, info['output']))
+                if not free:
+                    continue
+                offsets = [offset for offset, _, _ in free]
+                req = chip.request_lines(offsets, output=None, consumer=consumer)
+                self.requests[path] = (chip, req)
+                self.original[path] = ({offset: output for offset, _, output in free},
+                                       req.get_values())
+                for offset, tag, _ in free:
+                    self.tags[tag] = (path, offset)
+        except BaseException:
+            self.restore()
+            raise
+
+    def drive(self, high):
+        """Drive the lines of the `high` tags HIGH and all others LOW"""
+        high = {self.tags[tag] for tag in high}
+        for path, (chip, req) in self.requests.items():
+            values = {offset: int((path, offset) in high) for offset in req.offsets}
+            if path not in self.driving:
+                # One ioctl from as-is to output, already at the new values
+                req.reconfigure(True, values)
+                self.driving.add(path)
+            else:
+                req.set_values(values)
+
+    def restore(self):
+        """Put every line back to its original direction/value and release it"""
+        errors = []
+        for path, (chip, req) in self.requests.items():
+            outputs, values = self.original[path]
+            try:
+                if path in self.driving:
+                    req.reconfigure(outputs, {o: values[o] for o, out in outputs.items() if out})
+            except OSError as e:
+                errors.append(e)
+            finally:
+                req.close()
+        self.requests = {}
+        self.driving = set()
+        if errors:
+            raise errors[0]
+
+
+def _bisect(held, suspects, detect, timeout, log):
+    """Narrow suspects down to the line the device depends on, or None
+    if the device does not drop out when its line goes LOW"""
+    rounds = 0
+    while len(suspects) > 1:
+        held.drive([])
+        if wait_for(lambda: not detect(), timeout) is None:
+            log("Device stays up with every candidate LOW, cannot bisect")
+            return None, rounds
+        half = suspects[:len(suspects) // 2]
+        held.drive(half)
+        rounds += 1
+        if wait_for(detect, timeout) is not None:
+            suspects = half
+        else:
+            suspects = suspects[len(suspects) // 2:]
+    return suspects[0], rounds
+
+
+def _search_parallel(targets, detect, timeout, consumer, log, result):
+    held = _HeldLines(targets, consumer)
+    result['skipped'].extend(held.skipped)
+    try:
+        tags = list(held.tags)
+        if not tags:
+            return
+        held.drive(tags)
+        result['rounds'] = 1
+        if wait_for(detect, timeout) is not None:
+            log(f"Device answered with all {len(tags)} candidates HIGH, bisecting")
+            result['found'], rounds = _bisect(held, tags, detect, timeout, log)
+            result['rounds'] += rounds
+    finally:
+        held.restore()
+
+
+def _search_sequential(targets, detect, timeout, consumer, log, result):
+    seen = set()
+    for chip, offset, tag in targets:
+        if (chip.path, offset) in seen:
+            continue
+        seen.add((chip.path, offset))
+        # Hold only this line, so the other candidates are never touched
+        held = _HeldLines([(chip, offset, tag)], consumer)
+        result['skipped'].extend(held.skipped)
+        try:
+            if tag not in held.tags:
+                continue
+            held.drive([tag])
+            result['rounds'] += 1
+            if wait_for(detect, timeout) is not None:
+                result['found'] = tag
+                return
+        finally:
+            held.restore()
+
+
+def search_lines(targets, detect, strategy=SEQUENTIAL, timeout=0.25,
+                 consumer="gpio-search", log=None):
+    """
+    Find the candidate line that makes a device appear
+    Args:
+        targets: [(GpioChip, offset, tag)]; tag identifies the candidate
+                 in the result (e.g. the candidate dict or GPIO number)
+        detect: Predicate, True while the device answers
+        strategy: SEQUENTIAL or PARALLEL (see module docstring; only
+                  use PARALLEL for lines known to be independent)
+        timeout: Seconds to wait for the device after each change
+        consumer: Label for the held lines
+        log: Optional callable for progress messages
+    Returns: {'found': tag or None, 'elapsed', 'rounds', 'strategy',
+              'skipped': [(tag, consumer)]}
+    Raises: ValueError for an unknown strategy
+    """
+    if strategy not in (PARALLEL, SEQUENTIAL):
+        raise ValueError(f"Unknown search strategy {strategy!r}")
+    log = log or (lambda msg: None)
+    start = time.monotonic()
+    result = {'found': None, 'rounds': 0, 'strategy': strategy, 'skipped': []}
+    if detect():
+        log("Device already present before any candidate was driven")
+    elif strategy == PARALLEL:
+        _search_parallel(targets, detect, timeout, consumer, log, result)
+    else:
+        _search_sequential(targets, detect, timeout, consumer, log, result)
+    result['elapsed'] = time.monotonic() - start
+    return result
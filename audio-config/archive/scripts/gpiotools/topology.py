@@ -0,0 +1,301 @@
+"""
+Indexed GPIO topology: chip ranges, pinctrl pad groups, ACPI pin mapping
+
+Reads /sys/class/gpio once and keeps the chips sorted by base, so the
+chip owning a Linux GPIO number is a bisect instead of a scan. When the
+pinctrl debugfs is readable, the Intel pinctrl gpio-ranges (one range
+per pad group) and pin names (GPP_F02, ...) are indexed too, which maps
+an ACPI GpioIo/GpioInt pin straight to its Linux GPIO, pad and group.
+
+Many pins (e.g. every GPIO resource of a DSDT) are resolved in one
+sorted pass by resolve_many().
+"""
+
+import bisect
+import functools
+import re
+from pathlib import Path
+
+SYSFS_ROOT = Path('/sys')
+DEBUGFS_ROOT = Path('/sys/kernel/debug')
+
+# pinctrl_gpioranges_show(): "%u: %s GPIOS [%u - %u] PINS [%u - %u]"
+_RANGE_RE = re.compile(
+    r'^(\d+): (\S+) GPIOS \[(\d+) - (\d+)\] PINS \[(\d+) - (\d+)\]', re.M)
+# pinctrl_pins_show(): "pin %d (%s) ..."
+_PIN_RE = re.compile(r'^pin (\d+) \(([^)]*)\)', re.M)
+# GPP_F02 -> GPP_F, GPPC_B_17 -> GPPC_B
+_GROUP_RE = re.compile(r'^(.*?)_?\d+$')
+
+# iASL ASL: GpioIo (...) { // Pin list  0x0062 }; the arguments may hold
+# a RawDataBuffer (0x01) {...}, so they are scanned for the closing paren
+_ACPI_GPIO_RE = re.compile(r'\b(GpioIo|GpioInt)\s*\(')
+_ACPI_PIN_LIST_RE = re.compile(r'(?:\s|//[^\n]*)*\{([^}]*)\}')
+_ASL_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|/\*.*?\*/|[()]', re.S)
+_ACPI_SOURCE_RE = re.compile(r'"([^"]*)"')
+_ACPI_PIN_RE = re.compile(r'\b0x[0-9A-Fa-f]+\b|\b\d+\b')
+
+
+def _read(path):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def pad_group(pad_name):
+    """Pad group of an Intel pad name (GPP_F02 -> GPP_F), or None"""
+    if not pad_name:
+        return None
+    m = _GROUP_RE.match(pad_name)
+    return m.group(1) if m else None
+
+
+class GpioTopology:
+    """
+    GPIO chips plus optional pinctrl ranges, indexed for bisect lookups
+
+    Args:
+        chips: [{'name', 'base', 'ngpio', 'end', 'label'}]
+        ranges: [{'id', 'controller', 'gpio_start', 'gpio_end',
+                  'pin_start', 'pin_end'}] from pinctrl gpio-ranges
+        pin_names: {pin: pad name} from pinctrl pins
+        acpi_paths: {normalized ACPI path: chip label} of the controllers
+    """
+
+    def __init__(self, chips, ranges=(), pin_names=None, acpi_paths=None):
+        self.chips = sorted(chips, key=lambda c: c['base'])
+        self._bases = [c['base'] for c in self.chips]
+        # Chips by size, so "chips with more than N lines" is a bisect
+        self._by_ngpio = sorted(self.chips, key=lambda c: c['ngpio'])
+        self._ngpios = [c['ngpio'] for c in self._by_ngpio]
+        self._by_label = {c['label']: c for c in reversed(self.chips)}
+
+        self.ranges = sorted(ranges, key=lambda r: r['gpio_start'])
+        self._range_starts = [r['gpio_start'] for r in self.ranges]
+        self.pin_names = pin_names or {}
+        self.acpi_paths = acpi_paths or {}
+
+    @classmethod
+    def from_sysfs(cls, sysfs_root=SYSFS_ROOT, debugfs_root=DEBUGFS_ROOT):
+        """Build the topology from sysfs (and pinctrl debugfs, if readable)"""
+        chips = []
+        for chip_dir in Path(sysfs_root, 'class/gpio').glob('gpiochip*'):
+            base = _read(chip_dir / 'base')
+            if base is None or int(base) < 0:
+                continue
+            base = int(base)
+            ngpio = int(_read(chip_dir / 'ngpio') or 0)
+            chips.append({
+                'name': chip_dir.name,
+                'base': base,
+                'ngpio': ngpio,
+                'end': base + ngpio - 1,
+                'label': _read(chip_dir / 'label') or 'unknown',
+            })
+
+        ranges, pin_names = [], {}
+        pinctrl = Path(debugfs_root, 'pinctrl')
+        try:
+            controllers = list(pinctrl.iterdir())
+        except OSError:
+            controllers = []
+        for ctrl in controllers:
+            text = _read(ctrl / 'gpio-ranges')
+            if text:
+                ranges.extend(parse_gpio_ranges(text))
+            text = _read(ctrl / 'pins')
+            if text:
+                pin_names.update(parse_pin_names(text))
+
+        # Chip labels of ACPI-enumerated controllers are their device
+        # names (INTC1083:00), whose ACPI path maps DSDT resources to chips
+        acpi_paths = {}
+        for chip in chips:
+            path = _read(Path(sysfs_root, 'bus/acpi/devices', chip['label'], 'path'))
+            if path:
+                acpi_paths[normalize_acpi_path(path)] = chip['label']
+
+        return cls(chips, ranges, pin_names, acpi_paths)
+
+    def chip_for_gpio(self, gpio):
+        """Chip whose [base, end] range holds a Linux GPIO number, or None"""
+        i = bisect.bisect_right(self._bases, gpio) - 1
+        if i >= 0 and gpio <= self.chips[i]['end']:
+            return self.chips[i]
+        return None
+
+    def chip_by_label(self, label):
+        return self._by_label.get(label)
+
+    def chip_for_acpi_path(self, path):
+        """Chip of the GPIO controller at an ACPI path (\\_SB.GPI0), or None"""
+        label = self.acpi_paths.get(normalize_acpi_path(path))
+        return self.chip_by_label(label) if label else None
+
+    def range_for_gpio(self, gpio):
+        """pinctrl range (pad group) holding a Linux GPIO number, or None"""
+        i = bisect.bisect_right(self._range_starts, gpio) - 1
+        if i >= 0 and gpio <= self.ranges[i]['gpio_end']:
+            return self.ranges[i]
+        return None
+
+    def pad_for_gpio(self, gpio):
+        """
+        Intel pad behind a Linux GPIO number
+        Returns: {'pin', 'name', 'group', 'controller'} or None
+        """
+        rng = self.range_for_gpio(gpio)
+        if rng is None:
+            return None
+        pin = rng['pin_start'] + gpio - rng['gpio_start']
+        name = self.pin_names.get(pin)
+        return {'pin': pin, 'name': name, 'group': pad_group(name),
+                'controller': rng['controller']}
+
+    def candidates(self, pin_number):
+        """
+        Possible Linux GPIOs for an ACPI pin number
+
+        direct_offset - pin is relative to a chip's base (how ACPI GpioIo
+                        pins are resolved); 'high' if pinctrl confirms a pad
+                        or the chip is an Intel (INT*) controller
+        absolute      - pin is already a global GPIO number
+        Returns: list of candidate dicts (method, chip, gpio, confidence, pad)
+        """
+        candidates = []
+
+        first = bisect.bisect_right(self._ngpios, pin_number)
+        for chip in sorted(self._by_ngpio[first:], key=lambda c: c['base']):
+            gpio = chip['base'] + pin_number
+            pad = self.pad_for_gpio(gpio)
+            if pad or 'INT' in chip['label']:
+                confidence = 'high'
+            else:
+                confidence = 'medium'
+            candidates.append({
+                'method': 'direct_offset',
+                'chip': chip,
+                'gpio': gpio,
+                'confidence': confidence,
+                'pad': pad,
+            })
+
+        chip = self.chip_for_gpio(pin_number)
+        if chip:
+            candidates.append({
+                'method': 'absolute',
+                'chip': chip,
+                'gpio': pin_number,
+                'confidence': 'medium',
+                'pad': self.pad_for_gpio(pin_number),
+            })
+
+        return candidates
+
+    def resolve_many(self, pins, controller=None):
+        """
+        Resolve many ACPI pins in one pass
+        Args:
+            pins: Iterable of ACPI pin numbers
+            controller: Chip label (e.g. 'INTC1083:00') or ACPI path
+                        ('\\_SB.GPI0') the pins belong to; None (or an
+                        unknown controller) returns every candidate per pin
+        Returns: {pin: [candidates]}
+        """
+        chip = None
+        if controller:
+            chip = self.chip_by_label(controller) or self.chip_for_acpi_path(controller)
+        resolved = {}
+        for pin in sorted(set(pins)):
+            if chip is not None:
+                if pin >= chip['ngpio']:
+                    resolved[pin] = []
+                    continue
+                gpio = chip['base'] + pin
+                resolved[pin] = [{
+                    'method': 'direct_offset',
+                    'chip': chip,
+                    'gpio': gpio,
+                    'confidence': 'high',
+                    'pad': self.pad_for_gpio(gpio),
+                }]
+            else:
+                resolved[pin] = self.candidates(pin)
+        return resolved
+
+
+def normalize_acpi_path(path):
+    """'\\_SB_.GPI0' and '\\_SB.GPI0' -> '_SB.GPI0' (ASL drops the name padding)"""
+    return '.'.join(seg.rstrip('_') or seg for seg in path.strip().lstrip('\\^').split('.'))
+
+
+def parse_gpio_ranges(text):
+    """Parse a pinctrl debugfs gpio-ranges file into range dicts"""
+    return [{
+        'id': int(m.group(1)),
+        'controller': m.group(2),
+        'gpio_start': int(m.group(3)),
+        'gpio_end': int(m.group(4)),
+        'pin_start': int(m.group(5)),
+        'pin_end': int(m.group(6)),
+    } for m in _RANGE_RE.finditer(text)]
+
+
+def parse_pin_names(text):
+    """Parse a pinctrl debugfs pins file into {pin: pad name}"""
+    return {int(m.group(1)): m.group(2) for m in _PIN_RE.finditer(text)}
+
+
+def _closing_paren(text, pos):
+    """Index of the ')' closing the '(' just before pos, or None"""
+    depth = 1
+    for m in _ASL_TOKEN_RE.finditer(text, pos):
+        token = m.group()
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if not depth:
+                return m.start()
+    return None
+
+
+def acpi_gpio_resources(asl_text):
+    """
+    Extract GpioIo/GpioInt resources from disassembled ASL (iasl -d output)
+    Returns: [{'type', 'source', 'pins'}]
+    """
+    resources = []
+    pos = 0
+    while True:
+        m = _ACPI_GPIO_RE.search(asl_text, pos)
+        if m is None:
+            break
+        pos = m.end()
+        end = _closing_paren(asl_text, m.end())
+        if end is None:
+            continue
+        pin_list = _ACPI_PIN_LIST_RE.match(asl_text, end + 1)
+        if pin_list is None:
+            continue
+        args = asl_text[m.end():end]
+        # The first string argument is the ResourceSource
+        source = _ACPI_SOURCE_RE.search(re.sub(r'//[^\n]*', '', args))
+        body = re.sub(r'//[^\n]*', '', pin_list.group(1))
+        resources.append({
+            'type': m.group(1),
+            'source': source.group(1) if source else None,
+            'pins': [int(p, 0) for p in _ACPI_PIN_RE.findall(body)],
+        })
+        pos = pin_list.end()
+    return resources
+
+
+@functools.lru_cache(maxsize=None)
+def load_topology(sysfs_root=SYSFS_ROOT, debugfs_root=DEBUGFS_ROOT):
+    """
+    GPIO topology for a system, read once per process
+    Call load_topology.cache_clear() after GPIO chips come or go.
+    """
+    return GpioTopology.from_sysfs(sysfs_root, debugfs_root)
@@ -0,0 +1,66 @@
+"""
+Shared HDA codec helpers for the Galaxy Book5 Pro speaker fix scripts
+"""
+
+from .dump import CodecDump, parse_codec_dump, check_amp_muted
+from .metrics import Metrics, NULL_METRICS, metrics_from_env
+from .transaction import VerbTransaction, wait_for_codec_state
+from .hwdep import HwdepVerbChannel, decode_response
+from .verbs import VerbError, validate_verbs, pack_verbs, unpack_verbs, decode_verb
+from .backends import (
+    CodecBackend, SysfsBackend, HwdepBackend, SimulatedBackend, select_backend
+)
+from .state import SPEAKER_STATE, diff_state, plan_verbs, apply_state
+from .quirks import lookup_quirk, load_quirks
+from .graph import output_paths, speaker_paths, check_paths, speaker_state
+from .discovery import discover_codecs, fix_codecs, matching_codecs, run_on_codecs
+from .dumpdiff import DumpIndex, diff_dumps, diff_index
+from .snapshot import CodecSnapshot, capture_snapshot, restore_snapshot
+from .simulator import SimulatedCodec, SimulatedCodecTree
+from .controller import HDCodecController
+
+__all__ = [
+    'CodecDump',
+    'parse_codec_dump',
+    'check_amp_muted',
+    'Metrics',
+    'NULL_METRICS',
+    'metrics_from_env',
+    'VerbTransaction',
+    'wait_for_codec_state',
+    'HwdepVerbChannel',
+    'decode_response',
+    'VerbError',
+    'validate_verbs',
+    'pack_verbs',
+    'unpack_verbs',
+    'decode_verb',
+    'CodecBackend',
+    'SysfsBackend',
+    'HwdepBackend',
+    'SimulatedBackend',
+    'select_backend',
+    'SPEAKER_STATE',
+    'diff_state',
+    'plan_verbs',
+    'apply_state',
+    'lookup_quirk',
+    'load_quirks',
+    'output_paths',
+    'speaker_paths',
+    'check_paths',
+    'speaker_state',
+    'discover_codecs',
+    'matching_codecs',
+    'run_on_codecs',
+    'fix_codecs',
+    'DumpIndex',
+    'diff_dumps',
+    'diff_index',
+    'CodecSnapshot',
+    'capture_snapshot',
+    'restore_snapshot',
+    'SimulatedCodec',
+    'SimulatedCodecTree',
+    'HDCodecController',
+]
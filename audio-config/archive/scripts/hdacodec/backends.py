@@ -0,0 +1,187 @@
+"""
+Pluggable I/O backends for HDCodecController
+
+A backend knows how verbs reach the codec and where the codec dump and
+identification come from:
+
+  sysfs - legacy HDA driver: /sys/class/sound/hwCxDy/init_verbs + reconfig
+  hwdep - /dev/snd/hwCxDy ioctl channel, works with SOF, no reconfig needed
+  sim   - in-memory SimulatedCodec, for tests and benchmarks
+
+Backends raise OSError on I/O failures; the controller reports them.
+"""
+
+import os
+from pathlib import Path
+
+from .hwdep import HwdepVerbChannel
+from .verbs import pack_verbs
+
+CODEC_PATH = Path("/sys/class/sound/hwC0D0")
+PROC_CODEC = Path("/proc/asound/card0/codec#0")
+HWDEP_DEV = Path("/dev/snd/hwC0D0")
+
+# Preference order for automatic selection: hwdep applies verbs
+# immediately, sysfs needs a full codec reconfig per batch.
+BACKEND_ORDER = ('hwdep', 'sysfs')
+BACKEND_ENV = 'HDA_CODEC_BACKEND'
+
+
+def _read_attr(path):
+    return path.read_text().strip()
+
+
+class CodecBackend:
+    """Base class for codec I/O backends"""
+
+    name = None
+    needs_reconfig = False
+
+    def codec_info(self):
+        """Return {'vendor', 'chip', 'subsystem_id'}"""
+        raise NotImplementedError
+
+    def read_dump(self):
+        """Return the codec proc dump text"""
+        raise NotImplementedError
+
+    def write_verbs(self, verbs):
+        """Send (node, verb, param) tuples to the codec"""
+        raise NotImplementedError
+
+    def reconfigure(self):
+        """Apply previously written verbs, if the backend needs it"""
+
+    def close(self):
+        """Release any held resources"""
+
+
+class _KernelBackend(CodecBackend):
+    """A codec of the running kernel: identified via sysfs, dumped via /proc"""
+
+    def codec_info(self):
+        return {
+            'vendor': _read_attr(self.codec_path / "vendor_name"),
+            'chip': _read_attr(self.codec_path / "chip_name"),
+            'subsystem_id': _read_attr(self.codec_path / "subsystem_id"),
+        }
+
+    def read_dump(self):
+        return self.proc_path.read_text()
+
+
+class SysfsBackend(_KernelBackend):
+    """Verbs via init_verbs, applied by a codec reconfig (legacy HDA driver only)"""
+
+    name = 'sysfs'
+    needs_reconfig = True
+
+    def __init__(self, codec_path=CODEC_PATH, proc_path=PROC_CODEC):
+        self.codec_path = Path(codec_path)
+        self.proc_path = Path(proc_path)
+
+    @classmethod
+    def available(cls, codec_path=CODEC_PATH, proc_path=PROC_CODEC, **_):
+        return (Path(codec_path) / "init_verbs").exists() and Path(proc_path).exists()
+
+    def write_verbs(self, verbs):
+        # The sysfs store parses one verb per write() call, so each verb
+        # is its own write on a single open descriptor.
+        lines = [f"0x{node:02x} 0x{verb:04x} 0x{param:04x}\n".encode()
+                 for node, verb, param in verbs]
+        fd = os.open(self.codec_path / "init_verbs", os.O_WRONLY)
+        try:
+            for line in lines:
+                os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def reconfigure(self):
+        (self.codec_path / "reconfig").write_text("1\n")
+
+
+class HwdepBackend(_KernelBackend):
+    """Verbs via a persistent HDA_IOCTL_VERB_WRITE channel (works with SOF)"""
+
+    name = 'hwdep'
+
+    def __init__(self, hwdep_path=HWDEP_DEV, proc_path=PROC_CODEC,
+                 codec_path=CODEC_PATH, ioctl=None):
+        self.channel = HwdepVerbChannel(str(hwdep_path), ioctl=ioctl)
+        self.proc_path = Path(proc_path)
+        self.codec_path = Path(codec_path)
+
+    @classmethod
+    def available(cls, hwdep_path=HWDEP_DEV, proc_path=PROC_CODEC, **_):
+        return Path(hwdep_path).exists() and Path(proc_path).exists()
+
+    def write_verbs(self, verbs):
+        self.channel.write_packed(pack_verbs(verbs))
+
+    def read_verb(self, node, verb, param=0):
+        return self.channel.verb(node, verb, param)
+
+    def close(self):
+        self.channel.close()
+
+
+class SimulatedBackend(CodecBackend):
+    """Verbs applied to an in-memory SimulatedCodec"""
+
+    name = 'sim'
+
+    def __init__(self, codec):
+        self.codec = codec
+
+    def codec_info(self):
+        return self.codec.codec_info()
+
+    def read_dump(self):
+        return self.codec.render_dump()
+
+    def write_verbs(self, verbs):
+        execute = self.codec.execute
+        for node, verb, param in verbs:
+            execute(node, verb, param)
+
+    def read_verb(self, node, verb, param=0):
+        return self.codec.execute(node, verb, param)
+
+
+BACKENDS = {
+    'sysfs': SysfsBackend,
+    'hwdep': HwdepBackend,
+}
+
+
+# (codec_path, proc_path, hwdep_path, forced name) -> chosen backend class.
+# Only the choice is cached: every controller gets its own instance, so
+# closing one cannot close another's channel, and a codec with no usable
+# backend yet is probed again next time.
+_selected = {}
+
+
+def select_backend(codec_path=CODEC_PATH, proc_path=PROC_CODEC, hwdep_path=HWDEP_DEV):
+    """
+    Pick the fastest usable backend for a codec (probed once per codec)
+    Set HDA_CODEC_BACKEND=sysfs|hwdep to force a choice.
+    Returns: a new CodecBackend instance, or None if no backend is usable
+    """
+    forced = os.environ.get(BACKEND_ENV)
+    key = (Path(codec_path), Path(proc_path), Path(hwdep_path), forced)
+    cls = _selected.get(key)
+    if cls is None:
+        paths = {'codec_path': codec_path, 'proc_path': proc_path, 'hwdep_path': hwdep_path}
+        for name in (forced,) if forced else BACKEND_ORDER:
+            candidate = BACKENDS.get(name)
+            if candidate is None:
+                raise RuntimeError(f"Unknown codec backend {name!r} in ${BACKEND_ENV}")
+            if candidate.available(**paths):
+                cls = _selected[key] = candidate
+                break
+        else:
+            return None
+
+    if cls is SysfsBackend:
+        return cls(codec_path, proc_path)
+    return cls(hwdep_path, proc_path, codec_path)
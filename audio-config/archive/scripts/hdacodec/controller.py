@@ -0,0 +1,262 @@
+"""
+HDCodecController shared by the speaker fix scripts
+
+The controller holds the parsed codec dump and reports verb/reconfig
+failures; the actual I/O goes through a pluggable backend (see
+backends.py), picked automatically unless one is passed in. Without a
+backend or location the codec is discovered (see discovery.py): the
+first codec the quirk database knows, on whatever card it landed;
+CODEC_PATH/PROC_CODEC/HWDEP_DEV are only the fallback. Every
+operation is recorded in `metrics` (see metrics.py; a no-op unless
+enabled).
+"""
+
+import time
+
+from .backends import CODEC_PATH, PROC_CODEC, HWDEP_DEV, select_backend
+from .discovery import default_codec
+from .dump import parse_codec_dump, check_amp_muted
+from .hwdep import RESPONSE_INVALID
+from .metrics import metrics_from_env
+from .quirks import lookup_quirk
+from .transaction import VerbTransaction
+from .verbs import GET_AMP_GAIN_MUTE, VerbError, validate_verbs
+
+
+class HDCodecController:
+    """Interface to HDA codec via a sysfs, hwdep or simulated backend"""
+
+    CODEC_PATH = CODEC_PATH
+    PROC_CODEC = PROC_CODEC
+    HWDEP_DEV = HWDEP_DEV
+
+    def __init__(self, backend=None, metrics=None, location=None):
+        if backend is None:
+            if location is None:
+                location = default_codec()
+            if location is not None:
+                codec_path, proc_path, hwdep_path = (
+                    location['codec_path'], location['proc_path'], location['hwdep_path'])
+            else:
+                codec_path, proc_path, hwdep_path = self.CODEC_PATH, self.PROC_CODEC, self.HWDEP_DEV
+            backend = select_backend(codec_path, proc_path, hwdep_path)
+            if backend is None:
+                if not proc_path.exists():
+                    raise RuntimeError(f"Codec proc interface not found: {proc_path}")
+                raise RuntimeError(f"No codec interface found: neither "
+                                   f"{codec_path / 'init_verbs'} nor {hwdep_path}")
+        self.backend = backend
+        self.location = location
+        self.metrics = metrics if metrics is not None else metrics_from_env()
+        # Metrics passed in belong to the caller, which closes them
+        self._owns_metrics = metrics is None
+        self._dump = None
+        self._dump_text = None
+        self._parsed = None
+        self._quirk = None
+        self._quirk_loaded = False
+
+    def get_codec_info(self):
+        """Read codec identification"""
+        return self.backend.codec_info()
+
+    def get_quirk(self):
+        """
+        Look up this codec in the quirk database (once per controller)
+        Returns: quirk dict (see quirks.lookup_quirk), or None if unknown
+        """
+        if not self._quirk_loaded:
+            info = self.get_codec_info()
+            try:
+                self._quirk = lookup_quirk(info['vendor'], info['chip'], info['subsystem_id'])
+            except (OSError, ValueError) as e:
+                print(f"WARNING: Quirk database unusable: {e}")
+                self._quirk = None
+            self._quirk_loaded = True
+        return self._quirk
+
+    def quirk_state(self, name, default=None):
+        """Desired-state spec `name` from this codec's quirk, else default"""
+        quirk = self.get_quirk()
+        if quirk and name in quirk['states']:
+            return quirk['states'][name]
+        return default
+
+    def load_codec_dump(self):
+        """
+        Read and parse the codec dump once
+        Subsequent get_node_state() calls are served from this snapshot
+        until the next load or verb write. An unchanged dump is not re-parsed.
+        """
+        metrics = self.metrics
+        if not metrics.enabled:
+            text = self.backend.read_dump()
+            if text != self._dump_text:
+                self._dump_text, self._parsed = text, parse_codec_dump(text)
+            self._dump = self._parsed
+            return self._dump
+
+        start = time.perf_counter()
+        try:
+            text = self.backend.read_dump()
+        except OSError as e:
+            metrics.event('codec_dump_read', time.perf_counter() - start, ok=False, error=e)
+            raise
+        read = time.perf_counter()
+        metrics.event('codec_dump_read', read - start, bytes=len(text))
+        if text != self._dump_text:
+            self._dump_text, self._parsed = text, parse_codec_dump(text)
+            metrics.event('codec_dump_parse', time.perf_counter() - read,
+                          nodes=len(self._parsed))
+        self._dump = self._parsed
+        return self._dump
+
+    def get_node_state(self, node_id):
+        """
+        Look up node state in the parsed codec dump
+        Returns dict with node properties
+        """
+        dump = self._dump if self._dump is not None else self.load_codec_dump()
+        return dump.node(node_id)
+
+    def read_amp(self, node_id, output=True, index=0):
+        """
+        Read live left/right amp values of a node
+        Backends that can answer GET verbs are queried directly; otherwise
+        the values come from a fresh codec dump.
+        Returns: [left, right] (mute bit 0x80 | gain), or None if unavailable
+        """
+        read_verb = getattr(self.backend, 'read_verb', None)
+        if read_verb is None:
+            node = self.load_codec_dump().node(node_id)
+            amps = node and node['amp_out' if output else 'amp_in']
+            return list(amps[index]) if amps and index < len(amps) else None
+
+        base = (0x8000 if output else 0x0000) | (index & 0xf)
+        start = time.perf_counter() if self.metrics.enabled else None
+        try:
+            left = read_verb(node_id, GET_AMP_GAIN_MUTE, base | 0x2000)
+            right = read_verb(node_id, GET_AMP_GAIN_MUTE, base)
+        except OSError as e:
+            if start is not None:
+                self.metrics.event('verb_read', time.perf_counter() - start, ok=False,
+                                   error=e, node=node_id)
+            raise
+        answered = RESPONSE_INVALID not in (left, right)
+        if start is not None:
+            # Two GET verbs (left, right): record the per-verb round trip
+            self.metrics.event('verb_read', (time.perf_counter() - start) / 2, ok=answered,
+                               error=None if answered else 'no response', node=node_id)
+        if not answered:
+            return None
+        return [left & 0xff, right & 0xff]
+
+    def write_hda_verb(self, node, verb, param):
+        """
+        Write HDA verb to codec
+        Args:
+            node: Node ID (e.g., 0x17)
+            verb: Verb ID (e.g., 0x300)
+            param: Parameter value (e.g., 0x0000)
+        """
+        return self.write_hda_verbs([(node, verb, param)])
+
+    def write_hda_verbs(self, verbs):
+        """
+        Write a batch of HDA verbs through the backend in one call
+        Args:
+            verbs: Iterable of (node, verb, param) tuples
+        Returns: True on success; False without sending anything if a
+                 verb is malformed (see verbs.validate_verb)
+        """
+        try:
+            # Reject the whole batch before any of it reaches the codec
+            verbs = validate_verbs(verbs)
+        except VerbError as e:
+            print(f"ERROR: Refusing malformed verb batch: {e}")
+            self.metrics.event('verb_write', ok=False, error=e, backend=self.backend.name)
+            return False
+        for node, verb, param in verbs:
+            print(f"  Writing HDA verb: 0x{node:02x} 0x{verb:04x} 0x{param:04x}")
+        self._dump = None
+
+        metrics = self.metrics
+        start = time.perf_counter() if metrics.enabled else None
+        try:
+            self.backend.write_verbs(verbs)
+        except PermissionError as e:
+            print(f"ERROR: Permission denied. Run with sudo.")
+            error = e
+        except Exception as e:
+            print(f"ERROR: Failed to write verb: {e}")
+            error = e
+        else:
+            error = None
+
+        if start is not None:
+            metrics.event('verb_write', time.perf_counter() - start, ok=error is None,
+                          error=error, backend=self.backend.name, verbs=verbs)
+            if error is None:
+                metrics.inc('hda_verbs_written_total', len(verbs), backend=self.backend.name)
+                metrics.inc('hda_verb_batches_total', backend=self.backend.name)
+        return error is None
+
+    def reconfigure_codec(self):
+        """Trigger codec reconfiguration to apply verbs (sysfs backend only)"""
+        if not self.backend.needs_reconfig:
+            return True
+
+        print("  Triggering codec reconfiguration...")
+        self._dump = None
+
+        metrics = self.metrics
+        start = time.perf_counter() if metrics.enabled else None
+        try:
+            self.backend.reconfigure()
+        except Exception as e:
+            print(f"ERROR: Failed to reconfigure codec: {e}")
+            error = e
+        else:
+            error = None
+
+        if start is not None:
+            metrics.event('codec_reconfig', time.perf_counter() - start,
+                          ok=error is None, error=error)
+            if error is None:
+                metrics.inc('hda_codec_reconfigs_total')
+        return error is None
+
+    def transaction(self, timeout=3.0):
+        """Start a verb batch that is applied with a single reconfig"""
+        return VerbTransaction(self, timeout=timeout)
+
+    def check_amp_muted(self, amp_vals_str):
+        """
+        Check if amplifier is muted based on amp values string
+        Args:
+            amp_vals_str: String like "0x80 0x80" or "0x00 0x00"
+        Returns: (is_muted, values_list)
+        """
+        return check_amp_muted(amp_vals_str)
+
+    def check_mixer_node_muted(self, node_id=0x0d):
+        """
+        Check if mixer node input is muted
+        Returns: (is_muted, amp_values)
+        """
+        node = self.get_node_state(node_id)
+        if not node or not node['amp_in_vals']:
+            return (None, None)
+
+        return check_amp_muted(node['amp_in_vals'])
+
+    def close(self):
+        """
+        Release the backend and write any configured metrics snapshot;
+        metrics the controller set up itself are closed (trace file too)
+        """
+        if self._owns_metrics:
+            self.metrics.close()
+        else:
+            self.metrics.flush()
+        self.backend.close()
@@ -0,0 +1,249 @@
+"""
+Enumerate the HDA codecs of every sound card
+
+The card index is not stable: a dock, an HDMI/DP codec on SOF setups
+or a second controller can move the speaker codec away from card0 /
+hwC0D0. discover_codecs() walks /proc/asound/card*/codec#* and pairs
+each dump with its /sys/class/sound/hwCxDy and /dev/snd/hwCxDy nodes.
+Only the proc header (up to the Revision Id line) is read, and the
+result is cached for the rest of the process.
+
+A codec location is a dict:
+  {'name': 'hwC0D0', 'card', 'device', 'codec', 'vendor_id',
+   'subsystem_id', 'proc_path', 'codec_path', 'hwdep_path'}
+and can be passed to HDCodecController(location=...).
+
+matching_codecs() picks the codecs to work on - by vendor/subsystem ID,
+or by default those the quirk database knows (so HDMI codecs are left
+alone) - and run_on_codecs() runs a diagnostic or fix on each of them
+concurrently, keeping each codec's printed output together.
+fix_codecs() is the whole selection and dispatch of the fix scripts.
+"""
+
+import functools
+import io
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .dump import _parse_header_line
+from .metrics import metrics_from_env
+from .quirks import lookup_quirk
+
+SOUND_CLASS = "sys/class/sound"
+PROC_ASOUND = "proc/asound"
+DEV_SND = "dev/snd"
+
+_CODEC_RE = re.compile(r'card(\d+)/codec#(\d+)$')
+
+
+def read_codec_header(proc_path):
+    """Identification lines of a codec proc dump ({'codec', 'vendor_id', ...})"""
+    header = {}
+    with open(proc_path, errors='replace') as f:
+        for line in f:
+            if not line.strip() or line[0].isspace():
+                continue
+            _parse_header_line(header, line)
+            if 'revision_id' in header or line.startswith('No Modem'):
+                break
+    return header
+
+
+@functools.lru_cache(maxsize=None)
+def discover_codecs(root='/'):
+    """
+    Every codec with a proc dump, ordered by card and device
+    Args:
+        root: Filesystem root (a SimulatedCodecTree root in tests)
+    Returns: tuple of codec location dicts (see module docstring)
+    """
+    root = Path(root)
+    codecs = []
+    for proc_path in (root / PROC_ASOUND).glob('card*/codec#*'):
+        m = _CODEC_RE.search(proc_path.as_posix())
+        if not m:
+            continue
+        card, device = int(m.group(1)), int(m.group(2))
+        try:
+            header = read_codec_header(proc_path)
+        except OSError:
+            continue
+        name = f"hwC{card}D{device}"
+        codecs.append({
+            'name': name,
+            'card': card,
+            'device': device,
+            'codec': header.get('codec', ''),
+            'vendor_id': header.get('vendor_id'),
+            'subsystem_id': header.get('subsystem_id'),
+            'proc_path': proc_path,
+            'codec_path': root / SOUND_CLASS / name,
+            'hwdep_path': root / DEV_SND / name,
+        })
+    return tuple(sorted(codecs, key=lambda c: (c['card'], c['device'])))
+
+
+def refresh_codecs():
+    """Forget the cached discovery (after a card re-probe or hotplug)"""
+    discover_codecs.cache_clear()
+
+
+def has_quirk(location):
+    """True if the quirk database has an entry for this codec"""
+    vendor, _, chip = location['codec'].partition(' ')
+    try:
+        return lookup_quirk(vendor, chip, location['subsystem_id']) is not None
+    except (OSError, ValueError):
+        return False
+
+
+def matching_codecs(vendor_id=None, subsystem_id=None, root='/'):
+    """
+    Codecs to diagnose/fix
+    Args:
+        vendor_id, subsystem_id: IDs to match (ints); with neither given,
+                                 every codec with a quirk entry
+    Returns: list of codec location dicts
+    """
+    codecs = discover_codecs(root)
+    if vendor_id is None and subsystem_id is None:
+        return [c for c in codecs if has_quirk(c)]
+    return [c for c in codecs
+            if (vendor_id is None or c['vendor_id'] == vendor_id)
+            and (subsystem_id is None or c['subsystem_id'] == subsystem_id)]
+
+
+def default_codec(root='/'):
+    """First codec with a quirk entry, else the first codec, else None"""
+    codecs = matching_codecs(root=root) or discover_codecs(root)
+    return codecs[0] if codecs else None
+
+
+def find_codec(card=None, device=None, root='/'):
+    """Codec location at card/device (None matches any), or None"""
+    for codec in discover_codecs(root):
+        if (card is None or codec['card'] == card) and (device is None or codec['device'] == device):
+            return codec
+    return None
+
+
+class _ThreadStdout:
+    """sys.stdout stand-in that collects the output of worker threads"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def run_on_codecs(func, codecs, max_workers=None):
+    """
+    Call func(location) for every codec concurrently
+    The output each call prints is captured and returned instead of
+    being interleaved with the other codecs.
+    Args:
+        func: Callable taking a codec location dict
+        codecs: Codec locations (see matching_codecs)
+        max_workers: Thread limit (default: one per codec)
+    Returns: [{'codec', 'result', 'error', 'output'}] in codec order
+    """
+    codecs = list(codecs)
+    if not codecs:
+        return []
+    stdout = _ThreadStdout(sys.stdout)
+
+    def run(location):
+        buffer = stdout.local.buffer = io.StringIO()
+        try:
+            result, error = func(location), None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            stdout.local.buffer = None
+        return {'codec': location, 'result': result, 'error': error,
+                'output': buffer.getvalue()}
+
+    sys.stdout = stdout
+    try:
+        with ThreadPoolExecutor(max_workers or len(codecs)) as pool:
+            results = list(pool.map(run, codecs))
+    finally:
+        sys.stdout = stdout.stream
+    return results
+
+
+def _fix_one(fix, open_codec, location, metrics):
+    codec = open_codec(location=location, metrics=metrics)
+    try:
+        return fix(codec)
+    finally:
+        codec.close()
+
+
+def fix_codecs(fix, open_codec, card=None, error_prefix="ERROR:", root='/'):
+    """
+    Run a fix script's per-codec flow on the codecs it should handle
+    Every codec with a quirk entry (on `card`, if given) is fixed, in
+    parallel when there are several, each with its output printed as one
+    block. Without a known codec the first codec of `card`, else the
+    default location, is used. All controllers share one Metrics, each
+    codec's series labelled with its name, so a snapshot file holds
+    every codec instead of whichever flushed last.
+    Args:
+        fix: Callable taking an open controller, returning an exit status
+        open_codec: Controller factory, called as open_codec(location=, metrics=)
+                    (HDCodecController)
+        card: ALSA card number to restrict the codecs to
+        error_prefix: Start of the error lines, to match the script's output
+        root: Filesystem root (a SimulatedCodecTree root in tests)
+    Returns: the highest exit status (1 if no codec could be opened)
+    """
+    metrics = metrics_from_env()
+    codecs = [c for c in matching_codecs(root=root) if card is None or c['card'] == card]
+    try:
+        if len(codecs) > 1:
+            status = 0
+            results = run_on_codecs(
+                lambda location: _fix_one(fix, open_codec, location,
+                                          metrics.labelled(codec=location['name'])),
+                codecs)
+            for result in results:
+                location = result['codec']
+                print(f"\n##### {location['name']}: {location['codec']} "
+                      f"(subsystem 0x{location['subsystem_id'] or 0:08x}) #####\n")
+                print(result['output'], end='')
+                if result['error'] is not None:
+                    print(f"\n{error_prefix} {result['error']}")
+                status = max(status, 1 if result['result'] is None else result['result'])
+            return status
+
+        if not codecs and card is not None:
+            codecs = [c for c in discover_codecs(root) if c['card'] == card]
+            if not codecs:
+                print(f"\n{error_prefix} No HDA codec found on card {card}")
+                return 1
+
+        try:
+            codec = open_codec(location=codecs[0] if codecs else None, metrics=metrics)
+        except RuntimeError as e:
+            print(f"\n{error_prefix} {e}")
+            return 1
+        try:
+            return fix(codec)
+        finally:
+            codec.close()
+    finally:
+        metrics.close()
@@ -0,0 +1,319 @@
+"""
+Single-pass parser for /proc/asound/cardN/codec#M dumps
+
+The whole dump is tokenized exactly once and indexed by node ID, so
+looking up a node afterwards is a dict access instead of a fresh regex
+scan over the file.
+"""
+
+import re
+
+_HEX_RE = re.compile(r'0x[0-9a-fA-F]+')
+_BRACKET_RE = re.compile(r'\[([^\]]*)\]')
+_KV_RE = re.compile(r'(\w+)=(0x[0-9a-fA-F]+|\d+)\b')
+_HEX_VALUE_RE = re.compile(r'0x[0-9a-fA-F]{1,8}')
+_POWER_RE = re.compile(r'setting=(\w+), actual=(\w+)')
+
+_NODE_HDR_RE = re.compile(r'(0x[0-9a-fA-F]+) \[([^\]]*)\] wcaps (0x[0-9a-fA-F]+):?[ \t]*(.*)')
+
+# One alternative per line kind we extract inside a node block; the group
+# name is the token kind. Anchoring on a literal newline lets the regex
+# engine skip every other line without returning to Python. The
+# Connection token also swallows the following line with the node list.
+# Hex fields must be whole hex numbers: a truncated or garbled line does
+# not match and is skipped like any other unknown line.
+_TOKEN_RE = re.compile(
+    r'\n[ \t]+(?:'
+    r'(?P<amp>Amp-(?:In|Out) (?:caps|vals):[^\n]*)'
+    r'|Connection: *\d+\n[ \t]+(?P<conn>[^\n]*)'
+    r'|Converter:(?P<conv>[^\n]*)'
+    r'|Control: name="(?P<ctl>[^"]*)"[^\n]*'
+    r'|Pin-ctls: (?P<pinctl>0x[0-9a-fA-F]+\b[^\n]*)'
+    r'|Pin Default (?P<pindef>0x[0-9a-fA-F]+\b[^\n]*)'
+    r'|Pincap (?P<pincap>0x[0-9a-fA-F]+)\b[^\n]*'
+    r'|Power: (?P<power>[^\n]*)'
+    r'|EAPD (?P<eapd>0x[0-9a-fA-F]+)\b[^\n]*'
+    r')')
+
+# Parsed node records keyed by their exact block text. Node blocks rarely
+# change between successive reads (or between machines of one model), so
+# unchanged blocks are not re-parsed. The cached records are never handed
+# out; callers get a copy_node() of them.
+_BLOCK_CACHE_SIZE = 4096
+_block_cache = {}
+
+
+class CodecDump:
+    """Parsed codec dump: header fields plus a node-id -> node record index"""
+
+    def __init__(self, header, nodes):
+        self.header = header
+        self.nodes = nodes
+
+    @property
+    def codec(self):
+        return self.header.get('codec')
+
+    @property
+    def vendor_id(self):
+        return self.header.get('vendor_id')
+
+    @property
+    def subsystem_id(self):
+        return self.header.get('subsystem_id')
+
+    def node(self, node_id):
+        """Return the record for node_id, or None if the codec has no such node"""
+        return self.nodes.get(node_id)
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+
+def _hex_list(text):
+    return [int(v, 16) for v in _HEX_RE.findall(text)]
+
+
+def _kv_int(value):
+    """Value of a _KV_RE match: hex with 0x, else decimal (leading zeros allowed)"""
+    return int(value, 16) if value.startswith('0x') else int(value)
+
+
+def _hex_value(text):
+    """Integer of a whole 0x.. field, or None if it is truncated or garbled"""
+    m = _HEX_VALUE_RE.fullmatch(text)
+    return int(m.group(), 16) if m else None
+
+
+def _split_hex_field(text):
+    """'0x40: OUT' -> ('0x40', 'OUT'); the regex guarantees the hex prefix"""
+    value = _HEX_RE.match(text).group()
+    return value, text[len(value):].lstrip(' :')
+
+
+def _amp_caps(text):
+    """Parse 'ofs=0x00, nsteps=0x7f, stepsize=0x01, mute=0' (or 'N/A')"""
+    caps = {k: _kv_int(v) for k, v in _KV_RE.findall(text)}
+    return caps or None
+
+
+def _new_node(node_id, node_type, wcaps, wcaps_desc):
+    return {
+        'node_id': node_id,
+        'type': node_type,
+        'wcaps': wcaps,
+        'wcaps_desc': wcaps_desc,
+        'controls': [],
+        'amp_in_caps': None,
+        'amp_out_caps': None,
+        'amp_in_vals': None,
+        'amp_out_vals': None,
+        'amp_in': [],
+        'amp_out': [],
+        'connections': None,
+        'conn_list': [],
+        'conn_selected': None,
+        'pincap': None,
+        'pin_default': None,
+        'pin_default_desc': None,
+        'pin_ctls': None,
+        'pin_ctls_desc': None,
+        'eapd': None,
+        'stream': None,
+        'channel': None,
+        'power_setting': None,
+        'power_actual': None,
+        'raw': '',
+    }
+
+
+def _parse_connection_line(node, text):
+    node['connections'] = text
+    conn = []
+    for tok in text.split():
+        if tok.endswith('*'):
+            tok = tok[:-1]
+            node['conn_selected'] = len(conn)
+        try:
+            conn.append(int(tok, 16))
+        except ValueError:
+            pass
+    node['conn_list'] = conn
+
+
+_HEADER_HEX_FIELDS = {
+    'Vendor Id': 'vendor_id',
+    'Subsystem Id': 'subsystem_id',
+    'Revision Id': 'revision_id',
+}
+
+
+def _parse_header_line(header, line):
+    """Add one header field; malformed values are left out of the header"""
+    key, sep, value = line.partition(':')
+    if not sep:
+        return
+    value = value.strip()
+    if key == 'Codec':
+        header['codec'] = value
+    elif key == 'Address':
+        if value.isdigit():
+            header['address'] = int(value)
+    elif key in _HEADER_HEX_FIELDS:
+        number = _hex_value(value)
+        if number is not None:
+            header[_HEADER_HEX_FIELDS[key]] = number
+
+
+def copy_node(node):
+    """Copy a node record deep enough that editing it cannot alias another"""
+    node = dict(node)
+    node['amp_in'] = [list(v) for v in node['amp_in']]
+    node['amp_out'] = [list(v) for v in node['amp_out']]
+    node['controls'] = list(node['controls'])
+    node['conn_list'] = list(node['conn_list'])
+    node['amp_in_caps'] = node['amp_in_caps'] and dict(node['amp_in_caps'])
+    node['amp_out_caps'] = node['amp_out_caps'] and dict(node['amp_out_caps'])
+    return node
+
+
+def _parse_node_block(block):
+    """Parse one 'Node 0x..' block (text after the 'Node ' prefix)"""
+    eol = block.find('\n')
+    if eol < 0:
+        eol = len(block)
+    m = _NODE_HDR_RE.match(block, 0, eol)
+    if not m:
+        return None
+
+    node_id = int(m.group(1), 16)
+    node = _new_node(node_id, m.group(2), int(m.group(3), 16), m.group(4))
+    node['raw'] = block[eol + 1:]
+
+    for m in _TOKEN_RE.finditer(block, eol):
+        key = m.lastgroup
+        s = m.group(key)
+        if key == 'amp':
+            kind, _, rest = s.partition(':')
+            if kind.endswith('vals'):
+                amps = [_hex_list(v) for v in _BRACKET_RE.findall(rest)]
+                if amps:
+                    first = rest[rest.index('[') + 1:rest.index(']')]
+                    if kind == 'Amp-In vals':
+                        node['amp_in'], node['amp_in_vals'] = amps, first
+                    else:
+                        node['amp_out'], node['amp_out_vals'] = amps, first
+            elif kind == 'Amp-In caps':
+                node['amp_in_caps'] = _amp_caps(rest)
+            else:
+                node['amp_out_caps'] = _amp_caps(rest)
+        elif key == 'conn':
+            _parse_connection_line(node, s.strip())
+        elif key == 'conv':
+            kv = dict(_KV_RE.findall(s))
+            if 'stream' in kv:
+                node['stream'] = _kv_int(kv['stream'])
+            if 'channel' in kv:
+                node['channel'] = _kv_int(kv['channel'])
+        elif key == 'ctl':
+            node['controls'].append(s)
+        elif key == 'pinctl':
+            node['pin_ctls'], node['pin_ctls_desc'] = _split_hex_field(s)
+        elif key == 'pindef':
+            value, node['pin_default_desc'] = _split_hex_field(s)
+            node['pin_default'] = int(value, 16)
+        elif key == 'pincap':
+            node['pincap'] = int(s, 16)
+        elif key == 'power':
+            power = _POWER_RE.search(s)
+            if power:
+                node['power_setting'], node['power_actual'] = power.groups()
+        elif key == 'eapd':
+            node['eapd'] = s
+
+    return node
+
+
+def parse_codec_dump(text):
+    """
+    Parse a codec proc dump in one pass
+
+    The text is cut into per-node blocks at each 'Node 0x..' header and
+    every block is tokenized once by a single regex that only stops on
+    the lines we extract (amps, connections, pin, EAPD, converter and
+    power state). Blocks seen before are served from a cache.
+
+    Args:
+        text: Contents of /proc/asound/cardN/codec#M
+    Returns: CodecDump indexed by integer node ID
+    """
+    head, blocks = split_dump(text)
+    header = parse_header(head)
+
+    nodes = {}
+    for block in blocks:
+        node = parse_node_block(block)
+        if node is not None:
+            nodes[node['node_id']] = node
+
+    return CodecDump(header, nodes)
+
+
+def split_dump(text):
+    """
+    Cut a codec dump into its header and per-node blocks
+    Returns: (header text, [block]); each block is the text after its
+             'Node ' prefix, up to the next node
+    """
+    if text.startswith('Node '):
+        return '', ('\n' + text).split('\nNode ')[1:]
+    head, *blocks = text.split('\nNode ')
+    return head, blocks
+
+
+def parse_header(head):
+    """Header fields (codec, vendor_id, subsystem_id, ...) of a dump head"""
+    header = {}
+    for line in head.split('\n'):
+        if line and not line[0].isspace():
+            _parse_header_line(header, line)
+    return header
+
+
+def parse_node_block(block):
+    """Parsed record of one node block (a fresh copy), or None"""
+    cache = _block_cache
+    node = cache.get(block)
+    if node is None:
+        node = _parse_node_block(block)
+        if node is None:
+            return None
+        if len(cache) >= _BLOCK_CACHE_SIZE:
+            cache.clear()
+        cache[block] = node
+    return copy_node(node)
+
+
+def check_amp_muted(amp_vals_str):
+    """
+    Check if amplifier is muted based on amp values string
+    Args:
+        amp_vals_str: String like "0x80 0x80" or "0x00 0x00"
+    Returns: (is_muted, values_list)
+    """
+    if not amp_vals_str:
+        return (None, None)
+
+    vals = _hex_list(amp_vals_str)
+    if not vals:
+        return (None, amp_vals_str)
+
+    # Mute bit is bit 7 (0x80)
+    is_muted = any((v & 0x80) != 0 for v in vals)
+    return (is_muted, vals)
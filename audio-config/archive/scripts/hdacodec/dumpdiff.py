@@ -0,0 +1,195 @@
+"""
+Node-level differ for codec proc dumps
+
+DumpIndex cuts a dump into per-node blocks (split_dump(), the same cut
+the parser uses) and hashes each block and the whole text with BLAKE2.
+diff_index() then compares two indexes by hash: identical dumps stop at
+the whole-text digest, and of the rest only the nodes whose hashes
+differ are parsed (through the parser's block cache) and compared field
+by field. A reference is indexed once and compared against any number
+of dumps, so a fleet comparison costs one split and a few dozen hashes
+per machine plus the parse of the nodes that actually differ.
+
+A diff is a list of records
+  {'node', 'field', 'index', 'before', 'after', 'desc'}
+with desc like '0x17 Amp-Out [0x80 0x80] → [0x00 0x00]'. node is None
+for header fields; field 'node' marks an added/removed node and 'raw'
+a text change outside the parsed fields.
+"""
+
+import hashlib
+
+from .dump import parse_header, parse_node_block, split_dump
+
+DIGEST_SIZE = 8
+RAW_LINES = 4        # Changed lines shown for a 'raw' difference
+
+HEADER_FIELDS = (
+    ('codec', 'Codec', str),
+    ('vendor_id', 'Vendor Id', '0x{:08x}'.format),
+    ('subsystem_id', 'Subsystem Id', '0x{:08x}'.format),
+    ('revision_id', 'Revision Id', '0x{:x}'.format),
+)
+
+# (field, label, formatter) compared for every node besides the amps
+NODE_FIELDS = (
+    ('type', 'Type', str),
+    ('wcaps', 'wcaps', '0x{:x}'.format),
+    ('amp_in_caps', 'Amp-In caps', None),
+    ('amp_out_caps', 'Amp-Out caps', None),
+    ('connections', 'Connection', str),
+    ('pincap', 'Pincap', '0x{:08x}'.format),
+    ('pin_default', 'Pin Default', '0x{:08x}'.format),
+    ('pin_ctls', 'Pin-ctls', str),
+    ('eapd', 'EAPD', str),
+    ('stream', 'Stream', str),
+    ('channel', 'Channel', str),
+    ('power_setting', 'Power setting', str),
+    ('power_actual', 'Power actual', str),
+    ('controls', 'Controls', ', '.join),
+)
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+class DumpIndex:
+    """Per-node block hashes of one dump"""
+
+    def __init__(self, text, name=None):
+        head, blocks = split_dump(text)
+        self.name = name
+        self.digest = _digest(text)
+        self.head = head
+        self.blocks = {}
+        self.hashes = {}
+        for block in blocks:
+            try:
+                node_id = int(block[:block.index(' ')], 16)
+            except ValueError:
+                continue
+            self.blocks[node_id] = block
+            self.hashes[node_id] = _digest(block)
+        self._header = None
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = parse_header(self.head)
+        return self._header
+
+
+def _fmt(value, formatter):
+    if value is None:
+        return 'N/A'
+    if formatter is None:
+        return ', '.join(f"{k}={v:#x}" for k, v in value.items())
+    return formatter(value)
+
+
+def _amps(vals):
+    return '[' + ' '.join(f"0x{v:02x}" for v in vals) + ']' if vals else 'N/A'
+
+
+def _record(node_id, field, index, before, after, label, shown_before, shown_after):
+    where = f"0x{node_id:02x} " if node_id is not None else ''
+    return {'node': node_id, 'field': field, 'index': index, 'before': before,
+            'after': after, 'desc': f"{where}{label} {shown_before} → {shown_after}"}
+
+
+def diff_nodes(node_id, before, after):
+    """Field-level differences of two parsed node records"""
+    diffs = []
+    for field, label in (('amp_out', 'Amp-Out'), ('amp_in', 'Amp-In')):
+        a, b = before[field], after[field]
+        if a == b:
+            continue
+        for index in range(max(len(a), len(b))):
+            va = a[index] if index < len(a) else None
+            vb = b[index] if index < len(b) else None
+            if va != vb:
+                # Pins and DACs have one output amp; only index the rest
+                name = label if field == 'amp_out' and max(len(a), len(b)) == 1 else f"{label}[{index}]"
+                diffs.append(_record(node_id, field, index, va, vb, name, _amps(va), _amps(vb)))
+    for field, label, formatter in NODE_FIELDS:
+        a, b = before[field], after[field]
+        if a != b:
+            diffs.append(_record(node_id, field, None, a, b, label,
+                                 _fmt(a, formatter), _fmt(b, formatter)))
+    return diffs
+
+
+def _raw_diff(node_id, before, after):
+    """Changed lines of two blocks whose parsed fields are equal"""
+    a_lines, b_lines = before.split('\n'), after.split('\n')
+    a_set, b_set = set(a_lines), set(b_lines)
+    removed = [l.strip() for l in a_lines if l not in b_set][:RAW_LINES]
+    added = [l.strip() for l in b_lines if l not in a_set][:RAW_LINES]
+    return _record(node_id, 'raw', None, removed, added, 'text' if node_id is not None else 'Header text',
+                   ' | '.join(removed) or '-', ' | '.join(added) or '-')
+
+
+def diff_index(before, after):
+    """
+    Differences between two indexed dumps, comparing only changed nodes
+    Returns: list of diff records (see module docstring), header first,
+             then by node ID
+    """
+    if before.digest == after.digest:
+        return []
+    diffs = []
+    if before.head != after.head:
+        a, b = before.header, after.header
+        for field, label, formatter in HEADER_FIELDS:
+            if a.get(field) != b.get(field):
+                diffs.append(_record(None, field, None, a.get(field), b.get(field), label,
+                                     _fmt(a.get(field), formatter), _fmt(b.get(field), formatter)))
+        if not diffs:
+            diffs.append(_raw_diff(None, before.head, after.head))
+
+    a_hashes, b_hashes = before.hashes, after.hashes
+    for node_id in sorted(a_hashes.keys() | b_hashes.keys()):
+        a_hash, b_hash = a_hashes.get(node_id), b_hashes.get(node_id)
+        if a_hash == b_hash:
+            continue
+        a = parse_node_block(before.blocks[node_id]) if a_hash else None
+        b = parse_node_block(after.blocks[node_id]) if b_hash else None
+        if a_hash and b_hash and (a is None or b is None):
+            # A node header too garbled to parse: show the text instead
+            diffs.append(_raw_diff(node_id, before.blocks[node_id], after.blocks[node_id]))
+            continue
+        if a is None or b is None:
+            present = a or b or {'type': '?'}
+            diffs.append({'node': node_id, 'field': 'node', 'index': None,
+                          'before': a and a['type'], 'after': b and b['type'],
+                          'desc': f"0x{node_id:02x} {'removed' if b is None else 'added'} "
+                                  f"[{present['type']}]"})
+            continue
+        node_diffs = diff_nodes(node_id, a, b)
+        diffs.extend(node_diffs or [_raw_diff(node_id, before.blocks[node_id], after.blocks[node_id])])
+    return diffs
+
+
+def diff_dumps(before_text, after_text):
+    """diff_index() of two dump texts"""
+    return diff_index(DumpIndex(before_text), DumpIndex(after_text))
+
+
+def diff_many(reference, dumps):
+    """
+    Compare one reference against many dumps
+    Args:
+        reference: Dump text or DumpIndex
+        dumps: Iterable of (name, text)
+    Yields: (name, diffs)
+    """
+    if not isinstance(reference, DumpIndex):
+        reference = DumpIndex(reference)
+    for name, text in dumps:
+        yield name, diff_index(reference, DumpIndex(text, name))
+
+
+def diff_signature(diffs):
+    """Hashable summary of a diff, to group machines that differ the same way"""
+    return tuple(d['desc'] for d in diffs)
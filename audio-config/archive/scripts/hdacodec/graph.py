@@ -0,0 +1,256 @@
+"""
+Widget graph of a parsed codec dump: DAC -> output pin paths and checks
+
+Every node's Connection list names the widgets feeding it, which gives
+the signal-flow graph. output_paths() walks it backwards from each
+output-capable pin with a breadth-first search and returns every simple
+DAC -> ... -> pin path (shortest first, at most MAX_PATH_DEPTH widgets
+like the kernel's generic parser, which also never routes through
+another pin or an ADC). Digital converters only feed digital pins, so
+they are not path sources for analog ones.
+
+Paths depend only on the topology (node types, widget caps, connection
+lists, pin config), never on amp/EAPD/pin-ctl state, so they are
+memoized per topology checksum: re-reading the dump after every verb,
+or reading the same model on another machine, reuses the search.
+
+check_paths() then inspects every widget on every path in one sweep:
+the amp on the path (the input amp at the index of the upstream widget
+for mixers/selectors, the output amp everywhere), gain at the bottom of
+its range, EAPD and Pin-ctls OUT on the pin, and which connection each
+selector and pin has selected.
+"""
+
+import hashlib
+from collections import deque
+
+from .state import EAPD_BIT, merge_state
+
+MAX_PATH_DEPTH = 10
+
+AC_WCAP_DIGITAL = 0x200
+AC_PINCAP_OUT = 0x10
+AC_PINCAP_EAPD = 0x10000
+AC_PINCTL_OUT_EN = 0x40
+
+# Pin default config: port connectivity (bits 31-30) and default device
+AC_JACK_PORT_NONE = 1
+AC_JACK_SPEAKER = 1
+
+_MIXER = 'Audio Mixer'
+_OUTPUT = 'Audio Output'
+_INPUT = 'Audio Input'
+_PIN = 'Pin Complex'
+
+_PATH_CACHE_SIZE = 64
+_path_cache = {}
+
+
+def topology_key(dump):
+    """Checksum of everything that shapes the widget graph"""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(f"{dump.vendor_id}:{dump.subsystem_id}".encode())
+    for node_id in sorted(dump.nodes):
+        node = dump.nodes[node_id]
+        digest.update(f"|{node_id:x}:{node['type']}:{node['wcaps']:x}:"
+                      f"{node['pincap']}:{node['pin_default']}:"
+                      f"{','.join(map(str, node['conn_list']))}".encode())
+    return digest.hexdigest()
+
+
+def is_output_pin(node):
+    """Output-capable pin whose port is connected to something"""
+    if node['type'] != _PIN or node['pincap'] is None or not node['pincap'] & AC_PINCAP_OUT:
+        return False
+    default = node['pin_default']
+    return default is None or (default >> 30) != AC_JACK_PORT_NONE
+
+
+def is_speaker_pin(node):
+    """Output pin configured as a speaker (default device 1)"""
+    default = node['pin_default']
+    return is_output_pin(node) and default is not None and (default >> 20) & 0xf == AC_JACK_SPEAKER
+
+
+def _is_source(node, digital):
+    if node['type'] != _OUTPUT:
+        return False
+    return bool(node['wcaps'] & AC_WCAP_DIGITAL) == digital
+
+
+def _paths_to(dump, pin_id):
+    """Breadth-first search from a pin back to every DAC"""
+    pin = dump.nodes[pin_id]
+    digital = bool(pin['wcaps'] & AC_WCAP_DIGITAL)
+    paths = []
+    queue = deque([(pin_id,)])
+    while queue:
+        path = queue.popleft()
+        node = dump.nodes.get(path[0])
+        if node is None:
+            continue
+        if _is_source(node, digital):
+            paths.append(path)
+            continue
+        if len(path) >= MAX_PATH_DEPTH:
+            continue
+        for source in node['conn_list']:
+            upstream = dump.nodes.get(source)
+            # Simple paths only (the loopback mixers make the graph cyclic);
+            # pins and ADCs end a signal path, they never pass one through
+            if upstream is None or source in path or upstream['type'] in (_PIN, _INPUT):
+                continue
+            queue.append((source,) + path)
+    return paths
+
+
+def output_paths(dump):
+    """
+    Every DAC -> output pin path of a codec, memoized per topology
+    Returns: {pin node ID: [path]}; a path is a tuple of node IDs from
+             the DAC to the pin, shortest first
+    """
+    key = topology_key(dump)
+    paths = _path_cache.get(key)
+    if paths is None:
+        paths = {pin_id: _paths_to(dump, pin_id)
+                 for pin_id, node in sorted(dump.nodes.items()) if is_output_pin(node)}
+        if len(_path_cache) >= _PATH_CACHE_SIZE:
+            _path_cache.clear()
+        _path_cache[key] = paths
+    return paths
+
+
+def speaker_paths(dump):
+    """output_paths() restricted to the speaker pins"""
+    return {pin_id: paths for pin_id, paths in output_paths(dump).items()
+            if is_speaker_pin(dump.nodes[pin_id])}
+
+
+def _fmt(vals):
+    return '[' + ' '.join(f"0x{v:02x}" for v in vals) + ']'
+
+
+def _path_amp(node, upstream):
+    """(field, index, values, caps) of the amp a path crosses at node"""
+    # A pin's input amp belongs to its input direction, not the output path
+    if upstream is not None and node['type'] != _PIN and node['amp_in']:
+        try:
+            index = node['conn_list'].index(upstream)
+        except ValueError:
+            index = 0
+        if len(node['amp_in']) == 1:
+            index = 0
+        if index < len(node['amp_in']):
+            yield 'amp_in', index, node['amp_in'][index], node['amp_in_caps']
+    if node['amp_out']:
+        yield 'amp_out', 0, node['amp_out'][0], node['amp_out_caps']
+
+
+def check_path(dump, path):
+    """
+    Inspect every widget on one DAC -> pin path
+    Returns: {'path', 'active', 'hops', 'issues'}; hops has one
+             {'node', 'type', 'amps', 'selected', ...} record per widget and
+             issues one {'node', 'field', 'index', 'desc'} per problem.
+             active is False if a selector or the pin has another
+             connection selected (the path carries no signal).
+    """
+    hops, issues = [], []
+    active = True
+    upstream = None
+    for node_id in path:
+        node = dump.nodes[node_id]
+        hop = {'node': node_id, 'type': node['type'], 'amps': [], 'selected': True}
+
+        if upstream is not None and node['type'] != _MIXER and len(node['conn_list']) > 1:
+            selected = node['conn_selected']
+            if selected is not None and node['conn_list'][selected] != upstream:
+                hop['selected'] = False
+                active = False
+
+        for field, index, vals, caps in _path_amp(node, upstream):
+            hop['amps'].append((field, index, vals))
+            label = f"Amp-{'In' if field == 'amp_in' else 'Out'}"
+            if any(v & 0x80 for v in vals):
+                issues.append({'node': node_id, 'field': field, 'index': index,
+                               'desc': f"Node 0x{node_id:02x} {label}[{index}] "
+                                       f"{_fmt(vals)} is MUTED"})
+            elif caps and caps.get('nsteps') and all(v & 0x7f == 0 for v in vals):
+                issues.append({'node': node_id, 'field': field, 'index': index,
+                               'desc': f"Node 0x{node_id:02x} {label}[{index}] "
+                                       f"gain at minimum {_fmt(vals)}"})
+
+        if node['type'] == _OUTPUT:
+            hop['stream'] = node['stream']
+            if node['stream'] == 0:
+                issues.append({'node': node_id, 'field': 'stream', 'index': None,
+                               'desc': f"DAC 0x{node_id:02x} has no active audio stream"})
+
+        if node['type'] == _PIN:
+            hop['eapd'] = node['eapd']
+            hop['pin_ctls'] = node['pin_ctls']
+            if node['eapd'] and node['pincap'] and node['pincap'] & AC_PINCAP_EAPD:
+                if not int(node['eapd'], 16) & EAPD_BIT:
+                    issues.append({'node': node_id, 'field': 'eapd', 'index': None,
+                                   'desc': f"Pin 0x{node_id:02x} EAPD is OFF"})
+            if node['pin_ctls'] is not None and not int(node['pin_ctls'], 16) & AC_PINCTL_OUT_EN:
+                issues.append({'node': node_id, 'field': 'pin_ctls', 'index': None,
+                               'desc': f"Pin 0x{node_id:02x} output is not enabled "
+                                       f"(Pin-ctls {node['pin_ctls']})"})
+
+        hops.append(hop)
+        upstream = node_id
+
+    return {'path': path, 'active': active, 'hops': hops, 'issues': issues}
+
+
+def check_paths(dump, paths=None):
+    """
+    check_path() for every path of every pin in one sweep
+    Args:
+        paths: {pin: [path]} (default: output_paths(dump))
+    Returns: {pin node ID: [check_path() result]}
+    """
+    if paths is None:
+        paths = output_paths(dump)
+    return {pin_id: [check_path(dump, path) for path in pin_paths]
+            for pin_id, pin_paths in paths.items()}
+
+
+def path_state(dump, path):
+    """
+    Desired-state spec (see state.py) for a path to carry signal:
+    every amp on it unmuted, EAPD on and the pin output enabled
+    """
+    spec = {}
+    upstream = None
+    for node_id in path:
+        node = dump.nodes[node_id]
+        want = {}
+        for field, index, _, caps in _path_amp(node, upstream):
+            if caps is None or caps.get('mute', 1):
+                want.setdefault(field, {})[index] = {'mute': False}
+        if node['type'] == _PIN:
+            if node['eapd'] and node['pincap'] and node['pincap'] & AC_PINCAP_EAPD:
+                want['eapd'] = True
+            want['pin_ctls'] = AC_PINCTL_OUT_EN
+        if want:
+            spec[node_id] = want
+        upstream = node_id
+    return spec
+
+
+def describe_path(dump, path):
+    """'0x03 [Audio Output] -> 0x0d [Audio Mixer] -> 0x17 [Pin Complex]'"""
+    return ' -> '.join(f"0x{n:02x} [{dump.nodes[n]['type']}]" for n in path)
+
+
+def speaker_state(dump):
+    """path_state() of every speaker path its pin has selected, merged"""
+    spec = {}
+    for pin_paths in speaker_paths(dump).values():
+        for path in pin_paths:
+            if check_path(dump, path)['active']:
+                merge_state(spec, path_state(dump, path))
+    return spec
@@ -0,0 +1,162 @@
+"""
+Persistent HDA hwdep verb channel (/dev/snd/hwCxDy)
+
+Talks to the codec through the same HDA_IOCTL_VERB_WRITE ioctl that the
+hda-verb tool uses, but keeps the device open so a verb costs one ioctl
+instead of a fork+exec. Responses are decoded in pure Python. Verbs
+are encoded through verbs.encode_verb()/pack_verbs(), so a malformed
+verb raises VerbError instead of reaching the codec.
+
+The ioctl function is injectable, so the channel can be driven by an
+emulated shim instead of a real character device.
+"""
+
+import fcntl
+import os
+import struct
+
+from .verbs import (
+    GET_CONNECT_SEL, GET_CONNECT_LIST, GET_POWER_STATE, GET_CONV,
+    GET_PIN_WIDGET_CONTROL, GET_EAPD_BTLENABLE, GET_AMP_GAIN_MUTE,
+    encode_verb, get_amp, pack_verbs,
+)
+
+HWDEP_PATH = "/dev/snd/hwC0D0"
+
+# include/uapi/sound/hda_hwdep.h
+HDA_HWDEP_VERSION = (1 << 16) | (0 << 8) | 0
+HDA_IOCTL_PVERSION = 0x80044810     # _IOR('H', 0x10, int)
+HDA_IOCTL_VERB_WRITE = 0xC0084811   # _IOWR('H', 0x11, struct hda_verb_ioctl)
+HDA_IOCTL_GET_WCAP = 0xC0084812     # _IOWR('H', 0x12, struct hda_verb_ioctl)
+
+_VERB_IOCTL = struct.Struct('=II')  # struct hda_verb_ioctl { u32 verb; u32 res; }
+
+# Response value the controller returns when the codec did not answer
+RESPONSE_INVALID = 0xffffffff
+
+
+def decode_response(verb, res):
+    """
+    Decode a GET verb response into a dict of named fields
+    Args:
+        verb: The GET verb that was sent (e.g. 0xf07)
+        res: 32-bit response word
+    Returns: dict of fields, or None if the codec did not respond
+    """
+    if res == RESPONSE_INVALID:
+        return None
+
+    if verb == GET_AMP_GAIN_MUTE:
+        return {'mute': bool(res & 0x80), 'gain': res & 0x7f}
+    if verb == GET_EAPD_BTLENABLE:
+        return {'btl': bool(res & 0x1), 'eapd': bool(res & 0x2), 'lr_swap': bool(res & 0x4)}
+    if verb == GET_PIN_WIDGET_CONTROL:
+        return {
+            'value': res & 0xff,
+            'vref': res & 0x7,
+            'in': bool(res & 0x20),
+            'out': bool(res & 0x40),
+            'hp': bool(res & 0x80),
+        }
+    if verb == GET_POWER_STATE:
+        return {'setting': f"D{res & 0xf}", 'actual': f"D{(res >> 4) & 0xf}"}
+    if verb == GET_CONV:
+        return {'stream': (res >> 4) & 0xf, 'channel': res & 0xf}
+    if verb == GET_CONNECT_SEL:
+        return {'index': res & 0xff}
+    if verb == GET_CONNECT_LIST:
+        return {'nids': [(res >> s) & 0xff for s in (0, 8, 16, 24) if (res >> s) & 0xff]}
+    return {'value': res}
+
+
+class HwdepVerbChannel:
+    """
+    Open /dev/snd/hwCxDy once and exchange verbs through ioctl
+
+    Usage:
+        with HwdepVerbChannel() as chan:
+            chan.verb(0x17, 0x300, 0xb000)
+    """
+
+    def __init__(self, path=HWDEP_PATH, ioctl=None):
+        self.path = path
+        self._ioctl = ioctl or fcntl.ioctl
+        self.fd = None
+
+    def open(self):
+        """Open the device and check the hwdep protocol version"""
+        if self.fd is not None:
+            return self
+        fd = os.open(self.path, os.O_RDWR | os.O_CLOEXEC)
+        try:
+            buf = bytearray(4)
+            self._ioctl(fd, HDA_IOCTL_PVERSION, buf, True)
+            version = struct.unpack('=i', buf)[0]
+            if version < HDA_HWDEP_VERSION:
+                raise RuntimeError(f"Unsupported hwdep protocol 0x{version:x} on {self.path}")
+        except BaseException:
+            os.close(fd)
+            raise
+        self.fd = fd
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def verb(self, nid, verb, param):
+        """
+        Send one verb and return the raw 32-bit response
+        Raises: VerbError for a malformed verb
+        """
+        word = encode_verb(nid, verb, param)
+        if self.fd is None:
+            self.open()
+        buf = bytearray(_VERB_IOCTL.pack(word, 0))
+        self._ioctl(self.fd, HDA_IOCTL_VERB_WRITE, buf, True)
+        return _VERB_IOCTL.unpack(buf)[1]
+
+    def verbs(self, sequence):
+        """
+        Send (nid, verb, param) tuples back to back; returns the responses
+        Raises: VerbError before anything is sent if any verb is malformed
+        """
+        return self.write_packed(pack_verbs(sequence))
+
+    def write_packed(self, words):
+        """
+        Send pre-encoded 32-bit verb words (see verbs.pack_verbs) back to
+        back; hwdep takes one verb per ioctl, so this saves the per-verb
+        packing, not the ioctls
+        Returns: list of raw responses
+        """
+        if self.fd is None:
+            self.open()
+        fd, ioctl, pack, unpack = self.fd, self._ioctl, _VERB_IOCTL.pack, _VERB_IOCTL.unpack
+        buf = bytearray(_VERB_IOCTL.size)
+        results = []
+        for word in words:
+            buf[:] = pack(word, 0)
+            ioctl(fd, HDA_IOCTL_VERB_WRITE, buf, True)
+            results.append(unpack(buf)[1])
+        return results
+
+    def read(self, nid, verb, param=0):
+        """Send a GET verb and return its decoded response"""
+        return decode_response(verb, self.verb(nid, verb, param))
+
+    def read_amp(self, nid, output=True, index=0):
+        """Read left/right amp state; returns [left, right] decoded dicts"""
+        left, right = self.verbs([
+            get_amp(nid, output, index, left=True),
+            get_amp(nid, output, index, left=False),
+        ])
+        return [decode_response(GET_AMP_GAIN_MUTE, left),
+                decode_response(GET_AMP_GAIN_MUTE, right)]
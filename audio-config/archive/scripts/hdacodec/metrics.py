@@ -0,0 +1,309 @@
+"""
+Metrics and tracing hooks for codec I/O
+
+The controller records every dump read/parse, verb write/read, reconfig
+and settle wait into a Metrics instance:
+
+  counters    - hda_verbs_written_total, hda_codec_reconfigs_total,
+                hda_codec_errors_total{op,error}, hda_drift_events_total{node,field}, ...
+  histograms  - hda_<op>_seconds latency per operation
+
+and passes each operation as an event dict to the registered hooks
+(e.g. a JSON lines trace file). Snapshots export as Prometheus text
+(node_exporter textfile collector) or JSON lines. One Metrics can be
+shared by controllers running in several threads; labelled() gives each
+of them a view that tags its series and events (e.g. codec="hwC1D0").
+
+Metrics are off unless enabled; the controller then holds NULL_METRICS,
+whose `enabled` is False so instrumented code skips even the clock reads.
+
+Environment:
+  HDA_METRICS_PROM=FILE   write a Prometheus text snapshot on flush()
+  HDA_METRICS_JSON=FILE   write a JSON lines snapshot on flush()
+  HDA_TRACE=FILE          append one JSON line per operation
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds: 50us .. 5s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HELP = {
+    'hda_codec_dump_read_seconds': 'Time to read the codec proc dump',
+    'hda_codec_dump_parse_seconds': 'Time to parse the codec proc dump',
+    'hda_verb_write_seconds': 'Time to write one batch of verbs',
+    'hda_verb_read_seconds': 'Time for one GET verb round trip',
+    'hda_codec_reconfig_seconds': 'Time to trigger a codec reconfig',
+    'hda_codec_settle_seconds': 'Time until the codec reached the expected state',
+    'hda_snapshot_restore_seconds': 'Time to restore a codec state snapshot',
+    'hda_verbs_written_total': 'HDA verbs written',
+    'hda_verb_batches_total': 'Verb batches written',
+    'hda_codec_reconfigs_total': 'Codec reconfigs triggered',
+    'hda_codec_errors_total': 'Failed codec operations',
+    'hda_drift_events_total': 'Desired-state fields found drifted',
+    'hda_drift_repairs_total': 'Drift repairs applied',
+    'hda_drift_repairs_abandoned_total': 'Drifts left alone after repeated repairs',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _fmt(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper_bound, cumulative_count)] including +Inf"""
+        total = 0
+        out = []
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+
+class Metrics:
+    """
+    Counters, histograms and event hooks
+
+    Usage:
+        metrics = Metrics()
+        metrics.add_hook(print)
+        codec = HDCodecController(metrics=metrics)
+        ...
+        print(metrics.to_prometheus())
+    """
+
+    enabled = True
+
+    def __init__(self, prom_path=None, json_path=None):
+        self.counters = {}
+        self.histograms = {}
+        self.hooks = []
+        self.prom_path = prom_path
+        self.json_path = json_path
+        self.labels = {}
+        self._lock = threading.Lock()
+
+    def labelled(self, **labels):
+        """View sharing these series and hooks that adds labels to everything it records"""
+        view = copy.copy(self)
+        view.labels = {**self.labels, **labels}
+        return view
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key({**self.labels, **labels}))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key({**self.labels, **labels}))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def add_hook(self, hook):
+        """Call hook(event_dict) for every recorded operation"""
+        self.hooks.append(hook)
+
+    def event(self, op, seconds=None, ok=True, error=None, **fields):
+        """
+        Record one operation
+        Args:
+            op: Operation name (codec_dump_read, verb_write, codec_reconfig, ...)
+            seconds: Duration, observed into hda_<op>_seconds
+            ok: False counts it in hda_codec_errors_total
+            error: Exception (or message) for failed operations
+            fields: Extra event fields passed to hooks
+        """
+        if seconds is not None:
+            self.observe(f"hda_{op}_seconds", seconds)
+        if not ok:
+            self.inc('hda_codec_errors_total', op=op,
+                     error=type(error).__name__ if isinstance(error, BaseException) else str(error))
+        if self.hooks:
+            event = {'ts': time.time(), 'op': op, 'ok': ok}
+            if seconds is not None:
+                event['seconds'] = seconds
+            if error is not None:
+                event['error'] = str(error)
+            event.update(self.labels)
+            event.update(fields)
+            for hook in self.hooks:
+                hook(event)
+
+    def _series(self):
+        """Sorted (counters, histograms) items, copied under the lock"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = [(key, copy.deepcopy(hist)) for key, hist in sorted(self.histograms.items())]
+        return counters, histograms
+
+    def to_prometheus(self):
+        """Snapshot in Prometheus text exposition format"""
+        counters, histograms = self._series()
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_prom_labels(key)} {_fmt(value)}")
+        for (name, key), hist in histograms:
+            header(name, 'histogram')
+            for bound, total in hist.cumulative():
+                lines.append(f"{name}_bucket{_prom_labels(key, [('le', _fmt(bound))])} {total}")
+            lines.append(f"{name}_sum{_prom_labels(key)} {_fmt(hist.sum)}")
+            lines.append(f"{name}_count{_prom_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_json_lines(self):
+        """Snapshot as JSON lines, one series per line"""
+        counters, histograms = self._series()
+        lines = []
+        for (name, key), value in counters:
+            lines.append(json.dumps({'metric': name, 'type': 'counter',
+                                     'labels': dict(key), 'value': value}))
+        for (name, key), hist in histograms:
+            lines.append(json.dumps({
+                'metric': name, 'type': 'histogram', 'labels': dict(key),
+                'count': hist.count, 'sum': hist.sum,
+                'buckets': {_fmt(b): n for b, n in hist.cumulative()},
+            }))
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def flush(self):
+        """Write the configured snapshot files (atomically)"""
+        for path, render in ((self.prom_path, self.to_prometheus),
+                             (self.json_path, self.to_json_lines)):
+            if not path:
+                continue
+            tmp = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(render())
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"WARNING: Could not write metrics to {path}: {e}")
+
+    def close(self):
+        """Flush, then close and drop the hooks (of every labelled view)"""
+        self.flush()
+        hooks = list(self.hooks)
+        self.hooks.clear()
+        for hook in hooks:
+            close = getattr(hook, 'close', None)
+            if close is not None:
+                close()
+
+
+class NullMetrics:
+    """Disabled metrics: every call is a no-op"""
+
+    enabled = False
+    hooks = ()
+
+    def labelled(self, **labels):
+        return self
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def observe(self, name, seconds, **labels):
+        pass
+
+    def add_hook(self, hook):
+        pass
+
+    def event(self, op, seconds=None, ok=True, error=None, **fields):
+        pass
+
+    def to_prometheus(self):
+        return ""
+
+    def to_json_lines(self):
+        return ""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class JsonTraceHook:
+    """Hook appending each event as one JSON line to a file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', buffering=1)
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def metrics_from_env(environ=os.environ):
+    """Metrics configured by HDA_METRICS_PROM / HDA_METRICS_JSON / HDA_TRACE, else NULL_METRICS"""
+    prom = environ.get('HDA_METRICS_PROM')
+    json_path = environ.get('HDA_METRICS_JSON')
+    trace = environ.get('HDA_TRACE')
+    if not (prom or json_path or trace):
+        return NULL_METRICS
+
+    metrics = Metrics(prom_path=prom, json_path=json_path)
+    if trace:
+        try:
+            metrics.add_hook(JsonTraceHook(trace))
+        except OSError as e:
+            print(f"WARNING: Could not open trace file {trace}: {e}")
+    return metrics
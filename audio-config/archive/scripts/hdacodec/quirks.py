@@ -0,0 +1,209 @@
+"""
+Per-model quirk database
+
+quirks.json lists, per codec vendor/chip/subsystem_id, the widget roles
+(dac, mixer, speaker_pin) and named desired-state specs (see state.py)
+for that machine. A subsystem_id of null matches every machine with
+that codec.
+
+The JSON is compiled once into binary state tables (struct-packed
+records, one per spec field) and an index keyed by
+(vendor, chip, subsystem_id). The compiled index is cached on disk with
+marshal and rebuilt only when the database's mtime or size changes, so
+normal startup is one small file read and a dict lookup. Each entry's
+tables are decoded on its first lookup and kept with the loaded index.
+"""
+
+import copy
+import json
+import marshal
+import os
+import struct
+from pathlib import Path
+
+QUIRK_DB = Path(__file__).resolve().parent / "quirks.json"
+QUIRK_CACHE_ENV = 'HDA_QUIRK_CACHE'
+
+CACHE_FORMAT = 1
+
+# One state table record: node, kind, amp index, flags, value
+_RECORD = struct.Struct('<BBBBH')
+
+KIND_AMP_OUT = 1
+KIND_AMP_IN = 2
+KIND_EAPD = 3
+KIND_PIN_CTLS = 4
+
+_AMP_KINDS = {'amp_out': KIND_AMP_OUT, 'amp_in': KIND_AMP_IN}
+_AMP_FIELDS = {v: k for k, v in _AMP_KINDS.items()}
+
+FLAG_MUTE_SET = 0x1     # 'mute' given; FLAG_MUTE holds its value
+FLAG_MUTE = 0x2
+FLAG_GAIN_SET = 0x4     # 'gain' given; value holds it
+
+# db_path -> (stamp, index, {key: decoded quirk})
+_loaded = {}
+
+
+def default_cache_path():
+    """$HDA_QUIRK_CACHE, else $XDG_CACHE_HOME/hdacodec/quirks.bin"""
+    if os.environ.get(QUIRK_CACHE_ENV):
+        return Path(os.environ[QUIRK_CACHE_ENV])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache"
+    return Path(base) / "hdacodec" / "quirks.bin"
+
+
+def _int(value):
+    return value if isinstance(value, int) else int(value, 0)
+
+
+def quirk_key(vendor, chip, subsystem_id):
+    """Normalized index key; subsystem_id may be int, hex string or None"""
+    ssid = None if subsystem_id is None else _int(subsystem_id)
+    return (vendor.strip().lower(), chip.strip().lower(), ssid)
+
+
+def compile_state(spec):
+    """
+    Pack a JSON state spec into a binary state table
+    Args:
+        spec: {node: {field: ...}} with node IDs / indexes as strings or ints
+    Returns: bytes, one _RECORD per field
+    """
+    table = bytearray()
+    for node, want in spec.items():
+        node = _int(node)
+        for field, value in want.items():
+            if field in _AMP_KINDS:
+                for index, amp in value.items():
+                    flags, gain = 0, 0
+                    if amp.get('mute') is not None:
+                        flags |= FLAG_MUTE_SET | (FLAG_MUTE if amp['mute'] else 0)
+                    if amp.get('gain') is not None:
+                        flags |= FLAG_GAIN_SET
+                        gain = _int(amp['gain']) & 0x7f
+                    table += _RECORD.pack(node, _AMP_KINDS[field], _int(index), flags, gain)
+            elif field == 'eapd':
+                table += _RECORD.pack(node, KIND_EAPD, 0, 0, 1 if value else 0)
+            elif field == 'pin_ctls':
+                table += _RECORD.pack(node, KIND_PIN_CTLS, 0, 0, _int(value) & 0xff)
+            else:
+                raise ValueError(f"Unknown state field {field!r} for node 0x{node:02x}")
+    return bytes(table)
+
+
+def decode_state(table):
+    """Unpack a binary state table back into a state spec (see state.py)"""
+    spec = {}
+    for node, kind, index, flags, value in _RECORD.iter_unpack(table):
+        want = spec.setdefault(node, {})
+        if kind in _AMP_FIELDS:
+            amp = {}
+            if flags & FLAG_MUTE_SET:
+                amp['mute'] = bool(flags & FLAG_MUTE)
+            if flags & FLAG_GAIN_SET:
+                amp['gain'] = value
+            want.setdefault(_AMP_FIELDS[kind], {})[index] = amp
+        elif kind == KIND_EAPD:
+            want['eapd'] = bool(value)
+        elif kind == KIND_PIN_CTLS:
+            want['pin_ctls'] = value
+    return spec
+
+
+def compile_quirks(db_path=QUIRK_DB):
+    """
+    Compile the JSON database into the lookup index
+    Returns: {key: (name, nodes, {state_name: table_bytes})}
+    """
+    with open(db_path) as f:
+        db = json.load(f)
+
+    index = {}
+    for entry in db.get('quirks', []):
+        try:
+            key = quirk_key(entry['vendor'], entry['chip'], entry.get('subsystem_id'))
+            nodes = {role: _int(nid) for role, nid in entry.get('nodes', {}).items()}
+            states = {name: compile_state(spec) for name, spec in entry.get('states', {}).items()}
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"{db_path}: bad quirk entry {entry.get('name')!r}: {e}") from e
+        if key in index:
+            raise ValueError(f"{db_path}: duplicate quirk for {key} "
+                             f"({index[key][0]!r} and {entry.get('name')!r})")
+        index[key] = (entry.get('name', ''), nodes, states)
+    return index
+
+
+def _read_cache(cache_path, stamp):
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(cached, dict) or cached.get('stamp') != stamp:
+        return None
+    return cached.get('index')
+
+
+def _write_cache(cache_path, stamp, index):
+    tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump({'stamp': stamp, 'index': index}, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        # A read-only cache location only costs a recompile next time
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def load_quirks(db_path=QUIRK_DB, cache_path=None):
+    """
+    Return the compiled quirk index, from memory, disk cache or a fresh compile
+    The disk cache is valid while the database's mtime and size are unchanged.
+    """
+    db_path = Path(db_path)
+    st = os.stat(db_path)
+    stamp = (CACHE_FORMAT, str(db_path), st.st_mtime_ns, st.st_size)
+
+    loaded = _loaded.get(db_path)
+    if loaded and loaded[0] == stamp:
+        return loaded[1]
+
+    cache_path = Path(cache_path) if cache_path else default_cache_path()
+    index = _read_cache(cache_path, stamp)
+    if index is None:
+        index = compile_quirks(db_path)
+        _write_cache(cache_path, stamp, index)
+
+    _loaded[db_path] = (stamp, index, {})
+    return index
+
+
+def lookup_quirk(vendor, chip, subsystem_id, db_path=QUIRK_DB, cache_path=None):
+    """
+    Find the quirk for a codec: exact subsystem_id first, then the
+    codec-wide entry (subsystem_id null)
+    Returns: {'name', 'nodes', 'states'} with decoded state specs, or None
+    """
+    index = load_quirks(db_path, cache_path)
+    decoded = _loaded[Path(db_path)][2]
+    key = quirk_key(vendor, chip, subsystem_id)
+    if key not in index:
+        key = key[:2] + (None,)
+    quirk = decoded.get(key)
+    if quirk is None:
+        entry = index.get(key)
+        if entry is None:
+            return None
+        name, nodes, states = entry
+        quirk = decoded[key] = {
+            'name': name,
+            'nodes': dict(nodes),
+            'states': {state: decode_state(table) for state, table in states.items()},
+        }
+    # Callers get their own copy to modify
+    return copy.deepcopy(quirk)
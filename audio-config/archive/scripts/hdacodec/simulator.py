@@ -0,0 +1,355 @@
+"""
+In-memory HDA codec simulator
+
+Models the codec widget graph from a seed codec dump (by default the
+ALC298 of the Galaxy Book5 Pro 940XHA), executes verbs against it with
+the same encoding rules as the kernel, and renders a matching
+/proc/asound codec dump.
+
+The simulated codec can be reached three ways:
+  SimulatedBackend(codec)       - purely in memory
+  SimulatedCodecTree(root)      - rendered sysfs + proc files in a directory,
+                                  driven through the real SysfsBackend
+  HwdepBackend(ioctl=codec.ioctl) - emulated hwdep ioctls on any stand-in fd
+"""
+
+import struct
+from pathlib import Path
+
+from .backends import SysfsBackend, HwdepBackend
+from .dump import copy_node, parse_codec_dump
+from .hwdep import (
+    HDA_HWDEP_VERSION, HDA_IOCTL_PVERSION, HDA_IOCTL_VERB_WRITE, HDA_IOCTL_GET_WCAP,
+    RESPONSE_INVALID,
+)
+from .verbs import FOUR_BIT_VERBS
+
+FIXTURES = Path(__file__).parent / "fixtures"
+ALC298_FIXTURE = FIXTURES / "alc298-940xha.txt"
+
+_VERB_IOCTL = struct.Struct('=II')
+
+
+# AC_PAR_* parameter IDs answered from the widget records
+PAR_VENDOR_ID = 0x00
+PAR_SUBSYSTEM_ID = 0x01
+PAR_AUDIO_WIDGET_CAP = 0x09
+PAR_PIN_CAP = 0x0c
+
+
+def pin_ctls_desc(val):
+    """Describe a Pin-ctls value the way hda_proc.c does"""
+    parts = []
+    if val & 0x80:
+        parts.append('HP')
+    if val & 0x40:
+        parts.append('OUT')
+    if val & 0x20:
+        parts.append('IN')
+    vref = val & 0x7
+    if vref:
+        parts.append({1: 'VREF_50', 2: 'VREF_GRD', 4: 'VREF_80', 5: 'VREF_100'}.get(vref, 'VREF_HIZ'))
+    return ' '.join(parts)
+
+
+class SimulatedCodec:
+    """
+    Codec widget state that verbs can be executed against
+
+    Verbs are (nid, verb, param) as passed to init_verbs or hwdep:
+    12-bit verb IDs with an 8-bit payload, or 4-bit verb IDs (e.g. 0x300)
+    with a 16-bit payload. Anything the kernel would refuse to encode is
+    recorded in `rejected` and answered with RESPONSE_INVALID.
+    """
+
+    def __init__(self, dump):
+        self.header = dict(dump.header)
+        self.nodes = _copy_nodes(dump.nodes)
+        self._initial = _copy_nodes(self.nodes)
+        self._rendered = {}
+        self.verb_log = []
+        self.rejected = []
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(parse_codec_dump(text))
+
+    @classmethod
+    def alc298(cls):
+        """Galaxy Book5 Pro ALC298 in its boot state (mixer 0x0d and pin 0x17 muted)"""
+        return cls.from_text(ALC298_FIXTURE.read_text())
+
+    def reset(self):
+        """Return every widget to the seed state and clear the logs"""
+        self.nodes = _copy_nodes(self._initial)
+        self._rendered.clear()
+        self.verb_log.clear()
+        self.rejected.clear()
+
+    def codec_info(self):
+        vendor, _, chip = self.header.get('codec', '').partition(' ')
+        return {
+            'vendor': vendor,
+            'chip': chip,
+            'subsystem_id': f"0x{self.header.get('subsystem_id', 0):08x}",
+        }
+
+    def execute(self, nid, verb, param):
+        """Execute one verb and return the 32-bit response"""
+        if (nid & ~0x7f) or (verb & ~0xfff) or (param & ~0xffff):
+            self.rejected.append((nid, verb, param))
+            return RESPONSE_INVALID
+
+        cmd = ((verb << 8) | param) & 0xfffff
+        self.verb_log.append((nid, cmd))
+        node = self.nodes.get(nid)
+        if not cmd & 0x80000:
+            # SET verbs (0x2xx-0x7xx) may change what the node renders as
+            self._rendered.pop(nid, None)
+
+        if (cmd >> 16) in FOUR_BIT_VERBS:
+            vid, payload = cmd >> 16, cmd & 0xffff
+            if node is None:
+                return 0
+            if vid == 0x3:
+                self._set_amp(node, payload)
+                return 0
+            if vid == 0xb:
+                return self._get_amp(node, payload)
+            return 0
+
+        vid, payload = cmd >> 8, cmd & 0xff
+        if vid == 0xf00:
+            return self._get_parameter(nid, node, payload)
+        if node is None:
+            return 0
+
+        if vid == 0x70c:
+            node['eapd'] = f"0x{payload:x}"
+        elif vid == 0xf0c:
+            return int(node['eapd'], 16) if node['eapd'] else 0
+        elif vid == 0x707:
+            node['pin_ctls'] = f"0x{payload:02x}"
+            node['pin_ctls_desc'] = pin_ctls_desc(payload)
+        elif vid == 0xf07:
+            return int(node['pin_ctls'], 16) if node['pin_ctls'] else 0
+        elif vid == 0x705:
+            node['power_setting'] = node['power_actual'] = f"D{payload & 0xf}"
+        elif vid == 0xf05:
+            setting = int((node['power_setting'] or 'D0')[1:])
+            actual = int((node['power_actual'] or 'D0')[1:])
+            return (actual << 4) | setting
+        elif vid == 0x701:
+            if payload < len(node['conn_list']):
+                node['conn_selected'] = payload
+        elif vid == 0xf01:
+            return node['conn_selected'] or 0
+        elif vid == 0xf02:
+            conn = node['conn_list'][payload:payload + 4]
+            return sum(c << (8 * i) for i, c in enumerate(conn))
+        elif vid == 0x706:
+            node['stream'], node['channel'] = payload >> 4, payload & 0xf
+        elif vid == 0xf06:
+            return ((node['stream'] or 0) << 4) | (node['channel'] or 0)
+        return 0
+
+    def ioctl(self, fd, request, buf, mutate_flag=True):
+        """fcntl.ioctl stand-in answering the hwdep ioctls from this codec"""
+        if request == HDA_IOCTL_PVERSION:
+            buf[:] = struct.pack('=i', HDA_HWDEP_VERSION)
+            return 0
+        if request in (HDA_IOCTL_VERB_WRITE, HDA_IOCTL_GET_WCAP):
+            word = _VERB_IOCTL.unpack(buf)[0]
+            nid = word >> 24
+            if request == HDA_IOCTL_GET_WCAP:
+                node = self.nodes.get(nid)
+                res = node['wcaps'] if node else 0
+            else:
+                res = self.execute(nid, (word >> 8) & 0xffff, word & 0xff)
+            buf[:] = _VERB_IOCTL.pack(word, res)
+            return 0
+        raise OSError(25, "Inappropriate ioctl for device")
+
+    def _get_parameter(self, nid, node, par):
+        if nid == 0 and par == PAR_VENDOR_ID:
+            return self.header.get('vendor_id', 0)
+        if par == PAR_SUBSYSTEM_ID:
+            return self.header.get('subsystem_id', 0)
+        if node is None:
+            return 0
+        if par == PAR_AUDIO_WIDGET_CAP:
+            return node['wcaps']
+        if par == PAR_PIN_CAP:
+            return node['pincap'] or 0
+        return 0
+
+    @staticmethod
+    def _set_amp(node, payload):
+        for key, bit in (('amp_out', 0x8000), ('amp_in', 0x4000)):
+            amps = node[key]
+            index = (payload >> 8) & 0xf if key == 'amp_in' else 0
+            if not payload & bit or index >= len(amps):
+                continue
+            caps = node[key + '_caps'] or {}
+            val = (payload & 0x80) | min(payload & 0x7f, caps.get('nsteps', 0x7f))
+            if payload & 0x2000:
+                amps[index][0] = val
+            if payload & 0x1000 and len(amps[index]) > 1:
+                amps[index][1] = val
+            node[key + '_vals'] = ' '.join(f"0x{v:02x}" for v in amps[0])
+
+    @staticmethod
+    def _get_amp(node, payload):
+        amps = node['amp_out'] if payload & 0x8000 else node['amp_in']
+        index = 0 if payload & 0x8000 else payload & 0xf
+        if index >= len(amps):
+            return 0
+        channel = 0 if payload & 0x2000 or len(amps[index]) == 1 else 1
+        return amps[index][channel]
+
+    def render_dump(self):
+        """Render the current state in /proc/asound/cardN/codec#M format"""
+        h = self.header
+        out = [
+            f"Codec: {h.get('codec', 'Unknown')}",
+            f"Address: {h.get('address', 0)}",
+            f"Vendor Id: 0x{h.get('vendor_id', 0):08x}",
+            f"Subsystem Id: 0x{h.get('subsystem_id', 0):08x}",
+            f"Revision Id: 0x{h.get('revision_id', 0):x}",
+        ]
+        rendered = self._rendered
+        for nid in sorted(self.nodes):
+            lines = rendered.get(nid)
+            if lines is None:
+                lines = rendered[nid] = render_node(self.nodes[nid])
+            out.extend(lines)
+        out.append('')
+        return '\n'.join(out)
+
+
+def _copy_nodes(nodes):
+    """Copy node records deep enough that executing verbs cannot alias them"""
+    return {nid: copy_node(node) for nid, node in nodes.items()}
+
+
+def _render_caps(caps):
+    return (f"ofs=0x{caps.get('ofs', 0):02x}, nsteps=0x{caps.get('nsteps', 0):02x}, "
+            f"stepsize=0x{caps.get('stepsize', 0):02x}, mute={caps.get('mute', 0)}")
+
+
+def _render_vals(amps):
+    return ' '.join('[' + ' '.join(f"0x{v:02x}" for v in pair) + ']' for pair in amps)
+
+
+def render_node(node):
+    """Render one node record as proc dump lines"""
+    lines = [f"Node 0x{node['node_id']:02x} [{node['type']}] wcaps 0x{node['wcaps']:x}: "
+             f"{node['wcaps_desc']}"]
+    for name in node['controls']:
+        lines.append(f'  Control: name="{name}", index=0, device=0')
+    if node['amp_in_caps']:
+        lines.append(f"  Amp-In caps: {_render_caps(node['amp_in_caps'])}")
+    if node['amp_in']:
+        lines.append(f"  Amp-In vals:  {_render_vals(node['amp_in'])}")
+    if node['amp_out_caps']:
+        lines.append(f"  Amp-Out caps: {_render_caps(node['amp_out_caps'])}")
+    if node['amp_out']:
+        lines.append(f"  Amp-Out vals:  {_render_vals(node['amp_out'])}")
+    if node['stream'] is not None:
+        lines.append(f"  Converter: stream={node['stream']}, channel={node['channel'] or 0}")
+    if node['pincap'] is not None:
+        lines.append(f"  Pincap 0x{node['pincap']:08x}:")
+    if node['eapd'] is not None:
+        eapd = int(node['eapd'], 16)
+        lines.append(f"  EAPD {node['eapd']}:{' EAPD' if eapd & 0x2 else ''}")
+    if node['pin_default'] is not None:
+        lines.append(f"  Pin Default 0x{node['pin_default']:08x}: {node['pin_default_desc']}")
+    if node['pin_ctls'] is not None:
+        lines.append(f"  Pin-ctls: {node['pin_ctls']}: {node['pin_ctls_desc']}")
+    if node['power_setting'] is not None:
+        lines.append(f"  Power: setting={node['power_setting']}, actual={node['power_actual']}")
+    if node['conn_list']:
+        lines.append(f"  Connection: {len(node['conn_list'])}")
+        conns = [f"0x{c:02x}" + ('*' if i == node['conn_selected'] else '')
+                 for i, c in enumerate(node['conn_list'])]
+        lines.append('     ' + ' '.join(conns))
+    return lines
+
+
+class SimulatedSysfsBackend(SysfsBackend):
+    """SysfsBackend whose reconfig replays init_verbs into a SimulatedCodecTree"""
+
+    def __init__(self, tree):
+        super().__init__(tree.codec_path, tree.proc_path)
+        self.tree = tree
+
+    def reconfigure(self):
+        super().reconfigure()
+        self.tree.apply_init_verbs()
+
+
+class SimulatedCodecTree:
+    """
+    Render a simulated codec as sysfs + proc files under a directory
+
+    Layout mirrors the real system, rooted at `root`:
+        root/sys/class/sound/hwC0D0/{vendor_name,chip_name,subsystem_id,init_verbs,reconfig}
+        root/proc/asound/card0/codec#0
+    Writes to init_verbs take effect on the next reconfig, as with the
+    legacy HDA driver.
+    """
+
+    def __init__(self, root, codec=None, card=0, device=0):
+        self.root = Path(root)
+        self.codec = codec or SimulatedCodec.alc298()
+        self.codec_path = self.root / f"sys/class/sound/hwC{card}D{device}"
+        self.proc_path = self.root / f"proc/asound/card{card}/codec#{device}"
+        self.hwdep_path = self.root / f"dev/snd/hwC{card}D{device}"
+        self.render()
+
+    def render(self):
+        """Write identification, empty verb/reconfig nodes and the proc dump"""
+        self.codec_path.mkdir(parents=True, exist_ok=True)
+        self.proc_path.parent.mkdir(parents=True, exist_ok=True)
+        self.hwdep_path.parent.mkdir(parents=True, exist_ok=True)
+
+        info = self.codec.codec_info()
+        (self.codec_path / "vendor_name").write_text(info['vendor'] + "\n")
+        (self.codec_path / "chip_name").write_text(info['chip'] + "\n")
+        (self.codec_path / "subsystem_id").write_text(info['subsystem_id'] + "\n")
+        (self.codec_path / "vendor_id").write_text(f"0x{self.codec.header.get('vendor_id', 0):08x}\n")
+        (self.codec_path / "init_verbs").write_text("")
+        (self.codec_path / "reconfig").write_text("")
+        self.hwdep_path.touch()
+        self.sync()
+
+    def sync(self):
+        """Re-render the proc dump from the current codec state"""
+        self.proc_path.write_text(self.codec.render_dump())
+
+    def apply_init_verbs(self):
+        """Execute and clear pending init_verbs lines, then refresh the proc dump"""
+        verb_file = self.codec_path / "init_verbs"
+        for line in verb_file.read_text().splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                self.codec.execute(*(int(f, 0) for f in fields))
+        verb_file.write_text("")
+        self.sync()
+
+    def sysfs_backend(self):
+        """Backend going through the rendered files, like the legacy HDA driver"""
+        return SimulatedSysfsBackend(self)
+
+    def hwdep_backend(self):
+        """Backend using emulated hwdep ioctls on the stand-in device node"""
+        backend = HwdepBackend(self.hwdep_path, self.proc_path, self.codec_path,
+                               ioctl=self.codec.ioctl)
+        read_dump = backend.read_dump
+
+        def synced_read_dump():
+            self.sync()
+            return read_dump()
+
+        backend.read_dump = synced_read_dump
+        return backend
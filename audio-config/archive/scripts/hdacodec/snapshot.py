@@ -0,0 +1,284 @@
+"""
+Compact codec-state snapshots for suspend/resume
+
+A snapshot holds the values that make the speaker path work - amp
+gain/mute per amp index and channel, EAPD, Pin-ctls and power state -
+for the widgets on the selected speaker paths (see graph.py), or every
+widget. It is written as a small binary file named after the codec's
+subsystem ID:
+
+  header  '<4sBBHII'  magic 'HDAS', format, flags, record count,
+                      vendor ID, subsystem ID
+  record  '<BBBBH'    node, kind, amp index, reserved, value
+                      (amps: left | right << 8)
+  trailer '<I'        CRC32 of header and records
+
+restore_snapshot() is the resume path: with a backend that answers GET
+verbs (hwdep, sim) it reads back just the snapshotted values, writes
+only the SET verbs for those that differ in one batch and re-reads them
+to confirm, with no proc dump parse and no reconfig. The sysfs backend
+falls back to one dump read, and its reconfig settle is capped by the
+latency budget. Every phase is timed so the hook can be held to a
+budget and the result exported through metrics.
+
+Power states are captured but only replayed on request: the driver
+moves idle widgets to D3 itself, and a resumed codec is usually
+already back in D0.
+"""
+
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+
+from .graph import speaker_paths
+from .hwdep import RESPONSE_INVALID
+from .transaction import wait_for_codec_state
+from .verbs import (
+    GET_EAPD_BTLENABLE, GET_PIN_WIDGET_CONTROL, GET_POWER_STATE, SET_EAPD_BTLENABLE,
+    SET_PIN_WIDGET_CONTROL, SET_POWER_STATE, amp_value, validate_verb,
+)
+
+SNAPSHOT_DIR = Path("/var/lib/hdacodec")
+SNAPSHOT_DIR_ENV = 'HDA_SNAPSHOT_DIR'
+
+MAGIC = b'HDAS'
+FORMAT = 1
+_HEADER = struct.Struct('<4sBBHII')
+_RECORD = struct.Struct('<BBBBH')
+_CRC = struct.Struct('<I')
+
+KIND_AMP_OUT = 1
+KIND_AMP_IN = 2
+KIND_EAPD = 3
+KIND_PIN_CTLS = 4
+KIND_POWER = 5
+
+KIND_NAMES = {KIND_AMP_OUT: 'Amp-Out', KIND_AMP_IN: 'Amp-In', KIND_EAPD: 'EAPD',
+              KIND_PIN_CTLS: 'Pin-ctls', KIND_POWER: 'Power'}
+
+
+def default_snapshot_dir():
+    """$HDA_SNAPSHOT_DIR, else /var/lib/hdacodec"""
+    return Path(os.environ.get(SNAPSHOT_DIR_ENV) or SNAPSHOT_DIR)
+
+
+def snapshot_path(subsystem_id, snapshot_dir=None):
+    """
+    Snapshot file of a codec; subsystem_id as int or hex string
+    Raises: ValueError if there is no usable subsystem ID
+    """
+    if subsystem_id is None:
+        raise ValueError("No subsystem ID to name the snapshot after")
+    if isinstance(subsystem_id, str):
+        subsystem_id = int(subsystem_id, 16)
+    return Path(snapshot_dir or default_snapshot_dir()) / f"{subsystem_id:08x}.snap"
+
+
+class CodecSnapshot:
+    """Snapshot records: [(node, kind, index, value)]"""
+
+    def __init__(self, vendor_id, subsystem_id, records):
+        self.vendor_id = vendor_id
+        self.subsystem_id = subsystem_id
+        self.records = records
+
+    def encode(self):
+        body = _HEADER.pack(MAGIC, FORMAT, 0, len(self.records),
+                            self.vendor_id or 0, self.subsystem_id or 0)
+        body += b''.join(_RECORD.pack(node, kind, index, 0, value)
+                         for node, kind, index, value in self.records)
+        return body + _CRC.pack(zlib.crc32(body))
+
+    @classmethod
+    def decode(cls, data):
+        """
+        Parse an encoded snapshot
+        Raises: ValueError for a truncated, corrupt or foreign file
+        """
+        if len(data) < _HEADER.size + _CRC.size:
+            raise ValueError("Snapshot is truncated")
+        body, (crc,) = data[:-_CRC.size], _CRC.unpack_from(data, len(data) - _CRC.size)
+        if zlib.crc32(body) != crc:
+            raise ValueError("Snapshot checksum mismatch")
+        magic, fmt, _, count, vendor_id, subsystem_id = _HEADER.unpack_from(body)
+        if magic != MAGIC or fmt != FORMAT:
+            raise ValueError(f"Not a format {FORMAT} codec snapshot")
+        if len(body) != _HEADER.size + count * _RECORD.size:
+            raise ValueError("Snapshot record count does not match its size")
+        records = [(node, kind, index, value) for node, kind, index, _, value
+                   in _RECORD.iter_unpack(body[_HEADER.size:])]
+        return cls(vendor_id, subsystem_id, records)
+
+    def describe(self):
+        """One line per record, e.g. 'Node 0x17 Amp-Out[0] [0x00 0x00]'"""
+        lines = []
+        for node, kind, index, value in self.records:
+            if kind in (KIND_AMP_OUT, KIND_AMP_IN):
+                shown = f"[{index}] [0x{value & 0xff:02x} 0x{value >> 8:02x}]"
+            elif kind == KIND_POWER:
+                shown = f" D{value}"
+            else:
+                shown = f" 0x{value:02x}"
+            lines.append(f"Node 0x{node:02x} {KIND_NAMES.get(kind, kind)}{shown}")
+        return lines
+
+
+def _amp_value(vals):
+    left = vals[0]
+    right = vals[1] if len(vals) > 1 else left
+    return left | right << 8
+
+
+def node_records(node):
+    """Snapshot records of one parsed node (see dump.py)"""
+    node_id = node['node_id']
+    records = []
+    for kind, field in ((KIND_AMP_OUT, 'amp_out'), (KIND_AMP_IN, 'amp_in')):
+        for index, vals in enumerate(node[field]):
+            if vals:
+                records.append((node_id, kind, index, _amp_value(vals)))
+    if node['eapd']:
+        records.append((node_id, KIND_EAPD, 0, int(node['eapd'], 16) & 0xff))
+    if node['pin_ctls']:
+        records.append((node_id, KIND_PIN_CTLS, 0, int(node['pin_ctls'], 16) & 0xff))
+    if node['power_setting'] and node['power_setting'][1:].isdigit():
+        records.append((node_id, KIND_POWER, 0, int(node['power_setting'][1:])))
+    return records
+
+
+def capture_snapshot(dump, nodes=None):
+    """
+    Snapshot of a parsed codec dump
+    Args:
+        nodes: Node IDs to capture (default: every widget on a speaker path)
+    Returns: CodecSnapshot
+    """
+    if nodes is None:
+        nodes = sorted({node_id for paths in speaker_paths(dump).values()
+                        for path in paths for node_id in path})
+    records = []
+    for node_id in nodes:
+        node = dump.node(node_id)
+        if node is not None:
+            records.extend(node_records(node))
+    return CodecSnapshot(dump.vendor_id, dump.subsystem_id, records)
+
+
+def save_snapshot(snapshot, path):
+    """Write atomically, so a suspend during the write leaves the old file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(snapshot.encode())
+    os.replace(tmp, path)
+
+
+def load_snapshot(path):
+    """Raises: OSError, ValueError"""
+    with open(path, 'rb') as f:
+        return CodecSnapshot.decode(f.read())
+
+
+def _read_live(codec, record):
+    """Current value of one record via GET verbs, or None if unanswered"""
+    node, kind, index, _ = record
+    if kind in (KIND_AMP_OUT, KIND_AMP_IN):
+        vals = codec.read_amp(node, kind == KIND_AMP_OUT, index)
+        return _amp_value(vals) if vals else None
+    verb = {KIND_EAPD: GET_EAPD_BTLENABLE, KIND_PIN_CTLS: GET_PIN_WIDGET_CONTROL,
+            KIND_POWER: GET_POWER_STATE}[kind]
+    res = codec.backend.read_verb(node, verb, 0)
+    if res == RESPONSE_INVALID:
+        return None
+    return res & (0xf if kind == KIND_POWER else 0xff)
+
+
+def _record_verbs(record):
+    """SET verbs that put one record's value back"""
+    node, kind, index, value = record
+    if kind in (KIND_AMP_OUT, KIND_AMP_IN):
+        output = kind == KIND_AMP_OUT
+        left, right = value & 0xff, value >> 8
+        if left == right:
+            return [amp_value(node, left, output, index)]
+        return [amp_value(node, left, output, index, right=False),
+                amp_value(node, right, output, index, left=False)]
+    if kind == KIND_EAPD:
+        return [validate_verb(node, SET_EAPD_BTLENABLE, value)]
+    if kind == KIND_PIN_CTLS:
+        return [validate_verb(node, SET_PIN_WIDGET_CONTROL, value)]
+    return [validate_verb(node, SET_POWER_STATE, value)]
+
+
+def _dump_values(dump, records):
+    """Current values of records from a parsed dump ({record: value or None})"""
+    values = {}
+    for record in records:
+        node = dump.node(record[0])
+        live = {(kind, index): value for _, kind, index, value in node_records(node)} if node else {}
+        values[record] = live.get((record[1], record[2]))
+    return values
+
+
+def restore_snapshot(codec, snapshot, budget=None, power=False):
+    """
+    Replay the snapshot values that differ from the codec
+    Args:
+        codec: HDCodecController
+        snapshot: CodecSnapshot
+        budget: Latency budget in seconds (caps the sysfs settle wait)
+        power: Also restore power states
+    Returns: {'ok', 'verbs', 'changed', 'unmet', 'elapsed', 'phases',
+              'within_budget'}; phases maps read/write/verify to seconds
+    """
+    start = time.perf_counter()
+    phases = {}
+    backend = codec.backend
+    records = [r for r in snapshot.records if power or r[1] != KIND_POWER]
+    live = getattr(backend, 'read_verb', None) is not None
+
+    if live:
+        current = {record: _read_live(codec, record) for record in records}
+    else:
+        current = _dump_values(codec.load_codec_dump(), records)
+    changed = [record for record in records if current[record] != record[3]]
+    phases['read'] = time.perf_counter() - start
+
+    verbs = [verb for record in changed for verb in _record_verbs(record)]
+    ok, unmet = True, []
+    if verbs:
+        mark = time.perf_counter()
+        ok = codec.write_hda_verbs(verbs)
+        if ok and backend.needs_reconfig:
+            ok = codec.reconfigure_codec()
+        phases['write'] = time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        if ok and live:
+            unmet = [r for r in changed if _read_live(codec, r) != r[3]]
+        elif ok:
+            expectations = [(f"Node 0x{r[0]:02x} {KIND_NAMES[r[1]]}[{r[2]}]",
+                             lambda dump, r=r: _dump_values(dump, [r])[r] == r[3])
+                            for r in changed]
+            remaining = 3.0 if budget is None else max(budget - (mark - start), 0.0)
+            _, unmet, _ = wait_for_codec_state(codec.load_codec_dump, expectations, remaining)
+            unmet = [r for r, (desc, _) in zip(changed, expectations) if desc in unmet]
+        phases['verify'] = time.perf_counter() - mark
+
+    elapsed = time.perf_counter() - start
+    metrics = codec.metrics
+    if metrics.enabled:
+        metrics.event('snapshot_restore', elapsed, ok=ok and not unmet,
+                      error=None if ok and not unmet else 'unmet', verbs=len(verbs))
+    return {
+        'ok': ok and not unmet,
+        'verbs': verbs,
+        'changed': changed,
+        'unmet': unmet,
+        'elapsed': elapsed,
+        'phases': phases,
+        'within_budget': budget is None or elapsed <= budget,
+    }
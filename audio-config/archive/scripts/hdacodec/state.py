@@ -0,0 +1,240 @@
+"""
+Desired codec state: spec, differ and minimal verb planner
+
+A state spec says what the widgets on a path should look like:
+
+    {
+        0x0d: {'amp_in': {0: {'mute': False}}},
+        0x17: {'amp_out': {0: {'mute': False}}, 'eapd': True, 'pin_ctls': 0x40},
+    }
+
+  amp_out / amp_in - {index: {'mute': bool, 'gain': int}}; gain is optional
+                     and left as-is when omitted
+  eapd             - True/False for the EAPD bit (0x2)
+  pin_ctls         - bits that must be set in Pin-ctls
+
+diff_state() compares a spec with a parsed CodecDump and returns one
+change record per field that differs; plan_verbs() turns those into the
+smallest verb list that fixes them, keeping every bit the spec does not
+mention. Nothing to change means no verbs and no reconfig.
+merge_state() combines specs, e.g. those of several signal paths.
+"""
+
+from .verbs import SET_EAPD_BTLENABLE, SET_PIN_WIDGET_CONTROL, amp_value, validate_verb
+
+EAPD_BIT = 0x2
+
+# Galaxy Book5 Pro (ALC298) speaker path: DAC 0x03 -> mixer 0x0d -> pin 0x17
+SPEAKER_STATE = {
+    0x0d: {'amp_in': {0: {'mute': False}}},
+    0x17: {'amp_out': {0: {'mute': False}}, 'eapd': True, 'pin_ctls': 0x40},
+}
+
+
+def merge_state(spec, other):
+    """
+    Merge spec `other` into `spec`, field by field: amps per index,
+    Pin-ctls bits or-ed together, any other field taken from `other`
+    Returns: spec
+    """
+    for node_id, want in other.items():
+        into = spec.setdefault(node_id, {})
+        for field, value in want.items():
+            if field in ('amp_out', 'amp_in'):
+                amps = into.setdefault(field, {})
+                for index, amp in value.items():
+                    amps.setdefault(index, {}).update(amp)
+            elif field == 'pin_ctls':
+                into[field] = into.get(field, 0) | value
+            else:
+                into[field] = value
+    return spec
+
+
+def _amp_wanted(value, want):
+    mute = want.get('mute')
+    gain = want.get('gain')
+    if mute is not None:
+        value = (value & 0x7f) | (0x80 if mute else 0)
+    if gain is not None:
+        value = (value & 0x80) | (gain & 0x7f)
+    return value
+
+
+def _diff_amp(node, field, wants, changes, force):
+    amps = node[field]
+    for index, want in wants.items():
+        if index >= len(amps):
+            changes.append({
+                'node': node['node_id'], 'field': field, 'index': index,
+                'current': None, 'desired': want,
+                'desc': f"Node 0x{node['node_id']:02x} {field}[{index}] not present",
+            })
+            continue
+        current = amps[index]
+        desired = [_amp_wanted(v, want) for v in current]
+        if force or desired != current:
+            changes.append({
+                'node': node['node_id'], 'field': field, 'index': index,
+                'current': list(current), 'desired': desired,
+                'desc': (f"Node 0x{node['node_id']:02x} {field}[{index}]: "
+                         f"{' '.join(f'0x{v:02x}' for v in current)} -> "
+                         f"{' '.join(f'0x{v:02x}' for v in desired)}"),
+            })
+
+
+def diff_node(node_id, node, want, force=False):
+    """
+    Compare one node record with its desired state
+    Args:
+        node_id: Node ID
+        node: Node record from CodecDump (None if the node is missing)
+        want: Desired state dict for that node
+        force: Report every field in want, even those that already match
+    Returns: list of change records (empty if the node matches)
+    """
+    if node is None:
+        return [{'node': node_id, 'field': None, 'index': None,
+                 'current': None, 'desired': want,
+                 'desc': f"Node 0x{node_id:02x} not found"}]
+
+    changes = []
+    for field in ('amp_out', 'amp_in'):
+        if field in want:
+            _diff_amp(node, field, want[field], changes, force)
+
+    if 'eapd' in want:
+        current = int(node['eapd'], 16) if node['eapd'] else None
+        if current is None:
+            desired = None
+        elif want['eapd']:
+            desired = current | EAPD_BIT
+        else:
+            desired = current & ~EAPD_BIT
+        if force or current is None or desired != current:
+            changes.append({
+                'node': node_id, 'field': 'eapd', 'index': None,
+                'current': current, 'desired': desired,
+                'desc': f"Node 0x{node_id:02x} EAPD {'on' if want['eapd'] else 'off'}",
+            })
+
+    if 'pin_ctls' in want:
+        current = int(node['pin_ctls'], 16) if node['pin_ctls'] else None
+        bits = want['pin_ctls']
+        if force or current is None or current & bits != bits:
+            changes.append({
+                'node': node_id, 'field': 'pin_ctls', 'index': None,
+                'current': current,
+                'desired': None if current is None else current | bits,
+                'desc': f"Node 0x{node_id:02x} Pin-ctls 0x{bits:02x}",
+            })
+
+    return changes
+
+
+def diff_state(dump, spec, force=False):
+    """
+    Compare a parsed codec dump with a desired-state spec
+    Returns: list of change records, in spec order
+    """
+    changes = []
+    for node_id, want in spec.items():
+        changes.extend(diff_node(node_id, dump.node(node_id), want, force))
+    return changes
+
+
+def plan_change(change):
+    """
+    Verbs for one change record
+    Returns: list of (node, verb, param); empty if the change cannot be
+    expressed as a verb (missing node/field)
+    """
+    node, field, desired = change['node'], change['field'], change['desired']
+    current = change['current']
+    if current is None or desired is None:
+        return []
+
+    if field in ('amp_out', 'amp_in'):
+        output = field == 'amp_out'
+        index = change['index']
+        if len(desired) == 1:
+            return [amp_value(node, desired[0], output, index)]
+        left = current[0] != desired[0]
+        right = current[1] != desired[1]
+        if not left and not right:
+            left = right = True  # forced rewrite of an unchanged amp
+        if left and right and desired[0] == desired[1]:
+            return [amp_value(node, desired[0], output, index)]
+        verbs = []
+        if left:
+            verbs.append(amp_value(node, desired[0], output, index, right=False))
+        if right:
+            verbs.append(amp_value(node, desired[1], output, index, left=False))
+        return verbs
+
+    if field == 'eapd':
+        return [validate_verb(node, SET_EAPD_BTLENABLE, desired & 0xff)]
+    if field == 'pin_ctls':
+        return [validate_verb(node, SET_PIN_WIDGET_CONTROL, desired & 0xff)]
+    return []
+
+
+def expect_change(change):
+    """Expectation (description, predicate) that a change has been applied"""
+    node_id, field = change['node'], change['field']
+    if field in ('amp_out', 'amp_in'):
+        desired = change['desired']
+        amp = {'mute': bool(desired[0] & 0x80)}
+        if len(set(v & 0x7f for v in desired)) == 1:
+            amp['gain'] = desired[0] & 0x7f
+        want = {field: {change['index']: amp}}
+    elif field == 'eapd':
+        want = {'eapd': bool(change['desired'] & EAPD_BIT)}
+    else:
+        want = {'pin_ctls': change['desired']}
+
+    def check(dump):
+        return not diff_node(node_id, dump.node(node_id), want)
+
+    return (change['desc'], check)
+
+
+def plan_verbs(dump, spec, force=False):
+    """
+    Minimal verb plan that brings dump to spec
+    With force, every field of the spec is rewritten (still keeping the
+    bits the spec does not mention).
+    Returns: (verbs, changes) - verbs is a list of (node, verb, param, expect)
+    """
+    changes = diff_state(dump, spec, force)
+    verbs = []
+    for change in changes:
+        planned = plan_change(change)
+        if not planned:
+            continue
+        # One expectation per change, carried by its first verb
+        expects = [expect_change(change)] + [None] * (len(planned) - 1)
+        verbs.extend(verb + (expect,) for verb, expect in zip(planned, expects))
+    return verbs, changes
+
+
+def apply_state(codec, spec, timeout=3.0, force=False):
+    """
+    Bring the codec to spec with the fewest verbs
+    No verbs and no reconfig are issued when the codec already matches.
+    Args:
+        codec: HDCodecController
+        spec: Desired state spec
+        timeout: Settle timeout for the transaction
+        force: Rewrite every field of the spec, not just the drifted ones
+    Returns: (ok, changes, txn) - ok is False if the verbs could not be
+    written; txn is None when no verb had to be sent
+    """
+    verbs, changes = plan_verbs(codec.load_codec_dump(), spec, force)
+    if not verbs:
+        return True, changes, None
+
+    txn = codec.transaction(timeout=timeout)
+    for node, verb, param, expect in verbs:
+        txn.add(node, verb, param, expect=expect)
+    return txn.commit(), changes, txn
@@ -0,0 +1,123 @@
+"""
+Batched HDA verb transactions
+
+A transaction collects verbs together with the codec state each one is
+expected to produce, writes them in one go, fires a single reconfig and
+then polls the codec dump until every expectation holds or a deadline
+passes. This replaces the fixed sleeps after reconfigure_codec().
+"""
+
+import time
+
+POLL_INITIAL = 0.005
+POLL_MAX = 0.1
+
+
+def expect_amp_unmuted(node_id, direction='out', index=0):
+    """Expectation: amp values of node_id (in/out, connection index) have no mute bit"""
+    key = 'amp_out' if direction == 'out' else 'amp_in'
+
+    def check(dump):
+        node = dump.node(node_id)
+        if not node or len(node[key]) <= index:
+            return False
+        return not any(v & 0x80 for v in node[key][index])
+
+    return (f"Node 0x{node_id:02x} Amp-{direction.capitalize()}[{index}] unmuted", check)
+
+
+def expect_eapd(node_id):
+    """Expectation: EAPD bit (0x2) is set on node_id"""
+    def check(dump):
+        node = dump.node(node_id)
+        return bool(node and node['eapd'] and int(node['eapd'], 16) & 0x2)
+
+    return (f"Node 0x{node_id:02x} EAPD on", check)
+
+
+def expect_pin_ctls(node_id, bits):
+    """Expectation: all of bits are set in the Pin-ctls of node_id"""
+    def check(dump):
+        node = dump.node(node_id)
+        return bool(node and node['pin_ctls'] and (int(node['pin_ctls'], 16) & bits) == bits)
+
+    return (f"Node 0x{node_id:02x} Pin-ctls 0x{bits:02x}", check)
+
+
+def unmet_expectations(dump, expectations):
+    """Return descriptions of the expectations that dump does not satisfy"""
+    return [desc for desc, check in expectations if not check(dump)]
+
+
+def wait_for_codec_state(load_dump, expectations, timeout=3.0):
+    """
+    Poll the codec dump until all expectations hold or timeout expires
+    Args:
+        load_dump: Callable returning a freshly parsed CodecDump
+        expectations: List of (description, predicate) pairs
+        timeout: Deadline in seconds
+    Returns: (settled, unmet_descriptions, elapsed_seconds)
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = POLL_INITIAL
+
+    while True:
+        unmet = unmet_expectations(load_dump(), expectations)
+        now = time.monotonic()
+        if not unmet or now >= deadline:
+            return (not unmet, unmet, now - start)
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 2, POLL_MAX)
+
+
+class VerbTransaction:
+    """
+    Collects verbs for one buffered write and a single codec reconfig
+
+    Usage:
+        txn = codec.transaction()
+        txn.add(0x17, 0x70c, 0x0002, expect=expect_eapd(0x17))
+        if txn.commit():
+            ...
+    """
+
+    def __init__(self, codec, timeout=3.0):
+        self.codec = codec
+        self.timeout = timeout
+        self.verbs = []
+        self.expectations = []
+        self.settled = None
+        self.unmet = []
+        self.elapsed = None
+
+    def add(self, node, verb, param, expect=None):
+        """Queue a verb, optionally with the (description, predicate) it should produce"""
+        self.verbs.append((node, verb, param))
+        if expect is not None:
+            self.expectations.append(expect)
+        return self
+
+    def commit(self):
+        """
+        Write all queued verbs, reconfigure once and wait for the codec to settle
+        Returns: True if the verbs were written and reconfig triggered.
+        Whether the codec reached the expected state is in self.settled.
+        """
+        if not self.verbs:
+            self.settled = True
+            return True
+
+        if not self.codec.write_hda_verbs(self.verbs):
+            return False
+        if not self.codec.reconfigure_codec():
+            return False
+
+        self.settled, self.unmet, self.elapsed = wait_for_codec_state(
+            self.codec.load_codec_dump, self.expectations, self.timeout)
+
+        metrics = getattr(self.codec, 'metrics', None)
+        if metrics is not None and metrics.enabled:
+            metrics.event('codec_settle', self.elapsed, ok=self.settled,
+                          error=None if self.settled else 'timeout', unmet=self.unmet)
+        return True
@@ -0,0 +1,310 @@
+"""
+HDA verb encoding, validation and decoding
+
+A verb is (nid, verb, param), as written to init_verbs or hda-verb. The
+20-bit command under the node ID is split one of two ways:
+
+  4-bit verb ID, 16-bit payload   0x2/0x3/0x4/0x5 (SET), 0xa-0xd (GET),
+                                  written as 0xN00, e.g. 0x300 0xb000
+  12-bit verb ID, 8-bit payload   0x7xx (SET), 0xfxx (GET),
+                                  e.g. 0x70c 0x02
+
+Anything else is malformed: a 0x3000 "verb" shifts into the node ID
+bits, a 16-bit payload on a 12-bit verb overwrites its low byte. The
+kernel rejects only part of that (cmd out of range) and the rest
+silently addresses another verb, after a wasted reconfig. validate_verb()
+rejects all of it up front with VerbError; the controller checks every
+batch before it reaches the backend.
+
+The typed constructors (amp_gain_mute, eapd, pin_ctl, power_state, ...)
+build validated verbs from named fields, decode_verb() turns any verb
+back into them, and pack_verbs() encodes a whole sequence into a packed
+array of 32-bit hwdep words (nid << 24 | verb << 8 | param) that
+unpack_verbs() reverses exactly. parse_verb() checks the
+'nid verb param' text of init_verbs lines and hda-verb arguments.
+"""
+
+from array import array
+
+SET_CONVERTER_FORMAT = 0x200
+SET_AMP_GAIN_MUTE = 0x300
+SET_PROC_COEF = 0x400
+SET_COEF_INDEX = 0x500
+SET_CONNECT_SEL = 0x701
+SET_POWER_STATE = 0x705
+SET_CHANNEL_STREAMID = 0x706
+SET_PIN_WIDGET_CONTROL = 0x707
+SET_EAPD_BTLENABLE = 0x70c
+GET_CONVERTER_FORMAT = 0xa00
+GET_AMP_GAIN_MUTE = 0xb00
+GET_PROC_COEF = 0xc00
+GET_COEF_INDEX = 0xd00
+GET_PARAMETERS = 0xf00
+GET_CONNECT_SEL = 0xf01
+GET_CONNECT_LIST = 0xf02
+GET_POWER_STATE = 0xf05
+GET_CONV = 0xf06
+GET_PIN_WIDGET_CONTROL = 0xf07
+GET_EAPD_BTLENABLE = 0xf0c
+
+VERB_NAMES = {
+    SET_CONVERTER_FORMAT: 'SET_CONVERTER_FORMAT',
+    SET_AMP_GAIN_MUTE: 'SET_AMP_GAIN_MUTE',
+    SET_PROC_COEF: 'SET_PROC_COEF',
+    SET_COEF_INDEX: 'SET_COEF_INDEX',
+    SET_CONNECT_SEL: 'SET_CONNECT_SEL',
+    SET_POWER_STATE: 'SET_POWER_STATE',
+    SET_CHANNEL_STREAMID: 'SET_CHANNEL_STREAMID',
+    SET_PIN_WIDGET_CONTROL: 'SET_PIN_WIDGET_CONTROL',
+    SET_EAPD_BTLENABLE: 'SET_EAPD_BTLENABLE',
+    GET_CONVERTER_FORMAT: 'GET_CONVERTER_FORMAT',
+    GET_AMP_GAIN_MUTE: 'GET_AMP_GAIN_MUTE',
+    GET_PROC_COEF: 'GET_PROC_COEF',
+    GET_COEF_INDEX: 'GET_COEF_INDEX',
+    GET_PARAMETERS: 'GET_PARAMETERS',
+    GET_CONNECT_SEL: 'GET_CONNECT_SEL',
+    GET_CONNECT_LIST: 'GET_CONNECT_LIST',
+    GET_POWER_STATE: 'GET_POWER_STATE',
+    GET_CONV: 'GET_CONV',
+    GET_PIN_WIDGET_CONTROL: 'GET_PIN_WIDGET_CONTROL',
+    GET_EAPD_BTLENABLE: 'GET_EAPD_BTLENABLE',
+}
+
+# Verb ID top nibbles: 4-bit verbs carry a 16-bit payload, 0x7/0xf
+# prefix the 12-bit verbs with an 8-bit payload
+FOUR_BIT_VERBS = frozenset((0x2, 0x3, 0x4, 0x5, 0xa, 0xb, 0xc, 0xd))
+TWELVE_BIT_PREFIXES = frozenset((0x7, 0xf))
+
+MAX_NID = 0x7f
+
+# Amp payload bits (SET_AMP_GAIN_MUTE / GET_AMP_GAIN_MUTE)
+AMP_OUT = 0x8000
+AMP_IN = 0x4000
+AMP_LEFT = 0x2000
+AMP_RIGHT = 0x1000
+AMP_MUTE = 0x80
+
+# Pin-ctls and EAPD/BTL bits
+PIN_HP = 0x80
+PIN_OUT = 0x40
+PIN_IN = 0x20
+EAPD_BTL = 0x1
+EAPD_ENABLE = 0x2
+EAPD_LR_SWAP = 0x4
+
+
+class VerbError(ValueError):
+    """A verb that would be misencoded or rejected by the codec"""
+
+
+def is_four_bit(verb):
+    """True for the 0xN00 form of a 4-bit verb ID"""
+    return (verb >> 8) in FOUR_BIT_VERBS and not verb & 0xff
+
+
+def validate_verb(nid, verb, param):
+    """
+    Check one verb against the HDA command layout
+    Returns: (nid, verb, param)
+    Raises: VerbError describing the problem
+    """
+    if not isinstance(nid, int) or not 0 <= nid <= MAX_NID:
+        raise VerbError(f"Node ID {nid!r} is not a 7-bit node ID")
+    if not isinstance(verb, int) or not 0 <= verb <= 0xfff:
+        hint = ''
+        if isinstance(verb, int) and verb > 0xfff and (verb >> 12) in FOUR_BIT_VERBS:
+            hint = (f"; 4-bit verbs are 0x{verb >> 12:x}00 with a 16-bit payload, "
+                    f"e.g. SET_AMP_GAIN_MUTE is 0x300 0xb000")
+        raise VerbError(f"Verb 0x{verb:x} is wider than 12 bits{hint}"
+                        if isinstance(verb, int) else f"Verb {verb!r} is not an integer")
+    if not isinstance(param, int) or param < 0:
+        raise VerbError(f"Payload {param!r} is not a non-negative integer")
+
+    prefix = verb >> 8
+    if prefix in FOUR_BIT_VERBS:
+        if verb & 0xff:
+            raise VerbError(f"4-bit verb 0x{verb:03x}: the low byte belongs to the "
+                            f"16-bit payload, write 0x{prefix:x}00")
+        if param > 0xffff:
+            raise VerbError(f"Payload 0x{param:x} of verb 0x{verb:03x} is wider than 16 bits")
+    elif prefix in TWELVE_BIT_PREFIXES:
+        if param > 0xff:
+            raise VerbError(f"Payload 0x{param:x} of 12-bit verb 0x{verb:03x} is wider "
+                            f"than 8 bits")
+    else:
+        raise VerbError(f"0x{verb:03x} is not an HDA verb ID")
+    return nid, verb, param
+
+
+def validate_verbs(verbs):
+    """
+    validate_verb() for a whole sequence, before any of it is sent
+    Returns: list of (nid, verb, param)
+    Raises: VerbError naming the first bad verb and its position
+    """
+    checked = []
+    for i, (nid, verb, param) in enumerate(verbs):
+        try:
+            checked.append(validate_verb(nid, verb, param))
+        except VerbError as e:
+            raise VerbError(f"Verb #{i + 1} ({nid!r}, {verb!r}, {param!r}): {e}") from None
+    return checked
+
+
+def _amp_index(index):
+    if not 0 <= index <= 0xf:
+        raise VerbError(f"Amp index {index} is not 0-15")
+    return index
+
+
+def amp_gain_mute(nid, output=True, index=0, left=True, right=True, mute=False, gain=0):
+    """SET_AMP_GAIN_MUTE verb; index selects the input amp of a mixer/selector"""
+    if not left and not right:
+        raise VerbError("Amp verb must set the left and/or right channel")
+    if not 0 <= gain <= 0x7f:
+        raise VerbError(f"Amp gain 0x{gain:x} is not 0-0x7f")
+    param = ((AMP_OUT if output else AMP_IN) | (AMP_LEFT if left else 0)
+             | (AMP_RIGHT if right else 0) | (_amp_index(index) << 8)
+             | (AMP_MUTE if mute else 0) | gain)
+    return validate_verb(nid, SET_AMP_GAIN_MUTE, param)
+
+
+def amp_value(nid, value, output=True, index=0, left=True, right=True):
+    """amp_gain_mute() setting an amp to a read-back value (bit 7 mute, bits 6-0 gain)"""
+    return amp_gain_mute(nid, output, index, left, right,
+                         mute=bool(value & AMP_MUTE), gain=value & 0x7f)
+
+
+def get_amp(nid, output=True, index=0, left=True):
+    """GET_AMP_GAIN_MUTE verb for one channel of one amp"""
+    param = (AMP_OUT if output else 0) | (AMP_LEFT if left else 0) | _amp_index(index)
+    return validate_verb(nid, GET_AMP_GAIN_MUTE, param)
+
+
+def eapd(nid, enable=True, btl=False, lr_swap=False):
+    """SET_EAPD_BTLENABLE verb"""
+    param = (EAPD_ENABLE if enable else 0) | (EAPD_BTL if btl else 0) | (EAPD_LR_SWAP if lr_swap else 0)
+    return validate_verb(nid, SET_EAPD_BTLENABLE, param)
+
+
+def pin_ctl(nid, out=True, in_=False, hp=False, vref=0):
+    """SET_PIN_WIDGET_CONTROL verb; vref is the 3-bit VRef field"""
+    if not 0 <= vref <= 0x7:
+        raise VerbError(f"Pin VRef {vref} is not 0-7")
+    param = (PIN_OUT if out else 0) | (PIN_IN if in_ else 0) | (PIN_HP if hp else 0) | vref
+    return validate_verb(nid, SET_PIN_WIDGET_CONTROL, param)
+
+
+def power_state(nid, state=0):
+    """SET_POWER_STATE verb; state 0-3 for D0-D3 (or 'D0'-'D3')"""
+    if isinstance(state, str):
+        state = {'D0': 0, 'D1': 1, 'D2': 2, 'D3': 3}.get(state.upper(), state)
+    if not isinstance(state, int) or not 0 <= state <= 3:
+        raise VerbError(f"Power state {state} is not D0-D3")
+    return validate_verb(nid, SET_POWER_STATE, state)
+
+
+def connect_select(nid, index):
+    """SET_CONNECT_SEL verb"""
+    return validate_verb(nid, SET_CONNECT_SEL, index)
+
+
+def encode_verb(nid, verb, param):
+    """Validated 32-bit hwdep word: nid << 24 | verb << 8 | param"""
+    nid, verb, param = validate_verb(nid, verb, param)
+    return (nid << 24) | (verb << 8) | param
+
+
+def decode_word(word):
+    """
+    Split a 32-bit hwdep word back into (nid, verb, param), the way the
+    codec reads it (4-bit verbs keep their 16-bit payload)
+    Raises: VerbError if the word is not a valid verb
+    """
+    if not 0 <= word <= 0xffffffff or word & 0x80f00000:
+        raise VerbError(f"Word 0x{word:08x} has bits outside the node ID and command")
+    cmd = word & 0xfffff
+    if (cmd >> 16) in FOUR_BIT_VERBS:
+        verb, param = (cmd >> 16) << 8, cmd & 0xffff
+    else:
+        verb, param = cmd >> 8, cmd & 0xff
+    return validate_verb(word >> 24, verb, param)
+
+
+def pack_verbs(verbs):
+    """
+    Validate and encode a sequence into one packed array of 32-bit words
+    Nothing is returned (or sent) unless every verb is valid.
+    Returns: array('I')
+    Raises: VerbError naming the first bad verb
+    """
+    return array('I', [(nid << 24) | (verb << 8) | param
+                       for nid, verb, param in validate_verbs(verbs)])
+
+
+def unpack_verbs(words):
+    """Packed words back to [(nid, verb, param)]"""
+    return [decode_word(word) for word in words]
+
+
+def decode_verb(nid, verb, param):
+    """
+    Named fields of a verb
+    Returns: {'nid', 'verb', 'param', 'name', 'fields'}
+    Raises: VerbError for a malformed verb
+    """
+    nid, verb, param = validate_verb(nid, verb, param)
+    if verb == SET_AMP_GAIN_MUTE:
+        fields = {'output': bool(param & AMP_OUT), 'input': bool(param & AMP_IN),
+                  'left': bool(param & AMP_LEFT), 'right': bool(param & AMP_RIGHT),
+                  'index': (param >> 8) & 0xf, 'mute': bool(param & AMP_MUTE),
+                  'gain': param & 0x7f}
+    elif verb == GET_AMP_GAIN_MUTE:
+        fields = {'output': bool(param & AMP_OUT), 'left': bool(param & AMP_LEFT),
+                  'index': param & 0xf}
+    elif verb == SET_EAPD_BTLENABLE:
+        fields = {'eapd': bool(param & EAPD_ENABLE), 'btl': bool(param & EAPD_BTL),
+                  'lr_swap': bool(param & EAPD_LR_SWAP)}
+    elif verb == SET_PIN_WIDGET_CONTROL:
+        fields = {'out': bool(param & PIN_OUT), 'in': bool(param & PIN_IN),
+                  'hp': bool(param & PIN_HP), 'vref': param & 0x7}
+    elif verb == SET_POWER_STATE:
+        fields = {'state': f"D{param & 0xf}"}
+    elif verb == SET_CONNECT_SEL:
+        fields = {'index': param}
+    elif verb == SET_CHANNEL_STREAMID:
+        fields = {'stream': param >> 4, 'channel': param & 0xf}
+    else:
+        fields = {'value': param}
+    return {'nid': nid, 'verb': verb, 'param': param,
+            'name': VERB_NAMES.get(verb, f"VERB_0x{verb:03x}"), 'fields': fields}
+
+
+def describe_verb(nid, verb, param):
+    """'0x17 0x300 0xb000  SET_AMP_GAIN_MUTE out L R idx 0 unmute gain 0x00'"""
+    decoded = decode_verb(nid, verb, param)
+    f = decoded['fields']
+    if verb == SET_AMP_GAIN_MUTE:
+        direction = ' '.join(d for d, on in (('out', f['output']), ('in', f['input'])) if on)
+        channels = ' '.join(c for c, on in (('L', f['left']), ('R', f['right'])) if on)
+        detail = (f"{direction or '-'} {channels} idx {f['index']} "
+                  f"{'mute' if f['mute'] else 'unmute'} gain 0x{f['gain']:02x}")
+    else:
+        detail = ' '.join(f"{k}={v}" for k, v in f.items())
+    return f"0x{nid:02x} 0x{verb:03x} 0x{param:04x}  {decoded['name']} {detail}"
+
+
+def parse_verb(text):
+    """
+    Parse and validate 'nid verb param' (init_verbs / hda-verb syntax)
+    Raises: VerbError
+    """
+    fields = text.split()
+    if len(fields) != 3:
+        raise VerbError(f"Expected 'nid verb param', got {text.strip()!r}")
+    try:
+        nid, verb, param = (int(f, 0) for f in fields)
+    except ValueError:
+        raise VerbError(f"Not a number in {text.strip()!r}") from None
+    return validate_verb(nid, verb, param)
+
@@ -2,80 +2,87 @@
 """
 Samsung Galaxy Book5 Pro - SOF-compatible Speaker Unmute Tool
 
-Uses hda-verb tool to unmute Node 0x17 via hwdep interface.
+Unmutes Node 0x17 via the hwdep interface (/dev/snd/hwCxDy).
 Works with SOF driver (init_verbs sysfs interface not available).
+
+The codec is found by vendor/subsystem ID on whatever card it landed
+(HDMI codecs and docks move the index); with several matching codecs
+all of them are fixed concurrently.
+
+Verbs are sent through the HDA_IOCTL_VERB_WRITE ioctl on a device that
+is opened once, so no hda-verb/cat subprocesses are needed.
 """
 
-import subprocess
 import sys
 import os
 
-def check_hda_verb():
-    """Check if hda-verb tool is installed."""
-    result = subprocess.run(['which', 'hda-verb'],
-                          capture_output=True, text=True)
-    if result.returncode != 0:
-        print("ERROR: hda-verb tool not found!")
-        print("\nInstall with:")
-        print("  sudo apt-get update")
-        print("  sudo apt-get install -y alsa-tools")
-        sys.exit(1)
-    print(f"Found hda-verb: {result.stdout.strip()}")
+from hdacodec import (
+    HDCodecController, HwdepBackend, NULL_METRICS, matching_codecs, metrics_from_env, run_on_codecs,
+)
+from hdacodec.hwdep import HWDEP_PATH
+from hdacodec.verbs import SET_AMP_GAIN_MUTE
+
 
-def check_device():
-    """Check if codec device exists."""
-    device = "/dev/snd/hwC0D0"
+def find_devices():
+    """Discovered codecs to fix that have a hwdep device node."""
+    return [c for c in matching_codecs() if c['hwdep_path'].exists()]
+
+
+def check_device(device=HWDEP_PATH, location=None, metrics=None):
+    """Check if codec device exists and open a codec controller on it."""
+    if location is not None:
+        device = location['hwdep_path']
     if not os.path.exists(device):
         print(f"ERROR: Codec device {device} not found!")
         print("Check audio driver is loaded:")
         print("  lsmod | grep snd_hda")
         sys.exit(1)
+
+    if location is not None:
+        backend = HwdepBackend(device, location['proc_path'], location['codec_path'])
+    else:
+        backend = HwdepBackend(device)
+    try:
+        backend.channel.open()
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: Could not open {device}: {e}")
+        sys.exit(1)
+
     print(f"Codec device: {device}")
+    return HDCodecController(backend, metrics=metrics, location=location)
 
-def get_current_state():
-    """Read current Node 0x17 state."""
+def get_current_state(codec):
+    """Read current Node 0x17 output amp state from the codec."""
     try:
-        result = subprocess.run(
-            ['cat', '/proc/asound/card0/codec#0'],
-            capture_output=True, text=True, check=True
-        )
-
-        in_node_17 = False
-        for line in result.stdout.split('\n'):
-            if 'Node 0x17' in line:
-                in_node_17 = True
-            if in_node_17 and 'Amp-Out vals' in line:
-                print(f"Current state: {line.strip()}")
-                if '0x80' in line:
-                    print("  Status: MUTED (0x80 = mute bit set)")
-                    return False
-                else:
-                    print("  Status: UNMUTED")
-                    return True
-    except subprocess.CalledProcessError:
-        print("Warning: Could not read codec state")
-    return None
-
-def unmute_speaker():
+        vals = codec.read_amp(0x17, output=True)
+    except OSError as e:
+        print(f"Warning: Could not read codec state: {e}")
+        return None
+
+    if vals is None:
+        print("Warning: Codec did not respond")
+        return None
+
+    print(f"Current state: Amp-Out vals:  [0x{vals[0]:02x} 0x{vals[1]:02x}]")
+    if any(v & 0x80 for v in vals):
+        print("  Status: MUTED (0x80 = mute bit set)")
+        return False
+    else:
+        print("  Status: UNMUTED")
+        return True
+
+def unmute_speaker(codec):
     """Send HDA verb to unmute Node 0x17."""
     print("\nSending unmute command...")
 
     # Node 0x17, verb 0x300 (SET_AMP_GAIN_MUTE), param 0xb000
     # 0xb000 = output amp, both channels, unmute, 0dB gain
-    cmd = ['hda-verb', '/dev/snd/hwC0D0', '0x17', '0x300', '0xb000']
+    return codec.write_hda_verb(0x17, SET_AMP_GAIN_MUTE, 0xb000)
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(f"Result: {result.stdout.strip()}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: {e.stderr}")
-        return False
-
-def verify_fix():
+def verify_fix(codec):
     """Verify Node 0x17 is unmuted."""
     print("\nVerifying fix...")
-    state = get_current_state()
+    state = get_current_state(codec)
     if state:
         print("SUCCESS: Speaker is unmuted!")
         return True
@@ -83,33 +90,66 @@ def verify_fix():
         print("WARNING: Speaker may still be muted")
         return False
 
-def main():
+def fix_codec(codec):
+    """Read, unmute and verify one codec; returns False if the verb failed."""
+    try:
+        print("\n2. Reading current state...")
+        get_current_state(codec)
+
+        print("\n3. Applying fix...")
+        if not unmute_speaker(codec):
+            return False
+
+        print("\n4. Verification...")
+        verify_fix(codec)
+        return True
+    finally:
+        codec.close()
+
+def main(codec=None):
+    """Run the unmute flow; an injected codec skips the root and device checks."""
     print("=" * 60)
     print("Samsung Galaxy Book5 Pro - SOF Speaker Unmute")
     print("=" * 60)
 
-    if os.geteuid() != 0:
-        print("ERROR: Must run as root!")
-        print(f"Try: sudo {sys.argv[0]}")
-        sys.exit(1)
-
     print("\n1. Checking prerequisites...")
-    check_hda_verb()
-    check_device()
-
-    print("\n2. Reading current state...")
-    get_current_state()
+    if codec is None:
+        if os.geteuid() != 0:
+            print("ERROR: Must run as root!")
+            print(f"Try: sudo {sys.argv[0]}")
+            sys.exit(1)
+        # One metrics snapshot for every codec, each labelled with its name
+        metrics = metrics_from_env()
+        locations = find_devices()
+        codecs = ([check_device(location=location, metrics=metrics.labelled(codec=location['name']))
+                   for location in locations] or [check_device(metrics=metrics)])
+    else:
+        codecs = [codec]
+        metrics = NULL_METRICS
 
-    print("\n3. Applying fix...")
-    if not unmute_speaker():
+    try:
+        if len(codecs) == 1:
+            ok = fix_codec(codecs[0])
+        else:
+            by_name = {c.location['name']: c for c in codecs}
+            results = run_on_codecs(lambda location: fix_codec(by_name[location['name']]),
+                                    [c.location for c in codecs])
+            for result in results:
+                print(f"\n--- {result['codec']['name']}: {result['codec']['codec']} ---")
+                print(result['output'], end='')
+                if result['error'] is not None:
+                    print(f"ERROR: {result['error']}")
+            ok = all(result['result'] for result in results)
+    finally:
+        metrics.close()
+    if not ok:
         sys.exit(1)
 
-    print("\n4. Verification...")
-    verify_fix()
-
+    cards = sorted({c.location['card'] for c in codecs if c.location}) or [0]
     print("\n" + "=" * 60)
     print("Test speakers with:")
-    print("  speaker-test -c2 -t wav -Dhw:0,0")
+    for card in cards:
+        print(f"  speaker-test -c2 -t wav -Dhw:{card},0")
     print("=" * 60)
 
 if __name__ == '__main__':
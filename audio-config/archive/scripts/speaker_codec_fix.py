@@ -6,130 +6,19 @@ This tool directly manipulates the Realtek ALC298 HDA codec registers
 to unmute the audio mixer path to the physical speakers.
 
 Usage:
-    sudo python3 speaker_codec_fix.py [--verify-only]
+    sudo python3 speaker_codec_fix.py [--verify-only] [--card N]
 """
 
 import sys
 import os
-import re
-import time
 import argparse
-from pathlib import Path
-
-
-class HDCodecController:
-    """Interface to HDA codec via sysfs"""
-
-    CODEC_PATH = Path("/sys/class/sound/hwC0D0")
-    PROC_CODEC = Path("/proc/asound/card0/codec#0")
-
-    def __init__(self):
-        if not self.CODEC_PATH.exists():
-            raise RuntimeError(f"Codec sysfs path not found: {self.CODEC_PATH}")
-        if not self.PROC_CODEC.exists():
-            raise RuntimeError(f"Codec proc interface not found: {self.PROC_CODEC}")
-
-    def get_codec_info(self):
-        """Read codec identification"""
-        vendor = (self.CODEC_PATH / "vendor_name").read_text().strip()
-        chip = (self.CODEC_PATH / "chip_name").read_text().strip()
-        subsys = (self.CODEC_PATH / "subsystem_id").read_text().strip()
-        return {
-            'vendor': vendor,
-            'chip': chip,
-            'subsystem_id': subsys
-        }
-
-    def get_node_state(self, node_id):
-        """
-        Parse node state from /proc/asound/card0/codec#0
-
-        Returns dict with node properties
-        """
-        content = self.PROC_CODEC.read_text()
-
-        # Find the node section
-        pattern = rf"Node (0x{node_id:02x}).*?\n(.*?)(?=\nNode|\Z)"
-        match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
-
-        if not match:
-            return None
-
-        node_text = match.group(2)
-
-        # Extract Amp-In values
-        amp_in_match = re.search(r"Amp-In vals:\s+\[([^\]]+)\]", node_text)
-        amp_in_vals = amp_in_match.group(1) if amp_in_match else None
-
-        # Extract Connection list
-        conn_match = re.search(r"Connection:.*?\n\s+(.+)", node_text)
-        connections = conn_match.group(1).strip() if conn_match else None
-
-        return {
-            'node_id': node_id,
-            'amp_in_vals': amp_in_vals,
-            'connections': connections,
-            'raw': node_text
-        }
-
-    def write_hda_verb(self, node, verb, param):
-        """
-        Write HDA verb to codec via sysfs
-
-        Args:
-            node: Node ID (e.g., 0x0d)
-            verb: Verb ID (e.g., 0x7000)
-            param: Parameter value (e.g., 0xb000)
-        """
-        verb_str = f"0x{node:02x} 0x{verb:04x} 0x{param:04x}"
-        verb_file = self.CODEC_PATH / "init_verbs"
-
-        print(f"  Writing HDA verb: {verb_str}")
-
-        try:
-            verb_file.write_text(verb_str + "\n")
-            return True
-        except PermissionError:
-            print(f"ERROR: Permission denied. Run with sudo.")
-            return False
-        except Exception as e:
-            print(f"ERROR: Failed to write verb: {e}")
-            return False
-
-    def reconfigure_codec(self):
-        """Trigger codec reconfiguration to apply verbs"""
-        reconfig_file = self.CODEC_PATH / "reconfig"
-        print("  Triggering codec reconfiguration...")
-
-        try:
-            reconfig_file.write_text("1\n")
-            return True
-        except Exception as e:
-            print(f"ERROR: Failed to reconfigure codec: {e}")
-            return False
-
-    def check_mixer_node_muted(self, node_id=0x0d):
-        """
-        Check if mixer node input is muted
-
-        Returns: (is_muted, amp_values)
-        """
-        node = self.get_node_state(node_id)
-        if not node or not node['amp_in_vals']:
-            return (None, None)
-
-        amp_vals = node['amp_in_vals']
-
-        # Parse hex values from string like "0x00 0x00" or "0x80 0x80"
-        vals = [int(v, 16) for v in re.findall(r'0x[0-9a-fA-F]+', amp_vals)]
-
-        if not vals:
-            return (None, amp_vals)
-
-        # Check if mute bit (bit 7) is set
-        is_muted = any((v & 0x80) != 0 for v in vals)
-
-        return (is_muted, vals)
+
+from hdacodec import HDCodecController, fix_codecs
+from hdacodec.state import SPEAKER_STATE, apply_state
+
+# Fallback when the quirk database has no "mixer" state for this codec:
+# only the mixer part of the speaker path (Node 0x0d input 0)
+MIXER_STATE = {0x0d: SPEAKER_STATE[0x0d]}
 
 
 def verify_codec_state(codec):
@@ -141,6 +30,9 @@ def verify_codec_state(codec):
     print(f"Subsystem ID: {info['subsystem_id']}")
     print()
 
+    # One read + parse serves every node lookup below
+    codec.load_codec_dump()
+
     # Check mixer node 0x0d
     node_0d = codec.get_node_state(0x0d)
     if node_0d:
@@ -163,80 +55,52 @@ def verify_codec_state(codec):
     node_17 = codec.get_node_state(0x17)
     if node_17:
         print("Node 0x17 (Speaker Pin):")
-        eapd_match = re.search(r"EAPD\s+(0x[0-9a-fA-F]+)", node_17['raw'])
-        pin_match = re.search(r"Pin-ctls:\s+(0x[0-9a-fA-F]+):\s+(.+)", node_17['raw'])
-
-        if eapd_match:
-            print(f"  EAPD: {eapd_match.group(1)} (Amplifier powered)")
-        if pin_match:
-            print(f"  Pin-ctls: {pin_match.group(1)} ({pin_match.group(2)})")
+        if node_17['eapd']:
+            print(f"  EAPD: {node_17['eapd']} (Amplifier powered)")
+        if node_17['pin_ctls']:
+            print(f"  Pin-ctls: {node_17['pin_ctls']} ({node_17['pin_ctls_desc']})")
 
     print()
 
 
-def unmute_speaker_mixer(codec):
+def unmute_speaker_mixer(codec, force=False):
     """
     Unmute the mixer node 0x0d that routes to speakers
 
     HDA Verb: SET_AMP_GAIN_MUTE
       - Node 0x0d: Audio Mixer
-      - Verb 0x7000: Set input amp 0, left channel
-      - Verb 0x7001: Set input amp 0, right channel
-      - Param 0xb000: Both channels, unmute, 0dB gain
-                      (bit 13=both channels, bit 7=0 for unmute)
+      - Verb 0x300: SET_AMP_GAIN_MUTE (4-bit verb, 16-bit payload)
+      - Param 0x70gg: Input amp, index 0 (DAC 0x03), both channels,
+                      unmute, current gain gg kept
+                      (bit 14=input, bits 13-12=left+right, bit 7=0 for unmute)
+
+    The verb is skipped when the mixer input is already unmuted, unless
+    force is set.
     """
     print("\n=== Applying Fix ===\n")
 
-    # Write verbs to unmute both channels
-    if not codec.write_hda_verb(0x0d, 0x7000, 0xb000):
+    spec = codec.quirk_state('mixer', MIXER_STATE)
+    ok, changes, txn = apply_state(codec, spec, timeout=2.0, force=force)
+    if not ok:
         return False
 
-    if not codec.write_hda_verb(0x0d, 0x7001, 0xb000):
-        return False
-
-    # Reconfigure codec to apply changes
-    if not codec.reconfigure_codec():
-        return False
+    if txn is None:
+        print("  Mixer already unmuted, no verbs sent")
+        return not changes
 
-    print("  Waiting for codec to reinitialize...")
-    time.sleep(2)
+    if txn.settled:
+        print(f"  Codec settled after {txn.elapsed * 1000:.0f} ms")
+    else:
+        print(f"  Codec did not settle within {txn.timeout:.1f} s")
 
     return True
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Samsung Galaxy Book5 Pro - Fix speaker audio by unmuting HDA codec mixer"
-    )
-    parser.add_argument(
-        '--verify-only',
-        action='store_true',
-        help='Only check codec state, do not apply fix'
-    )
-    parser.add_argument(
-        '--force',
-        action='store_true',
-        help='Apply fix even if mixer appears unmuted'
-    )
-
-    args = parser.parse_args()
-
-    print("=" * 60)
-    print("Samsung Galaxy Book5 Pro - Speaker Codec Fix")
-    print("=" * 60)
-
-    # Check root privileges
-    if os.geteuid() != 0 and not args.verify_only:
-        print("\nERROR: This script must be run as root (use sudo)")
-        print("       Or use --verify-only to just check state")
-        sys.exit(1)
-
-    try:
-        codec = HDCodecController()
-    except RuntimeError as e:
-        print(f"\nERROR: {e}")
-        sys.exit(1)
-
+def fix_codec(codec, args):
+    """
+    Check and fix the mixer of one codec
+    Returns: exit status (0 = mixer unmuted or fixed)
+    """
     # Show current state
     verify_codec_state(codec)
 
@@ -251,7 +115,7 @@ def main():
         print("WARNING: Could not determine mute state")
         if not args.force:
             print("Use --force to apply fix anyway")
-            sys.exit(1)
+            return 1
     elif not is_muted and not args.force:
         print("Mixer node 0x0d is already unmuted.")
         print("If speakers still don't work, the issue may be elsewhere.")
@@ -259,12 +123,13 @@ def main():
         return 0
 
     # Apply fix
-    if not unmute_speaker_mixer(codec):
+    if not unmute_speaker_mixer(codec, force=args.force):
         print("\nERROR: Failed to apply fix")
-        sys.exit(1)
+        return 1
 
     # Verify fix
     print("\n=== Verification ===\n")
+    codec.load_codec_dump()
     is_muted_after, vals_after = codec.check_mixer_node_muted(0x0d)
 
     if is_muted_after is False:
@@ -274,15 +139,63 @@ def main():
         print("WARNING: Fix applied but mixer still appears muted")
         print("  This may indicate a different issue")
 
+    card = codec.location['card'] if codec.location else 0
     print("\n=== Test Audio ===\n")
     print("Test speakers with:")
-    print("  speaker-test -c2 -t wav -Dhw:0,0")
+    print(f"  speaker-test -c2 -t wav -Dhw:{card},0")
     print("\nOr play a sound file:")
-    print("  aplay -Dhw:0,0 /usr/share/sounds/alsa/Front_Center.wav")
+    print(f"  aplay -Dhw:{card},0 /usr/share/sounds/alsa/Front_Center.wav")
     print()
 
     return 0
 
 
+def main(argv=None, codec=None):
+    """
+    Run the check / fix flow on every matching codec
+    Args:
+        argv: Command line arguments (default: sys.argv[1:])
+        codec: HDCodecController to use instead of the discovered ones;
+               skips the root check
+    """
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - Fix speaker audio by unmuting HDA codec mixer"
+    )
+    parser.add_argument(
+        '--verify-only',
+        action='store_true',
+        help='Only check codec state, do not apply fix'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Apply fix even if mixer appears unmuted'
+    )
+    parser.add_argument(
+        '--card',
+        type=int,
+        default=None,
+        help='Only handle the codecs of this ALSA card (default: every known codec)'
+    )
+
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("Samsung Galaxy Book5 Pro - Speaker Codec Fix")
+    print("=" * 60)
+
+    # Check root privileges
+    if codec is None and os.geteuid() != 0 and not args.verify_only:
+        print("\nERROR: This script must be run as root (use sudo)")
+        print("       Or use --verify-only to just check state")
+        sys.exit(1)
+
+    if codec is not None:
+        return fix_codec(codec, args)
+
+    return fix_codecs(lambda controller: fix_codec(controller, args), HDCodecController,
+                      card=args.card, error_prefix="ERROR:")
+
+
 if __name__ == '__main__':
     sys.exit(main())
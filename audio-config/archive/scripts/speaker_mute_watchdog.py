@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Samsung Galaxy Book5 Pro - Speaker Mute Watchdog
+
+Long-running replacement for the oneshot unmute services. After
+suspend/resume, a codec reconfig or a PipeWire restart the speaker pin
+amp on Node 0x17 (or the mixer input on 0x0d) can come back muted; the
+oneshot fix only ran at boot.
+
+The daemon sleeps until the kernel tells it something happened:
+  - inotify on /dev/snd: device nodes created/removed/changed
+    (card re-probe, codec reconfig, resume)
+  - ALSA control events on /dev/snd/controlCN: any mixer element
+    changed (PipeWire/WirePlumber restoring or resetting controls)
+Events are coalesced, the codec dump is checked once, and only the
+verbs whose expected state has drifted are re-applied. No polling.
+
+Repairs go through the hwdep backend, which writes the verbs directly.
+The daemon refuses to run on the sysfs backend: every repair there
+appends to init_verbs and reconfigures the whole codec, which fires new
+control events and wakes the daemon again. Events that arrive right
+after a repair are the daemon's own and are ignored. If something keeps
+re-muting the path (PipeWire, the driver's own init), each repeat of the
+same drift waits twice as long before it is repaired again, and after
+MAX_REPAIRS repeats the daemon stops repairing it until the drift
+changes, clears or SIGHUP is sent.
+
+Drift and repair counts are exported through the hdacodec metrics
+(set HDA_METRICS_PROM to a node_exporter textfile path).
+
+Usage:
+    sudo python3 speaker_mute_watchdog.py [--card N] [--once] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import os
+import signal
+import struct
+import sys
+import time
+
+from hdacodec import HDCodecController
+from hdacodec.discovery import find_codec
+from hdacodec.state import SPEAKER_STATE, plan_verbs
+
+DEV_SND = "/dev/snd"
+
+# Quiet time after the last event before the codec is checked; events
+# come in bursts (a PipeWire restart touches dozens of controls).
+DEBOUNCE = 0.2
+# Longest a burst is coalesced for; a steady stream of events (e.g. a
+# volume slider being dragged) must not postpone the check forever
+DEBOUNCE_MAX = 2.0
+
+# Events this soon after a repair are taken to be caused by it
+SELF_EVENT_WINDOW = 0.5
+
+# Backoff before re-repairing the same drift: 1 s, 2 s, 4 s ... up to
+# BACKOFF_MAX; after MAX_REPAIRS repeats that drift is left alone
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+MAX_REPAIRS = 5
+# A drift that only comes back after this long (e.g. on the next
+# resume) starts a new count
+STREAK_RESET = 600.0
+
+# include/uapi/linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+_INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# include/uapi/sound/asound.h
+SNDRV_CTL_IOCTL_SUBSCRIBE_EVENTS = 0xC0045516  # _IOWR('U', 0x16, int)
+SNDRV_CTL_EVENT_SIZE = 64                      # struct snd_ctl_event
+
+
+class Inotify:
+    """Minimal inotify binding over libc (no third-party modules)"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self):
+        """Return the names of all pending events (empty if none)"""
+        try:
+            data = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            names.append(data[offset:offset + length].rstrip(b'\0').decode())
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_control(path):
+    """Open an ALSA control device and subscribe to its element events"""
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+    try:
+        fcntl.ioctl(fd, SNDRV_CTL_IOCTL_SUBSCRIBE_EVENTS, struct.pack('i', 1))
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+class SpeakerWatchdog:
+    """
+    Re-apply the speaker fix whenever codec events show it has drifted
+
+    Args:
+        codec: HDCodecController (default: auto-selected backend)
+        dev_dir: Directory with the ALSA device nodes to watch
+        card: Card number whose controlCN events are subscribed (default:
+              the card of the discovered codec)
+        dry_run: Report drift without writing verbs
+        spec: Desired state to maintain (default: the codec's "speaker"
+              quirk state, else SPEAKER_STATE)
+    """
+
+    def __init__(self, codec=None, dev_dir=DEV_SND, card=None, dry_run=False,
+                 spec=None):
+        if codec is None:
+            location = find_codec(card) if card is not None else None
+            if card is not None and location is None:
+                raise RuntimeError(f"No HDA codec found on card {card}")
+            codec = HDCodecController(location=location)
+        self.codec = codec
+        if card is None:
+            card = codec.location['card'] if codec.location else 0
+        self.spec = spec or self.codec.quirk_state('speaker', SPEAKER_STATE)
+        self.dev_dir = dev_dir
+        self.control_path = os.path.join(dev_dir, f"controlC{card}")
+        self.dry_run = dry_run
+        self.checks = 0
+        self.repairs = 0
+        self._drift = None          # Signature of the drift last repaired
+        self._streak = 0            # Consecutive repairs of that drift
+        self._last_repair = 0.0     # Monotonic time of the last repair
+        self._next_repair = 0.0     # Monotonic time it may be repaired again
+        self._gave_up = False
+        self._retry = None          # Timer handle for a backed-off repair
+        self._quiet_until = 0.0
+        self._inotify = None
+        self._control_fd = None
+        self._wake = None
+        self._loop = None
+
+    def check(self):
+        """
+        Check the codec once and re-apply the drifted verbs
+        Returns: list of verbs written (empty if nothing drifted)
+        """
+        self.checks += 1
+        try:
+            dump = self.codec.load_codec_dump()
+        except OSError as e:
+            print(f"Warning: Could not read codec dump: {e}", flush=True)
+            return []
+
+        verbs, changes = plan_verbs(dump, self.spec)
+        metrics = self.codec.metrics
+        for change in changes:
+            print(f"Drift: {change['desc']}", flush=True)
+            metrics.inc('hda_drift_events_total', node=f"0x{change['node']:02x}",
+                        field=change['field'])
+        if not changes:
+            # The last repair held
+            self.reset_backoff()
+        if not verbs or self.dry_run:
+            if changes:
+                metrics.flush()
+            return [verb[:3] for verb in verbs]
+
+        signature = tuple(change['desc'] for change in changes)
+        if signature != self._drift or time.monotonic() - self._last_repair > STREAK_RESET:
+            self.reset_backoff()
+            self._drift = signature
+        if self._streak >= MAX_REPAIRS:
+            if not self._gave_up:
+                print(f"Same drift repaired {self._streak} times in a row, something keeps "
+                      f"undoing it; not repairing it again until it changes or SIGHUP",
+                      flush=True)
+                metrics.inc('hda_drift_repairs_abandoned_total')
+                metrics.flush()
+                self._gave_up = True
+            return []
+        delay = self.repair_delay()
+        if delay:
+            print(f"Same drift again, repairing it in {delay:.1f} s", flush=True)
+            return []
+
+        txn = self.codec.transaction(timeout=2.0)
+        for node, verb, param, expect in verbs:
+            txn.add(node, verb, param, expect=expect)
+        if not txn.commit():
+            # The backend may hold a stale handle after a re-probe;
+            # it reopens lazily on the next write.
+            self.codec.backend.close()
+            return []
+
+        self.repairs += 1
+        self._streak += 1
+        self._last_repair = time.monotonic()
+        self._next_repair = self._last_repair + min(BACKOFF_BASE * 2 ** (self._streak - 1),
+                                                    BACKOFF_MAX)
+        metrics.inc('hda_drift_repairs_total', settled=txn.settled)
+        metrics.flush()
+        if txn.settled:
+            print(f"Re-applied {len(verbs)} verb(s), settled after "
+                  f"{txn.elapsed * 1000:.0f} ms", flush=True)
+        else:
+            print(f"Re-applied {len(verbs)} verb(s), still unmet: "
+                  f"{', '.join(txn.unmet)}", flush=True)
+        return [verb[:3] for verb in verbs]
+
+    def repair_delay(self):
+        """Seconds until the last repaired drift may be repaired again"""
+        if self._drift is None or self._streak >= MAX_REPAIRS:
+            return 0.0
+        return max(self._next_repair - time.monotonic(), 0.0)
+
+    def reset_backoff(self):
+        """Forget the repeated drift, its backoff and a given-up repair"""
+        self._drift, self._streak, self._next_repair, self._gave_up = None, 0, 0.0, False
+
+    def _wake_up(self):
+        # Events right after our own repair are the repair's echo
+        if self._loop.time() >= self._quiet_until:
+            self._wake.set()
+
+    def _on_inotify(self):
+        names = self._inotify.read()
+        if any(n.startswith(('controlC', 'hwC', 'pcmC')) for n in names):
+            if os.path.basename(self.control_path) in names:
+                self._reopen_control()
+            self._wake_up()
+
+    def _on_control(self):
+        try:
+            while os.read(self._control_fd, SNDRV_CTL_EVENT_SIZE * 16):
+                pass
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            # ENODEV when the card goes away; inotify reopens it
+            if e.errno != errno.ENODEV:
+                print(f"Warning: control event read failed: {e}", flush=True)
+            self._close_control()
+        self._wake_up()
+
+    def _reopen_control(self):
+        self._close_control()
+        if not os.path.exists(self.control_path):
+            return
+        try:
+            self._control_fd = open_control(self.control_path)
+        except OSError as e:
+            print(f"Warning: No control events from {self.control_path}: {e}", flush=True)
+            return
+        self._loop.add_reader(self._control_fd, self._on_control)
+
+    def _close_control(self):
+        if self._control_fd is not None:
+            self._loop.remove_reader(self._control_fd)
+            os.close(self._control_fd)
+            self._control_fd = None
+
+    async def run(self):
+        """
+        Watch for events until cancelled
+        Raises: RuntimeError on a backend that needs a codec reconfig
+        """
+        if self.codec.backend.needs_reconfig and not self.dry_run:
+            raise RuntimeError(
+                f"The watchdog needs the hwdep backend ({self.codec.backend.name} "
+                f"reconfigures the whole codec on every repair); check that "
+                f"/dev/snd/hwC*D* exists, or use --once / --dry-run")
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+
+        self._inotify = Inotify()
+        self._inotify.add_watch(self.dev_dir, IN_CREATE | IN_DELETE | IN_ATTRIB | IN_MODIFY)
+        self._loop.add_reader(self._inotify.fd, self._on_inotify)
+        self._reopen_control()
+
+        print(f"Watching {self.dev_dir} and {self.control_path}", flush=True)
+        try:
+            self._wake.set()  # initial check
+            while True:
+                await self._wake.wait()
+                await self._coalesce()
+                if self.check():
+                    self._quiet_until = self._loop.time() + SELF_EVENT_WINDOW
+                    self._wake.clear()
+                self._schedule_retry()
+        finally:
+            if self._retry is not None:
+                self._retry.cancel()
+            self._loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._close_control()
+
+    async def _coalesce(self):
+        """Wait until the burst goes quiet, or DEBOUNCE_MAX after it started"""
+        deadline = self._loop.time() + DEBOUNCE_MAX
+        while True:
+            self._wake.clear()
+            timeout = min(DEBOUNCE, deadline - self._loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    def _schedule_retry(self):
+        """Check again once a backed-off repair is due, even without events"""
+        if self._retry is not None:
+            self._retry.cancel()
+            self._retry = None
+        delay = self.repair_delay()
+        if delay:
+            self._retry = self._loop.call_later(delay, self._wake.set)
+
+    def request_check(self):
+        """Schedule a check from outside an event (e.g. SIGHUP); also
+        lifts the backoff and lets an abandoned drift be repaired again"""
+        self.reset_backoff()
+        if self._wake is not None:
+            self._wake.set()
+
+
+async def _serve(watchdog):
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    loop.add_signal_handler(signal.SIGHUP, watchdog.request_check)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await watchdog.run()
+    except asyncio.CancelledError:
+        print(f"Stopping: {watchdog.checks} checks, {watchdog.repairs} repairs", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - keep the speaker path unmuted"
+    )
+    parser.add_argument('--card', type=int, default=None,
+                        help='ALSA card number (default: the card of the speaker codec)')
+    parser.add_argument('--once', action='store_true',
+                        help='Check and repair once, then exit')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report drift without writing verbs')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0 and not args.dry_run:
+        print("ERROR: This script must be run as root (use sudo)")
+        print("       Or use --dry-run to only report drift")
+        sys.exit(1)
+
+    try:
+        watchdog = SpeakerWatchdog(card=args.card, dry_run=args.dry_run)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    try:
+        if args.once:
+            watchdog.check()
+        else:
+            asyncio.run(_serve(watchdog))
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return 1
+    finally:
+        watchdog.codec.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,142 +7,45 @@ Root cause: Node 0x17 (Speaker Pin) output amplifier is MUTED
 even though ALSA control "Speaker Playback Switch" reports "on"
 
 Usage:
-    sudo python3 speaker_pin_fix.py [--verify-only]
+    sudo python3 speaker_pin_fix.py [--verify-only] [--card N]
 """
 
 import sys
 import os
-import re
-import time
 import argparse
-from pathlib import Path
-
-
-class HDCodecController:
-    """Interface to HDA codec via sysfs"""
-
-    CODEC_PATH = Path("/sys/class/sound/hwC0D0")
-    PROC_CODEC = Path("/proc/asound/card0/codec#0")
-
-    def __init__(self):
-        if not self.CODEC_PATH.exists():
-            raise RuntimeError(f"Codec sysfs path not found: {self.CODEC_PATH}")
-        if not self.PROC_CODEC.exists():
-            raise RuntimeError(f"Codec proc interface not found: {self.PROC_CODEC}")
-
-    def get_codec_info(self):
-        """Read codec identification"""
-        vendor = (self.CODEC_PATH / "vendor_name").read_text().strip()
-        chip = (self.CODEC_PATH / "chip_name").read_text().strip()
-        subsys = (self.CODEC_PATH / "subsystem_id").read_text().strip()
-        return {
-            'vendor': vendor,
-            'chip': chip,
-            'subsystem_id': subsys
-        }
-
-    def get_node_state(self, node_id):
-        """
-        Parse node state from /proc/asound/card0/codec#0
-        Returns dict with node properties
-        """
-        content = self.PROC_CODEC.read_text()
-        pattern = rf"Node (0x{node_id:02x}).*?\n(.*?)(?=\nNode|\Z)"
-        match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
-
-        if not match:
-            return None
-
-        node_text = match.group(2)
-
-        # Extract Amp-In values
-        amp_in_match = re.search(r"Amp-In vals:\s+\[([^\]]+)\]", node_text)
-        amp_in_vals = amp_in_match.group(1) if amp_in_match else None
-
-        # Extract Amp-Out values
-        amp_out_match = re.search(r"Amp-Out vals:\s+\[([^\]]+)\]", node_text)
-        amp_out_vals = amp_out_match.group(1) if amp_out_match else None
-
-        # Extract Connection list
-        conn_match = re.search(r"Connection:.*?\n\s+(.+)", node_text)
-        connections = conn_match.group(1).strip() if conn_match else None
-
-        # Extract EAPD
-        eapd_match = re.search(r"EAPD\s+(0x[0-9a-fA-F]+)", node_text)
-        eapd = eapd_match.group(1) if eapd_match else None
-
-        # Extract Pin-ctls
-        pin_match = re.search(r"Pin-ctls:\s+(0x[0-9a-fA-F]+):\s+(.+)", node_text)
-        pin_ctls = pin_match.group(1) if pin_match else None
-        pin_ctls_desc = pin_match.group(2) if pin_match else None
-
-        return {
-            'node_id': node_id,
-            'amp_in_vals': amp_in_vals,
-            'amp_out_vals': amp_out_vals,
-            'connections': connections,
-            'eapd': eapd,
-            'pin_ctls': pin_ctls,
-            'pin_ctls_desc': pin_ctls_desc,
-            'raw': node_text
-        }
-
-    def write_hda_verb(self, node, verb, param):
-        """
-        Write HDA verb to codec via sysfs
-        Args:
-            node: Node ID (e.g., 0x17)
-            verb: Verb ID (e.g., 0x300)
-            param: Parameter value (e.g., 0x0000)
-        """
-        verb_str = f"0x{node:02x} 0x{verb:04x} 0x{param:04x}"
-        verb_file = self.CODEC_PATH / "init_verbs"
-
-        print(f"  Writing HDA verb: {verb_str}")
-
-        try:
-            verb_file.write_text(verb_str + "\n")
-            return True
-        except PermissionError:
-            print(f"ERROR: Permission denied. Run with sudo.")
-            return False
-        except Exception as e:
-            print(f"ERROR: Failed to write verb: {e}")
-            return False
-
-    def reconfigure_codec(self):
-        """Trigger codec reconfiguration to apply verbs"""
-        reconfig_file = self.CODEC_PATH / "reconfig"
-        print("  Triggering codec reconfiguration...")
-
-        try:
-            reconfig_file.write_text("1\n")
-            return True
-        except Exception as e:
-            print(f"ERROR: Failed to reconfigure codec: {e}")
-            return False
-
-    def check_amp_muted(self, amp_vals_str):
-        """
-        Check if amplifier is muted based on amp values string
-        Args:
-            amp_vals_str: String like "0x80 0x80" or "0x00 0x00"
-        Returns: (is_muted, values_list)
-        """
-        if not amp_vals_str:
-            return (None, None)
 
-        vals = [int(v, 16) for v in re.findall(r'0x[0-9a-fA-F]+', amp_vals_str)]
-        if not vals:
-            return (None, amp_vals_str)
-
-        # Mute bit is bit 7 (0x80)
-        is_muted = any((v & 0x80) != 0 for v in vals)
-        return (is_muted, vals)
+from hdacodec import HDCodecController, fix_codecs
+from hdacodec.graph import check_paths, describe_path, speaker_paths, speaker_state
+from hdacodec.state import EAPD_BIT, SPEAKER_STATE, apply_state
+
+
+def _hop_line(hop):
+    """One widget of a checked path, e.g. 'Node 0x0d [Audio Mixer]: Amp-In[0] [0x80 0x80] MUTED ❌'"""
+    parts = []
+    for field, index, vals in hop['amps']:
+        label = f"Amp-In[{index}]" if field == 'amp_in' else "Amp-Out"
+        muted = any(v & 0x80 for v in vals)
+        parts.append(f"{label} [{' '.join(f'0x{v:02x}' for v in vals)}] "
+                     f"{'MUTED ❌' if muted else 'UNMUTED ✓'}")
+    if 'stream' in hop and hop['stream'] is not None:
+        parts.append(f"stream {hop['stream']} ({'ACTIVE ✓' if hop['stream'] else 'INACTIVE ❌'})")
+    if hop.get('eapd'):
+        eapd_on = int(hop['eapd'], 16) & EAPD_BIT
+        parts.append(f"EAPD {hop['eapd']} ({'ON ✓' if eapd_on else 'OFF ❌'})")
+    if hop.get('pin_ctls'):
+        parts.append(f"Pin-ctls {hop['pin_ctls']}")
+    return f"  Node 0x{hop['node']:02x} [{hop['type']}]: {', '.join(parts) or '-'}"
 
 
 def verify_codec_state(codec):
-    """Print current codec state with detailed diagnostics"""
+    """
+    Print current codec state with detailed diagnostics
+
+    Every DAC -> speaker pin path of the codec's widget graph is checked
+    in one sweep (see hdacodec/graph.py): amps, gain, EAPD and Pin-ctls
+    of each widget on the path. Issues are reported for the paths the
+    pin actually has selected; the others are only listed.
+    """
     print("\n=== DIAGNOSTIC REPORT ===\n")
 
     info = codec.get_codec_info()
@@ -150,72 +53,29 @@ def verify_codec_state(codec):
     print(f"Subsystem ID: {info['subsystem_id']}")
     print()
 
-    issues_found = []
-
-    # Check mixer node 0x0d
-    print("Node 0x0d (Audio Mixer):")
-    node_0d = codec.get_node_state(0x0d)
-    if node_0d and node_0d['amp_in_vals']:
-        print(f"  Amp-In vals: {node_0d['amp_in_vals']}")
-        print(f"  Connections: {node_0d['connections']}")
-
-        is_muted, vals = codec.check_amp_muted(node_0d['amp_in_vals'])
-        if is_muted is not None:
-            status = "MUTED ❌" if is_muted else "UNMUTED ✓"
-            print(f"  Status: {status}")
-            if is_muted:
-                issues_found.append("Node 0x0d (Mixer) input is MUTED")
-    else:
-        print("  ERROR: Could not read node state")
-    print()
-
-    # Check speaker pin 0x17 - THIS IS THE CRITICAL ONE
-    print("Node 0x17 (Speaker Pin Complex):")
-    node_17 = codec.get_node_state(0x17)
-    if node_17:
-        if node_17['amp_out_vals']:
-            print(f"  Amp-Out vals: {node_17['amp_out_vals']}")
-            is_muted, vals = codec.check_amp_muted(node_17['amp_out_vals'])
-            if is_muted is not None:
-                status = "MUTED ❌" if is_muted else "UNMUTED ✓"
-                print(f"  Status: {status}")
-                if is_muted:
-                    issues_found.append("Node 0x17 (Speaker Pin) output amp is MUTED - THIS IS THE PROBLEM!")
-
-        if node_17['eapd']:
-            eapd_val = int(node_17['eapd'], 16)
-            eapd_status = "ON ✓" if (eapd_val & 0x2) else "OFF ❌"
-            print(f"  EAPD: {node_17['eapd']} ({eapd_status})")
-            if not (eapd_val & 0x2):
-                issues_found.append("Speaker amplifier EAPD is OFF")
-
-        if node_17['pin_ctls']:
-            print(f"  Pin-ctls: {node_17['pin_ctls']} ({node_17['pin_ctls_desc']})")
-            pin_val = int(node_17['pin_ctls'], 16)
-            if not (pin_val & 0x40):
-                issues_found.append("Speaker pin output is not enabled")
-
-        if node_17['connections']:
-            print(f"  Connections: {node_17['connections']}")
-    else:
-        print("  ERROR: Could not read node state")
-    print()
-
-    # Check DAC node 0x03
-    print("Node 0x03 (DAC / Audio Output):")
-    node_03 = codec.get_node_state(0x03)
-    if node_03:
-        conv_match = re.search(r"Converter:\s+stream=(\d+)", node_03['raw'])
-        if conv_match:
-            stream = int(conv_match.group(1))
-            stream_status = "ACTIVE ✓" if stream != 0 else "INACTIVE ❌"
-            print(f"  Stream: {stream} ({stream_status})")
-            if stream == 0:
-                issues_found.append("DAC has no active audio stream")
-
-        if node_03['amp_out_vals']:
-            print(f"  Amp-Out vals: {node_03['amp_out_vals']}")
-    print()
+    # One read + parse serves every path below
+    dump = codec.load_codec_dump()
+
+    issues_found = {}
+    results = check_paths(dump, speaker_paths(dump))
+    if not results:
+        issues_found["No speaker pin found in the codec dump"] = None
+
+    for pin_id, checks in results.items():
+        if not checks:
+            issues_found[f"No DAC path reaches speaker pin 0x{pin_id:02x}"] = None
+        elif not any(check['active'] for check in checks):
+            issues_found[f"Speaker pin 0x{pin_id:02x} has no DAC path selected"] = None
+        for check in checks:
+            if not check['active']:
+                print(f"Path {describe_path(dump, check['path'])} (not selected)")
+                continue
+            print(f"Path {describe_path(dump, check['path'])}:")
+            for hop in check['hops']:
+                print(_hop_line(hop))
+            for issue in check['issues']:
+                issues_found[issue['desc']] = None
+        print()
 
     # Summary
     print("=" * 60)
@@ -232,97 +92,71 @@ def verify_codec_state(codec):
         print("    - Hardware (physical speaker connection)")
         print()
 
-    return issues_found
+    return list(issues_found)
 
 
-def unmute_speaker_pin(codec):
+def unmute_speaker_pin(codec, force=False):
     """
     Unmute BOTH mixer and speaker pin output amplifiers
 
     Critical fix: Node 0x17 output amp is muted even though
     ALSA control shows "Speaker Playback Switch = on"
 
-    HDA Verbs:
-      1. Node 0x0d: Unmute mixer input (from DAC 0x03)
-      2. Node 0x17: Unmute speaker pin output amplifier
-      3. Node 0x17: Set EAPD to enable speaker amplifier
+    Desired state (the codec's "speaker" quirk state, see
+    hdacodec/quirks.json; hdacodec.state.SPEAKER_STATE if unknown, plus
+    the amps/EAPD/Pin-ctls of any other widget on the selected speaker
+    paths, see hdacodec.graph.speaker_state):
+      1. Node 0x0d: Mixer input 0 (from DAC 0x03) unmuted
+      2. Node 0x17: Speaker pin output amplifier unmuted
+      3. Node 0x17: EAPD enabled (speaker amplifier on)
+      4. Node 0x17: Pin output enabled (Pin-ctls 0x40)
+
+    Only the fields that differ are written (e.g. a single 0x70c verb if
+    just EAPD dropped); if nothing differs, no verb and no reconfig is
+    sent. Amp verbs use SET_AMP_GAIN_MUTE (0x300, 16-bit payload) and keep
+    the current gain. With force, every field is rewritten.
     """
     print("\n=== APPLYING COMPLETE SPEAKER FIX ===\n")
 
-    # Step 1: Unmute mixer node 0x0d (DAC → Mixer path)
-    print("Step 1: Unmuting mixer node 0x0d...")
-    if not codec.write_hda_verb(0x0d, 0x7000, 0xb000):  # Both channels
-        return False
-
-    # Step 2: Unmute speaker pin 0x17 OUTPUT amplifier (CRITICAL!)
-    # SET_AMP_GAIN_MUTE for output amp:
-    #   - 0x300: Output amp control
-    #   - 0x0000: Both channels unmuted, 0dB gain
-    #   But we need to use the proper format: 0xb000 = both channels unmuted
-    print("Step 2: Unmuting speaker pin 0x17 output amplifier...")
-    # Verb 0x300 = SET_AMP_GAIN_MUTE for output
-    # Parameter: bit 15 (output), bit 13-12 (both channels), bit 7=0 (unmute)
-    if not codec.write_hda_verb(0x17, 0x3000, 0xb000):  # Output amp, both channels
-        return False
+    quirk = codec.get_quirk()
+    if quirk:
+        print(f"Quirk: {quirk['name']}")
+    else:
+        print("No quirk for this codec, using Galaxy Book5 Pro defaults")
+    spec = codec.quirk_state('speaker', SPEAKER_STATE)
+    # Widgets on the selected speaker paths that the quirk state leaves out
+    spec = {**speaker_state(codec.load_codec_dump()), **spec}
 
-    # Step 3: Ensure EAPD is enabled on speaker pin
-    print("Step 3: Enabling speaker amplifier (EAPD)...")
-    # SET_EAPD_BTLENABLE verb: 0x70c
-    # Parameter: 0x0002 (EAPD bit set)
-    if not codec.write_hda_verb(0x17, 0x70c, 0x0002):
+    ok, changes, txn = apply_state(codec, spec, timeout=3.0, force=force)
+    if not ok:
         return False
 
-    # Step 4: Ensure pin is configured for output
-    print("Step 4: Setting speaker pin to output mode...")
-    # SET_PIN_WIDGET_CONTROL verb: 0x707
-    # Parameter: 0x40 (output enabled)
-    if not codec.write_hda_verb(0x17, 0x707, 0x0040):
-        return False
+    if txn is None:
+        if changes:
+            for change in changes:
+                print(f"  Cannot fix: {change['desc']}")
+            return False
+        print("  Codec already in the desired state, no verbs sent")
+        return True
 
-    # Reconfigure codec to apply all changes
-    if not codec.reconfigure_codec():
-        return False
+    for change in changes:
+        print(f"  Applied: {change['desc']}")
 
-    print("  Waiting for codec to reinitialize...")
-    time.sleep(3)
+    if txn.settled:
+        print(f"  Codec settled after {txn.elapsed * 1000:.0f} ms")
+    else:
+        print(f"  Codec did not settle within {txn.timeout:.1f} s:")
+        for desc in txn.unmet:
+            print(f"    - {desc}")
 
     return True
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Samsung Galaxy Book5 Pro - Complete speaker fix (mixer + pin amp)"
-    )
-    parser.add_argument(
-        '--verify-only',
-        action='store_true',
-        help='Only check codec state, do not apply fix'
-    )
-    parser.add_argument(
-        '--force',
-        action='store_true',
-        help='Apply fix even if no issues detected'
-    )
-
-    args = parser.parse_args()
-
-    print("=" * 70)
-    print("  Samsung Galaxy Book5 Pro - Complete Speaker Fix")
-    print("  Addresses BOTH mixer and pin amplifier issues")
-    print("=" * 70)
-
-    # Check root privileges
-    if os.geteuid() != 0 and not args.verify_only:
-        print("\n❌ ERROR: This script must be run as root (use sudo)")
-        print("       Or use --verify-only to just check state")
-        sys.exit(1)
-
-    try:
-        codec = HDCodecController()
-    except RuntimeError as e:
-        print(f"\n❌ ERROR: {e}")
-        sys.exit(1)
-
+def fix_codec(codec, args):
+    """
+    Diagnose and fix one codec
+    Returns: exit status (0 = speaker paths OK or fixed)
+    """
     # Show current state
     issues = verify_codec_state(codec)
 
@@ -336,9 +170,9 @@ def main():
         return 0
 
     # Apply comprehensive fix
-    if not unmute_speaker_pin(codec):
+    if not unmute_speaker_pin(codec, force=args.force):
         print("\n❌ ERROR: Failed to apply fix")
-        sys.exit(1)
+        return 1
 
     # Verify fix
     print("\n=== POST-FIX VERIFICATION ===\n")
@@ -352,10 +186,11 @@ def main():
             print(f"    - {issue}")
         print()
 
+    card = codec.location['card'] if codec.location else 0
     print("=" * 70)
     print("\n🔊 TEST AUDIO NOW:\n")
-    print("  Option 1: speaker-test -c2 -t wav -Dhw:0,0")
-    print("  Option 2: aplay -Dhw:0,0 /usr/share/sounds/alsa/Front_Center.wav")
+    print(f"  Option 1: speaker-test -c2 -t wav -Dhw:{card},0")
+    print(f"  Option 2: aplay -Dhw:{card},0 /usr/share/sounds/alsa/Front_Center.wav")
     print("  Option 3: pw-play /usr/share/sounds/alsa/Front_Center.wav")
     print("\n  Press Ctrl+C to stop speaker-test when you hear sound.")
     print("=" * 70)
@@ -364,5 +199,53 @@ def main():
     return 0
 
 
+def main(argv=None, codec=None):
+    """
+    Run the diagnostic / fix flow on every matching codec
+    Args:
+        argv: Command line arguments (default: sys.argv[1:])
+        codec: HDCodecController to use instead of the discovered ones;
+               skips the root check (used by bench_audio_fix.py)
+    """
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - Complete speaker fix (mixer + pin amp)"
+    )
+    parser.add_argument(
+        '--verify-only',
+        action='store_true',
+        help='Only check codec state, do not apply fix'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Apply fix even if no issues detected'
+    )
+    parser.add_argument(
+        '--card',
+        type=int,
+        default=None,
+        help='Only handle the codecs of this ALSA card (default: every known codec)'
+    )
+
+    args = parser.parse_args(argv)
+
+    print("=" * 70)
+    print("  Samsung Galaxy Book5 Pro - Complete Speaker Fix")
+    print("  Addresses BOTH mixer and pin amplifier issues")
+    print("=" * 70)
+
+    # Check root privileges
+    if codec is None and os.geteuid() != 0 and not args.verify_only:
+        print("\n❌ ERROR: This script must be run as root (use sudo)")
+        print("       Or use --verify-only to just check state")
+        sys.exit(1)
+
+    if codec is not None:
+        return fix_codec(codec, args)
+
+    return fix_codecs(lambda controller: fix_codec(controller, args), HDCodecController,
+                      card=args.card, error_prefix="❌ ERROR:")
+
+
 if __name__ == '__main__':
     sys.exit(main())
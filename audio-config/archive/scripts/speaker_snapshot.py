@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Samsung Galaxy Book5 Pro - Speaker codec state snapshot / restore
+
+After resume, speaker_pin_fix.py re-runs the whole detect-and-fix flow:
+a full proc dump parse, verb writes and a 3 second reconfig settle.
+This keeps a compact binary snapshot of the speaker path state (amps,
+EAPD, Pin-ctls, power states) per codec subsystem ID instead, and
+restore replays only the verbs whose value differs from the live codec.
+
+Commands:
+  save      capture the current state (--if-clean: only when the speaker
+            path is unmuted, so a broken state never replaces a good one)
+  restore   replay the snapshot; exits 2 if it took longer than --budget-ms
+  show      print the stored records
+
+speaker-snapshot.sleep runs save before suspend and restore after
+resume. Set HDA_METRICS_PROM to export the restore latency
+(hda_snapshot_restore_seconds).
+
+Usage:
+    sudo python3 speaker_snapshot.py save [--all-nodes] [--if-clean]
+    sudo python3 speaker_snapshot.py restore [--budget-ms 100] [--power]
+    python3 speaker_snapshot.py show
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from hdacodec import HDCodecController
+from hdacodec.graph import check_paths, speaker_paths
+from hdacodec.snapshot import (
+    CodecSnapshot, capture_snapshot, load_snapshot, restore_snapshot, save_snapshot, snapshot_path,
+)
+
+DEFAULT_BUDGET_MS = 100
+
+
+def _is_broken(issue):
+    """Mutes, EAPD off or pin output off; an idle DAC or low volume is fine"""
+    if issue['field'] in ('amp_in', 'amp_out'):
+        return issue['desc'].endswith('MUTED')
+    return issue['field'] in ('eapd', 'pin_ctls')
+
+
+def _broken_issues(dump):
+    """Problems on the selected speaker paths that a snapshot must not keep"""
+    issues = []
+    for results in check_paths(dump, speaker_paths(dump)).values():
+        for result in results:
+            if result['active']:
+                issues.extend(i['desc'] for i in result['issues'] if _is_broken(i))
+    return issues
+
+
+def _codec_path(codec, snapshot_dir):
+    """
+    Snapshot file of this codec, keyed by its subsystem ID (sysfs, else
+    the dump header); save, restore and show all use this key
+    Returns: Path, or None if the codec reports no subsystem ID
+    """
+    subsystem_id = codec.get_codec_info()['subsystem_id']
+    if not subsystem_id:
+        subsystem_id = codec.load_codec_dump().subsystem_id
+    if subsystem_id is None:
+        print("ERROR: The codec reports no subsystem ID to key its snapshot by")
+        return None
+    return snapshot_path(subsystem_id, snapshot_dir)
+
+
+def cmd_save(codec, args):
+    dump = codec.load_codec_dump()
+    if args.if_clean:
+        issues = _broken_issues(dump)
+        if issues:
+            print("Speaker path is not in a good state, keeping the old snapshot:")
+            for desc in issues:
+                print(f"  {desc}")
+            return 1
+    nodes = sorted(dump.nodes) if args.all_nodes else None
+    snapshot = capture_snapshot(dump, nodes)
+    if not snapshot.records:
+        print("ERROR: No speaker path found in the codec dump, nothing to save")
+        return 1
+    path = _codec_path(codec, args.dir)
+    if path is None:
+        return 1
+    save_snapshot(snapshot, path)
+    print(f"Saved {len(snapshot.records)} records to {path}")
+    return 0
+
+
+def cmd_restore(codec, args):
+    path = _codec_path(codec, args.dir)
+    if path is None:
+        return 1
+    try:
+        snapshot = load_snapshot(path)
+    except FileNotFoundError:
+        print(f"ERROR: No snapshot for this codec ({path}); run 'save' first")
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Unusable snapshot {path}: {e}")
+        return 1
+
+    budget = args.budget_ms / 1000 if args.budget_ms else None
+    result = restore_snapshot(codec, snapshot, budget, power=args.power)
+    codec.metrics.flush()
+
+    if args.json:
+        print(json.dumps({
+            'ok': result['ok'],
+            'within_budget': result['within_budget'],
+            'elapsed_ms': round(result['elapsed'] * 1000, 3),
+            'phases_ms': {k: round(v * 1000, 3) for k, v in result['phases'].items()},
+            'verbs': [[n, v, p] for n, v, p in result['verbs']],
+            'unmet': [list(r) for r in result['unmet']],
+        }))
+    else:
+        phases = ', '.join(f"{k} {v * 1000:.1f} ms" for k, v in result['phases'].items())
+        print(f"Restored {len(result['changed'])} of {len(snapshot.records)} records "
+              f"with {len(result['verbs'])} verb(s) in {result['elapsed'] * 1000:.1f} ms "
+              f"({phases})")
+        for line in CodecSnapshot(None, None, result['unmet']).describe():
+            print(f"  NOT RESTORED: {line}")
+
+    if not result['ok']:
+        return 1
+    if not result['within_budget']:
+        print(f"WARNING: Over the {args.budget_ms} ms budget")
+        return 2
+    return 0
+
+
+def cmd_show(codec, args):
+    path = _codec_path(codec, args.dir) if args.file is None else args.file
+    if path is None:
+        return 1
+    try:
+        snapshot = load_snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {path}: {e}")
+        return 1
+    print(f"{path}: codec 0x{snapshot.vendor_id:08x}, subsystem 0x{snapshot.subsystem_id:08x}, "
+          f"{len(snapshot.records)} records")
+    for line in snapshot.describe():
+        print(f"  {line}")
+    return 0
+
+
+def main(argv=None, codec=None):
+    parser = argparse.ArgumentParser(
+        description="Samsung Galaxy Book5 Pro - snapshot and restore the speaker codec state"
+    )
+    parser.add_argument('--dir', default=None,
+                        help='Snapshot directory (default: $HDA_SNAPSHOT_DIR or /var/lib/hdacodec)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    save = sub.add_parser('save', help='Capture the current codec state')
+    save.add_argument('--all-nodes', action='store_true',
+                      help='Capture every widget, not just the speaker paths')
+    save.add_argument('--if-clean', action='store_true',
+                      help='Only save if the speaker path is unmuted')
+
+    restore = sub.add_parser('restore', help='Replay the snapshot')
+    restore.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                         help=f'Latency budget, 0 for none (default: {DEFAULT_BUDGET_MS})')
+    restore.add_argument('--power', action='store_true',
+                         help='Also restore widget power states')
+    restore.add_argument('--json', action='store_true', help='Print the result as JSON')
+
+    show = sub.add_parser('show', help='Print the stored snapshot')
+    show.add_argument('file', nargs='?', default=None,
+                      help='Snapshot file (default: the one of this codec)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show' and args.file is not None:
+        return cmd_show(None, args)
+
+    if codec is None:
+        if os.geteuid() != 0 and args.command != 'show':
+            print("ERROR: This script must be run as root (use sudo)")
+            return 1
+        try:
+            codec = HDCodecController()
+        except RuntimeError as e:
+            print(f"ERROR: {e}")
+            return 1
+
+    try:
+        return {'save': cmd_save, 'restore': cmd_restore, 'show': cmd_show}[args.command](codec, args)
+    finally:
+        codec.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
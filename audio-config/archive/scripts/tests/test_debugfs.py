@@ -0,0 +1,135 @@
+"""
+GPIO debugfs tests: the streaming /sys/kernel/debug/gpio parser, the
+(chip, offset) / GPIO number index and calculate_gpio's debugfs check
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import calculate_gpio
+from gpiotools import GpioDebugfsIndex, iter_gpio_debugfs, load_gpio_debugfs
+
+DEBUGFS_GPIO = """\
+ gpio-7   (                    |orphan              ) out hi
+gpiochip0: GPIOs 512-871, parent: platform/INTC1083:00, INTC1083:00:
+ gpio-610 (                    |reset               ) out lo ACTIVE LOW
+ gpio-709 (                    |interrupt           ) in  hi IRQ ACTIVE LOW
+ gpio-710 (                    |cs42l43             ) in  hi IRQ
+
+gpiochip1: GPIOs 872-879, parent: i2c/2-0020, pca9534, can sleep:
+ gpio-873 (                    |amp98               ) out hi
+gpiochip2: GPIOs 880-887, parent: platform/gpio-mockup.0:
+ gpio-881 (LED0                |led-heartbeat       ) out ?
+ some driver specific dbg_show line
+gpiochip3: GPIOs 0-255, INT34C6:00:
+ gpio-198 (                    |speaker-amp         ) out hi
+"""
+
+
+def _records():
+    return list(iter_gpio_debugfs(io.StringIO(DEBUGFS_GPIO)))
+
+
+class IterGpioDebugfsTest(unittest.TestCase):
+
+    def test_records(self):
+        records = _records()
+        self.assertEqual([r['gpio'] for r in records], [610, 709, 710, 873, 881, 198])
+        self.assertEqual(records[0], {
+            'chip': 'gpiochip0', 'chip_label': 'INTC1083:00', 'gpio': 610, 'offset': 98,
+            'name': '', 'consumer': 'reset', 'direction': 'out', 'value': 0,
+            'irq': False, 'active_low': True,
+        })
+        self.assertEqual([(r['irq'], r['active_low'], r['value']) for r in records[1:3]],
+                         [(True, True, 1), (True, False, 1)])
+
+    def test_chip_headers(self):
+        records = {r['gpio']: r for r in _records()}
+        # "can sleep" is not part of the label; parent and label are optional
+        self.assertEqual((records[873]['chip_label'], records[873]['offset']), ('pca9534', 1))
+        self.assertEqual((records[881]['chip'], records[881]['chip_label']), ('gpiochip2', None))
+        self.assertEqual((records[198]['chip_label'], records[198]['offset']), ('INT34C6:00', 198))
+
+    def test_unknown_value_and_names(self):
+        led = {r['gpio']: r for r in _records()}[881]
+        self.assertEqual((led['name'], led['consumer'], led['value']), ('LED0', 'led-heartbeat', None))
+
+    def test_lines_before_a_chip_are_skipped(self):
+        self.assertEqual(list(iter_gpio_debugfs([" gpio-7 (   |x   ) out hi\n"])), [])
+
+    def test_streams(self):
+        lines = iter(DEBUGFS_GPIO.splitlines(keepends=True))
+        records = iter_gpio_debugfs(lines)
+        self.assertEqual(next(records)['gpio'], 610)
+        # Only the lines up to the first record were consumed
+        self.assertTrue(next(lines).lstrip().startswith('gpio-709'))
+
+
+class GpioDebugfsIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = GpioDebugfsIndex(iter_gpio_debugfs(io.StringIO(DEBUGFS_GPIO)))
+
+    def test_lookups(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(self.index.get_gpio(610)['consumer'], 'reset')
+        self.assertIs(self.index.get('gpiochip0', 98), self.index.get_gpio(610))
+        self.assertIs(self.index.get('INTC1083:00', 98), self.index.get_gpio(610))
+        self.assertIs(self.index.get('pca9534', 1), self.index.get_gpio(873))
+        self.assertIsNone(self.index.get('INTC1083:00', 99))
+        self.assertIsNone(self.index.get('gpiochip1', 98))
+
+    def test_exact_numbers_only(self):
+        # Neither gpio-198 nor the "amp98" consumer is GPIO 98
+        self.assertIsNone(self.index.get_gpio(98))
+        self.assertIsNone(self.index.get_gpio(19))
+        self.assertEqual(self.index.get('gpiochip3', 198)['consumer'], 'speaker-amp')
+
+    def test_iter_and_add(self):
+        self.assertEqual(sorted(r['gpio'] for r in self.index), [198, 610, 709, 710, 873, 881])
+        empty = GpioDebugfsIndex()
+        self.assertEqual((len(empty), list(empty), empty.get_gpio(610)), (0, [], None))
+        empty.add(self.index.get_gpio(881))
+        self.assertEqual(empty.get('gpiochip2', 1)['name'], 'LED0')
+        self.assertNotIn((None, 1), empty.by_offset)
+
+
+class CheckGpioDebugfsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "gpio"
+
+    def check(self):
+        with mock.patch.object(calculate_gpio, 'load_gpio_debugfs',
+                               lambda: load_gpio_debugfs(self.path)):
+            return calculate_gpio.check_gpio_debugfs()
+
+    def test_readable(self):
+        self.path.write_text(DEBUGFS_GPIO)
+        index, error = self.check()
+        self.assertIsNone(error)
+        self.assertEqual(index.get_gpio(610)['consumer'], 'reset')
+
+    def test_missing(self):
+        index, error = self.check()
+        self.assertIsInstance(index, GpioDebugfsIndex)
+        self.assertEqual((len(index), error), (0, "Not available"))
+
+    def test_permission_denied(self):
+        with mock.patch.object(calculate_gpio, 'load_gpio_debugfs', side_effect=PermissionError):
+            index, error = calculate_gpio.check_gpio_debugfs()
+        self.assertIsInstance(index, GpioDebugfsIndex)
+        self.assertEqual(len(index), 0)
+        self.assertIn("Permission denied", error)
+
+
+if __name__ == '__main__':
+    unittest.main()
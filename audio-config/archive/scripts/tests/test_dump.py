@@ -0,0 +1,94 @@
+"""
+Codec dump parser tests: agreement with the old per-node regex lookup
+on a large synthetic dump. Parse speed is left to bench_audio_fix.py.
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import re
+import unittest
+
+from hdacodec.dump import parse_codec_dump, split_dump
+from hdacodec.simulator import ALC298_FIXTURE
+
+# Copies of the fixture nodes, renumbered 0x40 apart (0x02-0xe4), so the
+# synthetic dump is the size of a large real codec
+REPLICAS = 4
+NODE_STRIDE = 0x40
+
+LEGACY_FIELDS = ('amp_in_vals', 'amp_out_vals', 'connections', 'eapd', 'pin_ctls', 'pin_ctls_desc')
+
+
+def legacy_get_node_state(content, node_id):
+    """HDCodecController.get_node_state() before the single-pass parser"""
+    pattern = rf"Node (0x{node_id:02x}).*?\n(.*?)(?=\nNode|\Z)"
+    match = re.search(pattern, content, re.DOTALL | re.IGNORECASE)
+
+    if not match:
+        return None
+
+    node_text = match.group(2)
+
+    amp_in_match = re.search(r"Amp-In vals:\s+\[([^\]]+)\]", node_text)
+    amp_out_match = re.search(r"Amp-Out vals:\s+\[([^\]]+)\]", node_text)
+    conn_match = re.search(r"Connection:.*?\n\s+(.+)", node_text)
+    eapd_match = re.search(r"EAPD\s+(0x[0-9a-fA-F]+)", node_text)
+    pin_match = re.search(r"Pin-ctls:\s+(0x[0-9a-fA-F]+):\s+(.+)", node_text)
+
+    return {
+        'amp_in_vals': amp_in_match.group(1) if amp_in_match else None,
+        'amp_out_vals': amp_out_match.group(1) if amp_out_match else None,
+        'connections': conn_match.group(1).strip() if conn_match else None,
+        'eapd': eapd_match.group(1) if eapd_match else None,
+        'pin_ctls': pin_match.group(1) if pin_match else None,
+        'pin_ctls_desc': pin_match.group(2) if pin_match else None,
+    }
+
+
+def synthetic_dump(text, replicas=REPLICAS):
+    """The fixture with its nodes repeated under new node IDs"""
+    head, blocks = split_dump(text)
+    nodes = []
+    for copy in range(replicas):
+        for block in blocks:
+            node_id, rest = block.split(' ', 1)
+            nodes.append(f"0x{int(node_id, 16) + copy * NODE_STRIDE:02x} {rest}")
+    return head + ''.join('\nNode ' + block for block in nodes)
+
+
+class ParserTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fixture = ALC298_FIXTURE.read_text()
+        cls.text = synthetic_dump(cls.fixture)
+
+    def test_synthetic_dump(self):
+        fixture = parse_codec_dump(self.fixture)
+        parsed = parse_codec_dump(self.text)
+        self.assertEqual(len(parsed), len(fixture) * REPLICAS)
+        self.assertEqual(parsed.subsystem_id, fixture.subsystem_id)
+        for node in fixture:
+            copy = parsed.node(node['node_id'] + NODE_STRIDE * (REPLICAS - 1))
+            self.assertEqual(copy['amp_out'], node['amp_out'])
+            self.assertEqual(copy['conn_list'], node['conn_list'])
+
+    def test_matches_legacy_regex(self):
+        parsed = parse_codec_dump(self.text)
+        for node in parsed:
+            legacy = legacy_get_node_state(self.text, node['node_id'])
+            with self.subTest(node=f"0x{node['node_id']:02x}"):
+                self.assertIsNotNone(legacy)
+                if node['pin_ctls_desc'] == '':
+                    # 'Pin-ctls: 0x00:' has no description; the old \s+
+                    # ran on and took the next line for it
+                    self.assertTrue(legacy['pin_ctls_desc'].startswith('Unsolicited'))
+                    legacy['pin_ctls_desc'] = ''
+                self.assertEqual({field: node[field] for field in LEGACY_FIELDS}, legacy)
+        self.assertIsNone(parsed.node(0xff))
+        self.assertIsNone(legacy_get_node_state(self.text, 0xff))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+Codec dump differ tests: field-level records from edited copies of the
+ALC298 fixture, parsing only changed nodes, and codec_dump_diff's
+grouping of many dumps by how they differ
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import codec_dump_diff
+from hdacodec import dumpdiff
+from hdacodec.dumpdiff import DumpIndex, diff_dumps, diff_index, diff_many, diff_signature
+from hdacodec.simulator import ALC298_FIXTURE
+
+REFERENCE = ALC298_FIXTURE.read_text()
+SPEAKER_PIN = 0x17
+
+
+def _edit_node(text, node_id, old, new):
+    """The dump with one replacement inside a node's block"""
+    start = text.index(f"Node 0x{node_id:02x} ")
+    end = text.index("Node 0x", start + 1)
+    block = text[start:end]
+    assert old in block
+    return text[:start] + block.replace(old, new) + text[end:]
+
+
+def _remove_node(text, node_id):
+    start = text.index(f"Node 0x{node_id:02x} ")
+    return text[:start] + text[text.index("Node 0x", start + 1):]
+
+
+MUTED = _edit_node(REFERENCE, SPEAKER_PIN, 'Amp-Out vals:  [0x80 0x80]', 'Amp-Out vals:  [0x00 0x00]')
+PIN_OFF = _edit_node(REFERENCE, SPEAKER_PIN, 'Pin-ctls: 0x40: OUT', 'Pin-ctls: 0x00:')
+
+
+def _descs(diffs):
+    return [d['desc'] for d in diffs]
+
+
+class DiffIndexTest(unittest.TestCase):
+
+    def test_identical(self):
+        self.assertEqual(diff_dumps(REFERENCE, REFERENCE), [])
+
+    def test_amp_change(self):
+        diff, = diff_dumps(REFERENCE, MUTED)
+        self.assertEqual(diff, {
+            'node': SPEAKER_PIN, 'field': 'amp_out', 'index': 0,
+            'before': [0x80, 0x80], 'after': [0x00, 0x00],
+            'desc': '0x17 Amp-Out [0x80 0x80] → [0x00 0x00]',
+        })
+
+    def test_node_fields(self):
+        self.assertEqual(_descs(diff_dumps(REFERENCE, PIN_OFF)), ['0x17 Pin-ctls 0x40 → 0x00'])
+        rerouted = _edit_node(REFERENCE, SPEAKER_PIN, '0x0c 0x0d* 0x06', '0x0c* 0x0d 0x06')
+        self.assertEqual(_descs(diff_dumps(REFERENCE, rerouted)),
+                         ['0x17 Connection 0x0c 0x0d* 0x06 → 0x0c* 0x0d 0x06'])
+
+    def test_several_fields_in_order(self):
+        both = _edit_node(MUTED, SPEAKER_PIN, 'Pin-ctls: 0x40: OUT', 'Pin-ctls: 0x00:')
+        self.assertEqual(_descs(diff_dumps(REFERENCE, both)), [
+            '0x17 Amp-Out [0x80 0x80] → [0x00 0x00]', '0x17 Pin-ctls 0x40 → 0x00',
+        ])
+        self.assertEqual(_descs(diff_dumps(both, REFERENCE)), [
+            '0x17 Amp-Out [0x00 0x00] → [0x80 0x80]', '0x17 Pin-ctls 0x00 → 0x40',
+        ])
+
+    def test_unparsed_text_change(self):
+        unsol = _edit_node(REFERENCE, SPEAKER_PIN, 'enabled=0', 'enabled=1')
+        diff, = diff_dumps(REFERENCE, unsol)
+        self.assertEqual((diff['field'], diff['before'], diff['after']),
+                         ('raw', ['Unsolicited: tag=00, enabled=0'], ['Unsolicited: tag=00, enabled=1']))
+
+    def test_garbled_node_header(self):
+        garbled = _edit_node(REFERENCE, SPEAKER_PIN, 'wcaps 0x40058d', 'wcaps zz')
+        diff, = diff_dumps(REFERENCE, garbled)
+        self.assertEqual((diff['node'], diff['field']), (SPEAKER_PIN, 'raw'))
+
+    def test_node_added_and_removed(self):
+        removed = _remove_node(REFERENCE, SPEAKER_PIN)
+        self.assertEqual(diff_dumps(REFERENCE, removed), [{
+            'node': SPEAKER_PIN, 'field': 'node', 'index': None, 'before': 'Pin Complex',
+            'after': None, 'desc': '0x17 removed [Pin Complex]',
+        }])
+        self.assertEqual(_descs(diff_dumps(removed, REFERENCE)), ['0x17 added [Pin Complex]'])
+
+    def test_header(self):
+        other = REFERENCE.replace('Subsystem Id: 0x144dca08', 'Subsystem Id: 0x144dc000')
+        diff, = diff_dumps(REFERENCE, other)
+        self.assertEqual((diff['node'], diff['field'], diff['before'], diff['after'], diff['desc']),
+                         (None, 'subsystem_id', 0x144dca08, 0x144dc000,
+                          'Subsystem Id 0x144dca08 → 0x144dc000'))
+        moved = REFERENCE.replace('Address: 0', 'Address: 1', 1)
+        self.assertEqual(_descs(diff_dumps(REFERENCE, moved)), ['Header text Address: 0 → Address: 1'])
+
+    def test_only_changed_nodes_parsed(self):
+        reference, muted = DumpIndex(REFERENCE), DumpIndex(MUTED)
+        with mock.patch.object(dumpdiff, 'parse_node_block',
+                               wraps=dumpdiff.parse_node_block) as parse:
+            self.assertEqual(diff_index(reference, DumpIndex(REFERENCE)), [])
+            self.assertEqual(parse.call_count, 0)
+            diff_index(reference, muted)
+        self.assertEqual([call.args[0] for call in parse.call_args_list],
+                         [reference.blocks[SPEAKER_PIN], muted.blocks[SPEAKER_PIN]])
+
+    def test_index(self):
+        index = DumpIndex(REFERENCE, 'reference')
+        self.assertIn(SPEAKER_PIN, index.blocks)
+        self.assertEqual(index.blocks.keys(), index.hashes.keys())
+        self.assertEqual(index.header['subsystem_id'], 0x144dca08)
+        muted = DumpIndex(MUTED)
+        self.assertEqual([n for n in index.hashes if index.hashes[n] != muted.hashes[n]], [SPEAKER_PIN])
+
+    def test_diff_many_and_signature(self):
+        results = list(diff_many(REFERENCE, [('a', MUTED), ('b', REFERENCE), ('c', MUTED)]))
+        self.assertEqual([name for name, _ in results], ['a', 'b', 'c'])
+        self.assertEqual(results[1][1], [])
+        self.assertEqual(diff_signature(results[0][1]), diff_signature(results[2][1]))
+        self.assertNotEqual(diff_signature(results[0][1]), diff_signature(diff_dumps(REFERENCE, PIN_OFF)))
+        self.assertEqual(diff_signature([]), ())
+
+
+class CodecDumpDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.reference = self.write("reference.txt", REFERENCE)
+
+    def write(self, name, text):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return str(path)
+
+    def run_main(self, *argv):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = codec_dump_diff.main([self.reference, *argv])
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def fleet(self):
+        for i in range(3):
+            self.write(f"fleet/same{i}.txt", REFERENCE)
+        for i in range(5):
+            self.write(f"fleet/muted/m{i}.txt", MUTED)
+        self.write("fleet/pin.txt", PIN_OFF)
+        self.write("fleet/notes.txt", "not a codec dump\n")
+        return str(self.root / "fleet")
+
+    def test_pair(self):
+        status, output, _ = self.run_main(self.write("after.txt", MUTED))
+        self.assertEqual(status, 1)
+        self.assertIn("  0x17 Amp-Out [0x80 0x80] → [0x00 0x00]", output.splitlines())
+        status, output, _ = self.run_main(self.write("same.txt", REFERENCE), '--json')
+        self.assertEqual((status, json.loads(output)['diffs']), (0, []))
+
+    def test_unreadable(self):
+        status, _, errors = self.run_main(str(self.root / "missing.txt"))
+        self.assertEqual(status, 2)
+        self.assertIn("ERROR: Could not read", errors)
+
+    def test_fleet_groups(self):
+        status, output, errors = self.run_main(self.fleet(), '--json')
+        self.assertEqual(status, 1)
+        self.assertIn("notes.txt: not a codec dump", errors)
+        result = json.loads(output)
+        self.assertEqual((result['dumps'], result['identical'], result['unreadable']), (9, 3, 1))
+        muted, pin = result['groups']
+        self.assertEqual((muted['count'], _descs(muted['diffs'])),
+                         (5, ['0x17 Amp-Out [0x80 0x80] → [0x00 0x00]']))
+        # A few examples per group, in walk order
+        self.assertEqual([Path(p).name for p in muted['examples']], ['m0.txt', 'm1.txt', 'm2.txt'])
+        self.assertEqual((pin['count'], [Path(p).name for p in pin['examples']]), (1, ['pin.txt']))
+
+    def test_fleet_text(self):
+        status, output, _ = self.run_main(self.fleet(), '--top', '1')
+        self.assertEqual(status, 1)
+        lines = output.splitlines()
+        self.assertTrue(lines[0].startswith("9 dump(s) against "))
+        self.assertTrue(lines[0].endswith(": 3 identical, 6 differ in 2 way(s), 1 unreadable"))
+        self.assertTrue(lines[2].startswith("  5 dump(s), e.g. ") and lines[2].endswith(", ..."))
+        self.assertEqual(lines[3], "      0x17 Amp-Out [0x80 0x80] → [0x00 0x00]")
+        self.assertEqual(lines[-1], "  ... 1 smaller group(s)")
+
+    def test_fleet_status(self):
+        same = [self.write(f"same{i}.txt", REFERENCE) for i in range(2)]
+        self.assertEqual(self.run_main(*same)[0], 0)
+        bad = self.write("bad/notes.txt", "no codec here\n")
+        self.assertEqual(self.run_main(str(Path(bad).parent))[0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
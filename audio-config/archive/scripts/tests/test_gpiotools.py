@@ -0,0 +1,136 @@
+"""
+GPIO search rollback and I2C probe tests against FakeGpioChip / I2cStub
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import unittest
+
+import calculate_gpio
+from gpiotools import FakeGpioChip, I2cStub, PARALLEL, SEQUENTIAL, search_lines
+from gpiotools.i2c import BUSY, PRESENT
+
+AMP_LINE = 5
+CANDIDATES = [2, 3, 5, 7, 11]
+
+
+def _line_states(fake):
+    return {o: (line['output'], line['value'], line['used']) for o, line in fake.lines.items()}
+
+
+class SearchRollbackTest(unittest.TestCase):
+    """Every candidate is back in its original state and released after a search"""
+
+    def setUp(self):
+        self.fake = FakeGpioChip(label='INTC1083:00', ngpio=16)
+        # Line 3 was an output driven HIGH, line 7 an input pulled HIGH
+        self.fake.lines[3].update(output=True, value=1)
+        self.fake.lines[7].update(pull=1, value=1)
+        self.stub = I2cStub(bus=2)
+        self.fake.on_set.append(self._enable_amp)
+        self.i2c = self.stub.bus()
+        self.addCleanup(self.i2c.close)
+        self.chip = self.fake.chip()
+        self.addCleanup(self.chip.close)
+        self.targets = [(self.chip, offset, offset) for offset in CANDIDATES]
+        self.before = _line_states(self.fake)
+        self.touched = set()
+
+    def _enable_amp(self, offset, value):
+        self.touched.add(offset)
+        if offset == AMP_LINE:
+            (self.stub.present.add if value else self.stub.present.discard)(0x38)
+
+    def _search(self, strategy, detect=None):
+        return search_lines(self.targets, detect or (lambda: calculate_gpio.max98390_present(self.i2c)),
+                            strategy=strategy, timeout=0.05)
+
+    def _assert_restored(self):
+        self.assertEqual(_line_states(self.fake), self.before)
+        self.assertEqual(self.fake.requests, {})
+        self.assertNotIn(0x38, self.stub.present)
+
+    def test_sequential_finds_line_and_restores(self):
+        result = self._search(SEQUENTIAL)
+        self.assertEqual(result['found'], AMP_LINE)
+        self.assertEqual(result['rounds'], CANDIDATES.index(AMP_LINE) + 1)
+        self._assert_restored()
+        # Candidates after the amp line were never driven
+        self.assertFalse(self.touched & {7, 11})
+
+    def test_parallel_finds_line_and_restores(self):
+        result = self._search(PARALLEL)
+        self.assertEqual(result['found'], AMP_LINE)
+        self.assertLess(result['rounds'], len(CANDIDATES))
+        self._assert_restored()
+
+    def test_nothing_found_restores(self):
+        for strategy in (SEQUENTIAL, PARALLEL):
+            with self.subTest(strategy=strategy):
+                result = self._search(strategy, detect=lambda: False)
+                self.assertIsNone(result['found'])
+                self._assert_restored()
+
+    def test_detect_error_restores(self):
+        def detect():
+            if self.fake.lines[2]['value']:
+                raise OSError(5, "Input/output error")
+            return False
+
+        for strategy in (SEQUENTIAL, PARALLEL):
+            with self.subTest(strategy=strategy):
+                with self.assertRaises(OSError):
+                    self._search(strategy, detect=detect)
+                self._assert_restored()
+
+    def test_used_lines_skipped(self):
+        self.fake.lines[AMP_LINE].update(used=True, consumer='speaker-amp')
+        self.before = _line_states(self.fake)
+        result = self._search(SEQUENTIAL)
+        self.assertIsNone(result['found'])
+        self.assertEqual(result['skipped'], [(AMP_LINE, 'speaker-amp')])
+        self.assertNotIn(AMP_LINE, self.touched)
+        self._assert_restored()
+
+    def test_search_candidates(self):
+        candidates = [{'gpio': 512 + offset, 'chip': {'label': 'INTC1083:00', 'base': 512}}
+                      for offset in CANDIDATES]
+        targets = [(self.chip, offset, 512 + offset) for offset in CANDIDATES]
+        with contextlib.redirect_stdout(io.StringIO()):
+            found = calculate_gpio.search_candidates(candidates, targets=targets,
+                                                     i2c=self.i2c, timeout=0.05)
+        self.assertEqual(found['gpio'], 512 + AMP_LINE)
+        self._assert_restored()
+
+
+class I2cProbeTest(unittest.TestCase):
+    """I2cBus.probe() against the stub adapter"""
+
+    def setUp(self):
+        self.stub = I2cStub(bus=2, present={0x38}, busy={0x39})
+        self.i2c = self.stub.bus()
+        self.addCleanup(self.i2c.close)
+
+    def test_probe(self):
+        self.assertEqual(self.i2c.probe(0x38), PRESENT)
+        self.assertEqual(self.i2c.probe(0x39), BUSY)
+        self.assertIsNone(self.i2c.probe(0x3a))
+        self.assertEqual(self.i2c.scan([0x38, 0x3a]), {0x38: PRESENT, 0x3a: None})
+
+    def test_probe_rejects_reserved_addresses(self):
+        for addr in (0x00, 0x02, 0x78):
+            with self.assertRaises(ValueError):
+                self.i2c.probe(addr)
+
+    def test_max98390_present(self):
+        self.assertTrue(calculate_gpio.max98390_present(self.i2c))
+        self.stub.present.clear()
+        self.stub.busy.clear()
+        self.assertFalse(calculate_gpio.max98390_present(self.i2c))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,342 @@
+"""
+Speaker fix, verb encoding and snapshot tests against the ALC298 simulator
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import speaker_pin_fix
+import speaker_snapshot
+from hdacodec import (
+    HDCodecController, NULL_METRICS, SimulatedBackend, SimulatedCodec, SimulatedCodecTree, fix_codecs,
+)
+from hdacodec.backends import BACKEND_ENV, HwdepBackend, SysfsBackend, select_backend
+from hdacodec.dump import parse_codec_dump
+from hdacodec.graph import speaker_state
+from hdacodec.hwdep import HwdepVerbChannel
+from hdacodec.simulator import ALC298_FIXTURE
+from hdacodec.snapshot import capture_snapshot, load_snapshot, restore_snapshot, save_snapshot
+from hdacodec.state import merge_state
+from hdacodec.verbs import (
+    SET_AMP_GAIN_MUTE, VerbError, amp_gain_mute, amp_value, decode_word, encode_verb, pack_verbs,
+    parse_verb, unpack_verbs, validate_verb,
+)
+
+SCRIPTS = Path(__file__).resolve().parent.parent
+
+# Mixer input 0 of 0x0d and the speaker pin 0x17, from the ALC298 fixture
+MIXER = 0x0d
+SPEAKER_PIN = 0x17
+
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+class SpeakerFixCycleTest(unittest.TestCase):
+    """speaker_pin_fix diagnose -> fix -> verify on both real backends"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tree = SimulatedCodecTree(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _controller(self, backend):
+        codec = HDCodecController(backend=backend, metrics=NULL_METRICS)
+        self.addCleanup(codec.close)
+        return codec
+
+    def _check_fix_cycle(self, backend):
+        codec = self._controller(backend)
+        dump = codec.load_codec_dump()
+        self.assertTrue(codec.check_mixer_node_muted(MIXER)[0])
+        self.assertTrue(any(v & 0x80 for v in dump.node(SPEAKER_PIN)['amp_out'][0]))
+
+        # Diagnose only: reports issues, writes nothing
+        self.assertEqual(_quiet(speaker_pin_fix.main, ['--verify-only'], codec=codec), 1)
+        self.assertTrue(codec.check_mixer_node_muted(MIXER)[0])
+
+        self.assertEqual(_quiet(speaker_pin_fix.main, [], codec=codec), 0)
+        dump = codec.load_codec_dump()
+        self.assertIs(codec.check_mixer_node_muted(MIXER)[0], False)
+        self.assertEqual(dump.node(SPEAKER_PIN)['amp_out'], [[0x00, 0x00]])
+        self.assertEqual(int(dump.node(SPEAKER_PIN)['pin_ctls'], 16) & 0x40, 0x40)
+        self.assertEqual(int(dump.node(SPEAKER_PIN)['eapd'], 16) & 0x2, 0x2)
+
+        # Already fixed: verify passes and a second run sends nothing
+        self.assertEqual(_quiet(speaker_pin_fix.main, ['--verify-only'], codec=codec), 0)
+        return codec
+
+    def test_sysfs_fix_cycle(self):
+        self._check_fix_cycle(self.tree.sysfs_backend())
+        # Every verb went through init_verbs and was consumed by the reconfig
+        self.assertEqual((self.tree.codec_path / "init_verbs").read_text(), "")
+
+    def test_hwdep_fix_cycle(self):
+        codec = self._check_fix_cycle(self.tree.hwdep_backend())
+        self.assertEqual(codec.read_amp(SPEAKER_PIN), [0x00, 0x00])
+
+    def test_fix_only_writes_drifted_fields(self):
+        codec = self._controller(self.tree.hwdep_backend())
+        _quiet(speaker_pin_fix.main, [], codec=codec)
+        written = []
+        write_verbs = codec.backend.write_verbs
+        codec.backend.write_verbs = lambda verbs: written.extend(verbs) or write_verbs(verbs)
+
+        self.tree.codec.execute(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb080)
+        self.assertEqual(_quiet(speaker_pin_fix.main, [], codec=codec), 0)
+        self.assertEqual(written, [(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb000)])
+
+
+class MultiCodecTest(unittest.TestCase):
+    """fix_codecs() over two simulated cards sharing one metrics file"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.root = Path(self._tmp.name)
+        self.trees = {tree.codec_path.name: tree for tree in
+                      (SimulatedCodecTree(self.root, card=0), SimulatedCodecTree(self.root, card=2))}
+        self.prom = self.root / "hda.prom"
+        env = mock.patch.dict(os.environ, {'HDA_METRICS_PROM': str(self.prom)})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def _open_codec(self, location, metrics):
+        return HDCodecController(backend=self.trees[location['name']].hwdep_backend(),
+                                 metrics=metrics, location=location)
+
+    def _fix(self, card=None):
+        args = argparse.Namespace(verify_only=False, force=False, card=card)
+        return _quiet(fix_codecs, lambda codec: speaker_pin_fix.fix_codec(codec, args),
+                      self._open_codec, card=card, root=self.root)
+
+    def _muted(self, name):
+        return any(v & 0x80 for v in self.trees[name].codec.nodes[SPEAKER_PIN]['amp_out'][0])
+
+    def test_every_codec_fixed_and_counted(self):
+        self.assertEqual(self._fix(), 0)
+        self.assertFalse(self._muted('hwC0D0'))
+        self.assertFalse(self._muted('hwC2D0'))
+        written = [line for line in self.prom.read_text().splitlines()
+                   if line.startswith('hda_verbs_written_total')]
+        self.assertEqual(len(written), 2)
+        self.assertTrue(any('codec="hwC0D0"' in line for line in written))
+        self.assertTrue(any('codec="hwC2D0"' in line for line in written))
+
+    def test_card_filter(self):
+        self.assertEqual(self._fix(card=2), 0)
+        self.assertTrue(self._muted('hwC0D0'))
+        self.assertFalse(self._muted('hwC2D0'))
+        self.assertEqual(self._fix(card=5), 1)
+
+
+class BackendSelectionTest(unittest.TestCase):
+    """select_backend() caches the choice, never the instance or a miss"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        root = Path(self._tmp.name)
+        self.codec_path, self.proc_path, self.hwdep_path = root / "hwC0D0", root / "codec#0", root / "hw"
+        self.codec_path.mkdir()
+        (self.codec_path / "init_verbs").touch()
+        self.proc_path.touch()
+        self.env = mock.patch.dict(os.environ)
+        self.env.start()
+        self.addCleanup(self.env.stop)
+        os.environ.pop(BACKEND_ENV, None)
+
+    def _select(self):
+        return select_backend(self.codec_path, self.proc_path, self.hwdep_path)
+
+    def test_fresh_instance_per_call(self):
+        self.hwdep_path.touch()
+        first, second = self._select(), self._select()
+        self.assertIsInstance(first, HwdepBackend)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.channel, second.channel)
+
+    def test_missing_backend_not_cached(self):
+        (self.codec_path / "init_verbs").unlink()
+        self.assertIsNone(self._select())
+        self.hwdep_path.touch()
+        self.assertIsInstance(self._select(), HwdepBackend)
+
+    def test_env_read_on_every_call(self):
+        self.hwdep_path.touch()
+        self.assertIsInstance(self._select(), HwdepBackend)
+        os.environ[BACKEND_ENV] = 'sysfs'
+        self.assertIsInstance(self._select(), SysfsBackend)
+        os.environ[BACKEND_ENV] = 'alsa'
+        with self.assertRaises(RuntimeError):
+            self._select()
+
+
+class SpeakerStateTest(unittest.TestCase):
+    """speaker_state() of several active paths through one mixer"""
+
+    def test_shared_mixer_keeps_every_input(self):
+        # Feed DAC 0x02 into mixer 0x0d next to DAC 0x03: two active speaker paths
+        text = ALC298_FIXTURE.read_text()
+        block = text[text.index('Node 0x0d '):text.index('Node 0x12 ')]
+        text = text.replace(block, block.replace('0x03 0x0b', '0x03 0x02'))
+        spec = speaker_state(parse_codec_dump(text))
+        self.assertEqual(spec[MIXER]['amp_in'], {0: {'mute': False}, 1: {'mute': False}})
+        self.assertEqual(spec[SPEAKER_PIN]['pin_ctls'], 0x40)
+
+    def test_merge_state(self):
+        spec = {MIXER: {'amp_in': {0: {'mute': False}}}, SPEAKER_PIN: {'pin_ctls': 0x40}}
+        other = {MIXER: {'amp_in': {0: {'gain': 0x1f}, 1: {'mute': False}}},
+                 SPEAKER_PIN: {'pin_ctls': 0x20, 'eapd': True}}
+        self.assertEqual(merge_state(spec, other), {
+            MIXER: {'amp_in': {0: {'mute': False, 'gain': 0x1f}, 1: {'mute': False}}},
+            SPEAKER_PIN: {'pin_ctls': 0x60, 'eapd': True},
+        })
+        other[MIXER]['amp_in'][1]['mute'] = True
+        self.assertIs(spec[MIXER]['amp_in'][1]['mute'], False)
+
+
+class VerbEncodingTest(unittest.TestCase):
+    """SET_AMP_GAIN_MUTE is 0x300 with a 16-bit payload, never 0x3000"""
+
+    def test_speaker_unmute_encoding(self):
+        self.assertEqual(amp_gain_mute(SPEAKER_PIN, output=True), (SPEAKER_PIN, 0x300, 0xb000))
+        self.assertEqual(amp_gain_mute(MIXER, output=False, index=0), (MIXER, 0x300, 0x7000))
+        self.assertEqual(encode_verb(SPEAKER_PIN, 0x300, 0xb000), 0x1703b000)
+        self.assertEqual(decode_word(0x1703b000), (SPEAKER_PIN, 0x300, 0xb000))
+        self.assertEqual(encode_verb(SPEAKER_PIN, 0x70c, 0x02), 0x17070c02)
+
+    def test_amp_value_keeps_mute_and_gain(self):
+        self.assertEqual(amp_value(SPEAKER_PIN, 0x85, right=False), (SPEAKER_PIN, 0x300, 0xa085))
+        self.assertEqual(amp_value(MIXER, 0x1f, output=False, index=1, left=False),
+                         (MIXER, 0x300, 0x511f))
+
+    def test_misencoded_verbs_rejected(self):
+        for verb in [(SPEAKER_PIN, 0x3000, 0xb0), (SPEAKER_PIN, 0x3b0, 0x00),
+                     (SPEAKER_PIN, 0x70c, 0x102), (0x117, 0x300, 0xb000)]:
+            with self.assertRaises(VerbError):
+                validate_verb(*verb)
+        with self.assertRaises(VerbError):
+            pack_verbs([(SPEAKER_PIN, 0x300, 0xb000), (SPEAKER_PIN, 0x3000, 0x70)])
+
+    def test_pack_round_trip(self):
+        verbs = [(MIXER, 0x300, 0x7000), (SPEAKER_PIN, 0x300, 0xb000),
+                 (SPEAKER_PIN, 0x70c, 0x02), (SPEAKER_PIN, 0x707, 0x40)]
+        self.assertEqual(unpack_verbs(pack_verbs(verbs)), verbs)
+
+    def test_shell_scripts_use_valid_verbs(self):
+        for script in ('fix-speaker-pin.sh', 'fix-speaker-unmute.sh'):
+            lines = [line for line in (SCRIPTS / script).read_text().splitlines()
+                     if line.startswith('echo "0x') and 'init_verbs' in line]
+            self.assertTrue(lines, script)
+            for line in lines:
+                parse_verb(line.split('"')[1])
+
+    def test_simulated_codec_unmutes_both_channels(self):
+        with tempfile.TemporaryDirectory() as root:
+            tree = SimulatedCodecTree(root)
+            chan = HwdepVerbChannel(tree.hwdep_path, ioctl=tree.codec.ioctl)
+            chan.verb(SPEAKER_PIN, 0x300, 0xb000)
+            self.assertEqual([amp['mute'] for amp in chan.read_amp(SPEAKER_PIN)], [False, False])
+            with self.assertRaises(VerbError):
+                chan.verb(SPEAKER_PIN, 0x3000, 0x70)
+            chan.close()
+
+
+class SnapshotTest(unittest.TestCase):
+    """Snapshot save -> drift -> restore of the fixed speaker path"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.tree = SimulatedCodecTree(Path(self._tmp.name) / "root")
+        self.path = Path(self._tmp.name) / "snap" / "144dca08.snap"
+
+    def _fixed_snapshot(self, backend):
+        codec = HDCodecController(backend=backend, metrics=NULL_METRICS)
+        self.addCleanup(codec.close)
+        _quiet(speaker_pin_fix.main, [], codec=codec)
+        save_snapshot(capture_snapshot(codec.load_codec_dump()), self.path)
+        return codec
+
+    def test_round_trip(self):
+        codec = self._fixed_snapshot(self.tree.hwdep_backend())
+        snapshot = load_snapshot(self.path)
+        self.assertEqual(snapshot.subsystem_id, 0x144dca08)
+        self.assertEqual(snapshot.records, capture_snapshot(codec.load_codec_dump()).records)
+
+        data = bytearray(self.path.read_bytes())
+        data[-5] ^= 0xff
+        self.path.write_bytes(bytes(data))
+        with self.assertRaises(ValueError):
+            load_snapshot(self.path)
+
+    def test_restore_hwdep_writes_only_differences(self):
+        codec = self._fixed_snapshot(self.tree.hwdep_backend())
+        snapshot = load_snapshot(self.path)
+
+        result = _quiet(restore_snapshot, codec, snapshot, budget=1.0)
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['verbs'], [])
+
+        self.tree.codec.execute(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb080)
+        self.tree.codec.execute(SPEAKER_PIN, 0x70c, 0x00)
+        result = _quiet(restore_snapshot, codec, snapshot, budget=1.0)
+        self.assertTrue(result['ok'], result['unmet'])
+        self.assertEqual(len(result['verbs']), 2)
+        self.assertEqual(codec.read_amp(SPEAKER_PIN), [0x00, 0x00])
+
+    def test_restore_sysfs(self):
+        codec = self._fixed_snapshot(self.tree.sysfs_backend())
+        self.tree.codec.execute(MIXER, SET_AMP_GAIN_MUTE, 0x7080)
+        self.tree.sync()
+
+        result = _quiet(restore_snapshot, codec, load_snapshot(self.path), budget=1.0)
+        self.assertTrue(result['ok'], result['unmet'])
+        self.assertEqual(result['verbs'], [(MIXER, SET_AMP_GAIN_MUTE, 0x7000)])
+        self.assertIs(codec.check_mixer_node_muted(MIXER)[0], False)
+
+    def _cli(self, command, codec, subsystem_id):
+        controller = HDCodecController(backend=SimulatedBackend(codec), metrics=NULL_METRICS)
+        info = dict(codec.codec_info(), subsystem_id=subsystem_id)
+        controller.get_codec_info = lambda: info
+        if not subsystem_id:
+            load_codec_dump = controller.load_codec_dump
+
+            def load_without_id():
+                dump = load_codec_dump()
+                dump.header.pop('subsystem_id', None)
+                return dump
+            controller.load_codec_dump = load_without_id
+        argv = ['--dir', str(self.path.parent)] + command
+        return _quiet(speaker_snapshot.main, argv, codec=controller)
+
+    def test_cli_save_and_restore_use_one_key(self):
+        codec = SimulatedCodec.alc298()
+        # sysfs and the dump header disagree: both commands key by sysfs
+        self.assertEqual(self._cli(['save'], codec, '0x11112222'), 0)
+        self.assertTrue((self.path.parent / "11112222.snap").exists())
+        self.assertEqual(self._cli(['restore', '--budget-ms', '0'], codec, '0x11112222'), 0)
+
+    def test_cli_without_subsystem_id(self):
+        codec = SimulatedCodec.alc298()
+        for command in (['save'], ['restore'], ['show']):
+            with self.subTest(command=command[0]):
+                self.assertEqual(self._cli(command, codec, ''), 1)
+        self.assertFalse(self.path.parent.exists())
+
+if __name__ == '__main__':
+    unittest.main()
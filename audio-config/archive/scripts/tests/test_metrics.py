@@ -0,0 +1,200 @@
+"""
+Metrics tests: Prometheus text and JSON lines snapshots, event hooks,
+the JSON lines trace and who closes it
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from hdacodec import (
+    HDCodecController, Metrics, NULL_METRICS, SimulatedBackend, SimulatedCodec, SimulatedCodecTree,
+    fix_codecs, metrics_from_env,
+)
+from hdacodec import discovery
+from hdacodec.metrics import JsonTraceHook
+
+
+def _sample_metrics():
+    metrics = Metrics()
+    metrics.inc('hda_verbs_written_total', 3)
+    metrics.labelled(codec='hwC0D0').inc('hda_verbs_written_total')
+    metrics.inc('hda_codec_errors_total', op='verb_write', error='OSError')
+    metrics.inc('custom_total', note='a "b"\n')
+    metrics.observe('hda_verb_write_seconds', 0.0003)
+    metrics.observe('hda_verb_write_seconds', 2.0)
+    return metrics
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+
+class SnapshotFormatTest(TempDirTestCase):
+
+    def test_prometheus(self):
+        lines = _sample_metrics().to_prometheus().splitlines()
+        self.assertEqual(lines[:9], [
+            '# TYPE custom_total counter',
+            'custom_total{note="a \\"b\\"\\n"} 1',
+            '# HELP hda_codec_errors_total Failed codec operations',
+            '# TYPE hda_codec_errors_total counter',
+            'hda_codec_errors_total{error="OSError",op="verb_write"} 1',
+            '# HELP hda_verbs_written_total HDA verbs written',
+            '# TYPE hda_verbs_written_total counter',
+            'hda_verbs_written_total 3',
+            'hda_verbs_written_total{codec="hwC0D0"} 1',
+        ])
+        self.assertEqual(lines[9:11], [
+            '# HELP hda_verb_write_seconds Time to write one batch of verbs',
+            '# TYPE hda_verb_write_seconds histogram',
+        ])
+        buckets = lines[11:-2]
+        self.assertEqual(len(buckets), 17)
+        self.assertEqual(buckets[0], 'hda_verb_write_seconds_bucket{le="5e-05"} 0')
+        self.assertIn('hda_verb_write_seconds_bucket{le="0.00025"} 0', buckets)
+        self.assertIn('hda_verb_write_seconds_bucket{le="0.0005"} 1', buckets)
+        self.assertIn('hda_verb_write_seconds_bucket{le="1.0"} 1', buckets)
+        self.assertIn('hda_verb_write_seconds_bucket{le="2.5"} 2', buckets)
+        self.assertEqual(buckets[-1], 'hda_verb_write_seconds_bucket{le="+Inf"} 2')
+        self.assertEqual(lines[-2:], ['hda_verb_write_seconds_sum 2.0003',
+                                      'hda_verb_write_seconds_count 2'])
+
+    def test_json_lines(self):
+        series = [json.loads(line) for line in _sample_metrics().to_json_lines().splitlines()]
+        self.assertEqual(series[:4], [
+            {'metric': 'custom_total', 'type': 'counter', 'labels': {'note': 'a "b"\n'}, 'value': 1},
+            {'metric': 'hda_codec_errors_total', 'type': 'counter',
+             'labels': {'error': 'OSError', 'op': 'verb_write'}, 'value': 1},
+            {'metric': 'hda_verbs_written_total', 'type': 'counter', 'labels': {}, 'value': 3},
+            {'metric': 'hda_verbs_written_total', 'type': 'counter',
+             'labels': {'codec': 'hwC0D0'}, 'value': 1},
+        ])
+        hist = series[4]
+        self.assertEqual((hist['metric'], hist['type'], hist['labels'], hist['count'], hist['sum']),
+                         ('hda_verb_write_seconds', 'histogram', {}, 2, 2.0003))
+        self.assertEqual((hist['buckets']['0.00025'], hist['buckets']['0.0005'],
+                          hist['buckets']['+Inf']), (0, 1, 2))
+        self.assertEqual(len(series), 5)
+
+    def test_empty(self):
+        self.assertEqual(Metrics().to_prometheus(), "")
+        self.assertEqual(Metrics().to_json_lines(), "")
+        self.assertEqual(NULL_METRICS.to_prometheus(), "")
+
+    def test_flush(self):
+        metrics = _sample_metrics()
+        metrics.prom_path = self.root / "hda.prom"
+        metrics.json_path = self.root / "hda.jsonl"
+        metrics.flush()
+        self.assertEqual(metrics.prom_path.read_text(), metrics.to_prometheus())
+        self.assertEqual(metrics.json_path.read_text(), metrics.to_json_lines())
+        self.assertEqual(list(self.root.glob("*.tmp")), [])
+
+    def test_flush_unwritable(self):
+        metrics = _sample_metrics()
+        metrics.prom_path = self.root / "missing" / "hda.prom"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            metrics.flush()
+        self.assertIn("WARNING: Could not write metrics", output.getvalue())
+
+
+class EventTest(unittest.TestCase):
+
+    def test_event_hooks_and_labels(self):
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(events.append)
+        view = metrics.labelled(codec='hwC1D0')
+        view.event('verb_write', 0.001, verbs=4)
+        view.event('codec_reconfig', 0.5, ok=False, error=OSError("busy"))
+
+        self.assertEqual([(e['op'], e['ok'], e['codec']) for e in events],
+                         [('verb_write', True, 'hwC1D0'), ('codec_reconfig', False, 'hwC1D0')])
+        self.assertEqual(events[0]['verbs'], 4)
+        self.assertEqual(events[1]['error'], 'busy')
+        self.assertEqual(metrics.counters, {
+            ('hda_codec_errors_total', (('codec', 'hwC1D0'), ('error', 'OSError'),
+                                        ('op', 'codec_reconfig'))): 1,
+        })
+        self.assertEqual(metrics.histograms[('hda_verb_write_seconds', (('codec', 'hwC1D0'),))].count, 1)
+
+
+class TraceCloseTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trace = self.root / "trace.jsonl"
+        env = mock.patch.dict('os.environ', {'HDA_TRACE': str(self.trace)})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def hooks(self, metrics):
+        return [hook for hook in metrics.hooks if isinstance(hook, JsonTraceHook)]
+
+    def test_trace_lines_and_close(self):
+        metrics = metrics_from_env()
+        hook, = self.hooks(metrics)
+        view = metrics.labelled(codec='hwC0D0')
+        view.event('codec_dump_read', 0.002)
+        metrics.close()
+        self.assertTrue(hook.file.closed)
+        self.assertEqual(view.hooks, [])
+        # Closed metrics still count, they just stop tracing
+        view.event('codec_dump_read', 0.002)
+        event, = [json.loads(line) for line in self.trace.read_text().splitlines()]
+        self.assertEqual((event['op'], event['codec'], event['seconds']),
+                         ('codec_dump_read', 'hwC0D0', 0.002))
+
+    def test_no_env(self):
+        self.assertIs(metrics_from_env({}), NULL_METRICS)
+
+    def test_controller_closes_its_own_metrics(self):
+        codec = HDCodecController(backend=SimulatedBackend(SimulatedCodec.alc298()))
+        hook, = self.hooks(codec.metrics)
+        codec.load_codec_dump()
+        codec.close()
+        self.assertTrue(hook.file.closed)
+        self.assertTrue(self.trace.read_text())
+
+    def test_controller_leaves_passed_metrics_open(self):
+        metrics = metrics_from_env()
+        self.addCleanup(metrics.close)
+        hook, = self.hooks(metrics)
+        codec = HDCodecController(backend=SimulatedBackend(SimulatedCodec.alc298()), metrics=metrics)
+        codec.close()
+        self.assertFalse(hook.file.closed)
+
+    def test_fix_codecs_closes_shared_metrics(self):
+        tree = SimulatedCodecTree(self.root)
+        created = []
+
+        def from_env():
+            created.append(metrics_from_env())
+            return created[-1]
+
+        def open_codec(location, metrics):
+            return HDCodecController(backend=tree.hwdep_backend(), metrics=metrics, location=location)
+
+        with mock.patch.object(discovery, 'metrics_from_env', from_env), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(fix_codecs(lambda codec: codec.load_codec_dump() and 0, open_codec,
+                                        root=self.root), 0)
+        self.assertTrue(self.trace.read_text())
+        self.assertEqual(self.hooks(created[0]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
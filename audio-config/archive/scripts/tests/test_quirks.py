@@ -0,0 +1,187 @@
+"""
+Quirk database tests: state table round trip, exact and codec-wide
+lookup, the marshal index cache and the decoded entry cache
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from hdacodec import quirks
+from hdacodec.quirks import compile_state, decode_state, load_quirks, lookup_quirk
+
+SPEAKER = {
+    "0x0d": {"amp_in": {"0": {"mute": False}, "1": {"mute": True, "gain": "0x1f"}}},
+    "0x17": {"amp_out": {"0": {"gain": 0x7f}}, "eapd": True, "pin_ctls": "0x40"},
+}
+
+DB = {
+    "version": 1,
+    "quirks": [
+        {"name": "book5-pro", "vendor": "Realtek", "chip": "ALC298",
+         "subsystem_id": "0x144dca08", "nodes": {"mixer": "0x0d", "speaker_pin": "0x17"},
+         "states": {"speaker": SPEAKER}},
+        {"name": "alc298", "vendor": "Realtek", "chip": "ALC298", "subsystem_id": None,
+         "nodes": {"speaker_pin": "0x17"},
+         "states": {"speaker": {"0x17": {"amp_out": {"0": {"mute": False}}}}}},
+    ],
+}
+
+
+class QuirkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = Path(tmp.name) / "quirks.json"
+        self.cache_path = Path(tmp.name) / "cache" / "quirks.bin"
+        self.write_db(DB)
+        loaded = mock.patch.dict(quirks._loaded, clear=True)
+        loaded.start()
+        self.addCleanup(loaded.stop)
+
+    def write_db(self, db):
+        self.db_path.write_text(json.dumps(db))
+
+    def lookup(self, subsystem_id, vendor="Realtek", chip="ALC298"):
+        return lookup_quirk(vendor, chip, subsystem_id, self.db_path, self.cache_path)
+
+
+class StateTableTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(decode_state(compile_state(SPEAKER)), {
+            0x0d: {'amp_in': {0: {'mute': False}, 1: {'mute': True, 'gain': 0x1f}}},
+            0x17: {'amp_out': {0: {'gain': 0x7f}}, 'eapd': True, 'pin_ctls': 0x40},
+        })
+
+    def test_unknown_field(self):
+        with self.assertRaises(ValueError):
+            compile_state({"0x17": {"volume": 3}})
+
+
+class LookupTest(QuirkTestCase):
+
+    def test_exact_subsystem_id(self):
+        for subsystem_id in ("0x144dca08", 0x144dca08, "0x144DCA08"):
+            with self.subTest(subsystem_id=subsystem_id):
+                quirk = self.lookup(subsystem_id)
+                self.assertEqual(quirk['name'], 'book5-pro')
+                self.assertEqual(quirk['nodes'], {'mixer': 0x0d, 'speaker_pin': 0x17})
+                self.assertEqual(quirk['states']['speaker'][0x17]['pin_ctls'], 0x40)
+
+    def test_codec_wide_fallback(self):
+        for subsystem_id in (0x10431234, None):
+            with self.subTest(subsystem_id=subsystem_id):
+                quirk = self.lookup(subsystem_id)
+                self.assertEqual(quirk['name'], 'alc298')
+                self.assertEqual(quirk['states'], {'speaker': {0x17: {'amp_out': {0: {'mute': False}}}}})
+
+    def test_vendor_and_chip_normalized(self):
+        self.assertEqual(self.lookup(0x144dca08, vendor=" realtek\n", chip="alc298")['name'],
+                         'book5-pro')
+
+    def test_unknown_codec(self):
+        self.assertIsNone(self.lookup(0x144dca08, chip="ALC256"))
+
+    def test_no_codec_wide_entry(self):
+        self.write_db({"quirks": DB["quirks"][:1]})
+        self.assertIsNone(self.lookup(0x10431234))
+        self.assertEqual(self.lookup(0x144dca08)['name'], 'book5-pro')
+
+    def test_duplicate_entry(self):
+        self.write_db({"quirks": DB["quirks"][:1] * 2})
+        with self.assertRaisesRegex(ValueError, "duplicate quirk"):
+            self.lookup(None)
+
+    def test_entry_decoded_once(self):
+        with mock.patch.object(quirks, 'decode_state', wraps=decode_state) as decode:
+            first = self.lookup(0x144dca08)
+            first['states']['speaker'][0x17]['eapd'] = False
+            first['nodes'].clear()
+            second = self.lookup("0x144dca08")
+            self.assertEqual(decode.call_count, 1)
+            self.lookup(None)
+            self.assertEqual(decode.call_count, 2)
+        # Each caller gets its own copy
+        self.assertIs(second['states']['speaker'][0x17]['eapd'], True)
+        self.assertEqual(second['nodes'], {'mixer': 0x0d, 'speaker_pin': 0x17})
+
+    def test_decoded_entry_dropped_on_change(self):
+        self.lookup(0x144dca08)
+        db = json.loads(json.dumps(DB))
+        db["quirks"][0]["name"] = "book5-pro-renamed"
+        self.write_db(db)
+        self.assertEqual(self.lookup(0x144dca08)['name'], 'book5-pro-renamed')
+
+
+class IndexCacheTest(QuirkTestCase):
+
+    def load(self):
+        """load_quirks() as in a fresh process; returns (index, compiled?)"""
+        quirks._loaded.clear()
+        with mock.patch.object(quirks, 'compile_quirks', wraps=quirks.compile_quirks) as compile_:
+            index = load_quirks(self.db_path, self.cache_path)
+        return index, compile_.called
+
+    def test_hit_and_miss(self):
+        index, compiled = self.load()
+        self.assertTrue(compiled)
+        self.assertTrue(self.cache_path.exists())
+
+        cached, compiled = self.load()
+        self.assertFalse(compiled)
+        self.assertEqual(cached, index)
+
+    def test_in_memory(self):
+        self.load()
+        with mock.patch.object(quirks, '_read_cache') as read_cache:
+            load_quirks(self.db_path, self.cache_path)
+        read_cache.assert_not_called()
+
+    def test_size_change_invalidates(self):
+        self.load()
+        db = json.loads(json.dumps(DB))
+        db["quirks"][0]["nodes"]["dac"] = "0x03"
+        self.write_db(db)
+        index, compiled = self.load()
+        self.assertTrue(compiled)
+        self.assertEqual(index[('realtek', 'alc298', 0x144dca08)][1]['dac'], 0x03)
+
+    def test_mtime_change_invalidates(self):
+        self.load()
+        # Same size, different content and mtime
+        db = json.loads(json.dumps(DB))
+        db["quirks"][0]["name"] = "book5-prx"
+        self.write_db(db)
+        st = self.db_path.stat()
+        os.utime(self.db_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        index, compiled = self.load()
+        self.assertTrue(compiled)
+        self.assertEqual(index[('realtek', 'alc298', 0x144dca08)][0], 'book5-prx')
+
+        _, compiled = self.load()
+        self.assertFalse(compiled)
+
+    def test_corrupt_cache_recompiled(self):
+        self.load()
+        self.cache_path.write_bytes(b"\x00not marshal")
+        _, compiled = self.load()
+        self.assertTrue(compiled)
+
+    def test_unwritable_cache_location(self):
+        self.cache_path.parent.write_text("a file where the cache directory should be")
+        _, compiled = self.load()
+        self.assertTrue(compiled)
+        self.assertEqual(list(self.cache_path.parent.parent.glob("*.tmp")), [])
+        self.assertEqual(self.lookup(None)['name'], 'alc298')
+
+
+if __name__ == '__main__':
+    unittest.main()
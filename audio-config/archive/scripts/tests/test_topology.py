@@ -0,0 +1,224 @@
+"""
+GPIO topology tests: pinctrl gpio-ranges/pins parsing, pad groups, ACPI
+pin candidates and GpioIo/GpioInt resources from sample ASL
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from gpiotools import GpioTopology, acpi_gpio_resources, load_topology, pad_group
+from gpiotools.topology import normalize_acpi_path, parse_gpio_ranges, parse_pin_names
+
+GPIO_RANGES = """\
+GPIO ranges handled:
+0: INTC1083:00 GPIOS [512 - 536] PINS [0 - 24]
+32: INTC1083:00 GPIOS [544 - 568] PINS [25 - 49]
+"""
+
+PINS = """\
+registered pins: 50
+pin 0 (GPP_B00) 0:INTC1083:00 mode 1 0x44000702 0x00000018 0x00000000 [LOCKED]
+pin 1 (GPP_B01) 1:INTC1083:00 GPIO 0x44000200 0x00000019 0x00000000
+pin 16 (GPP_B16) 16:INTC1083:00 GPIO 0x44000201 0x0000002a 0x00000000
+pin 25 (GPP_C00) 32:INTC1083:00 GPIO 0x44000200 0x0000002b 0x00000000
+pin 30 (GPPC_C_05) 37:INTC1083:00 mode 2 0x44000b00 0x00000030 0x00000000
+"""
+
+# iasl -d output: a plain GpioIo and a GpioInt carrying vendor data
+ASL = """\
+    Device (SPKR)
+    {
+        Name (_CRS, ResourceTemplate ()  // _CRS: Current Resource Settings
+        {
+            I2cSerialBusV2 (0x0038, ControllerInitiated, 0x000F4240,
+                AddressingMode7Bit, "\\\\_SB.PC00.I2C2",
+                0x00, ResourceConsumer, , Exclusive,
+                )
+            GpioIo (Exclusive, PullDefault, 0x0000, 0x0000, IoRestrictionOutputOnly,
+                "\\\\_SB.GPI0", 0x00, ResourceConsumer, ,
+                )
+                {   // Pin list
+                    0x0062
+                }
+            GpioInt (Edge, ActiveLow, ExclusiveAndWake, PullUp, 0x0000,
+                "\\\\_SB.GPI0", 0x00, ResourceConsumer, ,
+                RawDataBuffer (0x01)  // Vendor Data (trigger)
+                {
+                    0x07
+                })
+                {   // Pin list
+                    0x0010,
+                    0x0011
+                }
+            GpioIo (Shared, PullUp, 0x0000, 0x0000, IoRestrictionNone,
+                "\\\\_SB.GPI1", 0x00, ResourceConsumer, ,
+                RawDataBuffer (0x02)  // Vendor Data
+                {
+                    0x28, 0x29
+                })
+                {   // Pin list
+                    12
+                }
+        })
+    }
+"""
+
+
+def sample_topology():
+    chips = [
+        {'name': 'gpiochip512', 'base': 512, 'ngpio': 360, 'end': 871, 'label': 'INTC1083:00'},
+        {'name': 'gpiochip0', 'base': 0, 'ngpio': 64, 'end': 63, 'label': 'gpio-mockup-A'},
+    ]
+    return GpioTopology(chips, parse_gpio_ranges(GPIO_RANGES), parse_pin_names(PINS),
+                        {'_SB.GPI0': 'INTC1083:00'})
+
+
+def _summary(candidates):
+    return [(c['method'], c['chip']['label'], c['gpio'], c['confidence'],
+             c['pad'] and c['pad']['name']) for c in candidates]
+
+
+class PinctrlParseTest(unittest.TestCase):
+
+    def test_gpio_ranges(self):
+        self.assertEqual(parse_gpio_ranges(GPIO_RANGES), [
+            {'id': 0, 'controller': 'INTC1083:00', 'gpio_start': 512, 'gpio_end': 536,
+             'pin_start': 0, 'pin_end': 24},
+            {'id': 32, 'controller': 'INTC1083:00', 'gpio_start': 544, 'gpio_end': 568,
+             'pin_start': 25, 'pin_end': 49},
+        ])
+        self.assertEqual(parse_gpio_ranges("GPIO ranges handled:\n"), [])
+
+    def test_pin_names(self):
+        self.assertEqual(parse_pin_names(PINS), {
+            0: 'GPP_B00', 1: 'GPP_B01', 16: 'GPP_B16', 25: 'GPP_C00', 30: 'GPPC_C_05',
+        })
+
+    def test_pad_group(self):
+        self.assertEqual(pad_group('GPP_F02'), 'GPP_F')
+        self.assertEqual(pad_group('GPPC_B_17'), 'GPPC_B')
+        self.assertEqual(pad_group('vGPIO_0'), 'vGPIO')
+        self.assertIsNone(pad_group('GPP_B'))
+        self.assertIsNone(pad_group(None))
+        self.assertIsNone(pad_group(''))
+
+    def test_normalize_acpi_path(self):
+        for path in ('\\_SB_.GPI0', '\\_SB.GPI0', '_SB.GPI0 ', '\\\\_SB.GPI0'):
+            with self.subTest(path=path):
+                self.assertEqual(normalize_acpi_path(path), '_SB.GPI0')
+
+
+class TopologyLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.topo = sample_topology()
+
+    def test_chip_and_pad_lookups(self):
+        self.assertEqual(self.topo.chip_for_gpio(63)['label'], 'gpio-mockup-A')
+        self.assertIsNone(self.topo.chip_for_gpio(64))
+        self.assertEqual(self.topo.chip_for_gpio(871)['label'], 'INTC1083:00')
+        self.assertIsNone(self.topo.chip_for_gpio(872))
+        self.assertEqual(self.topo.pad_for_gpio(528),
+                         {'pin': 16, 'name': 'GPP_B16', 'group': 'GPP_B', 'controller': 'INTC1083:00'})
+        self.assertEqual(self.topo.pad_for_gpio(549)['group'], 'GPPC_C')
+        # Gap between the two pad groups, and a pin without a name
+        self.assertIsNone(self.topo.pad_for_gpio(540))
+        self.assertEqual(self.topo.pad_for_gpio(520)['name'], None)
+
+    def test_candidates(self):
+        self.assertEqual(_summary(self.topo.candidates(16)), [
+            ('direct_offset', 'gpio-mockup-A', 16, 'medium', None),
+            ('direct_offset', 'INTC1083:00', 528, 'high', 'GPP_B16'),
+            ('absolute', 'gpio-mockup-A', 16, 'medium', None),
+        ])
+        # Only the big controller has a line 100; nothing owns GPIO 100
+        self.assertEqual(_summary(self.topo.candidates(100)),
+                         [('direct_offset', 'INTC1083:00', 612, 'high', None)])
+        # A chip with exactly pin_number lines does not have that line
+        self.assertEqual([c['chip']['label'] for c in self.topo.candidates(64)], ['INTC1083:00'])
+        self.assertEqual(_summary(self.topo.candidates(600)),
+                         [('absolute', 'INTC1083:00', 600, 'medium', None)])
+
+    def test_resolve_many_by_controller(self):
+        by_label = self.topo.resolve_many([0x62, 0x10, 0x10, 400], 'INTC1083:00')
+        self.assertEqual(list(by_label), [16, 0x62, 400])
+        self.assertEqual(_summary(by_label[16]), [('direct_offset', 'INTC1083:00', 528, 'high', 'GPP_B16')])
+        self.assertEqual(by_label[400], [])
+        by_path = self.topo.resolve_many([0x62, 0x10, 400], '\\_SB_.GPI0')
+        self.assertEqual(by_path, by_label)
+
+    def test_resolve_many_without_controller(self):
+        for controller in (None, '\\_SB.GPI9', 'unknown:00'):
+            with self.subTest(controller=controller):
+                resolved = self.topo.resolve_many([16, 100], controller)
+                self.assertEqual(resolved, {16: self.topo.candidates(16), 100: self.topo.candidates(100)})
+
+
+class AcpiResourceTest(unittest.TestCase):
+
+    def test_resources(self):
+        self.assertEqual(acpi_gpio_resources(ASL), [
+            {'type': 'GpioIo', 'source': '\\\\_SB.GPI0', 'pins': [0x62]},
+            {'type': 'GpioInt', 'source': '\\\\_SB.GPI0', 'pins': [0x10, 0x11]},
+            {'type': 'GpioIo', 'source': '\\\\_SB.GPI1', 'pins': [12]},
+        ])
+
+    def test_resolve_resources(self):
+        topo = sample_topology()
+        io, interrupt, _ = acpi_gpio_resources(ASL)
+        resolved = topo.resolve_many(interrupt['pins'], interrupt['source'])
+        self.assertEqual([c['gpio'] for pin in (0x10, 0x11) for c in resolved[pin]], [528, 529])
+        self.assertEqual(resolved[0x10][0]['pad']['name'], 'GPP_B16')
+        self.assertEqual(topo.resolve_many(io['pins'], io['source'])[0x62][0]['gpio'], 610)
+
+    def test_truncated_or_without_pin_list(self):
+        self.assertEqual(acpi_gpio_resources("GpioIo (Exclusive, PullNone, 0, 0, , \"\\\\_SB.GPI0\","), [])
+        self.assertEqual(acpi_gpio_resources(
+            "GpioIo (Exclusive) // no pins\nGpioInt (Edge, \"GPI1\") { 3 }"),
+            [{'type': 'GpioInt', 'source': 'GPI1', 'pins': [3]}])
+
+
+class FromSysfsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.sysfs = Path(tmp.name) / "sys"
+        self.debugfs = Path(tmp.name) / "debug"
+        for name, base, ngpio, label in (('gpiochip512', '512', '360', 'INTC1083:00'),
+                                         ('gpiochip0', '0', '64', 'gpio-mockup-A'),
+                                         ('gpiochip1', '-1', '8', 'dynamic')):
+            self.write(self.sysfs / 'class/gpio' / name, base=base, ngpio=ngpio, label=label)
+        self.write(self.sysfs / 'bus/acpi/devices/INTC1083:00', path='\\_SB_.GPI0')
+        self.write(self.debugfs / 'pinctrl/INTC1083:00', **{'gpio-ranges': GPIO_RANGES, 'pins': PINS})
+
+    def write(self, directory, **files):
+        directory.mkdir(parents=True)
+        for name, text in files.items():
+            (directory / name).write_text(text + '\n')
+
+    def test_from_sysfs(self):
+        topo = GpioTopology.from_sysfs(self.sysfs, self.debugfs)
+        self.assertEqual([(c['name'], c['end']) for c in topo.chips],
+                         [('gpiochip0', 63), ('gpiochip512', 871)])
+        self.assertEqual(topo.acpi_paths, {'_SB.GPI0': 'INTC1083:00'})
+        self.assertEqual(topo.resolve_many([16], '\\_SB.GPI0'), sample_topology().resolve_many([16], '\\_SB.GPI0'))
+
+    def test_without_debugfs(self):
+        topo = GpioTopology.from_sysfs(self.sysfs, self.debugfs / "missing")
+        self.assertEqual((topo.ranges, topo.pin_names), ([], {}))
+        self.assertEqual(_summary(topo.resolve_many([16], 'INTC1083:00')[16]),
+                         [('direct_offset', 'INTC1083:00', 528, 'high', None)])
+
+    def test_load_topology_cached(self):
+        self.addCleanup(load_topology.cache_clear)
+        topo = load_topology(self.sysfs, self.debugfs)
+        self.assertIs(load_topology(self.sysfs, self.debugfs), topo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+VerbTransaction and wait_for_codec_state() tests: one write and one
+reconfig per batch, settle polling with backoff, and the timeout of a
+codec that never settles, on the sysfs backend of the ALC298 simulator
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+from hdacodec import HDCodecController, Metrics, NULL_METRICS, SimulatedCodecTree
+from hdacodec import transaction
+from hdacodec.transaction import (
+    POLL_INITIAL, POLL_MAX, expect_amp_unmuted, expect_eapd, expect_pin_ctls,
+    wait_for_codec_state,
+)
+from hdacodec.verbs import SET_AMP_GAIN_MUTE, SET_EAPD_BTLENABLE, SET_PIN_WIDGET_CONTROL
+
+MIXER = 0x0d
+SPEAKER_PIN = 0x17
+
+
+class FakeClock:
+    """Stands in for the time module: sleep() only advances monotonic()"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+class TransactionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tree = SimulatedCodecTree(tmp.name)
+        self.backend = self.tree.sysfs_backend()
+        self.codec = HDCodecController(backend=self.backend, metrics=NULL_METRICS)
+        self.addCleanup(self.codec.close)
+        self.clock = FakeClock()
+        patch = mock.patch.object(transaction, 'time', self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+        stdout = contextlib.redirect_stdout(io.StringIO())
+        stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    def lag(self, reads):
+        """Serve the pre-reconfig dump for the next `reads` dump reads"""
+        stale = self.tree.proc_path.read_text()
+        read_dump = self.backend.read_dump
+        remaining = [reads]
+
+        def lagging_read_dump():
+            if remaining[0] > 0:
+                remaining[0] -= 1
+                return stale
+            return read_dump()
+
+        self.backend.read_dump = lagging_read_dump
+
+    def speaker_txn(self, timeout=3.0):
+        txn = self.codec.transaction(timeout=timeout)
+        txn.add(MIXER, SET_AMP_GAIN_MUTE, 0x7000, expect=expect_amp_unmuted(MIXER, 'in', 0))
+        txn.add(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb000, expect=expect_amp_unmuted(SPEAKER_PIN))
+        txn.add(SPEAKER_PIN, SET_PIN_WIDGET_CONTROL, 0x40, expect=expect_pin_ctls(SPEAKER_PIN, 0x40))
+        txn.add(SPEAKER_PIN, SET_EAPD_BTLENABLE, 0x02, expect=expect_eapd(SPEAKER_PIN))
+        return txn
+
+
+class VerbTransactionTest(TransactionTestCase):
+
+    def test_one_write_one_reconfig(self):
+        calls = []
+        write_verbs, reconfigure = self.backend.write_verbs, self.backend.reconfigure
+        self.backend.write_verbs = lambda verbs: calls.append(('write', list(verbs))) or write_verbs(verbs)
+        self.backend.reconfigure = lambda: calls.append(('reconfig',)) or reconfigure()
+
+        txn = self.speaker_txn()
+        self.assertTrue(txn.commit())
+        self.assertEqual([call[0] for call in calls], ['write', 'reconfig'])
+        self.assertEqual(calls[0][1], txn.verbs)
+        self.assertIs(txn.settled, True)
+        self.assertEqual(txn.unmet, [])
+        self.assertEqual(txn.elapsed, 0.0)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertIs(self.codec.check_mixer_node_muted(MIXER)[0], False)
+
+    def test_empty_commit(self):
+        self.backend.write_verbs = mock.Mock()
+        txn = self.codec.transaction()
+        self.assertTrue(txn.commit())
+        self.assertIs(txn.settled, True)
+        self.backend.write_verbs.assert_not_called()
+
+    def test_failed_write(self):
+        self.backend.write_verbs = mock.Mock(side_effect=OSError("gone"))
+        self.backend.reconfigure = mock.Mock()
+        txn = self.speaker_txn()
+        self.assertFalse(txn.commit())
+        self.backend.reconfigure.assert_not_called()
+        self.assertIsNone(txn.settled)
+
+    def test_settles_after_lag(self):
+        self.lag(3)
+        txn = self.speaker_txn()
+        self.assertTrue(txn.commit())
+        self.assertIs(txn.settled, True)
+        self.assertEqual(self.clock.sleeps, [POLL_INITIAL, POLL_INITIAL * 2, POLL_INITIAL * 4])
+        self.assertAlmostEqual(txn.elapsed, POLL_INITIAL * 7)
+
+    def test_never_settles(self):
+        self.lag(float('inf'))
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(events.append)
+        self.codec.metrics = metrics
+
+        txn = self.speaker_txn(timeout=1.0)
+        self.assertTrue(txn.commit())
+        self.assertIs(txn.settled, False)
+        # The fixture boots with both amps muted, Pin-ctls and EAPD already on
+        self.assertEqual(txn.unmet, ["Node 0x0d Amp-In[0] unmuted", "Node 0x17 Amp-Out[0] unmuted"])
+        self.assertEqual(txn.elapsed, 1.0)
+        settle = [event for event in events if event['op'] == 'codec_settle']
+        self.assertEqual(len(settle), 1)
+        self.assertEqual((settle[0]['ok'], settle[0]['error']), (False, 'timeout'))
+        self.assertEqual(settle[0]['unmet'], txn.unmet)
+        self.assertEqual(metrics.counters[('hda_codec_errors_total',
+                                           (('error', 'timeout'), ('op', 'codec_settle')))], 1)
+
+
+class WaitForCodecStateTest(TransactionTestCase):
+
+    def test_backoff_capped_and_deadline(self):
+        self.lag(float('inf'))
+        settled, unmet, elapsed = wait_for_codec_state(
+            self.codec.load_codec_dump, [expect_amp_unmuted(SPEAKER_PIN)], timeout=0.5)
+        self.assertFalse(settled)
+        self.assertEqual(unmet, ["Node 0x17 Amp-Out[0] unmuted"])
+        self.assertEqual(elapsed, 0.5)
+        # 5, 10, 20, 40, 80 ms, then POLL_MAX until the last sleep ends on the deadline
+        self.assertEqual(self.clock.sleeps[:7], [0.005, 0.01, 0.02, 0.04, 0.08, POLL_MAX, POLL_MAX])
+        self.assertEqual(max(self.clock.sleeps), POLL_MAX)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 0.5)
+        self.assertEqual(self.clock.sleeps[-1], 0.045)
+
+    def test_no_expectations(self):
+        self.lag(float('inf'))
+        self.assertEqual(wait_for_codec_state(self.codec.load_codec_dump, [], timeout=0.5),
+                         (True, [], 0.0))
+
+    def test_zero_timeout_checks_once(self):
+        load_dump = mock.Mock(side_effect=self.codec.load_codec_dump)
+        settled, unmet, _ = wait_for_codec_state(load_dump, [expect_amp_unmuted(SPEAKER_PIN)], timeout=0)
+        self.assertFalse(settled)
+        self.assertEqual(load_dump.call_count, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_expectation_on_missing_node(self):
+        dump = self.codec.load_codec_dump()
+        for desc, check in (expect_amp_unmuted(0x7f), expect_eapd(0x7f), expect_pin_ctls(0x7f, 0x40),
+                            expect_amp_unmuted(MIXER, 'in', 5)):
+            with self.subTest(desc):
+                self.assertFalse(check(dump))
+
+
+if __name__ == '__main__':
+    unittest.main()
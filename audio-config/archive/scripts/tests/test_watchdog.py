@@ -0,0 +1,186 @@
+"""
+speaker_mute_watchdog tests: repair backoff, MAX_REPAIRS, ignoring the
+events of its own repairs and the capped debounce, on the hwdep backend of
+the ALC298 simulator
+
+Run from audio-config/archive/scripts:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import speaker_mute_watchdog
+from hdacodec import HDCodecController, NULL_METRICS, SimulatedCodecTree
+from hdacodec.verbs import SET_AMP_GAIN_MUTE
+
+SPEAKER_PIN = 0x17
+
+
+class WatchdogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.tree = SimulatedCodecTree(self.root / "codec")
+        self.dev_dir = self.root / "dev"
+        self.dev_dir.mkdir()
+        codec = HDCodecController(backend=self.tree.hwdep_backend(), metrics=NULL_METRICS)
+        self.addCleanup(codec.close)
+        self.watchdog = speaker_mute_watchdog.SpeakerWatchdog(codec, str(self.dev_dir), card=0)
+        stdout = contextlib.redirect_stdout(io.StringIO())
+        self.output = stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    def mute_speaker(self):
+        self.tree.codec.execute(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb080)
+
+    def speaker_muted(self):
+        return any(v & 0x80 for v in self.tree.codec.nodes[SPEAKER_PIN]['amp_out'][0])
+
+
+class BackoffTest(WatchdogTestCase):
+    """Repeats of one drift wait 1 s, 2 s, ... and stop after MAX_REPAIRS"""
+
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        clock = mock.patch.object(speaker_mute_watchdog, 'time',
+                                  mock.Mock(monotonic=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+        # The fixture's whole speaker path is off; repair it once so only
+        # the re-muted pin drifts from here on
+        self.assertTrue(self.watchdog.check())
+
+    def test_nothing_drifted(self):
+        self.assertEqual(self.watchdog.check(), [])
+        self.assertEqual(self.watchdog.repairs, 1)
+
+    def test_backoff_doubles(self):
+        self.mute_speaker()
+        self.assertEqual(self.watchdog.check(), [(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb000)])
+
+        for wait in (1.0, 2.0, 4.0):
+            self.mute_speaker()
+            self.assertEqual(self.watchdog.check(), [])
+            self.assertEqual(self.watchdog.repair_delay(), wait)
+            self.now += wait - 0.1
+            self.assertEqual(self.watchdog.check(), [])
+            self.assertTrue(self.speaker_muted())
+            self.now += 0.1
+            self.assertTrue(self.watchdog.check())
+            self.assertFalse(self.speaker_muted())
+
+    def test_gives_up_after_max_repairs(self):
+        for _ in range(speaker_mute_watchdog.MAX_REPAIRS):
+            self.mute_speaker()
+            self.now += speaker_mute_watchdog.BACKOFF_MAX
+            self.assertTrue(self.watchdog.check())
+        repairs = self.watchdog.repairs
+
+        self.mute_speaker()
+        self.now += speaker_mute_watchdog.BACKOFF_MAX
+        self.assertEqual(self.watchdog.check(), [])
+        self.assertEqual(self.watchdog.check(), [])
+        self.assertTrue(self.speaker_muted())
+        self.assertEqual(self.watchdog.repairs, repairs)
+        self.assertEqual(self.watchdog.repair_delay(), 0.0)
+        self.assertEqual(self.output.getvalue().count("not repairing it again"), 1)
+
+        # SIGHUP lifts it
+        self.watchdog.request_check()
+        self.assertTrue(self.watchdog.check())
+        self.assertFalse(self.speaker_muted())
+
+    def test_streak_resets_after_a_while(self):
+        for _ in range(speaker_mute_watchdog.MAX_REPAIRS):
+            self.mute_speaker()
+            self.now += speaker_mute_watchdog.BACKOFF_MAX
+            self.assertTrue(self.watchdog.check())
+        self.mute_speaker()
+        self.now += speaker_mute_watchdog.STREAK_RESET + 1
+        self.assertTrue(self.watchdog.check())
+
+    def test_dry_run_writes_nothing(self):
+        self.watchdog.dry_run = True
+        self.mute_speaker()
+        self.assertEqual(self.watchdog.check(), [(SPEAKER_PIN, SET_AMP_GAIN_MUTE, 0xb000)])
+        self.assertTrue(self.speaker_muted())
+
+
+class EventLoopTest(WatchdogTestCase):
+    """run() against inotify events on a stand-in /dev/snd"""
+
+    def _run(self, scenario, **constants):
+        patches = [mock.patch.object(speaker_mute_watchdog, name, value)
+                   for name, value in constants.items()]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        async def main():
+            task = asyncio.create_task(self.watchdog.run())
+            try:
+                await self._until(lambda: self.watchdog.checks == 1)
+                await scenario()
+            finally:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(main())
+
+    async def _until(self, condition, timeout=2.0):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not condition():
+            self.assertLess(loop.time(), deadline, "timed out")
+            await asyncio.sleep(0.01)
+
+    def _event(self, name='pcmC0D0p'):
+        path = self.dev_dir / name
+        path.touch()
+        os.utime(path)
+
+    def test_own_repair_events_ignored(self):
+        async def scenario():
+            # The initial check repaired the fixture; its echo is ignored
+            self.assertEqual(self.watchdog.repairs, 1)
+            self._event()
+            await asyncio.sleep(0.2)
+            self.assertEqual(self.watchdog.checks, 1)
+
+            await asyncio.sleep(0.4)
+            self.mute_speaker()
+            self._event()
+            await self._until(lambda: self.watchdog.checks == 2)
+            self.assertEqual(self.watchdog.repairs, 2)
+            self.assertFalse(self.speaker_muted())
+
+        self._run(scenario, DEBOUNCE=0.02, SELF_EVENT_WINDOW=0.5)
+
+    def test_event_stream_does_not_postpone_check(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            self.mute_speaker()
+            end = loop.time() + 1.5
+            # One event every 20 ms never leaves DEBOUNCE quiet
+            while loop.time() < end and self.watchdog.checks < 2:
+                self._event()
+                await asyncio.sleep(0.02)
+            self.assertEqual(self.watchdog.checks, 2)
+            self.assertFalse(self.speaker_muted())
+
+        self._run(scenario, DEBOUNCE=0.1, DEBOUNCE_MAX=0.3, SELF_EVENT_WINDOW=0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
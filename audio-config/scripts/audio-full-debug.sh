@@ -36,8 +36,14 @@ done
 
 # Try to scan I2C buses for common amplifier addresses
 echo ""
-echo "  Attempting hardware I2C scan (requires i2c-tools)..."
-if command -v i2cdetect >/dev/null 2>&1; then
+GPIOTOOLS_DIR="$(dirname "$0")/../archive/scripts"
+if [ -f "$GPIOTOOLS_DIR/gpiotools/i2c.py" ] && command -v python3 >/dev/null 2>&1; then
+    echo "  Probing amplifier addresses on all buses..."
+    (cd "$GPIOTOOLS_DIR" && sudo python3 -m gpiotools.i2c \
+        --addr 0x38 --addr 0x39 --addr 0x40 --addr 0x41 --addr 0x42 --addr 0x43) \
+        && echo "      ^ Possible audio amp (MAX98390 0x38/0x39, others 0x40-0x43)"
+elif command -v i2cdetect >/dev/null 2>&1; then
+    echo "  Attempting hardware I2C scan (requires i2c-tools)..."
     for i in $(seq 0 10); do
         if [ -e "/dev/i2c-$i" ]; then
             echo "    Bus $i:"
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Scan raw ACPI tables for WMI, EC and battery objects without iasl
+
+analyze_acpi.sh needs every table decompiled to .dsl and then greps the
+text once per pattern. This scanner memory-maps the binary AML (falling
+back to read() where mmap is not supported, e.g. sysfs) and runs ONE
+compiled multi-pattern regex over each table, matching the encoded AML:
+
+  _WDG buffers     NameOp "_WDG" BufferOp    (decoded with decode_wmi_guid)
+  WMI GUIDs        the 16-byte bytes_le form of each GUID
+  Devices/Scopes   DeviceOp/ScopeOp + PkgLength + NameString
+  Methods          MethodOp + PkgLength + NameString + MethodFlags
+  EC _HID          EisaId("PNP0C09") as DWordConst, or the string form
+
+Device and scope extents (from their PkgLength) give each hit its
+enclosing namespace path. This is a pattern scan, not an AML parser:
+byte sequences inside data buffers can occasionally look like opcodes.
+
+Usage:
+  acpi_scan.py                               # /sys/firmware/acpi/tables
+  acpi_scan.py dsdt.dat ssdt*.dat --json
+  acpi_scan.py acpi.out --guid 05901221-D566-11D1-B2F0-00A0C9062910
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import uuid
+
+from decode_wmi_guid import (
+    AML_TABLES, buffer_at, decode_wdg, iter_tables, load_tables, pkg_length, WDG_ENTRY
+)
+
+ACPI_TABLES_DIR = '/sys/firmware/acpi/tables'
+
+# Samsung GUIDs from WMI_ANALYSIS.md
+SAMSUNG_GUIDS = (
+    'C16C47BA-50E3-444A-AF3A-B1C348380002',
+    'A6FEA33E-DABF-46F5-BFC8-460D961BEC9F',
+)
+
+BATTERY_METHODS = {'_BST', '_BIF', '_BIX', '_BTP', '_BMC', '_BCT', '_BTM', '_BMD',
+                   '_BMA', '_BMS', '_BTH', 'GBAT', 'SBAT', 'BMAX', 'BSET'}
+_BATTERY_RE = re.compile(r'BAT|CHG|CHRG')
+_WMI_METHOD_RE = re.compile(r'^W[MQS][0-9A-Z]{2}$|^_WED$')
+_EC_NAME_RE = re.compile(r'EC')
+
+# PkgLength: lead byte bits 7-6 give the number of following bytes
+_PKG = rb'(?:[\x00-\x3f]|[\x40-\x7f][\x00-\xff]|[\x80-\xbf][\x00-\xff]{2}|[\xc0-\xff][\x00-\xff]{3})'
+# Lookahead for the first byte of a NameString
+_NAME_START = rb'(?=[\\^\x2e\x2fA-Z_])'
+_SEG_RE = re.compile(rb'[A-Z_][A-Z0-9_]{3}')
+
+# EisaId("PNP0C09") = 0x090CD041 as DWordConst, or _HID as a string
+EC_HID_PATTERNS = (b'\x0c\x41\xd0\x0c\x09', b'PNP0C09\x00')
+
+
+def build_pattern(guids):
+    """One alternation regex for every object of interest"""
+    alternatives = [
+        rb'(?P<wdg>\x08(?:\\|\^*)?_WDG\x11)',
+        rb'(?P<device>\x5b\x82' + _PKG + rb')' + _NAME_START,
+        rb'(?P<scope>\x10' + _PKG + rb')' + _NAME_START,
+        rb'(?P<method>\x14' + _PKG + rb')' + _NAME_START,
+        rb'(?P<ec_hid>' + b'|'.join(re.escape(p) for p in EC_HID_PATTERNS) + rb')',
+    ]
+    first = {0x08, 0x5b, 0x10, 0x14} | {p[0] for p in EC_HID_PATTERNS}
+    if guids:
+        guid_bytes = [uuid.UUID(g).bytes_le for g in guids]
+        first |= {g[0] for g in guid_bytes}
+        alternatives.append(rb'(?P<guid>' + b'|'.join(re.escape(g) for g in guid_bytes) + rb')')
+    # A leading first-byte class lets the engine skip non-candidate
+    # positions instead of trying every alternative at every byte
+    first_class = b'[' + b''.join(re.escape(bytes([c])) for c in sorted(first)) + b']'
+    return re.compile(b'(?=' + first_class + b')(?:' + b'|'.join(alternatives) + b')')
+
+
+def name_string(view, pos):
+    """
+    Decode an AML NameString at pos
+    Returns: (prefix, [segments], end), or None if it is not a valid name
+    """
+    start = pos
+    while pos < len(view) and view[pos] in (0x5c, 0x5e):    # \ and ^
+        pos += 1
+    prefix = bytes(view[start:pos]).decode('ascii')
+    if pos >= len(view):
+        return None
+    lead = view[pos]
+    if lead == 0x00:                                        # NullName
+        return prefix, [], pos + 1
+    if lead == 0x2e:                                        # DualNamePrefix
+        count, pos = 2, pos + 1
+    elif lead == 0x2f:                                      # MultiNamePrefix
+        if pos + 1 >= len(view):
+            return None
+        count, pos = view[pos + 1], pos + 2
+    else:
+        count = 1
+    segs = []
+    for _ in range(count):
+        seg = bytes(view[pos:pos + 4])
+        if not _SEG_RE.fullmatch(seg):
+            return None
+        segs.append(seg.decode('ascii').rstrip('_') or '_')
+        pos += 4
+    return prefix, segs, pos
+
+
+def join_path(parent, prefix, segs):
+    """Resolve a NameString against the enclosing scope path"""
+    if prefix.startswith('\\'):
+        parts = []
+    else:
+        parts = [p for p in parent.lstrip('\\').split('.') if p]
+        for _ in prefix:
+            if parts:
+                parts.pop()
+    return '\\' + '.'.join(parts + segs)
+
+
+def _open_table(path):
+    """mmap a table file; sysfs table attributes do not support mmap"""
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return f.read()
+
+
+def iter_table_files(paths):
+    """Yield (file, signature, table view) for files, directories and acpidump text"""
+    for path in paths:
+        if os.path.isdir(path):
+            files = []
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names))
+            yield from iter_table_files(files)
+            continue
+        try:
+            data = _open_table(path)
+        except OSError as e:
+            print(f"WARNING: Could not read {path}: {e}", file=sys.stderr)
+            continue
+        tables = list(iter_tables(data))
+        if tables:
+            for signature, table in tables:
+                yield path, signature, table
+        elif len(data):
+            # acpidump text output
+            yield from load_tables(path)
+
+
+def scan_table(table, pattern):
+    """
+    One pass over a DSDT/SSDT
+    Returns: list of hit dicts ({'kind', 'offset', 'path', ...})
+    """
+    view = memoryview(table)
+    hits = []
+    scopes = []     # [(end, path)] open Device/Scope extents
+
+    def current(offset):
+        while scopes and scopes[-1][0] <= offset:
+            scopes.pop()
+        return scopes[-1][1] if scopes else '\\'
+
+    for m in pattern.finditer(view):
+        kind = m.lastgroup
+        offset = m.start()
+        parent = current(offset)
+
+        if kind in ('device', 'scope', 'method'):
+            pkg_start = offset + (2 if kind == 'device' else 1)
+            length, _ = pkg_length(view, pkg_start)
+            name = name_string(view, m.end())
+            end = pkg_start + length
+            if name is None or end > len(view) or end <= m.end():
+                continue
+            prefix, segs, name_end = name
+            path = join_path(parent, prefix, segs)
+            if kind == 'method':
+                if name_end >= end:
+                    continue
+                hits.append({'kind': 'method', 'offset': offset, 'path': path,
+                             'name': segs[-1] if segs else '', 'args': view[name_end] & 0x7})
+            else:
+                scopes.append((end, path))
+                if kind == 'device':
+                    hits.append({'kind': 'device', 'offset': offset, 'path': path,
+                                 'name': segs[-1] if segs else ''})
+        elif kind == 'wdg':
+            found = buffer_at(view, m.end())
+            if found:
+                data_offset, data = found
+                usable = len(data) - len(data) % WDG_ENTRY.size
+                hits.append({'kind': 'wdg', 'offset': offset, 'path': join_path(parent, '', ['_WDG']),
+                             'entries': decode_wdg(data[:usable], base=data_offset)})
+        elif kind == 'ec_hid':
+            hits.append({'kind': 'ec_hid', 'offset': offset, 'path': parent})
+        elif kind == 'guid':
+            guid = uuid.UUID(bytes_le=bytes(m.group('guid')))
+            hits.append({'kind': 'guid', 'offset': offset, 'path': parent,
+                         'guid': str(guid).upper()})
+    return hits
+
+
+def summarize(hits):
+    """Select the interesting hits: WMI, EC and battery objects"""
+    ec_paths = {h['path'] for h in hits if h['kind'] == 'ec_hid'}
+    result = {'wdg': [], 'guids': [], 'ec_devices': [], 'battery_methods': [], 'wmi_methods': []}
+    for hit in hits:
+        kind = hit['kind']
+        if kind == 'wdg':
+            result['wdg'].append(hit)
+        elif kind == 'guid':
+            result['guids'].append(hit)
+        elif kind == 'device':
+            if hit['path'] in ec_paths or _EC_NAME_RE.search(hit['name']):
+                result['ec_devices'].append(dict(hit, pnp0c09=hit['path'] in ec_paths))
+        elif kind == 'method':
+            name, path = hit['name'], hit['path']
+            if name in BATTERY_METHODS or _BATTERY_RE.search(path):
+                result['battery_methods'].append(hit)
+            if _WMI_METHOD_RE.match(name):
+                result['wmi_methods'].append(hit)
+    return result
+
+
+def scan(paths, guids=SAMSUNG_GUIDS):
+    """Scan every AML table under paths; returns [{'file', 'table', 'seconds', ...}]"""
+    pattern = build_pattern(guids)
+    results = []
+    for name, signature, table in iter_table_files(paths):
+        if signature.encode() not in AML_TABLES:
+            continue
+        start = time.perf_counter()
+        hits = scan_table(table, pattern)
+        result = summarize(hits)
+        result.update(file=name, table=signature, size=len(table),
+                      seconds=time.perf_counter() - start)
+        results.append(result)
+    return results
+
+
+def as_json(results):
+    """Results with the _WDG entries (NamedTuples) as dicts"""
+    return [dict(r, wdg=[dict(hit, entries=[e.as_dict() for e in hit['entries']])
+                         for hit in r['wdg']])
+            for r in results]
+
+
+def print_results(results):
+    for r in results:
+        print(f"=== {r['file']} ({r['table']}, {r['size']} bytes, "
+              f"{r['seconds'] * 1000:.1f} ms) ===")
+        for hit in r['wdg']:
+            print(f"  _WDG     0x{hit['offset']:06X}  {hit['path']}")
+            for entry in hit['entries']:
+                print(f"             {str(entry.guid).upper()} -> {entry.acpi_method}")
+        for hit in r['guids']:
+            print(f"  GUID     0x{hit['offset']:06X}  {hit['guid']} in {hit['path']}")
+        for hit in r['ec_devices']:
+            hid = " (PNP0C09)" if hit['pnp0c09'] else ""
+            print(f"  EC       0x{hit['offset']:06X}  {hit['path']}{hid}")
+        for hit in r['battery_methods']:
+            print(f"  Battery  0x{hit['offset']:06X}  {hit['path']} ({hit['args']} args)")
+        for hit in r['wmi_methods']:
+            print(f"  WMI      0x{hit['offset']:06X}  {hit['path']} ({hit['args']} args)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan ACPI tables for WMI/EC/battery objects")
+    parser.add_argument('paths', nargs='*', default=[ACPI_TABLES_DIR],
+                        help=f"Table files, directories or acpidump text (default {ACPI_TABLES_DIR})")
+    parser.add_argument('--guid', action='append', default=[],
+                        help="Additional GUID to locate (repeatable)")
+    parser.add_argument('--json', action='store_true', help="Print JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = scan(args.paths, SAMSUNG_GUIDS + tuple(args.guid))
+    if args.json:
+        print(json.dumps(as_json(results), indent=2))
+    else:
+        print_results(results)
+        print(f"\n{len(results)} AML tables scanned in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
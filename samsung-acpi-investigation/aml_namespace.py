@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""AML namespace index with cached lookups
+
+Parses the definition blocks of each DSDT/SSDT once into namespace
+nodes (scopes, devices, methods with argument counts, named buffers,
+packages, integers, strings, operation regions and field units) plus,
+per method, the names its body references.
+
+Each table's index is persisted with marshal under a key derived from
+the table contents (signature + BLAKE2 digest), so a later run only
+hashes the tables and loads the cached indexes. Tables are merged into
+one namespace and method references are resolved with the AML search
+rules, which answers queries like "all methods under
+\\_SB.PC00.LPCB.H_EC" or "who calls WM01" without re-parsing.
+
+Method bodies are not decoded: names referenced inside them are picked
+up as NameStrings, so "calls" means "references" (a Store to a method
+name shows up too). Code outside methods that cannot be sized (e.g.
+an If predicate) is skipped up to the next valid definition.
+
+Usage:
+  aml_namespace.py --under '\\_SB.PC00.LPCB.H_EC' --type Method
+  aml_namespace.py --callers WM01
+  aml_namespace.py --find 'BAT|_BST' dsdt.dat ssdt*.dat
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+from acpi_scan import ACPI_TABLES_DIR, iter_table_files, join_path, name_string
+from decode_wmi_guid import ACPI_HEADER, AML_TABLES, buffer_at, pkg_length
+from marshal_cache import default_cache_dir as _cache_dir, read_cache, write_cache
+
+INDEX_CACHE_ENV = 'AML_INDEX_CACHE'
+INDEX_FORMAT = 1
+
+NAME_OP = 0x08
+ALIAS_OP = 0x06
+SCOPE_OP = 0x10
+BUFFER_OP = 0x11
+PACKAGE_OP = 0x12
+VAR_PACKAGE_OP = 0x13
+METHOD_OP = 0x14
+EXTERNAL_OP = 0x15
+STRING_PREFIX = 0x0d
+IF_OP = 0xa0
+ELSE_OP = 0xa1
+WHILE_OP = 0xa2
+EXT_OP = 0x5b
+
+EXT_MUTEX = 0x01
+EXT_EVENT = 0x02
+EXT_OPREGION = 0x80
+EXT_FIELD = 0x81
+EXT_DEVICE = 0x82
+EXT_PROCESSOR = 0x83
+EXT_POWER_RES = 0x84
+EXT_THERMAL_ZONE = 0x85
+EXT_INDEX_FIELD = 0x86
+EXT_BANK_FIELD = 0x87
+
+# Containers: node type and fixed bytes between the name and the TermList
+_EXT_CONTAINERS = {
+    EXT_DEVICE: ('Device', 0),
+    EXT_THERMAL_ZONE: ('ThermalZone', 0),
+    EXT_POWER_RES: ('PowerResource', 3),     # SystemLevel, ResourceOrder
+    EXT_PROCESSOR: ('Processor', 6),         # ProcID, PblkAddr, PblkLen
+}
+_INT_SIZES = {0x0a: 1, 0x0b: 2, 0x0c: 4, 0x0e: 8}
+
+# NameStrings inside method bodies
+_SEG = rb'[A-Z_][A-Z0-9_]{3}'
+_NAME_REF_RE = re.compile(
+    rb'(\\|\^+)?(?:\x2e(' + _SEG + _SEG + rb')|\x2f([\x03-\x7f])((?:' + _SEG + rb')+)|(' + _SEG + rb'))')
+
+_SEG_RE = re.compile(r'^[A-Z_][A-Z0-9_]{0,3}$')
+
+
+def default_cache_dir():
+    """$AML_INDEX_CACHE, else $XDG_CACHE_HOME/aml-namespace"""
+    return _cache_dir(INDEX_CACHE_ENV, "aml-namespace")
+
+
+def table_key(signature, table):
+    """Cache key of a table: signature plus a digest of its bytes"""
+    return f"{signature}-{hashlib.blake2b(table, digest_size=10).hexdigest()}"
+
+
+def _seg_name(seg):
+    return seg.decode('ascii').rstrip('_') or '_'
+
+
+def _method_refs(body):
+    """Distinct NameStrings referenced in a method body, as '\\A.B', '^A' or 'A'"""
+    refs = set()
+    for m in _NAME_REF_RE.finditer(body):
+        prefix = (m.group(1) or b'').decode('ascii')
+        if m.group(2):
+            raw = m.group(2)
+            segs = [raw[:4], raw[4:]]
+        elif m.group(3):
+            raw = m.group(4)
+            count = min(m.group(3)[0], len(raw) // 4)
+            segs = [raw[i * 4:i * 4 + 4] for i in range(count)]
+        else:
+            segs = [m.group(5)]
+        refs.add(prefix + '.'.join(_seg_name(s) for s in segs))
+    return sorted(refs)
+
+
+class _TableParser:
+    """Walks the definition blocks of one table"""
+
+    def __init__(self, table):
+        self.view = memoryview(table)
+        self.nodes = {}         # path -> (type, offset, info)
+        self.refs = {}          # method path -> [name strings]
+
+    def add(self, path, kind, offset, info=None):
+        # A Scope re-opens an existing object; never let it replace one
+        if kind == 'Scope' and path in self.nodes:
+            return
+        self.nodes.setdefault(path, (kind, offset, info))
+
+    def _name(self, pos, scope):
+        name = name_string(self.view, pos)
+        if name is None or not name[1]:
+            return None
+        prefix, segs, end = name
+        return join_path(scope, prefix, segs), end
+
+    def _pkg(self, pos, limit):
+        """(end of the package, position after PkgLength), or None"""
+        length, used = pkg_length(self.view, pos)
+        end = pos + length
+        if end > limit or length < used:
+            return None
+        return end, pos + used
+
+    def _integer(self, pos):
+        op = self.view[pos]
+        if op in (0x00, 0x01):
+            return op, pos + 1
+        if op == 0xff:
+            return 0xffffffffffffffff, pos + 1
+        size = _INT_SIZES.get(op)
+        if size is None:
+            return None
+        return int.from_bytes(self.view[pos + 1:pos + 1 + size], 'little'), pos + 1 + size
+
+    def parse(self, start, end, scope='\\'):
+        pos = start
+        while pos < end:
+            try:
+                nxt = self._term(pos, end, scope)
+            except (IndexError, UnicodeDecodeError):
+                nxt = None
+            # Not a definition we can size: resync on the next byte
+            pos = nxt if nxt is not None and nxt > pos else pos + 1
+
+    def _term(self, pos, end, scope):
+        view = self.view
+        op = view[pos]
+
+        if op == SCOPE_OP:
+            pkg = self._pkg(pos + 1, end)
+            name = pkg and self._name(pkg[1], scope)
+            if not name:
+                return None
+            path, body = name
+            self.add(path, 'Scope', pos)
+            self.parse(body, pkg[0], path)
+            return pkg[0]
+
+        if op == METHOD_OP:
+            pkg = self._pkg(pos + 1, end)
+            name = pkg and self._name(pkg[1], scope)
+            if not name or name[1] >= pkg[0]:
+                return None
+            path, flags_pos = name
+            flags = view[flags_pos]
+            self.add(path, 'Method', pos, {'args': flags & 0x7, 'serialized': bool(flags & 0x8)})
+            refs = _method_refs(view[flags_pos + 1:pkg[0]])
+            if refs:
+                self.refs[path] = refs
+            return pkg[0]
+
+        if op == NAME_OP:
+            name = self._name(pos + 1, scope)
+            if not name:
+                return None
+            path, data = name
+            return self._data_object(path, pos, data, end)
+
+        if op == EXT_OP:
+            return self._ext_term(pos, end, scope)
+
+        if op in (IF_OP, ELSE_OP, WHILE_OP):
+            # If/While predicates are expressions we do not size: the
+            # resync inside the body still finds its definitions
+            pkg = self._pkg(pos + 1, end)
+            if not pkg:
+                return None
+            self.parse(pkg[1], pkg[0], scope)
+            return pkg[0]
+
+        if op == ALIAS_OP:
+            source = self._name(pos + 1, scope)
+            alias = source and self._name(source[1], scope)
+            if not alias:
+                return None
+            self.add(alias[0], 'Alias', pos, {'target': source[0]})
+            return alias[1]
+
+        if op == EXTERNAL_OP:
+            name = self._name(pos + 1, scope)
+            return name[1] + 2 if name else None
+
+        return None
+
+    def _data_object(self, path, pos, data, end):
+        view = self.view
+        op = view[data]
+        if op == BUFFER_OP:
+            pkg = self._pkg(data + 1, end)
+            found = pkg and buffer_at(view, data + 1)
+            if not found:
+                return None
+            self.add(path, 'Buffer', pos, {'size': len(found[1])})
+            return pkg[0]
+        if op in (PACKAGE_OP, VAR_PACKAGE_OP):
+            pkg = self._pkg(data + 1, end)
+            if not pkg:
+                return None
+            count = view[pkg[1]] if op == PACKAGE_OP else None
+            self.add(path, 'Package', pos, {'count': count})
+            return pkg[0]
+        if op == STRING_PREFIX:
+            nul = bytes(view[data + 1:end]).find(b'\x00')
+            if nul < 0:
+                return None
+            value = bytes(view[data + 1:data + 1 + nul]).decode('ascii', 'replace')
+            self.add(path, 'String', pos, {'value': value})
+            return data + 2 + nul
+        integer = self._integer(data)
+        if integer:
+            self.add(path, 'Integer', pos, {'value': integer[0]})
+            return integer[1]
+        self.add(path, 'Name', pos)
+        return None
+
+    def _ext_term(self, pos, end, scope):
+        view = self.view
+        ext = view[pos + 1]
+
+        if ext in _EXT_CONTAINERS:
+            kind, fixed = _EXT_CONTAINERS[ext]
+            pkg = self._pkg(pos + 2, end)
+            name = pkg and self._name(pkg[1], scope)
+            if not name or name[1] + fixed > pkg[0]:
+                return None
+            path, body = name
+            self.add(path, kind, pos)
+            self.parse(body + fixed, pkg[0], path)
+            return pkg[0]
+
+        if ext == EXT_OPREGION:
+            name = self._name(pos + 2, scope)
+            if not name:
+                return None
+            path, space_pos = name
+            info = {'space': view[space_pos]}
+            # RegionOffset/RegionLen are TermArgs; decode them when constant
+            offset = self._integer(space_pos + 1)
+            length = offset and self._integer(offset[1])
+            if length:
+                info.update(offset=offset[0], length=length[0])
+            self.add(path, 'OperationRegion', pos, info)
+            return length[1] if length else space_pos + 1
+
+        if ext in (EXT_FIELD, EXT_INDEX_FIELD, EXT_BANK_FIELD):
+            pkg = self._pkg(pos + 2, end)
+            if not pkg:
+                return None
+            self._field_list(ext, pkg[1], pkg[0], scope)
+            return pkg[0]
+
+        if ext == EXT_MUTEX:
+            name = self._name(pos + 2, scope)
+            if not name:
+                return None
+            self.add(name[0], 'Mutex', pos)
+            return name[1] + 1
+
+        if ext == EXT_EVENT:
+            name = self._name(pos + 2, scope)
+            if not name:
+                return None
+            self.add(name[0], 'Event', pos)
+            return name[1]
+
+        return None
+
+    def _field_list(self, ext, pos, end, scope):
+        """Record the named field units of a Field/IndexField/BankField"""
+        region = self._name(pos, scope)
+        if not region:
+            return
+        pos = region[1]
+        if ext == EXT_INDEX_FIELD:
+            data = self._name(pos, scope)       # IndexName, DataName
+            if not data:
+                return
+            pos = data[1]
+        elif ext == EXT_BANK_FIELD:
+            bank = self._name(pos, scope)       # BankName, BankValue TermArg
+            value = bank and self._integer(bank[1])
+            if not value:
+                return
+            pos = value[1]
+        pos += 1                                # FieldFlags
+        bit = 0
+        view = self.view
+        while pos < end:
+            lead = view[pos]
+            if lead == 0x00:                    # ReservedField
+                width, used = pkg_length(view, pos + 1)
+                bit += width
+                pos += 1 + used
+            elif lead == 0x01:                  # AccessField
+                pos += 3
+            elif lead == 0x03:                  # ExtendedAccessField
+                pos += 4
+            elif lead == 0x02:                  # ConnectField
+                if view[pos + 1] == BUFFER_OP:
+                    pkg = self._pkg(pos + 2, end)
+                    if not pkg:
+                        return
+                    pos = pkg[0]
+                else:
+                    name = self._name(pos + 1, scope)
+                    if not name:
+                        return
+                    pos = name[1]
+            else:                               # NamedField
+                seg = bytes(view[pos:pos + 4])
+                width, used = pkg_length(view, pos + 4)
+                try:
+                    name = _seg_name(seg)
+                except UnicodeDecodeError:
+                    return
+                if not _SEG_RE.match(name):
+                    return
+                self.add(join_path(scope, '', [name]), 'Field', pos,
+                         {'region': region[0], 'bit': bit, 'bits': width})
+                bit += width
+                pos += 4 + used
+
+
+def parse_table(table):
+    """
+    Parse one DSDT/SSDT
+    Returns: {'nodes': {path: (type, offset, info)}, 'refs': {method: [names]}}
+    """
+    parser = _TableParser(table)
+    parser.parse(ACPI_HEADER.size, len(table))
+    return {'nodes': parser.nodes, 'refs': parser.refs}
+
+
+def load_table_index(signature, table, cache_dir=None):
+    """
+    Index of one table, from the cache or a fresh parse
+    Returns: (index dict, True if it came from the cache)
+    """
+    key = table_key(signature, table)
+    cache_path = None
+    if cache_dir is not False:
+        cache_path = Path(cache_dir or default_cache_dir()) / f"{key}.idx"
+        index = read_cache(cache_path, INDEX_FORMAT)
+        if index is not None:
+            return index, True
+    index = parse_table(table)
+    index.update(format=INDEX_FORMAT, key=key, signature=signature)
+    if cache_path is not None:
+        write_cache(cache_path, index)
+    return index, False
+
+
+class Namespace:
+    """
+    Merged namespace of several tables
+
+    Nodes are {path: {'type', 'table', 'offset', ...info}}; paths are
+    absolute ('\\_SB.PC00.LPCB.H_EC.GBAT').
+    """
+
+    def __init__(self, indexes=()):
+        self.nodes = {}
+        self.refs = {}
+        self.tables = []
+        for index in indexes:
+            self.add_table(index)
+        self._paths = None
+        self._callers = None
+
+    def add_table(self, index):
+        self.tables.append(index['key'])
+        for path, (kind, offset, info) in index['nodes'].items():
+            existing = self.nodes.get(path)
+            if existing and (kind == 'Scope' or existing['type'] != 'Scope'):
+                continue
+            node = {'type': kind, 'table': index['key'], 'offset': offset}
+            node.update(info or {})
+            self.nodes[path] = node
+        for method, refs in index['refs'].items():
+            self.refs.setdefault(method, []).extend(refs)
+        self._paths = None
+        self._callers = None
+
+    @property
+    def paths(self):
+        if self._paths is None:
+            self._paths = sorted(self.nodes)
+        return self._paths
+
+    def under(self, path, kind=None):
+        """All nodes below a path (any depth), optionally of one type"""
+        path = normalize_path(path)
+        prefix = path.rstrip('.') + '.' if path != '\\' else '\\'
+        paths = self.paths
+        result = []
+        for i in range(bisect.bisect_left(paths, prefix), len(paths)):
+            p = paths[i]
+            if not p.startswith(prefix):
+                break
+            if kind is None or self.nodes[p]['type'] == kind:
+                result.append(p)
+        return result
+
+    def find(self, pattern, kind=None):
+        """Nodes whose last name segment matches a regex"""
+        regex = re.compile(pattern)
+        return [p for p in self.paths
+                if regex.search(p.rsplit('.', 1)[-1].lstrip('\\'))
+                and (kind is None or self.nodes[p]['type'] == kind)]
+
+    def resolve(self, ref, scope):
+        """Resolve a NameString as referenced from scope (AML search rules)"""
+        if ref.startswith('\\'):
+            path = normalize_path(ref)
+            return path if path in self.nodes else None
+        prefix = len(ref) - len(ref.lstrip('^'))
+        segs = ref[prefix:].split('.')
+        if prefix or len(segs) > 1:
+            path = join_path(scope, '^' * prefix, segs)
+            return path if path in self.nodes else None
+        # Single segment: search the scope, then every parent up to root
+        parts = [p for p in scope.lstrip('\\').split('.') if p]
+        while True:
+            path = '\\' + '.'.join(parts + segs)
+            if path in self.nodes:
+                return path
+            if not parts:
+                return None
+            parts.pop()
+
+    def callers(self, target):
+        """Methods whose body references the target method (path or name)"""
+        if self._callers is None:
+            self._callers = {}
+            for method, refs in self.refs.items():
+                for ref in refs:
+                    path = self.resolve(ref, method)
+                    if path and path != method and self.nodes[path]['type'] == 'Method':
+                        self._callers.setdefault(path, set()).add(method)
+        if target.startswith('\\'):
+            targets = [normalize_path(target)]
+        else:
+            targets = self.find(f"^{re.escape(target)}$", 'Method')
+        return {t: sorted(self._callers.get(t, ())) for t in targets}
+
+
+def normalize_path(path):
+    """'\\_SB_.PC00' and '_SB.PC00' -> '\\_SB.PC00'"""
+    segs = [s.rstrip('_') or '_' for s in path.strip().lstrip('\\').split('.') if s]
+    return '\\' + '.'.join(segs)
+
+
+def load_namespace(paths=(ACPI_TABLES_DIR,), cache_dir=None):
+    """
+    Namespace of every DSDT/SSDT under paths
+    Returns: (Namespace, number of tables loaded from cache)
+    """
+    indexes = []
+    cached = 0
+    for name, signature, table in iter_table_files(paths):
+        if signature.encode() not in AML_TABLES:
+            continue
+        index, hit = load_table_index(signature, table, cache_dir)
+        cached += hit
+        indexes.append(index)
+    return Namespace(indexes), cached
+
+
+def _describe(path, node):
+    info = ''
+    if node['type'] == 'Method':
+        info = f" ({node['args']} args{', serialized' if node['serialized'] else ''})"
+    elif node['type'] == 'Buffer':
+        info = f" ({node['size']} bytes)"
+    elif node['type'] in ('Integer', 'String'):
+        value = node['value']
+        info = f" = 0x{value:X}" if isinstance(value, int) else f" = \"{value}\""
+    elif node['type'] == 'Field':
+        info = f" ({node['region']} bit {node['bit']}, {node['bits']} bits)"
+    return f"  {node['type']:<15} {path}{info}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the AML namespace of ACPI tables")
+    parser.add_argument('paths', nargs='*', default=[ACPI_TABLES_DIR],
+                        help=f"Table files, directories or acpidump text (default {ACPI_TABLES_DIR})")
+    parser.add_argument('--under', metavar='PATH', help="List nodes below a namespace path")
+    parser.add_argument('--find', metavar='REGEX', help="List nodes whose name matches")
+    parser.add_argument('--callers', metavar='METHOD', help="Methods referencing a method")
+    parser.add_argument('--type', help="Only nodes of this type (Method, Device, Buffer, ...)")
+    parser.add_argument('--no-cache', action='store_true', help="Parse without the index cache")
+    parser.add_argument('--json', action='store_true', help="Print JSON")
+    args = parser.parse_args(argv)
+
+    ns, cached = load_namespace(args.paths, cache_dir=False if args.no_cache else None)
+    if not ns.tables:
+        print("No DSDT/SSDT tables found")
+        return 1
+
+    if args.callers:
+        result = ns.callers(args.callers)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        elif not result:
+            print(f"No method named {args.callers}")
+        for target, callers in ([] if args.json else result.items()):
+            print(f"{target}: {len(callers)} caller(s)")
+            for caller in callers:
+                print(f"  {caller}")
+        return 0 if result else 1
+
+    if args.under:
+        selected = ns.under(args.under, args.type)
+    elif args.find:
+        selected = ns.find(args.find, args.type)
+    else:
+        selected = [p for p in ns.paths if args.type is None or ns.nodes[p]['type'] == args.type]
+
+    if args.json:
+        print(json.dumps({p: ns.nodes[p] for p in selected}, indent=2))
+    else:
+        for path in selected:
+            print(_describe(path, ns.nodes[path]))
+        print(f"\n{len(selected)} of {len(ns.nodes)} nodes; {len(ns.tables)} tables "
+              f"({cached} from cache)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
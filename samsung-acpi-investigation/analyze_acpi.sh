@@ -6,11 +6,20 @@ echo "========================================="
 echo ""
 
 INVESTIGATION_DIR="$HOME/dev/drivers/samsung-acpi-investigation"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 cd "$INVESTIGATION_DIR"
 
 if [ ! -f "dsdt.dsl" ] && [ ! -f "DSDT.dsl" ]; then
+    if [ -r /sys/firmware/acpi/tables/DSDT ] && command -v python3 >/dev/null 2>&1; then
+        # No decompiled tables: scan the raw AML directly (no iasl needed)
+        echo "dsdt.dsl not found, scanning /sys/firmware/acpi/tables instead"
+        echo ""
+        python3 "$SCRIPT_DIR/acpi_scan.py" | tee acpi_analysis.txt
+        exit "${PIPESTATUS[0]}"
+    fi
     echo "ERROR: dsdt.dsl not found!"
-    echo "Please run extract_all.sh first to decompile ACPI tables."
+    echo "Please run extract_all.sh first to decompile ACPI tables,"
+    echo "or run acpi_scan.py as root on the raw tables."
     exit 1
 fi
 
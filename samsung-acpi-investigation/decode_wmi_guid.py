@@ -1,30 +1,288 @@
 #!/usr/bin/env python3
-"""Decode WMI GUID from ACPI buffer"""
+"""Decode WMI GUID blocks (_WDG) from ACPI buffers and firmware dumps
+
+A _WDG buffer is an array of 20-byte struct guid_block entries
+(drivers/platform/x86/wmi.c):
+
+  16 bytes  GUID, in the little-endian (bytes_le) layout
+   2 bytes  object ID (ASCII, e.g. "01" -> method WM01) or, for events,
+            notify ID + reserved
+   1 byte   instance count
+   1 byte   flags: 0x1 expensive, 0x2 method, 0x4 string, 0x8 event
+
+decode_wdg() unpacks a whole buffer in one struct.iter_unpack pass over
+a memoryview, without copying the buffer.
+
+Usage:
+  decode_wmi_guid.py                          # the Galaxy Book5 Pro WM01 block
+  decode_wmi_guid.py /sys/firmware/acpi/tables
+  decode_wmi_guid.py acpi.out --json          # acpidump text output
+  decode_wmi_guid.py dsdt.dat ssdt*.dat       # binary tables (acpidump -b)
+"""
 
 # From dsdt.dsl line 26898-26902:
 # BA 47 6C C1 E3 50 4A 44 AF 3A B1 C3 48 38 00 02
 # This is the byte representation of C16C47BA-50E3-444A-AF3A-B1C348380002
 
+import argparse
+import json
+import os
+import re
 import struct
+import sys
+import uuid
+from typing import NamedTuple
+
+# struct guid_block
+WDG_ENTRY = struct.Struct('<16s2sBB')
+
+ACPI_WMI_EXPENSIVE = 0x1
+ACPI_WMI_METHOD = 0x2
+ACPI_WMI_STRING = 0x4
+ACPI_WMI_EVENT = 0x8
+
+_FLAG_NAMES = ((ACPI_WMI_EXPENSIVE, 'expensive'), (ACPI_WMI_METHOD, 'method'),
+               (ACPI_WMI_STRING, 'string'), (ACPI_WMI_EVENT, 'event'))
+
+# ACPI table header: signature, length, revision, checksum, OEM ID,
+# OEM table ID, OEM revision, creator ID, creator revision
+ACPI_HEADER = struct.Struct('<4sIBB6s8sI4sI')
+AML_TABLES = (b'DSDT', b'SSDT')
+
+# NameOp, optional root/parent prefix, _WDG, BufferOp
+_WDG_NAME = re.compile(rb'\x08(?:\\|\^*)?_WDG\x11')
+
+
+class WdgEntry(NamedTuple):
+    """One _WDG guid_block"""
+    guid: uuid.UUID
+    object_id: bytes        # 2 bytes; notify_id + reserved for events
+    instance_count: int
+    flags: int
+    offset: int             # Byte offset of the entry in its buffer/table
+
+    @property
+    def is_event(self):
+        return bool(self.flags & ACPI_WMI_EVENT)
+
+    @property
+    def is_method(self):
+        return bool(self.flags & ACPI_WMI_METHOD)
+
+    @property
+    def notify_id(self):
+        return self.object_id[0] if self.is_event else None
+
+    @property
+    def acpi_method(self):
+        """ACPI method the WMI core calls: WMxx, WQxx, or _WED for events"""
+        if self.is_event:
+            return '_WED'
+        prefix = 'WM' if self.is_method else 'WQ'
+        return prefix + self.object_id.decode('ascii', 'replace')
+
+    def flag_names(self):
+        return [name for bit, name in _FLAG_NAMES if self.flags & bit] or ['data']
+
+    def as_dict(self):
+        entry = {
+            'guid': str(self.guid).upper(),
+            'instance_count': self.instance_count,
+            'flags': self.flags,
+            'type': self.flag_names(),
+            'acpi_method': self.acpi_method,
+            'offset': self.offset,
+        }
+        if self.is_event:
+            entry['notify_id'] = self.notify_id
+        else:
+            entry['object_id'] = self.object_id.decode('ascii', 'replace')
+        return entry
+
 
 def decode_wmi_guid(buffer):
     """Convert ACPI buffer format to GUID string"""
-    # First 4 bytes (little-endian DWORD)
-    part1 = struct.unpack('<I', bytes(buffer[0:4]))[0]
-    # Next 2 bytes (little-endian WORD)
-    part2 = struct.unpack('<H', bytes(buffer[4:6]))[0]
-    # Next 2 bytes (little-endian WORD)  
-    part3 = struct.unpack('<H', bytes(buffer[6:8]))[0]
-    # Next 2 bytes (big-endian)
-    part4 = buffer[8:10]
-    # Last 6 bytes (big-endian)
-    part5 = buffer[10:16]
-    
-    guid = f"{part1:08X}-{part2:04X}-{part3:04X}-"
-    guid += f"{part4[0]:02X}{part4[1]:02X}-"
-    guid += ''.join(f"{b:02X}" for b in part5)
-    
-    return guid
+    return str(uuid.UUID(bytes_le=bytes(buffer[:16]))).upper()
+
+
+def decode_wdg(buffer, base=0):
+    """
+    Decode every entry of a _WDG buffer
+    Args:
+        buffer: bytes, bytearray, memoryview or list of ints
+        base: Offset of the buffer in its table, added to entry offsets
+    Returns: list of WdgEntry
+    Raises: ValueError if the length is not a multiple of 20
+    """
+    if isinstance(buffer, list):
+        buffer = bytes(buffer)
+    view = memoryview(buffer)
+    if len(view) % WDG_ENTRY.size:
+        raise ValueError(f"_WDG buffer length {len(view)} is not a multiple "
+                         f"of {WDG_ENTRY.size}")
+    return [WdgEntry(uuid.UUID(bytes_le=guid), object_id, count, flags,
+                     base + i * WDG_ENTRY.size)
+            for i, (guid, object_id, count, flags) in enumerate(WDG_ENTRY.iter_unpack(view))]
+
+
+def decode_wdg_many(buffers):
+    """Decode several _WDG buffers; returns one entry list per buffer"""
+    return [decode_wdg(buffer) for buffer in buffers]
+
+
+def pkg_length(data, pos):
+    """Decode an AML PkgLength at pos; returns (length, bytes used)"""
+    lead = data[pos]
+    follow = lead >> 6
+    if follow == 0:
+        return lead & 0x3f, 1
+    length = lead & 0x0f
+    for i in range(follow):
+        length |= data[pos + 1 + i] << (4 + 8 * i)
+    return length, 1 + follow
+
+
+def _integer(data, pos):
+    """Decode an AML integer constant at pos; returns (value, bytes used)"""
+    op = data[pos]
+    if op in (0x00, 0x01):                      # ZeroOp, OneOp
+        return op, 1
+    if op == 0xff:                              # OnesOp
+        return 0xffffffffffffffff, 1
+    size = {0x0a: 1, 0x0b: 2, 0x0c: 4, 0x0e: 8}.get(op)
+    if size is None:
+        raise ValueError(f"Buffer size is not a constant (opcode 0x{op:02x})")
+    return int.from_bytes(data[pos + 1:pos + 1 + size], 'little'), 1 + size
+
+
+def buffer_at(view, pos):
+    """
+    Decode the DefBuffer whose PkgLength starts at pos (just after BufferOp)
+    Returns: (data offset, memoryview of the data), or None if malformed
+    """
+    try:
+        length, used = pkg_length(view, pos)
+        size, size_used = _integer(view, pos + used)
+    except (IndexError, ValueError):
+        return None
+    data_start = pos + used + size_used
+    data_end = min(pos + length, len(view))
+    if data_end < data_start:
+        return None
+    data = view[data_start:data_end]
+    # Buffer (size) may declare more than is initialized
+    return data_start, data[:size] if size < len(data) else data
+
+
+def find_wdg_buffers(table):
+    """
+    Locate Name (_WDG, Buffer (...) {...}) objects in raw AML
+    Args:
+        table: A DSDT/SSDT as bytes or memoryview (header included)
+    Yields: (offset, memoryview of the buffer data)
+    """
+    view = memoryview(table)
+    for m in _WDG_NAME.finditer(view):
+        found = buffer_at(view, m.end())
+        if found:
+            yield found
+
+
+def iter_tables(data):
+    """
+    Split raw table data (one table, or several back to back) into tables
+    Yields: (signature, memoryview)
+    """
+    view = memoryview(data)
+    pos = 0
+    while pos + ACPI_HEADER.size <= len(view):
+        signature, length = ACPI_HEADER.unpack_from(view, pos)[:2]
+        if length < ACPI_HEADER.size or pos + length > len(view) \
+                or not signature.isalnum():
+            break
+        yield signature.decode('ascii', 'replace'), view[pos:pos + length]
+        pos += length
+
+
+# acpidump text: "DSDT @ 0x0000000000000000" then "    0000: 44 53 44 54 ...  DSDT..."
+_DUMP_TABLE_RE = re.compile(r'^\s*(\w{4}) @ 0x[0-9A-Fa-f]+\s*$')
+_DUMP_ROW_RE = re.compile(r'^\s*[0-9A-Fa-f]{4,}: ((?:[0-9A-Fa-f]{2} ){1,16})')
+
+
+def iter_acpidump_text(lines):
+    """Yield (signature, bytes) for each table of acpidump text output"""
+    signature, chunks = None, []
+    for line in lines:
+        m = _DUMP_TABLE_RE.match(line)
+        if m:
+            if signature and chunks:
+                yield signature, bytes.fromhex(''.join(chunks))
+            signature, chunks = m.group(1), []
+            continue
+        m = _DUMP_ROW_RE.match(line)
+        if m and signature:
+            chunks.append(m.group(1))
+    if signature and chunks:
+        yield signature, bytes.fromhex(''.join(chunks))
+
+
+def load_tables(path):
+    """
+    Yield (name, signature, table) for a table file, a directory of table
+    files (e.g. /sys/firmware/acpi/tables) or acpidump text output
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                yield from load_tables(os.path.join(root, name))
+        return
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        print(f"WARNING: Could not read {path}: {e}", file=sys.stderr)
+        return
+    tables = list(iter_tables(data))
+    if tables:
+        for signature, table in tables:
+            yield path, signature, table
+    else:
+        for signature, table in iter_acpidump_text(data.decode('latin-1').splitlines()):
+            yield path, signature, table
+
+
+def scan(paths):
+    """
+    Decode the _WDG buffers of every AML table under paths
+    Returns: [{'file', 'table', 'offset', 'entries': [WdgEntry]}]
+    """
+    found = []
+    for path in paths:
+        for name, signature, table in load_tables(path):
+            if signature.encode() not in AML_TABLES:
+                continue
+            for offset, data in find_wdg_buffers(table):
+                usable = len(data) - len(data) % WDG_ENTRY.size
+                found.append({
+                    'file': name,
+                    'table': signature,
+                    'offset': offset,
+                    'entries': decode_wdg(data[:usable], base=offset),
+                })
+    return found
+
+
+def print_entry(entry, indent="  "):
+    kind = '/'.join(entry.flag_names())
+    if entry.is_event:
+        ident = f"notify ID 0x{entry.notify_id:02X}"
+    else:
+        ident = f"object ID '{entry.object_id.decode('ascii', 'replace')}'"
+    print(f"{indent}{str(entry.guid).upper()}  {ident}, "
+          f"{entry.instance_count} instance(s), {kind} (0x{entry.flags:02X}) "
+          f"-> {entry.acpi_method}")
+
 
 # WMI GUID 1 from _WDG buffer
 buffer1 = [0xBA, 0x47, 0x6C, 0xC1, 0xE3, 0x50, 0x4A, 0x44,
@@ -34,13 +292,45 @@ buffer1 = [0xBA, 0x47, 0x6C, 0xC1, 0xE3, 0x50, 0x4A, 0x44,
 # 30 31 = "01" (Object ID in ASCII)
 # 01 = Instance count
 # 02 = Flags (0x02 = WMmethod call, not WMI query)
+instance1 = [0x30, 0x31, 0x01, 0x02]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode ACPI _WDG WMI GUID blocks")
+    parser.add_argument('paths', nargs='*',
+                        help="ACPI table files, table directories or acpidump text output")
+    parser.add_argument('--json', action='store_true', help="Print JSON")
+    args = parser.parse_args(argv)
+
+    if not args.paths:
+        entry = decode_wdg(buffer1 + instance1)[0]
+        print("Samsung Galaxy Book5 Pro WMI Analysis")
+        print("=" * 50)
+        print(f"\nGUID 1: {decode_wmi_guid(buffer1)}")
+        print(f"  Object ID: '{entry.object_id.decode()}' (0x{entry.object_id.hex().upper()})")
+        print(f"  Instance: {entry.instance_count}")
+        print(f"  Type: WMI Method (0x{entry.flags:02X})")
+        print(f"  ACPI Method: {entry.acpi_method}")
+        print()
+        print(f"This GUID handles method calls via {entry.acpi_method}(instance, method_id, args)")
+        return 0
+
+    found = scan(args.paths)
+    if args.json:
+        print(json.dumps([dict(block, entries=[e.as_dict() for e in block['entries']])
+                          for block in found], indent=2))
+        return 0 if found else 1
+
+    if not found:
+        print("No _WDG buffers found")
+        return 1
+    for block in found:
+        print(f"{block['file']}: {block['table']} _WDG at 0x{block['offset']:X} "
+              f"({len(block['entries'])} entries)")
+        for entry in block['entries']:
+            print_entry(entry)
+    return 0
+
 
-print("Samsung Galaxy Book5 Pro WMI Analysis")
-print("=" * 50)
-print(f"\nGUID 1: {decode_wmi_guid(buffer1)}")
-print(f"  Object ID: '01' (0x3031)")
-print(f"  Instance: 1")
-print(f"  Type: WMI Method (0x02)")
-print(f"  ACPI Method: WM01")
-print()
-print("This GUID handles method calls via WM01(instance, method_id, args)")
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""On-disk caches shared by aml_namespace.py and wmi_prober.py
+
+A cache file holds one marshal-encoded dict with a 'format' key; a file
+of another format, or a truncated or foreign one, reads as a miss. Saves
+go through a temporary file and os.replace(), so an interrupted run
+never leaves a half-written cache behind.
+"""
+
+import marshal
+import os
+from pathlib import Path
+
+
+def default_cache_dir(env_var, name):
+    """$<env_var>, else $XDG_CACHE_HOME/<name> (~/.cache/<name>)"""
+    if os.environ.get(env_var):
+        return Path(os.environ[env_var])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / ".cache"
+    return Path(base) / name
+
+
+def read_cache(path, fmt):
+    """Cached dict at path, or None if missing, unreadable or not format fmt"""
+    try:
+        # One read: marshal.load() on a file object reads in small pieces
+        with open(path, 'rb') as f:
+            cached = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(cached, dict) or cached.get('format') != fmt:
+        return None
+    return cached
+
+
+def write_cache(path, data):
+    """
+    Atomically replace the cache at path with data (a dict with 'format')
+    Returns: False if it could not be written; an unwritable cache only
+             costs the work again next time
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
@@ -109,6 +109,9 @@ else
     echo ""
     echo "Try testing with argument buffer:"
     echo "  echo '\\_SB.SWSD.WM01 0x01 0x44 {0x00, 0x50}' | sudo tee /proc/acpi/call"
+    echo ""
+    echo "Or sweep argument patterns in batches (results cached per firmware):"
+    echo "  sudo python3 wmi_prober.py --methods 0x40-0x4f --args '' --args '00??'"
 fi
 
 echo ""
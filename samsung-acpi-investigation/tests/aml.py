@@ -0,0 +1,154 @@
+"""
+Tiny AML encoder for building synthetic ACPI tables in the tests
+
+Only the encodings the scanners look at: PkgLength, NameStrings,
+Scope/Device/Method/Name/Buffer/Package/If/Else/Alias definitions,
+OperationRegion/Field, integer and string constants and the table header.
+"""
+
+import uuid
+
+from decode_wmi_guid import ACPI_HEADER, WDG_ENTRY
+
+
+def pkg_value(value):
+    """A number in PkgLength encoding (also used for field widths)"""
+    if value <= 0x3f:
+        return bytes([value])
+    for follow in (1, 2, 3):
+        if value < 1 << (4 + 8 * follow):
+            return bytes([(follow << 6) | (value & 0xf)]) + (value >> 4).to_bytes(follow, 'little')
+    raise ValueError("package too long")
+
+
+def pkg(body):
+    """Prefix body with the PkgLength that covers it (and itself)"""
+    for used in range(1, 5):
+        encoded = pkg_value(len(body) + used)
+        if len(encoded) == used:
+            return encoded + body
+    raise ValueError("package too long")
+
+
+def seg(name):
+    return name.ljust(4, '_').encode('ascii')
+
+
+def name_string(path):
+    """'\\_SB.PCI0', '^^FOO', 'BAR' or 'A.B.C' as an AML NameString"""
+    prefix = b''
+    while path[:1] in ('\\', '^'):
+        prefix += path[:1].encode()
+        path = path[1:]
+    segs = [seg(s) for s in path.split('.')] if path else []
+    if not segs:
+        return prefix + b'\x00'
+    if len(segs) == 1:
+        return prefix + segs[0]
+    if len(segs) == 2:
+        return prefix + b'\x2e' + b''.join(segs)
+    return prefix + b'\x2f' + bytes([len(segs)]) + b''.join(segs)
+
+
+def integer(value):
+    if value in (0, 1):
+        return bytes([value])
+    for op, size in ((0x0a, 1), (0x0b, 2), (0x0c, 4), (0x0e, 8)):
+        if value < 1 << (8 * size):
+            return bytes([op]) + value.to_bytes(size, 'little')
+    raise ValueError(value)
+
+
+def string(text):
+    return b'\x0d' + text.encode('ascii') + b'\x00'
+
+
+def eisa_id(text):
+    """EisaId("PNP0C09") as a DWordConst"""
+    def c(ch):
+        return ord(ch) - 0x40
+    value = (c(text[0]) << 10 | c(text[1]) << 5 | c(text[2])) << 16 | int(text[3:], 16)
+    # EISA IDs are stored big-endian within the dword
+    return b'\x0c' + value.to_bytes(4, 'big')
+
+
+def scope(path, *body):
+    return b'\x10' + pkg(name_string(path) + b''.join(body))
+
+
+def device(path, *body):
+    return b'\x5b\x82' + pkg(name_string(path) + b''.join(body))
+
+
+def method(path, args, *body, serialized=False):
+    flags = args | (0x8 if serialized else 0)
+    return b'\x14' + pkg(name_string(path) + bytes([flags]) + b''.join(body))
+
+
+def name(path, data):
+    return b'\x08' + name_string(path) + data
+
+
+def buffer(data, size=None):
+    return b'\x11' + pkg(integer(len(data) if size is None else size) + data)
+
+
+def package(*elements):
+    return b'\x12' + pkg(bytes([len(elements)]) + b''.join(elements))
+
+
+def if_(predicate, *body):
+    return b'\xa0' + pkg(predicate + b''.join(body))
+
+
+def else_(*body):
+    return b'\xa1' + pkg(b''.join(body))
+
+
+def alias(source, alias_name):
+    return b'\x06' + name_string(source) + name_string(alias_name)
+
+
+def op_region(path, space, offset, length):
+    return b'\x5b\x80' + name_string(path) + bytes([space]) + integer(offset) + integer(length)
+
+
+def field(region, flags, *units):
+    """Field (region) {name, bits ...}; a name of None is a reserved gap"""
+    body = name_string(region) + bytes([flags])
+    for unit, bits in units:
+        body += (b'\x00' if unit is None else seg(unit)) + pkg_value(bits)
+    return b'\x5b\x81' + pkg(body)
+
+
+def return_(value):
+    return b'\xa4' + value
+
+
+def wdg_entry(guid, object_id, count=1, flags=0x2):
+    """One 20-byte struct guid_block; object_id is 2 bytes, or 2 ASCII characters"""
+    if isinstance(object_id, str):
+        object_id = object_id.encode('ascii')
+    return WDG_ENTRY.pack(uuid.UUID(guid).bytes_le, object_id, count, flags)
+
+
+def table(signature, *body):
+    """A DSDT/SSDT: header (checksum not computed) plus the AML body"""
+    aml = b''.join(body)
+    header = ACPI_HEADER.pack(signature.encode('ascii'), ACPI_HEADER.size + len(aml), 2, 0,
+                              b'SECCSD', b'LH43STAR', 1, b'INTL', 0x20200717)
+    return header + aml
+
+
+def acpidump_text(tables):
+    """acpidump-style hex dump of [(signature, table bytes)]"""
+    lines = []
+    for signature, data in tables:
+        lines.append(f"{signature} @ 0x0000000000000000")
+        for offset in range(0, len(data), 16):
+            row = data[offset:offset + 16]
+            hexes = ''.join(f"{b:02X} " for b in row)
+            text = ''.join(chr(b) if 0x20 <= b < 0x7f else '.' for b in row)
+            lines.append(f"    {offset:04X}: {hexes:<48} {text}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+"""
+acpi_scan tests: the multi-pattern regex, NameString decoding and
+resolution, Device/Scope extents and the summary of a synthetic DSDT
+
+Run from samsung-acpi-investigation:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+import acpi_scan
+from acpi_scan import build_pattern, join_path, name_string, scan_table, summarize
+from tests import aml
+
+WMI_GUID = acpi_scan.SAMSUNG_GUIDS[0]
+OTHER_GUID = acpi_scan.SAMSUNG_GUIDS[1]
+
+
+def sample_dsdt():
+    return aml.table(
+        'DSDT',
+        aml.scope('\\_SB', aml.device(
+            'PC00', aml.device(
+                'LPCB',
+                aml.device('H_EC',
+                           aml.name('_HID', aml.eisa_id('PNP0C09')),
+                           aml.method('GBAT', 1, aml.return_(aml.integer(0)))),
+                # Back in LPCB once H_EC's extent has ended
+                aml.device('EMB0', aml.name('_HID', aml.string('PNP0C09'))),
+                aml.device('ECDV', aml.name('_STA', aml.integer(0x0f))),
+            ),
+        ), aml.device(
+            'WMID',
+            aml.name('_WDG', aml.buffer(aml.wdg_entry(WMI_GUID, '01'))),
+            aml.method('WM01', 3, aml.return_(aml.integer(0))),
+            aml.method('_WED', 1, aml.return_(aml.integer(0))),
+        ), aml.device(
+            'BAT1',
+            aml.method('_STA', 0, aml.return_(aml.integer(0x1f))),
+            aml.name('GUI2', aml.buffer(uuid.UUID(OTHER_GUID).bytes_le)),
+        )),
+        aml.method('\\_SB.PC00.LPCB.H_EC._BST', 0, aml.return_(aml.integer(0)), serialized=True),
+        aml.method('MAIN', 0, aml.return_(aml.integer(0))),
+    )
+
+
+class NameStringTest(unittest.TestCase):
+
+    def check(self, path):
+        encoded = aml.name_string(path) + b'\x99'
+        return name_string(memoryview(encoded), 0), len(encoded) - 1
+
+    def test_forms(self):
+        for path, expected in (
+                ('FOO', ('', ['FOO'])),
+                ('\\_SB', ('\\', ['_SB'])),
+                ('^^BAR', ('^^', ['BAR'])),
+                ('PC00.LPCB', ('', ['PC00', 'LPCB'])),
+                ('\\_SB.PC00.LPCB.H_EC', ('\\', ['_SB', 'PC00', 'LPCB', 'H_EC'])),
+                ('\\', ('\\', [])),
+                ('____', ('', ['_'])),
+        ):
+            with self.subTest(path=path):
+                (prefix, segs, end), size = self.check(path)
+                self.assertEqual((prefix, segs), expected)
+                self.assertEqual(end, size)
+
+    def test_invalid(self):
+        for data in (b'foo_', b'1ABC', b'\\', b'\x2e_SB_PC', b'\x2f', b'\x2f\x03_SB_PC00'):
+            with self.subTest(data=data):
+                self.assertIsNone(name_string(memoryview(data), 0))
+
+    def test_join_path(self):
+        self.assertEqual(join_path('\\_SB.PC00', '', ['LPCB', 'H_EC']), '\\_SB.PC00.LPCB.H_EC')
+        self.assertEqual(join_path('\\_SB.PC00', '^', ['FOO']), '\\_SB.FOO')
+        self.assertEqual(join_path('\\_SB.PC00', '\\', ['_GPE']), '\\_GPE')
+        self.assertEqual(join_path('\\_SB', '^^^', ['FOO']), '\\FOO')
+        self.assertEqual(join_path('\\', '', ['_SB']), '\\_SB')
+        self.assertEqual(join_path('\\_SB', '\\', []), '\\')
+
+
+class PatternTest(unittest.TestCase):
+
+    def kinds(self, data, guids=()):
+        return [(m.lastgroup, m.start()) for m in build_pattern(guids).finditer(data)]
+
+    def test_alternatives(self):
+        data = (b'..' + aml.name('_WDG', aml.buffer(b'')) + aml.scope('\\_SB')
+                + aml.device('DEV0') + aml.method('WM01', 2)
+                + b'\x0c\x41\xd0\x0c\x09' + b'PNP0C09\x00')
+        self.assertEqual([kind for kind, _ in self.kinds(data)],
+                         ['wdg', 'scope', 'device', 'method', 'ec_hid', 'ec_hid'])
+        self.assertEqual(self.kinds(data)[0], ('wdg', 2))
+
+    def test_opcode_without_name_is_skipped(self):
+        # ScopeOp/MethodOp bytes followed by something that cannot start a name
+        self.assertEqual(self.kinds(b'\x10\x05\x01\x02\x14\x05abcd'), [])
+
+    def test_guids(self):
+        data = b'\x00' + uuid.UUID(WMI_GUID).bytes_le + uuid.UUID(OTHER_GUID).bytes_le
+        self.assertEqual(self.kinds(data), [])
+        self.assertEqual(self.kinds(data, [WMI_GUID]), [('guid', 1)])
+        self.assertEqual(self.kinds(data, [WMI_GUID, OTHER_GUID]), [('guid', 1), ('guid', 17)])
+
+
+class ScanTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.table = sample_dsdt()
+        cls.hits = scan_table(cls.table, build_pattern(acpi_scan.SAMSUNG_GUIDS))
+
+    def paths(self, kind):
+        return [hit['path'] for hit in self.hits if hit['kind'] == kind]
+
+    def test_scope_extents(self):
+        self.assertEqual(self.paths('device'), [
+            '\\_SB.PC00', '\\_SB.PC00.LPCB', '\\_SB.PC00.LPCB.H_EC', '\\_SB.PC00.LPCB.EMB0',
+            '\\_SB.PC00.LPCB.ECDV', '\\_SB.WMID', '\\_SB.BAT1',
+        ])
+        self.assertEqual(self.paths('method'), [
+            '\\_SB.PC00.LPCB.H_EC.GBAT', '\\_SB.WMID.WM01', '\\_SB.WMID._WED', '\\_SB.BAT1._STA',
+            '\\_SB.PC00.LPCB.H_EC._BST', '\\MAIN',
+        ])
+        self.assertEqual([hit['args'] for hit in self.hits if hit['kind'] == 'method'],
+                         [1, 3, 1, 0, 0, 0])
+
+    def test_ec_hids(self):
+        self.assertEqual(self.paths('ec_hid'), ['\\_SB.PC00.LPCB.H_EC', '\\_SB.PC00.LPCB.EMB0'])
+
+    def test_wdg_and_guid(self):
+        wdg, = [hit for hit in self.hits if hit['kind'] == 'wdg']
+        self.assertEqual(wdg['path'], '\\_SB.WMID._WDG')
+        entry, = wdg['entries']
+        self.assertEqual((str(entry.guid).upper(), entry.acpi_method), (WMI_GUID, 'WM01'))
+        self.assertEqual(self.table[entry.offset:entry.offset + 16], uuid.UUID(WMI_GUID).bytes_le)
+        # The GUID inside _WDG is found too, as is the one in a plain buffer
+        self.assertEqual([(hit['guid'], hit['path']) for hit in self.hits if hit['kind'] == 'guid'],
+                         [(WMI_GUID, '\\_SB.WMID'), (OTHER_GUID, '\\_SB.BAT1')])
+
+    def test_summary(self):
+        result = summarize(self.hits)
+        self.assertEqual([(hit['path'], hit['pnp0c09']) for hit in result['ec_devices']], [
+            ('\\_SB.PC00.LPCB.H_EC', True), ('\\_SB.PC00.LPCB.EMB0', True),
+            ('\\_SB.PC00.LPCB.ECDV', False),
+        ])
+        self.assertEqual([hit['path'] for hit in result['battery_methods']], [
+            '\\_SB.PC00.LPCB.H_EC.GBAT', '\\_SB.BAT1._STA', '\\_SB.PC00.LPCB.H_EC._BST',
+        ])
+        self.assertEqual([hit['name'] for hit in result['wmi_methods']], ['WM01', '_WED'])
+        self.assertEqual(len(result['wdg']), 1)
+        self.assertEqual(len(result['guids']), 2)
+
+    def test_truncated_device_skipped(self):
+        table = aml.table('DSDT', aml.device('TRNC', aml.method('WM02', 1)))[:-3]
+        self.assertEqual(scan_table(table, build_pattern(())), [])
+
+
+class ScanFilesTest(unittest.TestCase):
+
+    def test_binary_and_acpidump_text(self):
+        dsdt = sample_dsdt()
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "dsdt.dat").write_bytes(dsdt)
+            (Path(tmp) / "facp.dat").write_bytes(aml.table('FACP', b'\x00' * 8))
+            (Path(tmp) / "acpi.out").write_text(aml.acpidump_text([('SSDT', dsdt)]))
+            results = acpi_scan.scan([tmp])
+        self.assertEqual([(Path(r['file']).name, r['table']) for r in results],
+                         [('acpi.out', 'SSDT'), ('dsdt.dat', 'DSDT')])
+        for result in results:
+            self.assertEqual(result['size'], len(dsdt))
+            self.assertEqual(len(result['wmi_methods']), 2)
+        as_json = acpi_scan.as_json(results)
+        self.assertEqual(as_json[0]['wdg'][0]['entries'][0]['guid'], WMI_GUID)
+
+
+if __name__ == '__main__':
+    unittest.main()
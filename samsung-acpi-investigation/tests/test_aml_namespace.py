@@ -0,0 +1,254 @@
+"""
+AML namespace tests: definitions and argument counts of a synthetic
+DSDT, If/Else bodies and resync over undecoded bytes, under(), the
+search rules behind callers(), and the marshal index cache
+
+Run from samsung-acpi-investigation:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import aml_namespace
+from aml_namespace import Namespace, load_namespace, load_table_index, normalize_path, parse_table
+from tests import aml
+
+WMI_GUID = 'C16C47BA-50E3-444A-AF3A-B1C348380002'
+EMBEDDED_CONTROL = 0x03
+
+# LEqual (One, One): a predicate the parser does not size
+PREDICATE = b'\x93\x01\x01'
+
+
+def sample_dsdt(extra=b''):
+    return aml.table(
+        'DSDT',
+        aml.scope('\\_SB',
+                  aml.device('PC00', aml.device('LPCB', aml.device(
+                      'H_EC',
+                      aml.op_region('ECOR', EMBEDDED_CONTROL, 0, 0xff),
+                      aml.field('ECOR', 0x01, ('B1ST', 8), (None, 8), ('B1CR', 16)),
+                      aml.method('GBAT', 1, aml.return_(aml.name_string('B1ST'))),
+                      aml.method('ECRD', 2, aml.return_(aml.integer(0)), serialized=True),
+                  ))),
+                  aml.device(
+                      'WMID',
+                      aml.name('_WDG', aml.buffer(aml.wdg_entry(WMI_GUID, '01'))),
+                      aml.name('_UID', aml.integer(0x1234)),
+                      aml.name('_HID', aml.string('PNP0C14')),
+                      aml.name('PKG0', aml.package(aml.integer(1), aml.integer(2))),
+                      aml.method('WM01', 3, aml.return_(aml.name_string('WMAA')), serialized=True),
+                      aml.method('WMAA', 1,
+                                 aml.return_(aml.name_string('\\_SB.PC00.LPCB.H_EC.GBAT'))),
+                      # ^WM01 from the method's own scope is a sibling of CALR
+                      aml.method('CALR', 0, aml.return_(aml.name_string('^WM01'))),
+                      aml.device('SUB0', aml.method(
+                          'CALL', 0, aml.return_(aml.name_string('WM01')))),
+                  ),
+                  aml.if_(PREDICATE, aml.device('CND1', aml.name('_STA', aml.integer(0x0f)))),
+                  aml.else_(aml.method('ELS1', 0,
+                                       aml.return_(aml.name_string('\\_SB.WMID.WM01')))),
+                  aml.alias('\\_SB.WMID.WM01', 'WMX1')),
+        # Undecoded bytes between definitions: the parser resyncs after them
+        b'\xff\x5b\xfe',
+        aml.scope('\\_SB.WMID', aml.name('EXTR', aml.integer(1))),
+        aml.method('\\_SB.PC00.LPCB.H_EC.SBAT', 2, aml.return_(aml.name_string('ECRD'))),
+        extra,
+    )
+
+
+class ParseTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        index = parse_table(sample_dsdt())
+        cls.nodes = {path: (kind, info) for path, (kind, _, info) in index['nodes'].items()}
+        cls.refs = index['refs']
+
+    def test_nodes(self):
+        self.assertEqual({path: kind for path, (kind, _) in self.nodes.items()}, {
+            '\\_SB': 'Scope',
+            '\\_SB.PC00': 'Device',
+            '\\_SB.PC00.LPCB': 'Device',
+            '\\_SB.PC00.LPCB.H_EC': 'Device',
+            '\\_SB.PC00.LPCB.H_EC.ECOR': 'OperationRegion',
+            '\\_SB.PC00.LPCB.H_EC.B1ST': 'Field',
+            '\\_SB.PC00.LPCB.H_EC.B1CR': 'Field',
+            '\\_SB.PC00.LPCB.H_EC.GBAT': 'Method',
+            '\\_SB.PC00.LPCB.H_EC.ECRD': 'Method',
+            '\\_SB.PC00.LPCB.H_EC.SBAT': 'Method',
+            '\\_SB.WMID': 'Device',
+            '\\_SB.WMID._WDG': 'Buffer',
+            '\\_SB.WMID._UID': 'Integer',
+            '\\_SB.WMID._HID': 'String',
+            '\\_SB.WMID.PKG0': 'Package',
+            '\\_SB.WMID.WM01': 'Method',
+            '\\_SB.WMID.WMAA': 'Method',
+            '\\_SB.WMID.CALR': 'Method',
+            '\\_SB.WMID.SUB0': 'Device',
+            '\\_SB.WMID.SUB0.CALL': 'Method',
+            '\\_SB.WMID.EXTR': 'Integer',
+            '\\_SB.CND1': 'Device',
+            '\\_SB.CND1._STA': 'Integer',
+            '\\_SB.ELS1': 'Method',
+            '\\_SB.WMX1': 'Alias',
+        })
+
+    def test_info(self):
+        self.assertEqual(self.nodes['\\_SB.WMID.WM01'][1], {'args': 3, 'serialized': True})
+        self.assertEqual(self.nodes['\\_SB.PC00.LPCB.H_EC.GBAT'][1], {'args': 1, 'serialized': False})
+        self.assertEqual(self.nodes['\\_SB.PC00.LPCB.H_EC.SBAT'][1]['args'], 2)
+        self.assertEqual(self.nodes['\\_SB.WMID._WDG'][1], {'size': 20})
+        self.assertEqual(self.nodes['\\_SB.WMID._UID'][1], {'value': 0x1234})
+        self.assertEqual(self.nodes['\\_SB.WMID._HID'][1], {'value': 'PNP0C14'})
+        self.assertEqual(self.nodes['\\_SB.WMID.PKG0'][1], {'count': 2})
+        self.assertEqual(self.nodes['\\_SB.WMX1'][1], {'target': '\\_SB.WMID.WM01'})
+        self.assertEqual(self.nodes['\\_SB.PC00.LPCB.H_EC.ECOR'][1],
+                         {'space': EMBEDDED_CONTROL, 'offset': 0, 'length': 0xff})
+        self.assertEqual(self.nodes['\\_SB.PC00.LPCB.H_EC.B1CR'][1],
+                         {'region': '\\_SB.PC00.LPCB.H_EC.ECOR', 'bit': 16, 'bits': 16})
+
+    def test_scope_reopens_device(self):
+        self.assertEqual(self.nodes['\\_SB.WMID'][0], 'Device')
+
+    def test_method_refs(self):
+        self.assertEqual(self.refs['\\_SB.WMID.WM01'], ['WMAA'])
+        self.assertEqual(self.refs['\\_SB.WMID.CALR'], ['^WM01'])
+        self.assertEqual(self.refs['\\_SB.WMID.WMAA'], ['\\_SB.PC00.LPCB.H_EC.GBAT'])
+        self.assertNotIn('\\_SB.PC00.LPCB.H_EC.ECRD', self.refs)
+
+    def test_resync_after_garbage(self):
+        # The definitions after the undecodable bytes are all there
+        garbage = aml.table('SSDT', b'\x5b\x5b\x00\x10\xff', aml.name('TAIL', aml.integer(7)))
+        nodes = parse_table(garbage)['nodes']
+        self.assertEqual(nodes['\\TAIL'][0], 'Integer')
+
+
+class NamespaceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ns = Namespace([load_table_index('DSDT', sample_dsdt(), cache_dir=False)[0]])
+
+    def test_under(self):
+        self.assertEqual(self.ns.under('\\_SB.PC00.LPCB.H_EC', 'Method'), [
+            '\\_SB.PC00.LPCB.H_EC.ECRD', '\\_SB.PC00.LPCB.H_EC.GBAT', '\\_SB.PC00.LPCB.H_EC.SBAT',
+        ])
+        self.assertEqual(self.ns.under('_SB_.WMID.SUB0'), ['\\_SB.WMID.SUB0.CALL'])
+        self.assertEqual(self.ns.under('\\_SB.WMI'), [])
+        self.assertEqual(len(self.ns.under('\\')), len(self.ns.nodes))
+
+    def test_find(self):
+        self.assertEqual(self.ns.find('^WM', 'Method'), ['\\_SB.WMID.WM01', '\\_SB.WMID.WMAA'])
+        self.assertEqual(self.ns.find('^B1'), ['\\_SB.PC00.LPCB.H_EC.B1CR',
+                                               '\\_SB.PC00.LPCB.H_EC.B1ST'])
+
+    def test_resolve(self):
+        resolve = self.ns.resolve
+        self.assertEqual(resolve('\\_SB_.WMID', '\\_SB.PC00'), '\\_SB.WMID')
+        self.assertIsNone(resolve('\\_SB.NONE', '\\_SB'))
+        # One segment: the scope, then each parent up to the root
+        self.assertEqual(resolve('WM01', '\\_SB.WMID.SUB0.CALL'), '\\_SB.WMID.WM01')
+        self.assertEqual(resolve('WMID', '\\_SB.PC00.LPCB.H_EC'), '\\_SB.WMID')
+        self.assertEqual(resolve('_SB', '\\_SB.WMID'), '\\_SB')
+        self.assertIsNone(resolve('NONE', '\\_SB.WMID'))
+        # Prefixed or multi-segment names are not searched
+        self.assertEqual(resolve('^WM01', '\\_SB.WMID.CALR'), '\\_SB.WMID.WM01')
+        self.assertEqual(resolve('WMID.WM01', '\\_SB'), '\\_SB.WMID.WM01')
+        self.assertIsNone(resolve('WMID.WM01', '\\_SB.PC00'))
+        self.assertIsNone(resolve('^^WM01', '\\_SB.WMID.CALR'))
+
+    def test_callers(self):
+        self.assertEqual(self.ns.callers('WM01'), {'\\_SB.WMID.WM01': [
+            '\\_SB.ELS1', '\\_SB.WMID.CALR', '\\_SB.WMID.SUB0.CALL',
+        ]})
+        self.assertEqual(self.ns.callers('\\_SB.PC00.LPCB.H_EC.GBAT'),
+                         {'\\_SB.PC00.LPCB.H_EC.GBAT': ['\\_SB.WMID.WMAA']})
+        self.assertEqual(self.ns.callers('ECRD'),
+                         {'\\_SB.PC00.LPCB.H_EC.ECRD': ['\\_SB.PC00.LPCB.H_EC.SBAT']})
+        # GBAT references a Field, not a method
+        self.assertEqual(self.ns.callers('B1ST'), {})
+        self.assertEqual(self.ns.callers('NONE'), {})
+
+    def test_later_table_extends_scope(self):
+        ssdt = aml.table('SSDT', aml.scope('\\_SB.WMID', aml.method(
+            'WM02', 1, aml.return_(aml.name_string('WM01')))))
+        ns = Namespace([load_table_index('DSDT', sample_dsdt(), cache_dir=False)[0],
+                        load_table_index('SSDT', ssdt, cache_dir=False)[0]])
+        self.assertEqual(ns.nodes['\\_SB.WMID']['type'], 'Device')
+        self.assertEqual(ns.nodes['\\_SB.WMID.WM02']['table'], ns.tables[1])
+        self.assertIn('\\_SB.WMID.WM02', ns.callers('WM01')['\\_SB.WMID.WM01'])
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path('_SB_.PC00.'), '\\_SB.PC00')
+        self.assertEqual(normalize_path(' \\____ '), '\\_')
+        self.assertEqual(normalize_path('\\'), '\\')
+
+
+class IndexCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tables = Path(tmp.name) / "tables"
+        self.tables.mkdir()
+        self.cache = Path(tmp.name) / "cache"
+        (self.tables / "DSDT").write_bytes(sample_dsdt())
+
+    def test_hit_and_miss(self):
+        ns, cached = load_namespace([str(self.tables)], cache_dir=self.cache)
+        self.assertEqual(cached, 0)
+        self.assertEqual(len(list(self.cache.glob("DSDT-*.idx"))), 1)
+
+        again, cached = load_namespace([str(self.tables)], cache_dir=self.cache)
+        self.assertEqual(cached, 1)
+        self.assertEqual(again.nodes, ns.nodes)
+        self.assertEqual(again.callers('WM01'), ns.callers('WM01'))
+
+        # Different contents, different key: parsed and cached again
+        (self.tables / "DSDT").write_bytes(sample_dsdt(aml.name('NEW0', aml.integer(2))))
+        changed, cached = load_namespace([str(self.tables)], cache_dir=self.cache)
+        self.assertEqual(cached, 0)
+        self.assertIn('\\NEW0', changed.nodes)
+        self.assertEqual(len(list(self.cache.glob("DSDT-*.idx"))), 2)
+
+    def test_parse_skipped_on_hit(self):
+        load_namespace([str(self.tables)], cache_dir=self.cache)
+        with mock.patch.object(aml_namespace, 'parse_table') as parse:
+            load_namespace([str(self.tables)], cache_dir=self.cache)
+        parse.assert_not_called()
+
+    def test_corrupt_or_foreign_cache(self):
+        load_namespace([str(self.tables)], cache_dir=self.cache)
+        cache_file, = self.cache.glob("*.idx")
+        for content in (b'garbage', b''):
+            cache_file.write_bytes(content)
+            _, cached = load_namespace([str(self.tables)], cache_dir=self.cache)
+            self.assertEqual(cached, 0)
+        _, cached = load_namespace([str(self.tables)], cache_dir=self.cache)
+        self.assertEqual(cached, 1)
+
+    def test_no_cache(self):
+        _, cached = load_namespace([str(self.tables)], cache_dir=False)
+        self.assertEqual(cached, 0)
+        self.assertFalse(self.cache.exists())
+
+    def test_cli(self):
+        output = io.StringIO()
+        with mock.patch.dict('os.environ', {aml_namespace.INDEX_CACHE_ENV: str(self.cache)}), \
+                contextlib.redirect_stdout(output):
+            self.assertEqual(aml_namespace.main(['--callers', 'WM01', '--json', str(self.tables)]), 0)
+        self.assertEqual(json.loads(output.getvalue()), {'\\_SB.WMID.WM01': [
+            '\\_SB.ELS1', '\\_SB.WMID.CALR', '\\_SB.WMID.SUB0.CALL',
+        ]})
+        self.assertTrue(list(self.cache.glob("*.idx")))
+
+
+if __name__ == '__main__':
+    unittest.main()
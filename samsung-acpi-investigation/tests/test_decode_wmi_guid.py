@@ -0,0 +1,188 @@
+"""
+_WDG decoder tests: PkgLength and DefBuffer decoding, locating _WDG in
+raw AML, splitting binary tables and acpidump text
+
+Run from samsung-acpi-investigation:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+import decode_wmi_guid
+from decode_wmi_guid import (
+    buffer_at, decode_wdg, find_wdg_buffers, iter_acpidump_text, iter_tables, pkg_length,
+)
+from tests import aml
+
+WMI_GUID = 'C16C47BA-50E3-444A-AF3A-B1C348380002'
+EVENT_GUID = 'A6FEA33E-DABF-46F5-BFC8-460D961BEC9F'
+WDG = aml.wdg_entry(WMI_GUID, '01') + aml.wdg_entry(EVENT_GUID, b'\xd0\x00', flags=0x8)
+
+
+def wmi_dsdt(wdg=WDG):
+    return aml.table('DSDT', aml.scope('\\_SB', aml.device(
+        'WMID',
+        aml.name('_HID', aml.string('PNP0C14')),
+        aml.name('_UID', aml.integer(1)),
+        aml.name('_WDG', aml.buffer(wdg)),
+        aml.method('WM01', 3, aml.return_(aml.integer(0))),
+    )))
+
+
+class PkgLengthTest(unittest.TestCase):
+
+    def test_encodings(self):
+        self.assertEqual(pkg_length(b'\x3f', 0), (0x3f, 1))
+        self.assertEqual(pkg_length(b'\x4a\x12', 0), (0x12a, 2))
+        self.assertEqual(pkg_length(b'\x00\x83\x34\x12', 1), (0x12343, 3))
+        self.assertEqual(pkg_length(b'\xc1\x00\x00\x01', 0), (0x100001, 4))
+
+    def test_round_trip(self):
+        for size in (0, 10, 61, 62, 100, 4000, 5000, 1 << 20):
+            with self.subTest(size=size):
+                data = aml.pkg(b'\xaa' * size)
+                length, used = pkg_length(data, 0)
+                self.assertEqual(length, len(data))
+                self.assertEqual(len(data) - used, size)
+
+    def test_truncated(self):
+        with self.assertRaises(IndexError):
+            pkg_length(b'\x80\x01', 0)
+
+
+class BufferAtTest(unittest.TestCase):
+
+    def test_buffer(self):
+        # BufferOp, PkgLength, ByteConst size, data
+        data = aml.buffer(b'\x01\x02\x03')
+        offset, view = buffer_at(memoryview(data), 1)
+        self.assertEqual((offset, bytes(view)), (4, b'\x01\x02\x03'))
+
+    def test_declared_size_larger_than_initializer(self):
+        data = aml.buffer(b'\x01\x02', size=0x40)
+        offset, view = buffer_at(memoryview(data), 1)
+        self.assertEqual((offset, bytes(view)), (4, b'\x01\x02'))
+
+    def test_declared_size_smaller_than_initializer(self):
+        data = aml.buffer(b'\x01\x02\x03\x04', size=2)
+        self.assertEqual(bytes(buffer_at(memoryview(data), 1)[1]), b'\x01\x02')
+
+    def test_word_size(self):
+        data = aml.buffer(b'\x55' * 300)
+        offset, view = buffer_at(memoryview(data), 1)
+        self.assertEqual((offset, len(view)), (6, 300))
+
+    def test_size_not_a_constant(self):
+        # Buffer (Arg0) {...}
+        data = b'\x11' + aml.pkg(b'\x68\x01\x02')
+        self.assertIsNone(buffer_at(memoryview(data), 1))
+
+    def test_clipped_at_end_of_table(self):
+        data = aml.buffer(b'\x01\x02\x03\x04')[:-2]
+        self.assertEqual(bytes(buffer_at(memoryview(data), 1)[1]), b'\x01\x02')
+
+    def test_malformed(self):
+        self.assertIsNone(buffer_at(memoryview(b'\x11\x01\x0a\x04'), 1))
+        self.assertIsNone(buffer_at(memoryview(b'\x11'), 1))
+
+
+class DecodeWdgTest(unittest.TestCase):
+
+    def test_entries(self):
+        method, event = decode_wdg(WDG, base=0x100)
+        self.assertEqual(method.guid, uuid.UUID(WMI_GUID))
+        self.assertEqual((method.object_id, method.instance_count, method.flags), (b'01', 1, 0x2))
+        self.assertEqual((method.acpi_method, method.flag_names(), method.offset),
+                         ('WM01', ['method'], 0x100))
+        self.assertIsNone(method.notify_id)
+        self.assertEqual((event.acpi_method, event.notify_id, event.offset), ('_WED', 0xd0, 0x114))
+        self.assertEqual(event.as_dict()['notify_id'], 0xd0)
+        self.assertNotIn('object_id', event.as_dict())
+
+    def test_data_block(self):
+        entry, = decode_wdg(aml.wdg_entry(WMI_GUID, 'AB', flags=0x0))
+        self.assertEqual((entry.acpi_method, entry.flag_names()), ('WQAB', ['data']))
+
+    def test_input_types(self):
+        self.assertEqual(decode_wdg(list(WDG)), decode_wdg(bytearray(WDG)))
+        self.assertEqual(decode_wdg(memoryview(WDG)), decode_wdg(WDG))
+
+    def test_length_not_a_multiple_of_20(self):
+        with self.assertRaisesRegex(ValueError, "not a multiple of 20"):
+            decode_wdg(WDG + b'\x00' * 5)
+
+    def test_legacy_guid_helper(self):
+        self.assertEqual(decode_wmi_guid.decode_wmi_guid(decode_wmi_guid.buffer1), WMI_GUID)
+
+
+class FindWdgTest(unittest.TestCase):
+
+    def test_synthetic_table(self):
+        table = wmi_dsdt()
+        (offset, data), = find_wdg_buffers(table)
+        self.assertEqual(bytes(data), WDG)
+        self.assertEqual(table[offset:offset + len(WDG)], WDG)
+        self.assertEqual([e.acpi_method for e in decode_wdg(data, base=offset)], ['WM01', '_WED'])
+
+    def test_prefixed_names(self):
+        body = (aml.name('\\_WDG', aml.buffer(WDG[:20]))
+                + aml.scope('\\_SB', aml.name('^_WDG', aml.buffer(WDG[20:]))))
+        found = list(find_wdg_buffers(aml.table('SSDT', body)))
+        self.assertEqual([bytes(data) for _, data in found], [WDG[:20], WDG[20:]])
+
+    def test_no_wdg(self):
+        table = aml.table('DSDT', aml.name('_WDX', aml.buffer(WDG)))
+        self.assertEqual(list(find_wdg_buffers(table)), [])
+
+    def test_partial_entry_dropped_by_scan(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "dsdt.dat"
+            path.write_bytes(wmi_dsdt(WDG + b'\x00' * 7))
+            block, = decode_wmi_guid.scan([str(path)])
+        self.assertEqual(len(block['entries']), 2)
+        self.assertEqual(block['table'], 'DSDT')
+
+
+class TableSplitTest(unittest.TestCase):
+
+    def test_back_to_back(self):
+        dsdt, ssdt = wmi_dsdt(), aml.table('SSDT', aml.name('FOO', aml.integer(5)))
+        tables = [(sig, bytes(view)) for sig, view in iter_tables(dsdt + ssdt + b'\xff' * 8)]
+        self.assertEqual(tables, [('DSDT', dsdt), ('SSDT', ssdt)])
+
+    def test_bad_header_stops(self):
+        dsdt = wmi_dsdt()
+        self.assertEqual(list(iter_tables(dsdt[:-1])), [])
+        self.assertEqual(list(iter_tables(b'\x00' * 64)), [])
+        self.assertEqual([sig for sig, _ in iter_tables(dsdt + b'SS!T' + dsdt[4:])], ['DSDT'])
+
+    def test_acpidump_text(self):
+        dsdt, ssdt = wmi_dsdt(), aml.table('SSDT', aml.name('FOO', aml.integer(5)))
+        text = aml.acpidump_text([('DSDT', dsdt), ('SSDT', ssdt)])
+        self.assertEqual(list(iter_acpidump_text(text.splitlines())), [('DSDT', dsdt), ('SSDT', ssdt)])
+
+    def test_acpidump_text_noise(self):
+        lines = ["Firmware dump", "    0000: 44 53", ""] + aml.acpidump_text(
+            [('FACP', b'\x01' * 20), ('EMPT', b'')]).splitlines()
+        self.assertEqual(list(iter_acpidump_text(lines)), [('FACP', b'\x01' * 20)])
+
+    def test_main_on_acpidump_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "acpi.out"
+            path.write_text(aml.acpidump_text([('FACP', b'\x01' * 40), ('DSDT', wmi_dsdt())]))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(decode_wmi_guid.main([str(path), '--json']), 0)
+        block, = json.loads(output.getvalue())
+        self.assertEqual([e['guid'] for e in block['entries']], [WMI_GUID, EVENT_GUID])
+        self.assertEqual(block['entries'][0]['object_id'], '01')
+
+
+if __name__ == '__main__':
+    unittest.main()
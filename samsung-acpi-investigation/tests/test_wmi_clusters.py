@@ -0,0 +1,253 @@
+"""
+wmi_clusters tests: the [FOUND] line parser, response fingerprints, the
+streaming clusters with their overflow cap, baseline and classification,
+and the reservoir samples
+
+Run from samsung-acpi-investigation:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import random
+import unittest
+from pathlib import Path
+
+import wmi_clusters
+from wmi_clusters import (
+    OVERFLOW, Reservoir, ResponseClusters, fingerprint, iter_found_lines, method_ranges, payload,
+)
+from wmi_prober import format_found
+
+RESULTS = Path(__file__).resolve().parent.parent / "wmi_method_results.txt"
+UNSUPPORTED = '{0xff, 0x00}'
+
+
+class FoundLineTest(unittest.TestCase):
+
+    def test_lines(self):
+        lines = [
+            "Testing method 1...\n",
+            "  [FOUND] Method 1: {0xff, 0x00}\n",
+            "  [FOUND] Method 68: {0x64, 0x00} (args 00)\r\n",
+            "[FOUND] Method 70: {0x00, 0x00} (args 0050)   \n",
+            "  [FOUND] Method 9: Error: AE_NOT_FOUND (no handler)\n",
+            "  [FOUND] Method 0x10: {0xff, 0x00}\n",
+            "  [found] Method 2: {0xff, 0x00}\n",
+        ]
+        self.assertEqual(list(iter_found_lines(lines)), [
+            (1, b'', UNSUPPORTED),
+            (68, b'\x00', '{0x64, 0x00}'),
+            (70, b'\x00\x50', '{0x00, 0x00}'),
+            (9, b'', 'Error: AE_NOT_FOUND (no handler)'),
+        ])
+
+    def test_prober_output_round_trip(self):
+        calls = [(0x44, b'', '{0x64, 0x00}'), (0x46, b'\x00\x50', '{0x00, 0x00}'),
+                 (0x45, b'\xff' * 8, UNSUPPORTED)]
+        lines = [format_found(*call) + "\n" for call in calls]
+        self.assertEqual(list(iter_found_lines(lines)), calls)
+
+    def test_results_file(self):
+        with open(RESULTS, errors='replace') as f:
+            found = list(iter_found_lines(f))
+        self.assertEqual([m for m, _, _ in found], list(range(1, 256)))
+        self.assertEqual({(args, response) for _, args, response in found}, {(b'', UNSUPPORTED)})
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_payload(self):
+        self.assertEqual(payload('{0xff, 0x00}'), b'\xff\x00')
+        self.assertEqual(payload(' {0xFF,0x0} '), b'\xff\x00')
+        self.assertEqual(payload('{}'), b'')
+        self.assertEqual(payload('0x1234'), b'0x1234')
+        self.assertEqual(payload('Error: AE_NOT_FOUND'), b'Error: AE_NOT_FOUND')
+
+    def test_fingerprint_ignores_spacing(self):
+        self.assertEqual(fingerprint('{0xff, 0x00}'), fingerprint('{0xFF,0x0}'))
+        self.assertNotEqual(fingerprint('{0xff, 0x00}'), fingerprint('{0x00, 0xff}'))
+        self.assertEqual(len(fingerprint(UNSUPPORTED)), 16)
+
+    def test_method_ranges(self):
+        self.assertEqual(method_ranges([7, 1, 3, 2, 2]), '1-3, 7')
+        self.assertEqual(method_ranges([5]), '5')
+        self.assertEqual(method_ranges([]), '')
+
+
+class ResponseClustersTest(unittest.TestCase):
+
+    def sample(self):
+        """255 unsupported methods, a constant one and an argument-sensitive one"""
+        clusters = ResponseClusters()
+        for method_id in range(1, 256):
+            if method_id not in (0x44, 0x50):
+                clusters.add(method_id, b'', UNSUPPORTED)
+        for threshold in range(256):
+            args = bytes([0, threshold])
+            clusters.add(0x44, args, '{0x64, 0x00}')
+            clusters.add(0x50, args, '{0x00, 0x00}' if threshold <= 100 else UNSUPPORTED)
+        return clusters
+
+    def test_empty(self):
+        clusters = ResponseClusters()
+        self.assertIsNone(clusters.baseline())
+        self.assertEqual(clusters.interesting(), [])
+        self.assertEqual(clusters.summary()['clusters'], [])
+
+    def test_clusters(self):
+        clusters = self.sample()
+        self.assertEqual(clusters.calls, 253 + 2 * 256)
+        self.assertEqual(len(clusters.clusters), 3)
+        unsupported = clusters.clusters[fingerprint(UNSUPPORTED)]
+        self.assertEqual((unsupported['response'], unsupported['calls'], len(unsupported['methods'])),
+                         (UNSUPPORTED, 253 + 155, 254))
+        # The same response spelled differently joins the same cluster
+        clusters.add(3, b'\x01', '{0xFF,0x0}')
+        self.assertEqual(unsupported['calls'], 253 + 156)
+        self.assertEqual(len(clusters.clusters), 3)
+
+    def test_baseline_is_most_methods(self):
+        clusters = self.sample()
+        self.assertEqual(clusters.baseline(), fingerprint(UNSUPPORTED))
+        # Many calls from one method do not make a baseline
+        for i in range(5000):
+            clusters.add(0x44, i.to_bytes(2, 'little'), '{0x64, 0x00}')
+        self.assertEqual(clusters.baseline(), fingerprint(UNSUPPORTED))
+
+    def test_baseline_tie_broken_by_calls(self):
+        clusters = ResponseClusters()
+        clusters.add(1, b'', 'a')
+        clusters.add(2, b'', 'b')
+        clusters.add(2, b'\x01', 'b')
+        self.assertEqual(clusters.baseline(), fingerprint('b'))
+
+    def test_interesting(self):
+        clusters = self.sample()
+        constant, sensitive = clusters.interesting()
+        self.assertEqual(constant, {
+            'method_id': 0x44, 'kind': 'constant', 'calls': 256,
+            'fingerprints': {fingerprint('{0x64, 0x00}'): b'\x00\x00'},
+            'more_fingerprints': False,
+        })
+        self.assertEqual((sensitive['method_id'], sensitive['kind'], sensitive['calls']),
+                         (0x50, 'argument-sensitive', 256))
+        # Each fingerprint maps to the first args that produced it
+        self.assertEqual(sensitive['fingerprints'], {
+            fingerprint('{0x00, 0x00}'): b'\x00\x00',
+            fingerprint(UNSUPPORTED): b'\x00\x65',
+        })
+
+    def test_fingerprint_cap_per_method(self):
+        clusters = ResponseClusters()
+        for i in range(wmi_clusters.FINGERPRINT_CAP + 3):
+            clusters.add(7, bytes([i]), f"{{0x{i:02x}}}")
+        method, = clusters.interesting()
+        self.assertEqual(len(method['fingerprints']), wmi_clusters.FINGERPRINT_CAP)
+        self.assertTrue(method['more_fingerprints'])
+        self.assertEqual(method['kind'], 'argument-sensitive')
+        self.assertEqual(len(clusters.clusters), wmi_clusters.FINGERPRINT_CAP + 3)
+
+    def test_overflow_cap(self):
+        clusters = ResponseClusters(max_clusters=3)
+        responses = [f"{{0x{i:02x}}}" for i in range(10)]
+        for method_id, response in enumerate(responses):
+            clusters.add(method_id, b'', response)
+        # Responses seen before the cap keep their own cluster
+        clusters.add(20, b'\x01', responses[1])
+
+        self.assertEqual(list(clusters.clusters), [fingerprint(r) for r in responses[:3]] + [OVERFLOW])
+        overflow = clusters.clusters[OVERFLOW]
+        self.assertEqual((overflow['response'], overflow['calls'], sorted(overflow['methods'])),
+                         (None, 7, list(range(3, 10))))
+        self.assertEqual(clusters.clusters[fingerprint(responses[1])]['calls'], 2)
+        self.assertEqual(list(clusters.methods[9]['fingerprints']), [OVERFLOW])
+        self.assertLessEqual(len(clusters.fingerprints), 3)
+        # The overflow bucket is the baseline here, and is listed like any other
+        self.assertEqual(clusters.baseline(), OVERFLOW)
+        self.assertEqual(clusters.summary()['clusters'][0]['fingerprint'], OVERFLOW)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            wmi_clusters.print_clusters(clusters)
+        self.assertIn('(other responses)', output.getvalue())
+
+    def test_summary_is_json(self):
+        summary = json.loads(json.dumps(self.sample().summary()))
+        self.assertEqual(summary['calls'], 253 + 2 * 256)
+        self.assertEqual(summary['baseline'], fingerprint(UNSUPPORTED))
+        self.assertEqual([c['calls'] for c in summary['clusters']], [408, 256, 101])
+        self.assertEqual(summary['clusters'][1]['methods'], '68')
+        self.assertEqual(summary['interesting'][1]['fingerprints'][fingerprint(UNSUPPORTED)], '0065')
+
+    def test_feed_accepts_prober_results(self):
+        results = [(1, b'', UNSUPPORTED, False), (2, b'', UNSUPPORTED, True)]
+        clusters = ResponseClusters().feed(iter(results))
+        self.assertEqual((clusters.calls, list(clusters.methods)), (2, [1, 2]))
+
+
+class ReservoirTest(unittest.TestCase):
+
+    def test_fewer_items_than_k(self):
+        reservoir = Reservoir(4, random.Random(0))
+        for i in range(3):
+            reservoir.add(i)
+        self.assertEqual((reservoir.items, reservoir.seen), ([0, 1, 2], 3))
+
+    def test_size_stays_k(self):
+        reservoir = Reservoir(4, random.Random(0))
+        for i in range(10000):
+            reservoir.add(i)
+        self.assertEqual((len(reservoir.items), reservoir.seen), (4, 10000))
+        self.assertEqual(len(set(reservoir.items)), 4)
+
+    def test_uniform(self):
+        counts = [0] * 10
+        for seed in range(3000):
+            reservoir = Reservoir(2, random.Random(seed))
+            for i in range(10):
+                reservoir.add(i)
+            for item in reservoir.items:
+                counts[item] += 1
+        # Every item is kept with probability k/n = 0.2, 600 times expected
+        for item, count in enumerate(counts):
+            with self.subTest(item=item):
+                self.assertTrue(500 <= count <= 700, count)
+
+    def test_cluster_samples_reproducible(self):
+        def samples(seed):
+            clusters = ResponseClusters(samples=3, seed=seed)
+            for i in range(500):
+                clusters.add(i % 50, bytes([i % 256]), UNSUPPORTED)
+            return clusters.summary()['clusters'][0]['samples']
+
+        self.assertEqual(len(samples(0)), 3)
+        self.assertEqual(samples(0), samples(0))
+        self.assertNotEqual(samples(0), samples(1))
+
+
+class MainTest(unittest.TestCase):
+
+    def run_main(self, argv):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            status = wmi_clusters.main(argv)
+        return status, output.getvalue()
+
+    def test_results_file(self):
+        status, output = self.run_main([str(RESULTS), '--json'])
+        summary = json.loads(output)
+        self.assertEqual(status, 0)
+        self.assertEqual((summary['calls'], summary['interesting']), (255, []))
+        cluster, = summary['clusters']
+        self.assertEqual((cluster['methods'], len(cluster['samples'])), ('1-255', 8))
+
+        status, output = self.run_main([str(RESULTS)])
+        self.assertIn("Every method gave the baseline response", output)
+
+    def test_no_results(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            status, _ = self.run_main([str(RESULTS.with_name("missing.txt")), '--json'])
+        self.assertEqual(status, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,291 @@
+"""
+wmi_prober tests: argument patterns, the WM01 stand-in, batched probing
+with the per-firmware result cache, and sweeps with and without it
+
+Run from samsung-acpi-investigation:
+    python3 -m unittest discover -s tests -t .
+"""
+
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import wmi_prober
+from wmi_prober import (
+    EmulatedWm01, ResultCache, expand_args, format_call, iter_calls, parse_methods, parse_pattern,
+    probe, sweep,
+)
+
+UNSUPPORTED = '{0xff, 0x00}'
+
+
+class RecordingWm01(EmulatedWm01):
+    """The stand-in, remembering the size of every batch it was handed"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def call_many(self, calls):
+        self.batches.append(len(calls))
+        return super().call_many(calls)
+
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = Path(tmp.name) / "cache"
+
+
+class PatternTest(unittest.TestCase):
+
+    def test_parse_pattern(self):
+        self.assertEqual(parse_pattern(''), [])
+        self.assertEqual(parse_pattern('0050'), [(0x00,), (0x50,)])
+        self.assertEqual(parse_pattern('00 5a'), [(0x00,), (0x5a,)])
+        self.assertEqual(parse_pattern('??01'), [range(256), (0x01,)])
+
+    def test_invalid_patterns(self):
+        for pattern in ('0', '00?', 'zz', '0?'):
+            with self.subTest(pattern=pattern), self.assertRaises(ValueError):
+                parse_pattern(pattern)
+
+    def test_expand_args(self):
+        self.assertEqual(list(expand_args('')), [b''])
+        self.assertEqual(list(expand_args('0050')), [b'\x00\x50'])
+        swept = list(expand_args('01??'))
+        self.assertEqual(len(swept), 256)
+        self.assertEqual((swept[0], swept[1], swept[-1]), (b'\x01\x00', b'\x01\x01', b'\x01\xff'))
+        self.assertEqual(len(set(expand_args('????'))), 65536)
+
+    def test_expand_args_is_lazy(self):
+        args = expand_args('????????')
+        self.assertEqual([next(args), next(args)], [b'\x00\x00\x00\x00', b'\x00\x00\x00\x01'])
+        with self.assertRaises(ValueError):
+            next(expand_args('abc'))
+
+    def test_iter_calls(self):
+        calls = list(iter_calls([0x44, 0x46], ['', '0050']))
+        self.assertEqual(calls, [(0x44, b''), (0x46, b''), (0x44, b'\x00\x50'), (0x46, b'\x00\x50')])
+
+    def test_iter_calls_skips_covered_args(self):
+        calls = list(iter_calls([1], ['00??', '0050', '01??', '0150']))
+        self.assertEqual(len(calls), 512)
+        self.assertEqual(len(set(calls)), 512)
+        # Order does not matter: 0050 is not called again within 00??
+        self.assertEqual(len(list(iter_calls([1], ['0050', '00??']))), 256)
+
+    def test_parse_methods(self):
+        self.assertEqual(parse_methods('0x44,0x46'), [0x44, 0x46])
+        self.assertEqual(parse_methods('3-5, 1, 4'), [1, 3, 4, 5])
+        self.assertEqual(len(parse_methods('1-255')), 255)
+
+    def test_format_call(self):
+        self.assertEqual(format_call('\\_SB.SWSD.WM01', 0x44, b''),
+                         '\\_SB.SWSD.WM01 0x01 0x44 0x0')
+        self.assertEqual(format_call('\\_SB.SWSD.WM01', 0x46, b'\x00\x50'),
+                         '\\_SB.SWSD.WM01 0x01 0x46 {0x00, 0x50}')
+
+
+class EmulatedWm01Test(unittest.TestCase):
+
+    def test_threshold_handlers(self):
+        wm01 = EmulatedWm01()
+        self.assertEqual(wm01.call(0x44), '{0x64, 0x00}')
+        self.assertEqual(wm01.call(0x46, b'\x00\x50'), '{0x00, 0x00}')
+        self.assertEqual(wm01.call(0x44, b'\x00'), '{0x50, 0x00}')
+        self.assertEqual(wm01.call(0x44, b'\x01'), UNSUPPORTED)
+        self.assertEqual(wm01.calls, 4)
+
+    def test_rejected_set_returns_whole_buffer(self):
+        wm01 = EmulatedWm01()
+        response = wm01.call(0x46, b'\x00\x20\x07')
+        self.assertEqual(response.count('0x'), wmi_prober.SABX_SIZE)
+        # The status overwrites the start of SABX, the other arguments stay
+        self.assertTrue(response.startswith('{0xfe, 0x00, 0x07, 0x00'))
+        self.assertEqual(wm01.threshold, 100)
+
+    def test_unknown_methods(self):
+        wm01 = EmulatedWm01()
+        self.assertEqual(wm01.call_many([(1, b''), (0x45, b'\x00'), (0x400, b'')]), [UNSUPPORTED] * 3)
+
+
+class ResultCacheTest(TempDirTestCase):
+
+    def cache(self, transport=None):
+        return ResultCache.for_transport(transport or EmulatedWm01(), wmi_prober.WM01_PATH,
+                                         self.cache_dir)
+
+    def test_round_trip(self):
+        cache = self.cache()
+        self.assertEqual(cache.path, self.cache_dir / "emulated-wm01-100-_SB_SWSD_WM01.cache")
+        self.assertEqual(cache.results, {})
+        cache.put((0x44, b''), '{0x64, 0x00}')
+        cache.put((0x46, b'\x00\x50'), '{0x00, 0x00}')
+        cache.save()
+        self.assertFalse(cache.dirty)
+
+        again = self.cache()
+        self.assertEqual(again.results, cache.results)
+        self.assertEqual(again.get((0x46, b'\x00\x50')), '{0x00, 0x00}')
+        self.assertIsNone(again.get((0x46, b'')))
+
+    def test_key_per_firmware(self):
+        self.cache().put((1, b''), UNSUPPORTED)
+        other = self.cache(EmulatedWm01(threshold=80))
+        self.assertNotEqual(other.path, self.cache().path)
+
+    def test_clean_cache_is_not_written(self):
+        self.cache().save()
+        self.assertFalse(self.cache_dir.exists())
+
+    def test_corrupt_or_foreign_file(self):
+        cache = self.cache()
+        cache.put((1, b''), UNSUPPORTED)
+        cache.save()
+        for content in (b'', b'\x00garbage', cache.path.read_bytes()[:-3]):
+            cache.path.write_bytes(content)
+            self.assertEqual(self.cache().results, {})
+        wmi_prober.write_cache(cache.path, {'format': wmi_prober.CACHE_FORMAT + 1, 'results': {}})
+        self.assertEqual(self.cache().results, {})
+
+    def test_disabled(self):
+        self.assertIsNone(ResultCache.for_transport(EmulatedWm01(), wmi_prober.WM01_PATH, False))
+
+        class Keyless(EmulatedWm01):
+            def firmware_key(self):
+                return None
+
+        self.assertIsNone(ResultCache.for_transport(Keyless(), wmi_prober.WM01_PATH, self.cache_dir))
+
+
+class ProbeTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.transport = RecordingWm01()
+        self.calls = list(iter_calls([0x43, 0x44, 0x45], ['', '00', '01']))
+
+    def test_batches(self):
+        results = list(probe(self.transport, self.calls, batch_size=4))
+        self.assertEqual(self.transport.batches, [4, 4, 1])
+        self.assertEqual([(m, a) for m, a, _, _ in results], self.calls)
+        self.assertFalse(any(cached for *_, cached in results))
+        self.assertEqual([r for m, a, r, _ in results if m == 0x44], ['{0x64, 0x00}'] * 2 + [UNSUPPORTED])
+
+    def test_identical_responses_interned(self):
+        responses = [r for _, _, r, _ in probe(self.transport, self.calls)]
+        unsupported = [r for r in responses if r == UNSUPPORTED]
+        self.assertEqual(len(unsupported), 7)
+        self.assertTrue(all(r is unsupported[0] for r in unsupported))
+
+    def test_cache_answers_and_fills(self):
+        cache = ResultCache(self.cache_dir / "probe.cache")
+        cache.put((0x44, b''), 'from cache')
+        cache.put((0x45, b'\x01'), 'also cached')
+        results = list(probe(self.transport, self.calls, cache, batch_size=4))
+
+        # Only the misses reach the transport, still in call order
+        self.assertEqual(self.transport.batches, [3, 4])
+        self.assertEqual(self.transport.calls, 7)
+        self.assertEqual([(m, a, r) for m, a, r, cached in results if cached],
+                         [(0x44, b'', 'from cache'), (0x45, b'\x01', 'also cached')])
+        self.assertEqual([(m, a) for m, a, _, _ in results], self.calls)
+        self.assertEqual(len(cache.results), len(self.calls))
+        self.assertEqual(ResultCache(cache.path).results, cache.results)
+
+    def test_fully_cached_batch_skips_transport(self):
+        cache = ResultCache(self.cache_dir / "probe.cache")
+        list(probe(self.transport, self.calls, cache, batch_size=3))
+        self.transport.batches.clear()
+        results = list(probe(self.transport, self.calls, cache, batch_size=3))
+        self.assertEqual(self.transport.batches, [])
+        self.assertTrue(all(cached for *_, cached in results))
+
+    def test_saved_when_abandoned(self):
+        cache = ResultCache(self.cache_dir / "probe.cache")
+        results = probe(self.transport, self.calls, cache, batch_size=2, save_interval=3600)
+        next(results)
+        self.assertFalse(cache.path.exists())
+        results.close()
+        self.assertEqual(list(ResultCache(cache.path).results), [self.calls[0]])
+
+    def test_saved_every_interval(self):
+        cache = ResultCache(self.cache_dir / "probe.cache")
+        results = probe(self.transport, self.calls, cache, batch_size=2, save_interval=0)
+        for _ in range(3):
+            next(results)
+        # The first batch was saved once it was done
+        self.assertEqual(len(ResultCache(cache.path).results), 2)
+        results.close()
+
+
+class SweepTest(TempDirTestCase):
+    """A small sweep of the stand-in's GET method and its neighbours"""
+
+    METHODS = [0x43, 0x44, 0x45]
+    PATTERNS = ['', '00??', '01']
+
+    def run_sweep(self, cache_dir, methods=METHODS):
+        transport = RecordingWm01()
+        cache = ResultCache.for_transport(transport, wmi_prober.WM01_PATH, cache_dir)
+        result = sweep(transport, iter_calls(methods, self.PATTERNS), cache, batch_size=64)
+        return transport, result
+
+    def check(self, result):
+        self.assertEqual(result['calls'], 3 * 258)
+        self.assertEqual(set(result['responses']), {UNSUPPORTED, '{0x64, 0x00}'})
+        threshold = result['responses']['{0x64, 0x00}']
+        self.assertEqual(len(threshold), 257)
+        self.assertEqual({m for m, _ in threshold}, {0x44})
+        self.assertNotIn((0x44, b'\x01'), threshold)
+
+    def test_without_cache(self):
+        for _ in range(2):
+            transport, result = self.run_sweep(False)
+            self.check(result)
+            self.assertEqual((result['cached'], transport.calls), (0, result['calls']))
+        self.assertFalse(self.cache_dir.exists())
+
+    def test_with_cache(self):
+        transport, first = self.run_sweep(self.cache_dir)
+        self.check(first)
+        self.assertEqual((first['cached'], transport.calls), (0, first['calls']))
+
+        transport, second = self.run_sweep(self.cache_dir)
+        self.check(second)
+        self.assertEqual((second['cached'], transport.calls, transport.batches),
+                         (second['calls'], 0, []))
+        self.assertEqual(second['responses'], first['responses'])
+
+    def test_cache_extended_by_a_wider_sweep(self):
+        self.run_sweep(self.cache_dir)
+        transport, result = self.run_sweep(self.cache_dir, self.METHODS + [0x46])
+        self.assertEqual((result['cached'], transport.calls), (3 * 258, 258))
+
+    def test_main_json(self):
+        argv = ['--emulate', '--methods', '0x43-0x45', '--args', '', '--args', '00??',
+                '--cache-dir', str(self.cache_dir), '--json']
+        for expected_cached in (0, 3 * 257):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(wmi_prober.main(argv), 0)
+            result = json.loads(output.getvalue())
+            self.assertEqual((result['method'], result['calls'], result['cached']),
+                             (wmi_prober.WM01_PATH, 3 * 257, expected_cached))
+            self.assertEqual(sorted(r['response'] for r in result['responses']),
+                             ['{0x64, 0x00}', UNSUPPORTED])
+
+    def test_main_bad_pattern(self):
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            self.assertEqual(wmi_prober.main(['--emulate', '--args', '0?', '--no-cache']), 2)
+        self.assertIn("ERROR", errors.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Cluster WMI probe results by response fingerprint in constant memory
+
+Reads probe results as a stream, either `[FOUND] Method N: <response>`
+lines (test_wmi_methods.sh, wmi_prober.py --all) or the calls of a live
+wmi_prober.py sweep, and never keeps the calls themselves:
+
+  clusters     one per response fingerprint (BLAKE2 of the payload
+               bytes, so spacing/case of the text does not matter), with
+               its call count, the methods that produced it and a fixed
+               size reservoir sample of (method, args)
+  methods      per method ID, the fingerprints it produced (capped),
+               each with the first args that produced it
+
+The baseline is the cluster answered by the most methods (the
+{0xff, 0x00} of an unsupported sub-function). Methods that produced
+anything else are the interesting ones; a method with several
+fingerprints is argument-sensitive, one with a single non-baseline
+fingerprint answers a constant.
+
+Memory depends on the number of distinct methods and clusters (capped
+at max_clusters, further fingerprints are counted as overflow), not on
+the number of calls.
+
+Usage:
+  wmi_clusters.py wmi_method_results.txt
+  sudo wmi_prober.py --methods 1-255 --args '00??' --all | wmi_clusters.py
+  wmi_clusters.py results.txt --samples 4 --json
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+
+DEFAULT_SAMPLES = 8
+MAX_CLUSTERS = 4096
+FINGERPRINT_CAP = 16        # Fingerprints remembered per method
+TOP_CLUSTERS = 12
+OVERFLOW = 'overflow'
+
+_FOUND_RE = re.compile(r'^\s*\[FOUND\] Method (\d+): (.*?)(?: \(args ([0-9a-fA-F]*)\))?\s*$')
+_BYTE_RE = re.compile(r'0x([0-9a-fA-F]{1,2})\b')
+
+
+def payload(response):
+    """Bytes of an acpi_call Buffer ({0xff, 0x00}); any other response as text"""
+    text = response.strip()
+    if text.startswith('{') and text.endswith('}'):
+        try:
+            # Fast path for acpi_call's own "0x%02x, " rendering
+            return bytes.fromhex(text[1:-1].replace('0x', '').replace(',', ''))
+        except ValueError:
+            return bytes(int(b, 16) for b in _BYTE_RE.findall(text))
+    return text.encode()
+
+
+def fingerprint(response):
+    """Short hex digest of a response payload"""
+    return hashlib.blake2b(payload(response), digest_size=8).hexdigest()
+
+
+def method_ranges(ids):
+    """[1, 2, 3, 7] -> '1-3, 7'"""
+    parts = []
+    start = prev = None
+    for i in sorted(set(ids)):
+        if prev is not None and i == prev + 1:
+            prev = i
+            continue
+        if start is not None:
+            parts.append(str(start) if start == prev else f"{start}-{prev}")
+        start = prev = i
+    if start is not None:
+        parts.append(str(start) if start == prev else f"{start}-{prev}")
+    return ', '.join(parts)
+
+
+def iter_found_lines(lines):
+    """Yield (method_id, args bytes, response) from [FOUND] result lines"""
+    for line in lines:
+        m = _FOUND_RE.match(line)
+        if m:
+            yield int(m.group(1)), bytes.fromhex(m.group(3) or ''), m.group(2)
+
+
+class Reservoir:
+    """Uniform sample of at most k items from a stream (Algorithm R)"""
+
+    def __init__(self, k, rng):
+        self.k = k
+        self.rng = rng
+        self.seen = 0
+        self.items = []
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.k:
+            self.items.append(item)
+        else:
+            j = self.rng.randrange(self.seen)
+            if j < self.k:
+                self.items[j] = item
+
+
+class ResponseClusters:
+    """
+    Streaming clusters of probe responses
+    Args:
+        samples: Reservoir size per cluster
+        max_clusters: Distinct fingerprints kept; later ones go to OVERFLOW
+        seed: Seed of the reservoir sampling, for reproducible summaries
+    """
+
+    def __init__(self, samples=DEFAULT_SAMPLES, max_clusters=MAX_CLUSTERS, seed=0):
+        self.samples = samples
+        self.max_clusters = max_clusters
+        self.rng = random.Random(seed)
+        self.clusters = {}      # fingerprint -> cluster dict
+        self.methods = {}       # method_id -> method dict
+        self.fingerprints = {}  # response -> fingerprint, for repeated responses
+        self.calls = 0
+
+    def _cluster(self, fp, response):
+        cluster = self.clusters.get(fp)
+        if cluster is None:
+            if len(self.clusters) >= self.max_clusters:
+                fp, response = OVERFLOW, None
+                cluster = self.clusters.get(fp)
+            if cluster is None:
+                cluster = self.clusters[fp] = {
+                    'fingerprint': fp, 'response': response, 'calls': 0,
+                    'methods': set(), 'samples': Reservoir(self.samples, self.rng),
+                }
+        return cluster
+
+    def add(self, method_id, args, response):
+        self.calls += 1
+        fp = self.fingerprints.get(response)
+        if fp is None:
+            fp = fingerprint(response)
+            if len(self.fingerprints) < self.max_clusters:
+                self.fingerprints[response] = fp
+        cluster = self._cluster(fp, response)
+        fp = cluster['fingerprint']
+        cluster['calls'] += 1
+        cluster['methods'].add(method_id)
+        cluster['samples'].add((method_id, args))
+
+        method = self.methods.get(method_id)
+        if method is None:
+            method = self.methods[method_id] = {'calls': 0, 'fingerprints': {}, 'more': False}
+        method['calls'] += 1
+        if fp not in method['fingerprints']:
+            if len(method['fingerprints']) < FINGERPRINT_CAP:
+                method['fingerprints'][fp] = args
+            else:
+                method['more'] = True
+
+    def feed(self, results):
+        """Add every (method_id, args, response, ...) of a stream; returns self"""
+        for result in results:
+            self.add(*result[:3])
+        return self
+
+    def baseline(self):
+        """Fingerprint answered by the most methods, or None"""
+        if not self.clusters:
+            return None
+        return max(self.clusters.values(), key=lambda c: (len(c['methods']), c['calls']))['fingerprint']
+
+    def interesting(self):
+        """
+        Methods that answered anything besides the baseline
+        Returns: [{'method_id', 'kind', 'calls', 'fingerprints',
+                  'more_fingerprints'}]; fingerprints maps each fingerprint
+                 to the first args that produced it, kind is
+                 'argument-sensitive' or 'constant'
+        """
+        baseline = self.baseline()
+        found = []
+        for method_id in sorted(self.methods):
+            method = self.methods[method_id]
+            fps = method['fingerprints']
+            if list(fps) == [baseline] and not method['more']:
+                continue
+            sensitive = len(fps) > 1 or method['more']
+            found.append({
+                'method_id': method_id,
+                'kind': 'argument-sensitive' if sensitive else 'constant',
+                'calls': method['calls'],
+                'fingerprints': dict(fps),
+                'more_fingerprints': method['more'],
+            })
+        return found
+
+    def summary(self):
+        """JSON-ready summary"""
+        baseline = self.baseline()
+        return {
+            'calls': self.calls,
+            'baseline': baseline,
+            'clusters': [{
+                'fingerprint': c['fingerprint'],
+                'response': c['response'],
+                'calls': c['calls'],
+                'methods': method_ranges(c['methods']),
+                'samples': [{'method_id': m, 'args': a.hex()} for m, a in sorted(c['samples'].items)],
+            } for c in sorted(self.clusters.values(), key=lambda c: -c['calls'])],
+            'interesting': [dict(m, fingerprints={fp: args.hex() for fp, args in m['fingerprints'].items()})
+                            for m in self.interesting()],
+        }
+
+
+def print_clusters(clusters, top=TOP_CLUSTERS):
+    baseline = clusters.baseline()
+    print(f"{clusters.calls} calls, {len(clusters.methods)} methods, "
+          f"{len(clusters.clusters)} response cluster(s)")
+    print()
+    ordered = sorted(clusters.clusters.values(), key=lambda c: -c['calls'])
+    for c in ordered[:top]:
+        response = c['response'] or '(other responses)'
+        shown = response if len(response) <= 48 else response[:45] + '...'
+        mark = '  baseline' if c['fingerprint'] == baseline else ''
+        print(f"  {c['fingerprint']:<16}  {shown:<48} {c['calls']:>8} call(s), "
+              f"{len(c['methods'])} method(s){mark}")
+        print(f"  {'':<16}  methods {method_ranges(c['methods'])}")
+    if len(ordered) > top:
+        print(f"  ... {len(ordered) - top} smaller cluster(s)")
+
+    interesting = clusters.interesting()
+    print()
+    if not interesting:
+        print("Every method gave the baseline response")
+        return
+    print(f"{len(interesting)} method(s) answered something else:")
+    for m in interesting:
+        more = '+' if m['more_fingerprints'] else ''
+        print(f"  Method {m['method_id']} (0x{m['method_id']:02x}): {m['kind']}, "
+              f"{len(m['fingerprints'])}{more} response(s) in {m['calls']} call(s)")
+        for fp, args in m['fingerprints'].items():
+            response = clusters.clusters[fp]['response'] or '(other responses)'
+            mark = '  (baseline)' if fp == baseline else ''
+            print(f"      args {args.hex() or '-':<12} -> {response[:60]}{mark}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster WMI probe results by response")
+    parser.add_argument('paths', nargs='*', default=['-'],
+                        help="[FOUND] result files (default stdin)")
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES,
+                        help=f"(method, args) samples kept per cluster (default {DEFAULT_SAMPLES})")
+    parser.add_argument('--seed', type=int, default=0, help="Sampling seed")
+    parser.add_argument('--top', type=int, default=TOP_CLUSTERS,
+                        help=f"Clusters listed (default {TOP_CLUSTERS})")
+    parser.add_argument('--json', action='store_true', help="Print JSON")
+    args = parser.parse_args(argv)
+
+    clusters = ResponseClusters(args.samples, seed=args.seed)
+    for path in args.paths:
+        if path == '-':
+            clusters.feed(iter_found_lines(sys.stdin))
+            continue
+        try:
+            with open(path, errors='replace') as f:
+                clusters.feed(iter_found_lines(f))
+        except OSError as e:
+            print(f"WARNING: Could not read {path}: {e}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(clusters.summary(), indent=2))
+    else:
+        print_clusters(clusters, args.top)
+    return 0 if clusters.calls else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
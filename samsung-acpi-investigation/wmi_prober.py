@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""Sweep WM01 method IDs and argument patterns through a pluggable transport
+
+test_wmi_methods.sh makes one `sudo tee` + `sudo cat` pair per method,
+always with argument 0x0. This prober drives the WMI method that
+decode_wmi_guid.py identifies (GUID C16C47BA-..., object ID "01" ->
+\\_SB.SWSD.WM01) through a transport:
+
+  AcpiCallTransport  /proc/acpi/call (acpi_call module), one fd kept open
+  EmulatedWm01       local stand-in following the DSDT WM01 body
+                     (SMFN 0x5357, SSFN = method ID - 1, SABX, SARF)
+
+Calls are the product of method IDs and argument patterns; a pattern is
+a hex string in which each '??' byte is swept over 0x00-0xFF ("00??" is
+256 patterns). They are issued in batches; identical responses are
+interned, so a sweep is summarized as one line per distinct response.
+
+Responses are cached per firmware, keyed by a BLAKE2 digest of the
+DSDT/SSDTs (or the emulator's identity), so a repeated sweep only calls
+what it has not seen on this firmware. The cache assumes a response
+depends only on the firmware and the call; use --no-cache when probing
+SET methods whose effect changes later results. The cache holds every
+call it has seen, so multi-million-call sweeps should combine
+--no-cache with --cluster (wmi_clusters.py) or --all, which keep
+memory constant.
+
+Usage:
+  wmi_prober.py --emulate --methods 1-255             # stand-in, no root
+  sudo wmi_prober.py --methods 0x40-0x4f --args '' --args '00??'
+  sudo wmi_prober.py --methods 0x45 --args 0050 --all --no-cache
+  wmi_prober.py --emulate --args '????' --cluster --no-cache
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from acpi_scan import ACPI_TABLES_DIR, iter_table_files
+from decode_wmi_guid import AML_TABLES, buffer1, decode_wdg, instance1
+from marshal_cache import default_cache_dir as _cache_dir, read_cache, write_cache
+from wmi_clusters import ResponseClusters, method_ranges, print_clusters
+
+ACPI_CALL = '/proc/acpi/call'
+DMI_DIR = '/sys/class/dmi/id'
+PROBE_CACHE_ENV = 'WMI_PROBE_CACHE'
+CACHE_FORMAT = 1
+INTERN_LIMIT = 4096
+
+# The _WDG entry of WM01 and where the DSDT defines it
+WM01_ENTRY = decode_wdg(buffer1 + instance1)[0]
+WM01_GUID = str(WM01_ENTRY.guid).upper()
+WM01_PATH = f"\\_SB.SWSD.{WM01_ENTRY.acpi_method}"
+# Arg0 of WM01 is the instance index; test_wmi_methods.sh always passes
+# 0x01. Not the _WDG instance count, which only happens to match.
+WM01_INSTANCE = 0x01
+
+# SAWB.SABX, the WM01 argument/result buffer (DRIVER_SPEC.md section 2)
+SABX_SIZE = 2032 // 8
+
+
+_HEX_BYTES = tuple(f"0x{b:02x}" for b in range(256))
+
+
+def format_buffer(data):
+    """Render bytes the way acpi_call prints a Buffer: {0xff, 0x00}"""
+    return '{' + ', '.join(map(_HEX_BYTES.__getitem__, data)) + '}'
+
+
+def format_call(path, method_id, args, instance=WM01_INSTANCE):
+    """acpi_call command line; empty args are passed as 0x0 like the shell loop"""
+    arg = format_buffer(args) if args else '0x0'
+    return f"{path} 0x{instance:02x} 0x{method_id:02x} {arg}"
+
+
+class AcpiCallTransport:
+    """
+    WM01 calls through the acpi_call module
+
+    The call file is opened once; each call is a write of the command
+    and a pread of the result, without a process per call.
+    """
+
+    def __init__(self, path=WM01_PATH, call_file=ACPI_CALL, tables=ACPI_TABLES_DIR):
+        self.path = path
+        self.call_file = call_file
+        self.tables = tables
+        self.fd = None
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.call_file, os.O_RDWR)
+        return self
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, method_id, args=b''):
+        os.write(self.fd, format_call(self.path, method_id, args).encode())
+        return os.pread(self.fd, 4096, 0).rstrip(b'\x00\n').decode('ascii', 'replace')
+
+    def call_many(self, calls):
+        return [self.call(method_id, args) for method_id, args in calls]
+
+    def firmware_key(self):
+        """Digest of the DSDT/SSDTs, else of the DMI BIOS strings, else None"""
+        digest = hashlib.blake2b(digest_size=10)
+        count = 0
+        for _, signature, table in iter_table_files([self.tables]):
+            if signature.encode() in AML_TABLES:
+                digest.update(table)
+                count += 1
+        if count:
+            return f"acpi-{digest.hexdigest()}"
+        # /sys/firmware/acpi/tables is root-only; DMI identifies the BIOS build
+        fields = []
+        for name in ('bios_vendor', 'bios_version', 'bios_date', 'product_name'):
+            try:
+                fields.append(Path(DMI_DIR, name).read_text().strip())
+            except OSError:
+                return None
+        digest.update('\n'.join(fields).encode())
+        return f"dmi-{digest.hexdigest()}"
+
+
+class EmulatedWm01:
+    """
+    Local stand-in for \\_SB.SWSD.WM01
+
+    Follows the DSDT method: SABX is cleared and loaded with the
+    arguments, SSFN is the 0-based method ID, the SMI handler fills SABX
+    and SARF, and WM01 returns the first 16 bits of SABX when SARF is
+    zero or the whole buffer otherwise. Unknown sub-functions answer
+    0x00ff like every method in wmi_method_results.txt. The battery
+    threshold handlers follow the hypothesis in DRIVER_SPEC.md section 4
+    (GET 0x44, SET 0x46, battery 0, 50-100 %); they are not confirmed.
+    """
+
+    GET_THRESHOLD = 0x44
+    SET_THRESHOLD = 0x46
+
+    def __init__(self, threshold=100):
+        self.threshold = threshold
+        self.calls = 0
+        self.handlers = {
+            self.GET_THRESHOLD - 1: self._get_threshold,
+            self.SET_THRESHOLD - 1: self._set_threshold,
+        }
+
+    def open(self):
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def _get_threshold(self, sabx):
+        if sabx[0] != 0:
+            return b'\xff\x00', 0
+        return bytes([self.threshold, 0]), 0
+
+    def _set_threshold(self, sabx):
+        if sabx[0] != 0 or not 50 <= sabx[1] <= 100:
+            return b'\xfe\x00', 1
+        self.threshold = sabx[1]
+        return b'\x00\x00', 0
+
+    def call(self, method_id, args=b''):
+        self.calls += 1
+        sabx = bytearray(SABX_SIZE)
+        sabx[:len(args)] = args[:SABX_SIZE]
+        ssfn = (method_id - 1) & 0xffff
+        handler = self.handlers.get(ssfn)
+        if handler is None:
+            result, sarf = b'\xff\x00', 0
+        else:
+            result, sarf = handler(sabx)
+        sabx[:len(result)] = result
+        return format_buffer(sabx[:2] if sarf == 0 else sabx)
+
+    def call_many(self, calls):
+        return [self.call(method_id, args) for method_id, args in calls]
+
+    def firmware_key(self):
+        return f"emulated-wm01-{self.threshold}"
+
+
+def parse_methods(spec):
+    """'1-255', '0x40-0x4f,0x80' -> sorted method IDs"""
+    ids = set()
+    for part in spec.split(','):
+        first, _, last = part.strip().partition('-')
+        ids.update(range(int(first, 0), int(last or first, 0) + 1))
+    return sorted(ids)
+
+
+def parse_pattern(pattern):
+    """
+    Parse an argument pattern
+    Args:
+        pattern: Hex bytes, '??' for a byte swept over 0x00-0xFF
+                 (e.g. '0050', '00??', '' for no arguments)
+    Returns: list with the possible values of each byte
+    Raises: ValueError for an odd length or a non-hex byte
+    """
+    pattern = pattern.replace(' ', '')
+    if len(pattern) % 2:
+        raise ValueError(f"Argument pattern {pattern!r} has an odd number of digits")
+    choices = []
+    for i in range(0, len(pattern), 2):
+        byte = pattern[i:i + 2]
+        choices.append(range(256) if byte == '??' else (int(byte, 16),))
+    return choices
+
+
+def expand_args(pattern):
+    """Yield every byte string of an argument pattern, lazily"""
+    for combo in itertools.product(*parse_pattern(pattern)):
+        yield bytes(combo)
+
+
+def iter_calls(method_ids, patterns):
+    """
+    (method_id, args) for every method and expanded pattern; args already
+    covered by an earlier pattern are skipped without remembering calls
+    """
+    parsed = []
+    for pattern in patterns:
+        choices = parse_pattern(pattern)
+        for combo in itertools.product(*choices):
+            args = bytes(combo)
+            if any(len(earlier) == len(args) and all(b in c for b, c in zip(args, earlier))
+                   for earlier in parsed):
+                continue
+            for method_id in method_ids:
+                yield method_id, args
+        parsed.append(choices)
+
+
+def default_cache_dir():
+    """$WMI_PROBE_CACHE, else $XDG_CACHE_HOME/wmi-prober"""
+    return _cache_dir(PROBE_CACHE_ENV, "wmi-prober")
+
+
+class ResultCache:
+    """{(method_id, args): response} of one firmware, persisted with marshal"""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self.dirty = False
+        self._load()
+
+    @classmethod
+    def for_transport(cls, transport, method_path, cache_dir=None):
+        """Cache of the transport's firmware; None if disabled or it has no key"""
+        key = transport.firmware_key() if cache_dir is not False else None
+        if key is None:
+            return None
+        name = method_path.lstrip('\\').replace('.', '_')
+        return cls(Path(cache_dir or default_cache_dir()) / f"{key}-{name}.cache")
+
+    def _load(self):
+        cached = read_cache(self.path, CACHE_FORMAT)
+        if cached is not None:
+            self.results = cached['results']
+
+    def get(self, call):
+        return self.results.get(call)
+
+    def put(self, call, response):
+        self.results[call] = response
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        if write_cache(self.path, {'format': CACHE_FORMAT, 'results': self.results}):
+            self.dirty = False
+
+
+def probe(transport, calls, cache=None, batch_size=256, save_interval=1.0):
+    """
+    Issue calls in batches, answering from the cache where possible
+    Args:
+        transport: Object with call_many([(method_id, args)]) -> [response]
+        calls: Iterable of (method_id, args bytes)
+        cache: Optional ResultCache, saved at most every save_interval s;
+               without one nothing is kept per call
+        batch_size: Calls handed to the transport at once
+    Yields: (method_id, args, response, cached) in call order
+    """
+    interned = {}       # One string per distinct response, up to INTERN_LIMIT
+    calls = iter(calls)
+    last_save = time.monotonic()
+    try:
+        while True:
+            batch = list(itertools.islice(calls, batch_size))
+            if not batch:
+                break
+            answers = [cache.get(call) for call in batch] if cache else [None] * len(batch)
+            pending = [call for call, answer in zip(batch, answers) if answer is None]
+            fresh = iter(transport.call_many(pending) if pending else ())
+            for call, answer in zip(batch, answers):
+                cached = answer is not None
+                if not cached:
+                    answer = next(fresh)
+                    if cache:
+                        cache.put(call, answer)
+                if len(interned) < INTERN_LIMIT:
+                    answer = interned.setdefault(answer, answer)
+                else:
+                    answer = interned.get(answer, answer)
+                yield call[0], call[1], answer, cached
+            if cache and time.monotonic() - last_save >= save_interval:
+                cache.save()
+                last_save = time.monotonic()
+    finally:
+        if cache:
+            cache.save()
+
+
+def sweep(transport, calls, cache=None, batch_size=256):
+    """
+    Probe every call and group the calls by response
+    Returns: {'responses': {response: [(method_id, args)]}, 'calls',
+              'cached', 'elapsed'}
+    """
+    start = time.monotonic()
+    responses = {}
+    total = cached_count = 0
+    for method_id, args, response, cached in probe(transport, calls, cache, batch_size):
+        responses.setdefault(response, []).append((method_id, args))
+        total += 1
+        cached_count += cached
+    return {'responses': responses, 'calls': total, 'cached': cached_count,
+            'elapsed': time.monotonic() - start}
+
+
+def format_found(method_id, args, response):
+    """One result line in the test_wmi_methods.sh format"""
+    suffix = f" (args {args.hex()})" if args else ""
+    return f"  [FOUND] Method {method_id}: {response}{suffix}"
+
+
+def print_sweep(result):
+    """Print one line per distinct response"""
+    by_count = sorted(result['responses'].items(), key=lambda item: -len(item[1]))
+    print(f"{len(result['responses'])} distinct response(s):")
+    for response, calls in by_count:
+        shown = response if len(response) <= 60 else response[:57] + '...'
+        arg_count = len({args for _, args in calls})
+        print(f"  {shown:<60} {len(calls):>6} call(s), methods "
+              f"{method_ranges(m for m, _ in calls)}, {arg_count} distinct argument(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep WM01 method IDs and arguments")
+    parser.add_argument('--methods', default='1-255', help="Method IDs, e.g. 1-255 or 0x44,0x46")
+    parser.add_argument('--args', action='append', dest='patterns',
+                        help="Argument hex pattern, '??' sweeps a byte (repeatable, default none)")
+    parser.add_argument('--emulate', action='store_true', help="Use the local WM01 stand-in")
+    parser.add_argument('--acpi-call', default=ACPI_CALL, help=f"acpi_call file (default {ACPI_CALL})")
+    parser.add_argument('--tables', default=ACPI_TABLES_DIR, help="ACPI tables for the cache key")
+    parser.add_argument('--batch', type=int, default=256, help="Calls per batch")
+    parser.add_argument('--cache-dir', help="Result cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Always call, never cache")
+    parser.add_argument('--all', action='store_true',
+                        help="Print every call as it completes ([FOUND] lines)")
+    parser.add_argument('--cluster', action='store_true',
+                        help="Summarize by response fingerprint in constant memory")
+    parser.add_argument('--json', action='store_true', help="Print JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        method_ids = parse_methods(args.methods)
+        patterns = args.patterns or ['']
+        for pattern in patterns:
+            parse_pattern(pattern)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    if args.emulate:
+        transport = EmulatedWm01()
+    else:
+        transport = AcpiCallTransport(WM01_PATH, args.acpi_call, args.tables)
+    cache = ResultCache.for_transport(transport, WM01_PATH,
+                                      False if args.no_cache else args.cache_dir)
+    try:
+        transport.open()
+    except OSError as e:
+        print(f"ERROR: Cannot open {args.acpi_call}: {e}", file=sys.stderr)
+        print("Load acpi_call (sudo modprobe acpi_call) and run as root, "
+              "or use --emulate", file=sys.stderr)
+        return 1
+    calls = iter_calls(method_ids, patterns)
+    source = "emulated WM01" if args.emulate else args.acpi_call
+    try:
+        if args.all:
+            start = time.monotonic()
+            total = cached = 0
+            for method_id, call_args, response, hit in probe(transport, calls, cache, args.batch):
+                print(format_found(method_id, call_args, response))
+                total += 1
+                cached += hit
+            print(f"\n{total} calls ({cached} from cache) in "
+                  f"{(time.monotonic() - start) * 1000:.1f} ms")
+            return 0
+        if args.cluster:
+            clusters = ResponseClusters().feed(probe(transport, calls, cache, args.batch))
+            if args.json:
+                print(json.dumps(dict(clusters.summary(), guid=WM01_GUID, method=WM01_PATH),
+                                 indent=2))
+            else:
+                print(f"{WM01_GUID} -> {WM01_PATH} via {source}\n")
+                print_clusters(clusters)
+            return 0
+        result = sweep(transport, calls, cache, args.batch)
+    finally:
+        transport.close()
+
+    if args.json:
+        print(json.dumps({
+            'guid': WM01_GUID,
+            'method': WM01_PATH,
+            'calls': result['calls'],
+            'cached': result['cached'],
+            'responses': [{'response': response,
+                           'calls': [{'method_id': m, 'args': a.hex()} for m, a in calls]}
+                          for response, calls in result['responses'].items()],
+        }, indent=2))
+        return 0
+
+    print(f"{WM01_GUID} -> {WM01_PATH} via {source}")
+    print(f"Cache: {cache.path if cache else 'disabled'}")
+    print()
+    print_sweep(result)
+    print(f"\n{result['calls']} calls ({result['cached']} from cache) in "
+          f"{result['elapsed'] * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())